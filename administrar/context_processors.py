@@ -1,9 +1,9 @@
-from .models import Empresa
+from .services import ConfiguracionEmpresa
 
 def empresa_context(request):
     """
-    Provee el objeto Empresa a todas las plantillas.
+    Provee el objeto Empresa a todas las plantillas (cacheado, ver ConfiguracionEmpresa).
     """
     return {
-        'empresa': Empresa.objects.first()
+        'empresa': ConfiguracionEmpresa.obtener()
     }
@@ -1,7 +1,7 @@
 
 from django.core.mail.backends.smtp import EmailBackend
 from django.conf import settings
-from .models import Empresa
+from .services import ConfiguracionEmpresa
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +14,7 @@ class DatabaseEmailBackend(EmailBackend):
         
         # Intentar cargar configuración de la base de datos
         try:
-            empresa = Empresa.objects.first()
+            empresa = ConfiguracionEmpresa.obtener()
             if empresa and empresa.smtp_server and empresa.smtp_user:
                 host = empresa.smtp_server
                 port = empresa.smtp_port
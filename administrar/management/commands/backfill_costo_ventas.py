@@ -0,0 +1,26 @@
+"""
+Completa DetalleVenta.costo_unitario en las líneas de venta registradas antes de capturar el costo
+al vender (último costo de MovimientoStock a la fecha de la venta o, si no hay, el costo actual).
+Ejecutar con: python manage.py backfill_costo_ventas [--lote N] [--dry-run]
+"""
+
+from django.core.management.base import BaseCommand
+
+from administrar.services_ventas import VentaService
+
+
+class Command(BaseCommand):
+    help = 'Completa el costo unitario histórico de las líneas de venta que no lo tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Líneas por lote')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa, sin guardar')
+
+    def handle(self, *args, **options):
+        completadas, total = VentaService.completar_costos(lote=options['lote'], aplicar=not options['dry_run'])
+
+        mensaje = f"Líneas de venta sin costo: {completadas}, CMV que suman: ${total:,.2f}"
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(mensaje + ' (simulación: sin --dry-run para guardar)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(mensaje + ' - completadas'))
@@ -0,0 +1,137 @@
+"""
+Benchmark del balance de sumas y saldos: compara la consulta por cuenta (esquema anterior,
+2 aggregate() por cuenta) contra BalanceService (snapshots mensuales + 1 consulta agrupada).
+Ejecutar con: python manage.py benchmark_balance [--cuentas 400] [--asientos 10000]
+Todo se ejecuta dentro de una transacción que se revierte al final (no deja datos).
+"""
+
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from administrar.models import PlanCuenta, EjercicioContable, Asiento, ItemAsiento
+from administrar.services_contabilidad import BalanceService, SaldosService, PlanCuentasService
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara consultas SQL y tiempo del balance de sumas y saldos (por cuenta vs agrupado)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cuentas', type=int, default=400, help='Cuentas imputables a generar')
+        parser.add_argument('--asientos', type=int, default=10000, help='Asientos a generar (2 ítems c/u)')
+
+    def _crear_plan(self, cantidad):
+        """Rubros de nivel 1 y 2 (no imputables) con cuentas imputables de nivel 3"""
+        rubros = []
+        for i in range(1, 5):
+            rubros.append(PlanCuenta.objects.create(
+                codigo=f"9{i}", nombre=f"Rubro Bench {i}", tipo='ACTIVO', imputable=False, nivel=1
+            ))
+        subrubros = []
+        for rubro in rubros:
+            for j in range(1, 6):
+                subrubros.append(PlanCuenta.objects.create(
+                    codigo=f"{rubro.codigo}.{j:02d}", nombre=f"Subrubro Bench {rubro.codigo}.{j}",
+                    tipo='ACTIVO', imputable=False, nivel=2, padre=rubro
+                ))
+        PlanCuenta.objects.bulk_create([
+            PlanCuenta(
+                codigo=f"{subrubros[i % len(subrubros)].codigo}.{i:04d}", nombre=f"Cuenta Bench {i}",
+                tipo='ACTIVO', imputable=True, nivel=3, padre=subrubros[i % len(subrubros)]
+            )
+            for i in range(cantidad)
+        ])
+        PlanCuentasService.reconstruir_rutas()  # bulk_create no dispara la señal que asigna la ruta
+        return list(PlanCuenta.objects.filter(codigo__startswith="9", imputable=True))
+
+    def _crear_asientos(self, ejercicio, cuentas, cantidad):
+        inicio = timezone.make_aware(datetime.combine(ejercicio.fecha_inicio, datetime.min.time()))
+        asientos = Asiento.objects.bulk_create([
+            Asiento(
+                numero=i + 1,
+                fecha=inicio + timedelta(hours=i % 8000),
+                descripcion=f"Asiento Bench {i}",
+                ejercicio=ejercicio,
+                origen='MANUAL'
+            )
+            for i in range(cantidad)
+        ])
+        if asientos and asientos[0].pk is None:  # MySQL no devuelve los ids en bulk_create
+            asientos = list(Asiento.objects.filter(ejercicio=ejercicio, descripcion__startswith="Asiento Bench"))
+
+        items = []
+        for asiento in asientos:
+            monto = Decimal(random.randint(100, 100000)) / 100
+            debe, haber = random.sample(cuentas, 2)
+            items.append(ItemAsiento(asiento=asiento, cuenta=debe, debe=monto, haber=0))
+            items.append(ItemAsiento(asiento=asiento, cuenta=haber, debe=0, haber=monto))
+        ItemAsiento.objects.bulk_create(items, batch_size=5000)
+        # bulk_create no pasa por AsientoBuilder: se regeneran los snapshots mensuales
+        SaldosService.reconstruir(ejercicio.id)
+
+    @staticmethod
+    def _balance_por_cuenta(ejercicio, fecha_desde, fecha_hasta):
+        """Esquema anterior de api_balance_generar: 2 aggregate() por cuenta"""
+        filas = []
+        for cuenta in PlanCuenta.objects.all().order_by('codigo'):
+            items = ItemAsiento.objects.filter(
+                cuenta=cuenta,
+                asiento__ejercicio_id=ejercicio.id,
+                asiento__fecha__gte=fecha_desde,
+                asiento__fecha__lte=fecha_hasta
+            )
+            debe = items.aggregate(total=Sum('debe'))['total'] or Decimal('0')
+            haber = items.aggregate(total=Sum('haber'))['total'] or Decimal('0')
+            if debe or haber:
+                filas.append((cuenta.codigo, debe, haber))
+        return filas
+
+    def _medir(self, funcion):
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            funcion()
+            duracion = (time.perf_counter() - inicio) * 1000
+        return len(ctx.captured_queries), duracion
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        resultados = []
+
+        try:
+            with transaction.atomic():
+                ejercicio = EjercicioContable.objects.create(
+                    descripcion="Ejercicio Benchmark",
+                    fecha_inicio=date(2000, 1, 1),
+                    fecha_fin=date(2000, 12, 31)
+                )
+                cuentas = self._crear_plan(options['cuentas'])
+                self._crear_asientos(ejercicio, cuentas, options['asientos'])
+                self.stdout.write(f"Datos: {len(cuentas)} cuentas imputables, {options['asientos']} asientos")
+
+                desde, hasta = ejercicio.fecha_inicio, ejercicio.fecha_fin
+                resultados.append(('Por cuenta (anterior)',) + self._medir(
+                    lambda: self._balance_por_cuenta(ejercicio, desde, hasta)
+                ))
+                resultados.append(('BalanceService',) + self._medir(
+                    lambda: BalanceService.generar(ejercicio.id, desde, hasta)
+                ))
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'Motor':<24} | {'Consultas':>9} | {'Tiempo (ms)':>11}")
+        self.stdout.write("-" * 50)
+        for motor, consultas, duracion in resultados:
+            self.stdout.write(f"{motor:<24} | {consultas:>9} | {duracion:>11.1f}")
@@ -0,0 +1,97 @@
+"""
+Benchmark del buscador de productos: latencia de icontains sobre código/descripción (esquema
+anterior) contra ProductoBuscador, con un catálogo grande.
+Ejecutar con: python manage.py benchmark_busqueda [--productos 50000] [--repeticiones 20]
+Todo se ejecuta dentro de una transacción que se revierte al final (no deja datos).
+"""
+
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from administrar.models import Producto
+from administrar.services_productos import ProductoBuscador
+
+
+class _Rollback(Exception):
+    pass
+
+
+PALABRAS = [
+    'tornillo', 'tuerca', 'arandela', 'cable', 'caño', 'codo', 'llave', 'térmica', 'lámpara', 'pintura',
+    'látex', 'esmalte', 'rodillo', 'pincel', 'cinta', 'aislante', 'taladro', 'mecha', 'acero', 'bronce',
+    'galvanizado', 'blanco', 'negro', 'interior', 'exterior', 'chico', 'grande', 'rosca', 'hexagonal', 'ñandú',
+]
+CONSULTAS = ['torn', 'tornillo hex', 'latex blanco', 'BENCH-01234', '01234', 'cab', 'termica', 'zzz', 'ca']
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia del buscador de productos (icontains vs ProductoBuscador)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=50000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def _crear_productos(self, cantidad):
+        Producto.objects.bulk_create([
+            Producto(
+                codigo=f"BENCH-{i:05d}",
+                descripcion=' '.join(random.sample(PALABRAS, 4)).capitalize() + f" {random.randint(1, 99)}mm",
+                costo=Decimal("10.00"), precio_efectivo=Decimal("20.00"),
+                precio_tarjeta=Decimal("22.00"), precio_ctacte=Decimal("24.00"),
+            )
+            for i in range(cantidad)
+        ], batch_size=5000)
+        # bulk_create no pasa por las señales: se completa el texto de búsqueda
+        ProductoBuscador.reindexar(Producto.objects.filter(codigo__startswith="BENCH-"))
+
+    @staticmethod
+    def _anterior(texto):
+        return list(Producto.objects.filter(Q(codigo__icontains=texto) | Q(descripcion__icontains=texto))[:20])
+
+    @staticmethod
+    def _nuevo(texto):
+        return list(ProductoBuscador.filtrar(texto)[:20])
+
+    def _latencias(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            for consulta in CONSULTAS:
+                inicio = time.perf_counter()
+                funcion(consulta)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        resultados = []
+
+        try:
+            with transaction.atomic():
+                self._crear_productos(options['productos'])
+                self.stdout.write(f"Datos: {options['productos']} productos ({connection.vendor})")
+
+                inicio = time.perf_counter()
+                self._nuevo('calentamiento')  # En SQLite construye el índice en memoria
+                self.stdout.write(f"Primera búsqueda (carga de índice): {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+                resultados.append(('icontains (anterior)',) + self._latencias(self._anterior, options['repeticiones']))
+                resultados.append(('ProductoBuscador',) + self._latencias(self._nuevo, options['repeticiones']))
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            # El índice en memoria puede tener productos que se revirtieron
+            ProductoBuscador.invalidar()
+
+        self.stdout.write(f"{'Motor':<22} | {'p50 (ms)':>9} | {'p95 (ms)':>9}")
+        self.stdout.write("-" * 46)
+        for motor, p50, p95 in resultados:
+            self.stdout.write(f"{motor:<22} | {p50:>9.2f} | {p95:>9.2f}")
@@ -0,0 +1,140 @@
+"""
+Benchmark de api_dashboard_stats con un volumen grande de ventas.
+Mide la respuesta completa con cache vacío y con cache caliente, y compara el costo estimado
+y el gráfico de 6 meses contra el esquema anterior (sum() en Python y 12 aggregate()).
+Ejecutar con: python manage.py benchmark_dashboard [--ventas 100000]
+Todo se ejecuta dentro de una transacción que se revierte al final (no deja datos).
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from administrar.models import Cliente, Producto, Venta, DetalleVenta, Compra
+from administrar.services_dashboard import DashboardService
+from administrar.views import api_dashboard_stats
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas SQL y tiempo de api_dashboard_stats (cache vacío/caliente) con N ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventas', type=int, default=100000, help='Ventas a generar (1 a 3 líneas c/u)')
+        parser.add_argument('--dias', type=int, default=180, help='Días hacia atrás en que se reparten las ventas')
+
+    def _crear_ventas(self, cantidad, dias):
+        cliente = Cliente.objects.create(nombre="Cliente Benchmark", condicion_fiscal="CF")
+        Producto.objects.bulk_create([
+            Producto(
+                codigo=f"BENCH-{i:05d}", descripcion=f"Producto Benchmark {i}", stock=1000,
+                costo=Decimal(random.randint(100, 5000)) / 100, precio_efectivo=Decimal("100.00"),
+                precio_tarjeta=Decimal("110.00"), precio_ctacte=Decimal("120.00"),
+            )
+            for i in range(200)
+        ])
+        productos = list(Producto.objects.filter(codigo__startswith="BENCH-"))
+
+        Venta.objects.bulk_create([
+            Venta(cliente=cliente, tipo_comprobante='B', total=Decimal(random.randint(1000, 100000)) / 100)
+            for _ in range(cantidad)
+        ], batch_size=5000)
+        ventas = list(Venta.objects.filter(cliente=cliente).values_list('id', flat=True))
+
+        detalles = []
+        for venta_id in ventas:
+            for producto in random.sample(productos, random.randint(1, 3)):
+                detalles.append(DetalleVenta(
+                    venta_id=venta_id, producto=producto, cantidad=random.randint(1, 5),
+                    precio_unitario=Decimal("100.00"), subtotal=Decimal("100.00")
+                ))
+        DetalleVenta.objects.bulk_create(detalles, batch_size=5000)
+
+        # `fecha` es auto_now_add: se reparte en los últimos N días con un UPDATE por día
+        ahora = timezone.now()
+        for dia in range(dias):
+            Venta.objects.filter(id__in=ventas[dia::dias]).update(fecha=ahora - timedelta(days=dia))
+        return len(detalles)
+
+    @staticmethod
+    def _esquema_anterior(dt_start, dt_end, hoy_date):
+        """Costo del rango con sum() en Python + 6 meses con 2 aggregate() por mes"""
+        ventas_rango = Venta.objects.filter(fecha__range=(dt_start, dt_end))
+        detalles = DetalleVenta.objects.filter(venta__in=ventas_rango).select_related('producto')
+        sum((d.cantidad * d.producto.costo) for d in detalles)
+        for i in range(5, -1, -1):
+            target_date = hoy_date
+            for _ in range(i):
+                target_date = target_date.replace(day=1) - timedelta(days=1)
+            inicio = timezone.make_aware(datetime.combine(target_date.replace(day=1), datetime.min.time()))
+            fin = timezone.make_aware(datetime.combine(
+                (target_date.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1),
+                datetime.max.time()
+            ))
+            Venta.objects.filter(fecha__range=(inicio, fin)).aggregate(total=Sum('total'))
+            Compra.objects.filter(fecha__range=(inicio, fin)).aggregate(total=Sum('total'))
+
+    def _medir(self, funcion):
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            funcion()
+            duracion = (time.perf_counter() - inicio) * 1000
+        return len(ctx.captured_queries), duracion
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        resultados = []
+        factory = RequestFactory()
+
+        try:
+            with transaction.atomic():
+                lineas = self._crear_ventas(options['ventas'], options['dias'])
+                self.stdout.write(f"Datos: {options['ventas']} ventas, {lineas} líneas")
+
+                usuario = User.objects.create_superuser("benchmark_dashboard", "bench@example.com", "x")
+                hoy_date = timezone.localdate()
+                dt_start = timezone.make_aware(datetime.combine(hoy_date.replace(day=1), datetime.min.time()))
+                dt_end = timezone.make_aware(datetime.combine(hoy_date, datetime.max.time()))
+
+                def endpoint():
+                    request = factory.get('/api/dashboard/stats/')
+                    request.user = usuario
+                    response = api_dashboard_stats(request)
+                    if response.status_code != 200:
+                        raise RuntimeError(response.content.decode())
+
+                resultados.append(('Costo + 6 meses (anterior)',) + self._medir(
+                    lambda: self._esquema_anterior(dt_start, dt_end, hoy_date)
+                ))
+                resultados.append(('Costo + 6 meses (nuevo)',) + self._medir(lambda: (
+                    DashboardService.costo_ventas(Venta.objects.filter(fecha__range=(dt_start, dt_end))),
+                    DashboardService.totales_por_mes(Venta, dt_start - timedelta(days=160)),
+                    DashboardService.totales_por_mes(Compra, dt_start - timedelta(days=160)),
+                )))
+                DashboardService.invalidar()
+                resultados.append(('Endpoint, cache vacío',) + self._medir(endpoint))
+                resultados.append(('Endpoint, cache caliente',) + self._medir(endpoint))
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            # Descarta lo cacheado con datos que se revirtieron
+            DashboardService.invalidar()
+
+        self.stdout.write(f"{'Escenario':<28} | {'Consultas':>9} | {'Tiempo (ms)':>11}")
+        self.stdout.write("-" * 54)
+        for escenario, consultas, duracion in resultados:
+            self.stdout.write(f"{escenario:<28} | {consultas:>9} | {duracion:>11.1f}")
@@ -0,0 +1,120 @@
+"""
+Benchmark de los motores de PDF: ReportLab directo (PdfNativo) contra HTML + xhtml2pdf.
+Arma facturas de --lineas ítems y un estado de cuenta de --movimientos movimientos dentro de una transacción
+que se revierte al final (no deja datos), y renderiza cada documento --repeticiones veces con cada motor.
+Cada motor corre en un proceso nuevo (spawn) para medir por separado páginas por segundo y pico de RSS.
+Ejecutar con: python manage.py benchmark_pdf [--lineas 10 100] [--movimientos 300] [--repeticiones 10]
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from administrar.models import Cliente, DetalleVenta, Producto, Venta
+from administrar.services import ConfiguracionEmpresa
+from administrar.services_pdf import ComprobantePdf
+from administrar.services_pdf_nativo import PdfNativo
+from administrar.utils_pdf import inicializar_proceso_pdf, medir_motor_pdf
+
+MOTORES = ('reportlab', 'xhtml2pdf')
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara páginas/segundo y pico de memoria de los motores de PDF (ReportLab y xhtml2pdf)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', nargs='+', type=int, default=[10, 100], help='Ítems por factura')
+        parser.add_argument('--movimientos', type=int, default=300, help='Movimientos del estado de cuenta')
+        parser.add_argument('--repeticiones', type=int, default=10, help='Renders de cada documento por motor')
+
+    def _documentos(self, lineas, movimientos):
+        """{motor: [(nombre, fuente)]} con las mismas facturas y estado de cuenta para los 2 motores"""
+        documentos = {motor: [] for motor in MOTORES}
+        template = get_template(ComprobantePdf.DOCUMENTOS['factura'][1])
+        try:
+            with transaction.atomic():
+                cliente = Cliente.objects.create(nombre="Cliente Benchmark PDF", condicion_fiscal="CF",
+                                                 domicilio="Calle Falsa 123")
+                Producto.objects.bulk_create([
+                    Producto(codigo=f"BPDF-{i:05d}", descripcion=f"Producto Benchmark PDF {i}",
+                             precio_efectivo=Decimal("100.00"), precio_tarjeta=Decimal("110.00"),
+                             precio_ctacte=Decimal("120.00"))
+                    for i in range(max(lineas))
+                ])
+                productos = list(Producto.objects.filter(codigo__startswith="BPDF-").order_by('codigo'))
+
+                for cantidad in lineas:
+                    total = Decimal("121.00") * cantidad
+                    venta = Venta.objects.create(cliente=cliente, tipo_comprobante="A", neto=total / Decimal("1.21"),
+                                                 iva_amount=total - total / Decimal("1.21"), total=total)
+                    DetalleVenta.objects.bulk_create([
+                        DetalleVenta(venta=venta, producto=producto, cantidad=1, precio_unitario=Decimal("121.00"),
+                                     subtotal=Decimal("121.00"))
+                        for producto in productos[:cantidad]
+                    ])
+                    contexto = ComprobantePdf.contexto('factura', venta)
+                    nombre = f"factura {cantidad} líneas"
+                    documentos['reportlab'].append((nombre, PdfNativo.datos('factura', venta, contexto['empresa'])))
+                    documentos['xhtml2pdf'].append((nombre, template.render(contexto)))
+
+                saldo = Decimal('0')
+                filas = []
+                for i in range(movimientos):
+                    debe, haber = (Decimal("150.00"), 0) if i % 3 else (0, Decimal("200.00"))
+                    saldo += debe - haber
+                    filas.append({'fecha': timezone.now(), 'tipo': 'VENTA' if debe else 'PAGO',
+                                  'descripcion': f"Movimiento de prueba {i}", 'debe': float(debe),
+                                  'haber': float(haber), 'saldo': float(saldo)})
+                contexto = {'cliente': cliente, 'movimientos': filas, 'saldo_actual': float(saldo),
+                            'empresa': ConfiguracionEmpresa.obtener(),
+                            'fecha_impresion': timezone.localtime().strftime('%d/%m/%Y %H:%M')}
+                nombre = f"estado de cuenta {movimientos} movs."
+                documentos['reportlab'].append((nombre, PdfNativo.datos_estado_cuenta(contexto)))
+                documentos['xhtml2pdf'].append(
+                    (nombre, get_template('administrar/ctacte/cliente_imprimir_final.html').render(contexto)))
+                raise _Rollback()
+        except _Rollback:
+            pass
+        return documentos
+
+    def handle(self, *args, **options):
+        repeticiones = max(options['repeticiones'], 1)
+        documentos = self._documentos(options['lineas'], options['movimientos'])
+
+        resultados = {}
+        for motor in MOTORES:
+            self.stdout.write(f"Midiendo {motor}...")
+            # 1 proceso nuevo por motor: el pico de RSS no arrastra lo que cargó el otro
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=inicializar_proceso_pdf) as pool:
+                resultados[motor] = pool.submit(medir_motor_pdf, motor, documentos[motor], repeticiones).result()
+
+        self.stdout.write(f"\n{'Documento':<30} {'Págs':>5} {'reportlab pág/s':>16} {'xhtml2pdf pág/s':>16} "
+                          f"{'Mejora':>8}")
+        for nombre, _ in documentos['reportlab']:
+            velocidades = []
+            for motor in MOTORES:
+                paginas, segundos = resultados[motor][0][nombre]
+                velocidades.append(paginas * repeticiones / segundos if segundos else 0)
+            paginas = resultados['reportlab'][0][nombre][0]
+            mejora = velocidades[0] / velocidades[1] if velocidades[1] else 0
+            self.stdout.write(f"{nombre:<30} {paginas:>5} {velocidades[0]:>16.1f} {velocidades[1]:>16.1f} "
+                              f"{mejora:>7.1f}x")
+
+        self.stdout.write("\nPico de memoria (RSS) por proceso:")
+        for motor in MOTORES:
+            _, inicial, pico = resultados[motor]
+            if pico is None:
+                self.stdout.write(f"  {motor}: no disponible en esta plataforma")
+            else:
+                self.stdout.write(f"  {motor}: {pico / 1024:.1f} MB (+{(pico - inicial) / 1024:.1f} MB sobre "
+                                  f"el proceso con Django cargado)")
@@ -0,0 +1,85 @@
+"""
+Benchmark de api_venta_guardar: cuenta consultas SQL y tiempo para tickets de 1, 10 y 100 líneas.
+Ejecutar con: python manage.py benchmark_ventas [--lineas 1 10 100]
+Todo se ejecuta dentro de una transacción que se revierte al final (no deja datos).
+"""
+
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import AnonymousUser
+
+from administrar.models import Cliente, Producto
+from administrar.views import api_venta_guardar
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas SQL y tiempo de api_venta_guardar para distintos tamaños de ticket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lineas', nargs='+', type=int, default=[1, 10, 100])
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        resultados = []
+
+        try:
+            with transaction.atomic():
+                cliente = Cliente.objects.create(nombre="Cliente Benchmark", condicion_fiscal="CF")
+                max_lineas = max(options['lineas'])
+                Producto.objects.bulk_create([
+                    Producto(
+                        codigo=f"BENCH-{i:05d}",
+                        descripcion=f"Producto Benchmark {i}",
+                        stock=1000000,
+                        costo=Decimal("50.00"),
+                        precio_efectivo=Decimal("100.00"),
+                        precio_tarjeta=Decimal("110.00"),
+                        precio_ctacte=Decimal("120.00"),
+                    )
+                    for i in range(max_lineas)
+                ])
+                productos = list(Producto.objects.filter(codigo__startswith="BENCH-").order_by('codigo'))
+
+                for lineas in options['lineas']:
+                    items = [
+                        {"id": p.id, "cantidad": 1, "precio": 100, "subtotal": 100}
+                        for p in productos[:lineas]
+                    ]
+                    body = json.dumps({
+                        "cliente_id": cliente.id,
+                        "items": items,
+                        "total_general": 100 * lineas,
+                        "medio_pago": "EFECTIVO",
+                    })
+                    request = factory.post('/api/ventas/guardar/', data=body, content_type='application/json')
+                    request.user = AnonymousUser()
+                    request._dont_enforce_csrf_checks = True
+
+                    with CaptureQueriesContext(connection) as ctx:
+                        inicio = time.perf_counter()
+                        response = api_venta_guardar(request)
+                        duracion = (time.perf_counter() - inicio) * 1000
+
+                    if response.status_code != 200:
+                        self.stdout.write(self.style.ERROR(f'{lineas} líneas: {response.content.decode()}'))
+                        continue
+                    resultados.append((lineas, len(ctx.captured_queries), duracion))
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'Líneas':>8} | {'Consultas':>9} | {'Tiempo (ms)':>11}")
+        self.stdout.write("-" * 34)
+        for lineas, consultas, duracion in resultados:
+            self.stdout.write(f"{lineas:>8} | {consultas:>9} | {duracion:>11.1f}")
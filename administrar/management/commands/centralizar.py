@@ -0,0 +1,64 @@
+"""
+Centraliza en el libro diario las ventas, compras y/o el CMV de un rango de fechas que todavía no
+estén centralizados (pensado para ponerse al día a fin de mes).
+Ejecutar con: python manage.py centralizar --desde 2026-09-01 --hasta 2026-09-30 [--solo ventas compras cmv] [--consolidado]
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from administrar.services_centralizacion import CentralizacionService
+
+
+class Command(BaseCommand):
+    help = 'Centraliza ventas, compras y CMV pendientes de un rango de fechas en el libro diario'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (YYYY-MM-DD); por defecto, hoy')
+        parser.add_argument('--hasta', help='Fecha final inclusive (YYYY-MM-DD); por defecto, igual a --desde')
+        parser.add_argument('--solo', nargs='+', choices=['ventas', 'compras', 'cmv'],
+                            default=['ventas', 'compras', 'cmv'], help='Qué centralizar')
+        parser.add_argument('--consolidado', action='store_true',
+                            help='1 asiento por día y tipo de comprobante en lugar de 1 por documento')
+        parser.add_argument('--lote', type=int, default=CentralizacionService.LOTE, help='Asientos por transacción')
+        parser.add_argument('--usuario', default='Sistema', help='Usuario que figura en los asientos')
+
+    def _fecha(self, valor, defecto):
+        if not valor:
+            return defecto
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida (YYYY-MM-DD): {valor}')
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], timezone.localdate())
+        hasta = self._fecha(options['hasta'], desde)
+        if hasta < desde:
+            raise CommandError('--hasta no puede ser anterior a --desde')
+
+        for tipo in ('ventas', 'compras', 'cmv'):
+            if tipo not in options['solo']:
+                continue
+            try:
+                if tipo == 'cmv':
+                    resultado = CentralizacionService.cmv(desde, hasta, usuario=options['usuario'], lote=options['lote'])
+                else:
+                    resultado = getattr(CentralizacionService, tipo)(
+                        desde, hasta, consolidado=options['consolidado'], usuario=options['usuario'],
+                        lote=options['lote']
+                    )
+            except ValueError as e:
+                raise CommandError(f'{tipo}: {e}')
+
+            self.stdout.write(
+                f"{tipo.capitalize()}: {resultado['documentos']} documentos en {resultado['asientos']} asientos "
+                f"(${resultado['total']:,.2f})"
+            )
+            if resultado['sin_ejercicio']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {resultado['sin_ejercicio']} documentos sin ejercicio contable abierto para su fecha"
+                ))
+        self.stdout.write(self.style.SUCCESS(f"Centralización del {desde} al {hasta} finalizada"))
@@ -0,0 +1,40 @@
+"""
+Genera el cierre de stock (CierreStock: cantidad y costo valorizado por producto) al último día de cada mes.
+Pensado para correr periódicamente (cron, día 1): por defecto cierra el mes anterior.
+Ejecutar con: python manage.py cerrar_stock [--fecha YYYY-MM-DD] [--meses N]
+"""
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from administrar.services_stock import LibroStockService
+
+
+class Command(BaseCommand):
+    help = 'Genera los cierres mensuales de stock (foto de cantidades y valorización)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de cierre (YYYY-MM-DD); por defecto, fin del mes anterior')
+        parser.add_argument('--meses', type=int, default=1,
+                            help='Cantidad de fines de mes a (re)generar hasta --fecha, del más viejo al más nuevo')
+
+    def handle(self, *args, **options):
+        if options['fecha']:
+            try:
+                fecha = datetime.strptime(options['fecha'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Fecha inválida (YYYY-MM-DD)')
+        else:
+            fecha = timezone.localdate().replace(day=1) - timedelta(days=1)
+
+        # Fines de mes hacia atrás; se generan del más viejo al más nuevo (cada uno parte del anterior)
+        fechas = [fecha]
+        for _ in range(options['meses'] - 1):
+            fechas.append(fechas[-1].replace(day=1) - timedelta(days=1))
+
+        for dia in reversed(fechas):
+            productos, valor = LibroStockService.generar_cierre(dia)
+            self.stdout.write(f"Cierre {dia}: {productos} productos, valor ${valor:,.2f}")
+        self.stdout.write(self.style.SUCCESS(f"Cierres generados: {len(fechas)}"))
@@ -0,0 +1,264 @@
+"""
+Ejecuta EXPLAIN sobre las consultas principales de los endpoints (listados, dashboard, reportes,
+centralización, cuenta corriente, libro diario/mayor) con un volumen de datos generado, y marca
+las que recorren completa su tabla principal (SCAN en SQLite, Seq Scan en PostgreSQL, type=ALL en MySQL).
+Los recorridos de tablas chicas unidas por select_related (clientes, productos) no se marcan.
+Ejecutar con: python manage.py explicar_consultas [--filas 20000] [--detalle]
+Todo se ejecuta dentro de una transacción que se revierte al final (no deja datos).
+"""
+
+import random
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from administrar.models import (
+    Cliente, Proveedor, Producto, Venta, DetalleVenta, Compra, CajaDiaria, MovimientoCaja,
+    MovimientoStock, Pedido, Cheque, Remito, NotaCredito, PlanCuenta, EjercicioContable, Asiento,
+    ItemAsiento, MovimientoCuentaCorriente, MovimientoCuentaCorrienteProveedor
+)
+from administrar.services_contabilidad import PlanCuentasService
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN de las consultas principales de los endpoints; marca los recorridos completos de tabla'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=20000, help='Filas a generar por tabla principal')
+        parser.add_argument('--detalle', action='store_true', help='Muestra el plan completo de cada consulta')
+
+    def _crear_datos(self, filas):
+        ahora = timezone.now()
+        clientes = Cliente.objects.bulk_create([
+            Cliente(nombre=f"Cliente Explain {i}", condicion_fiscal="CF") for i in range(200)
+        ])
+        proveedores = Proveedor.objects.bulk_create([Proveedor(nombre=f"Proveedor Explain {i}") for i in range(50)])
+        productos = Producto.objects.bulk_create([
+            Producto(
+                codigo=f"EXPL-{i:05d}", descripcion=f"Producto Explain {i}", stock=100, costo=Decimal("10.00"),
+                precio_efectivo=Decimal("20.00"), precio_tarjeta=Decimal("22.00"), precio_ctacte=Decimal("24.00"),
+            )
+            for i in range(500)
+        ])
+        # MySQL no devuelve los ids en bulk_create
+        clientes = list(Cliente.objects.filter(nombre__startswith="Cliente Explain"))
+        proveedores = list(Proveedor.objects.filter(nombre__startswith="Proveedor Explain"))
+        productos = list(Producto.objects.filter(codigo__startswith="EXPL-"))
+        usuario = User.objects.create_user("explicar_consultas", password="x")
+        caja = CajaDiaria.objects.create(usuario=usuario, monto_apertura=0)
+
+        Venta.objects.bulk_create([
+            Venta(cliente=random.choice(clientes), tipo_comprobante='B', total=Decimal(random.randint(100, 10000)))
+            for _ in range(filas)
+        ], batch_size=5000)
+        Compra.objects.bulk_create([
+            Compra(proveedor=random.choice(proveedores), total=Decimal(random.randint(100, 10000)))
+            for _ in range(filas // 4)
+        ], batch_size=5000)
+        MovimientoCaja.objects.bulk_create([
+            MovimientoCaja(caja_diaria=caja, usuario=usuario, tipo=random.choice(['Ingreso', 'Egreso']),
+                           descripcion="Explain", monto=Decimal(random.randint(1, 1000)))
+            for _ in range(filas)
+        ], batch_size=5000)
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(producto=random.choice(productos), tipo=random.choice(['IN', 'OUT']), cantidad=1)
+            for _ in range(filas)
+        ], batch_size=5000)
+        Pedido.objects.bulk_create([
+            Pedido(cliente=random.choice(clientes), estado=random.choice(['PENDIENTE', 'LISTO', 'FACTURADO', 'FACTURADO']))
+            for _ in range(filas // 4)
+        ], batch_size=5000)
+        hoy = timezone.localdate()
+        Cheque.objects.bulk_create([
+            Cheque(numero=str(i), banco="Banco Explain", fecha_emision=hoy, monto=Decimal("1000.00"),
+                   fecha_pago=hoy + timedelta(days=random.randint(-180, 180)),
+                   estado=random.choice(['CARTERA', 'DEPOSITADO', 'COBRADO', 'COBRADO']),
+                   tipo=random.choice(['PROPIO', 'TERCERO']))
+            for i in range(filas // 4)
+        ], batch_size=5000)
+        ventas = list(Venta.objects.filter(cliente__in=clientes).values_list('id', 'cliente_id'))
+        Remito.objects.bulk_create([
+            Remito(cliente_id=cliente_id, venta_asociada_id=venta_id) for venta_id, cliente_id in ventas[: filas // 4]
+        ], batch_size=5000)
+        NotaCredito.objects.bulk_create([
+            NotaCredito(cliente_id=cliente_id, venta_asociada_id=venta_id, tipo_comprobante='NCB', total=1)
+            for venta_id, cliente_id in ventas[: filas // 10]
+        ], batch_size=5000)
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(venta_id=venta_id, producto=random.choice(productos), cantidad=1,
+                         precio_unitario=Decimal("20.00"), subtotal=Decimal("20.00"))
+            for venta_id, _ in ventas
+        ], batch_size=5000)
+        MovimientoCuentaCorriente.objects.bulk_create([
+            MovimientoCuentaCorriente(cliente_id=cliente_id, tipo='DEBE', descripcion="Explain",
+                                      monto=Decimal("10.00"), saldo=Decimal("10.00"), venta_id=venta_id)
+            for venta_id, cliente_id in ventas
+        ], batch_size=5000)
+        MovimientoCuentaCorrienteProveedor.objects.bulk_create([
+            MovimientoCuentaCorrienteProveedor(proveedor=random.choice(proveedores), tipo='HABER',
+                                               descripcion="Explain", monto=Decimal("10.00"), saldo=Decimal("10.00"))
+            for _ in range(filas // 4)
+        ], batch_size=5000)
+
+        # `fecha` es auto_now_add: se reparte en el último año (bloques de 3 días) con un UPDATE por bloque
+        for modelo in (Venta, Compra, MovimientoCaja, MovimientoStock, Pedido, Remito, NotaCredito,
+                       MovimientoCuentaCorriente, MovimientoCuentaCorrienteProveedor):
+            ids = list(modelo.objects.order_by('id').values_list('id', flat=True))
+            for bloque in range(120):
+                modelo.objects.filter(id__in=ids[bloque::120]).update(fecha=ahora - timedelta(days=bloque * 3))
+
+        ejercicio = EjercicioContable.objects.create(
+            descripcion="Ejercicio Explain", fecha_inicio=hoy.replace(month=1, day=1),
+            fecha_fin=hoy.replace(month=12, day=31)
+        )
+        PlanCuenta.objects.bulk_create([
+            PlanCuenta(codigo=f"EXPL.{i:04d}", nombre=f"Cuenta Explain {i}", tipo='ACTIVO', imputable=True, nivel=1)
+            for i in range(200)
+        ])
+        PlanCuentasService.reconstruir_rutas()
+        cuentas = list(PlanCuenta.objects.filter(codigo__startswith="EXPL."))
+        inicio = timezone.make_aware(datetime.combine(ejercicio.fecha_inicio, datetime.min.time()))
+        Asiento.objects.bulk_create([
+            Asiento(numero=i + 1, fecha=inicio + timedelta(hours=i % 8000), descripcion="Asiento Explain",
+                    ejercicio=ejercicio, origen='MANUAL')
+            for i in range(filas)
+        ], batch_size=5000)
+        items = []
+        for asiento_id in Asiento.objects.filter(ejercicio=ejercicio).values_list('id', flat=True):
+            debe, haber = random.sample(cuentas, 2)
+            items.append(ItemAsiento(asiento_id=asiento_id, cuenta=debe, debe=1, haber=0))
+            items.append(ItemAsiento(asiento_id=asiento_id, cuenta=haber, debe=0, haber=1))
+        ItemAsiento.objects.bulk_create(items, batch_size=5000)
+
+        return clientes[0], proveedores[0], productos[0], caja, ejercicio, cuentas[:5]
+
+    @staticmethod
+    def _consultas(cliente, proveedor, producto, caja, ejercicio, cuentas):
+        """(endpoint, queryset) con la misma forma que la consulta del endpoint"""
+        hoy = timezone.localdate()
+
+        def inicio(dia):
+            return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+
+        mes = (inicio(hoy.replace(day=1)), inicio(hoy + timedelta(days=1)))
+        dia = (inicio(hoy), inicio(hoy + timedelta(days=1)))
+        cursor = timezone.now() - timedelta(days=30)
+        return [
+            ('api_ventas_listar (cursor)',
+             Venta.objects.select_related('cliente').filter(fecha__range=mes, fecha__lt=cursor)
+             .order_by('-fecha', '-id')[:51]),
+            ('dashboard ventas del día', Venta.objects.filter(fecha__gte=dia[0], fecha__lt=dia[1]).values('total')),
+            ('DashboardService.totales_por_mes',
+             Venta.objects.filter(fecha__gte=mes[0] - timedelta(days=160)).annotate(m=TruncMonth('fecha'))
+             .values('m').annotate(total=Sum('total'))),
+            ('DashboardService.costo_ventas',
+             DetalleVenta.objects.filter(venta__fecha__range=mes)
+             .annotate(costo=F('cantidad') * F('producto__costo')).values('costo')),
+            ('ventas por cliente', Venta.objects.filter(cliente=cliente).order_by('-fecha')[:50]),
+            ('compras del mes', Compra.objects.filter(fecha__range=mes).values('total')),
+            ('compras pendientes de proveedor',
+             Compra.objects.filter(proveedor=proveedor, estado='REGISTRADA').values('total')),
+            ('caja: totales por tipo', MovimientoCaja.objects.filter(caja_diaria=caja, tipo='Ingreso').values('monto')),
+            ('reporte c_gastos',
+             MovimientoCaja.objects.filter(tipo='Egreso', fecha__gte=mes[0], fecha__lte=mes[1]).order_by('fecha')),
+            ('dashboard caja del día', MovimientoCaja.objects.filter(fecha__gte=dia[0], fecha__lt=dia[1]).values('monto')),
+            ('kardex de producto', MovimientoStock.objects.filter(producto=producto).order_by('-fecha')[:100]),
+            ('movimientos de stock por rango', MovimientoStock.objects.filter(fecha__range=mes).values('cantidad')),
+            ('pedidos pendientes', Pedido.objects.filter(estado__in=['PENDIENTE', 'PREPARACION']).values('id')),
+            ('api_pedidos_lista (estado)',
+             Pedido.objects.filter(estado='LISTO').order_by('-fecha', '-id')[:50]),
+            ('cheques en cartera por vencimiento',
+             Cheque.objects.filter(estado='CARTERA', fecha_pago__range=(hoy, hoy + timedelta(days=30)))
+             .order_by('fecha_pago')),
+            ('cheques de terceros por estado', Cheque.objects.filter(tipo='TERCERO', estado='DEPOSITADO').values('id')),
+            ('libro diario del ejercicio',
+             Asiento.objects.filter(ejercicio=ejercicio, fecha__range=mes).order_by('fecha', 'numero')),
+            ('libro mayor (ítems por cuenta y rango)',
+             ItemAsiento.objects.filter(cuenta__in=cuentas, asiento__ejercicio=ejercicio, asiento__fecha__range=mes)
+             .order_by('asiento__fecha', 'asiento__numero', 'id').values('debe', 'haber')),
+            ('api_cc_cliente_movimientos',
+             MovimientoCuentaCorriente.objects.filter(cliente=cliente, fecha__gte=mes[0])
+             .order_by('-fecha', '-id')[:100]),
+            ('cuenta corriente proveedor',
+             MovimientoCuentaCorrienteProveedor.objects.filter(proveedor=proveedor).order_by('-fecha')[:100]),
+            ('api_remitos_listar (cursor)', Remito.objects.filter(fecha__lt=cursor).order_by('-fecha', '-id')[:51]),
+            ('api_notas_credito_listar (cursor)',
+             NotaCredito.objects.filter(fecha__lt=cursor).order_by('-fecha', '-id')[:51]),
+        ]
+
+    @staticmethod
+    def _analizar():
+        """Estadísticas al día para el planificador (en MySQL ANALYZE TABLE confirmaría la transacción)"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("ANALYZE")
+            elif connection.vendor == 'postgresql':
+                cursor.execute("ANALYZE")
+
+    @staticmethod
+    def _recorridos_completos(plan):
+        """Tablas que el plan recorre completas, según el motor"""
+        if connection.vendor == 'sqlite':
+            # "SCAN tabla" sin índice (SCAN ... USING INDEX recorre el índice en orden, no la tabla)
+            return re.findall(r"SCAN (?:TABLE )?(\w+)\b(?! USING)", plan)
+        if connection.vendor == 'postgresql':
+            return re.findall(r"Seq Scan on (\w+)", plan)
+        if connection.vendor == 'mysql':
+            return re.findall(r"table=(\w+).*?\btype=ALL", plan)
+        return []
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        resultados = []
+        try:
+            with transaction.atomic():
+                contexto = self._crear_datos(options['filas'])
+                self._analizar()
+                for endpoint, queryset in self._consultas(*contexto):
+                    if connection.vendor == 'mysql':
+                        # Formato tradicional en una línea por tabla con clave=valor
+                        plan = "\n".join(
+                            " ".join(f"{k}={v}" for k, v in fila.items())
+                            for fila in self._explain_mysql(queryset)
+                        )
+                    else:
+                        plan = queryset.explain()
+                    tabla = queryset.model._meta.db_table
+                    completos = [t for t in self._recorridos_completos(plan) if t == tabla]
+                    resultados.append((endpoint, plan, completos))
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"Motor: {connection.vendor}, {options['filas']} filas por tabla principal")
+        self.stdout.write(f"{'Consulta':<42} | Recorrido completo")
+        self.stdout.write("-" * 70)
+        for endpoint, plan, completos in resultados:
+            estado = completos[0] if completos else "ninguno"
+            linea = f"{endpoint:<42} | {estado}"
+            self.stdout.write(self.style.WARNING(linea) if completos else linea)
+            if options['detalle']:
+                self.stdout.write("    " + plan.replace("\n", "\n    "))
+
+        con_recorridos = sum(1 for _, _, completos in resultados if completos)
+        mensaje = f"Consultas: {len(resultados)}, con recorridos completos: {con_recorridos}"
+        self.stdout.write(self.style.WARNING(mensaje) if con_recorridos else self.style.SUCCESS(mensaje))
+
+    @staticmethod
+    def _explain_mysql(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columnas = [c[0] for c in cursor.description]
+            return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
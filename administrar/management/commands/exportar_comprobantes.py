@@ -0,0 +1,45 @@
+"""
+Exporta a 1 ZIP los PDFs de las facturas, notas de crédito, notas de débito y remitos de un período
+(entrega de fin de mes al contador). Renderiza en un pool de procesos y reutiliza el cache de PDFs.
+Ejecutar con: python manage.py exportar_comprobantes --desde 2026-09-01 --hasta 2026-09-30 [--tipos factura nc nd remito] [--procesos 4] [--salida archivo.zip]
+"""
+
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from administrar.services_pdf import ComprobantePdf
+
+
+class Command(BaseCommand):
+    help = 'Exporta a un ZIP los PDFs de los comprobantes de un período'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='Fecha inicial (YYYY-MM-DD)')
+        parser.add_argument('--hasta', required=True, help='Fecha final inclusive (YYYY-MM-DD)')
+        parser.add_argument('--tipos', nargs='+', choices=list(ComprobantePdf.DOCUMENTOS),
+                            help='Tipos de comprobante; por defecto, todos')
+        parser.add_argument('--procesos', type=int, help='Procesos para renderizar; por defecto, 1 por CPU')
+        parser.add_argument('--salida', help='Ruta del ZIP; por defecto, MEDIA_ROOT/pdf_lotes/')
+
+    def _fecha(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida (YYYY-MM-DD): {valor}')
+
+    def handle(self, *args, **options):
+        desde, hasta = self._fecha(options['desde']), self._fecha(options['hasta'])
+        if hasta < desde:
+            raise CommandError('--hasta no puede ser anterior a --desde')
+
+        inicio = time.perf_counter()
+        resultado = ComprobantePdf.lote_zip(desde, hasta, options['tipos'], options['procesos'], options['salida'])
+        segundos = time.perf_counter() - inicio
+
+        for error in resultado['errores']:
+            self.stdout.write(self.style.WARNING(f"  No se pudo generar el PDF de {error}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['documentos']} comprobantes en {resultado['archivo']} ({segundos:.1f}s)"
+        ))
@@ -0,0 +1,63 @@
+"""
+Importa un conteo físico de inventario (codigo, cantidad contada) desde CSV, JSON o NDJSON y
+ajusta el stock por la diferencia. Sin --aplicar solo informa las diferencias.
+Ejecutar con: python manage.py importar_inventario conteo.csv [--formato csv|json|ndjson] [--aplicar]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from administrar.services_stock import InventarioService, ErrorInventario
+
+
+class Command(BaseCommand):
+    help = 'Importa un conteo físico de inventario y ajusta el stock (dry-run por defecto)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Archivo con el conteo (codigo, cantidad)')
+        parser.add_argument('--formato', choices=['csv', 'json', 'ndjson'], help='Por defecto, según la extensión')
+        parser.add_argument('--aplicar', action='store_true', help='Registra los ajustes (sin esto, solo informa)')
+        parser.add_argument('--observaciones', default='', help='Observaciones de los movimientos de ajuste')
+        parser.add_argument('--lote', type=int, default=1000, help='Códigos por lote')
+        parser.add_argument('--detalle', action='store_true', help='Lista cada diferencia')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or next(
+            (ext for ext in ('ndjson', 'json') if options['archivo'].lower().endswith('.' + ext)), 'csv'
+        )
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                conteo, errores = InventarioService.conteo(InventarioService.leer(archivo, formato))
+        except OSError as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+        except (ErrorInventario, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        for error in errores:
+            self.stdout.write(self.style.ERROR(f"Línea {error['linea']} ({error['codigo']}): {error['error']}"))
+        if errores and options['aplicar']:
+            raise CommandError(f"{len(errores)} filas con errores: corregir el archivo antes de aplicar")
+
+        informe = InventarioService.aplicar_conteo(
+            conteo, aplicar=options['aplicar'], observaciones=options['observaciones'], batch_size=options['lote']
+        )
+
+        if options['detalle']:
+            for ajuste in informe['ajustes']:
+                self.stdout.write(
+                    f"{ajuste['codigo']:<20} {ajuste['descripcion'][:40]:<40} "
+                    f"{ajuste['stock_anterior']:>8} -> {ajuste['contado']:>8} ({ajuste['diferencia']:+d})"
+                )
+        for codigo in informe['no_encontrados']:
+            self.stdout.write(self.style.WARNING(f"Código no encontrado: {codigo}"))
+
+        entradas = sum(a['diferencia'] for a in informe['ajustes'] if a['diferencia'] > 0)
+        salidas = -sum(a['diferencia'] for a in informe['ajustes'] if a['diferencia'] < 0)
+        mensaje = (
+            f"Códigos contados: {informe['contados']}, sin cambios: {informe['sin_cambios']}, "
+            f"con diferencia: {len(informe['ajustes'])} (+{entradas} / -{salidas} unidades), "
+            f"no encontrados: {len(informe['no_encontrados'])}"
+        )
+        if informe['aplicado']:
+            self.stdout.write(self.style.SUCCESS(mensaje + ' - ajustes registrados'))
+        else:
+            self.stdout.write(self.style.WARNING(mensaje + ' (simulación: usar --aplicar para registrar)'))
@@ -0,0 +1,38 @@
+"""
+Recalcula los totales de caja (CajaDiaria.total_ingresos/total_egresos y PosicionCaja) desde
+MovimientoCaja, informa las diferencias y, con --reparar, las corrige.
+Ejecutar con: python manage.py reconciliar_caja [--reparar]
+"""
+
+from django.core.management.base import BaseCommand
+
+from administrar.services_caja import CajaService
+
+
+class Command(BaseCommand):
+    help = 'Verifica (y opcionalmente repara) los totales incrementales de caja'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Corrige los totales con diferencias')
+
+    def handle(self, *args, **options):
+        diferencias, diferencia_global = CajaService.reconciliar(reparar=options['reparar'])
+
+        for caja_id, (ingresos, egresos), (ingresos_ok, egresos_ok) in diferencias:
+            self.stdout.write(
+                f"Caja {caja_id}: ingresos {ingresos} -> {ingresos_ok}, egresos {egresos} -> {egresos_ok} "
+                f"(desvío de saldo {(ingresos - egresos) - (ingresos_ok - egresos_ok)})"
+            )
+        if diferencia_global:
+            (ingresos, egresos), (ingresos_ok, egresos_ok) = diferencia_global
+            self.stdout.write(
+                f"Posición global: ingresos {ingresos} -> {ingresos_ok}, egresos {egresos} -> {egresos_ok}"
+            )
+
+        mensaje = f"Cajas con diferencias: {len(diferencias)}, posición global {'con' if diferencia_global else 'sin'} diferencias"
+        if (diferencias or diferencia_global) and not options['reparar']:
+            self.stdout.write(self.style.WARNING(mensaje + ' (usar --reparar para corregir)'))
+        elif diferencias or diferencia_global:
+            self.stdout.write(self.style.SUCCESS(mensaje + ' (reparadas)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(mensaje))
@@ -0,0 +1,57 @@
+"""
+Reconstruye los snapshots mensuales SaldoCuentaPeriodo a partir de ItemAsiento.
+Ejecutar con: python manage.py reconstruir_saldos [--ejercicio ID] [--verificar]
+"""
+
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from administrar.models import ItemAsiento, SaldoCuentaPeriodo
+from administrar.services_contabilidad import SaldosService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los saldos mensuales por cuenta (SaldoCuentaPeriodo) desde los asientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ejercicio', type=int, help='ID del ejercicio a reconstruir (por defecto, todos)')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Sólo informa las diferencias entre snapshots y asientos, sin modificar nada')
+
+    def _diferencias(self, ejercicio_id):
+        items = ItemAsiento.objects.all()
+        snapshots = SaldoCuentaPeriodo.objects.all()
+        if ejercicio_id:
+            items = items.filter(asiento__ejercicio_id=ejercicio_id)
+            snapshots = snapshots.filter(ejercicio_id=ejercicio_id)
+
+        esperados = SaldosService.agrupar(items)
+        actuales = {
+            (s.cuenta_id, s.ejercicio_id, s.periodo): (s.debe, s.haber) for s in snapshots
+        }
+        cero = (Decimal('0'), Decimal('0'))
+        return [
+            (clave, actuales.get(clave, cero), esperados.get(clave, cero))
+            for clave in sorted(set(esperados) | set(actuales), key=str)
+            if actuales.get(clave, cero) != esperados.get(clave, cero)
+        ]
+
+    def handle(self, *args, **options):
+        ejercicio_id = options.get('ejercicio')
+
+        if options['verificar']:
+            diferencias = self._diferencias(ejercicio_id)
+            for (cuenta_id, ej_id, periodo), actual, esperado in diferencias:
+                self.stdout.write(
+                    f"Cuenta {cuenta_id} / Ejercicio {ej_id} / {periodo:%m-%Y}: "
+                    f"snapshot D {actual[0]} H {actual[1]} - asientos D {esperado[0]} H {esperado[1]}"
+                )
+            if diferencias:
+                self.stdout.write(self.style.WARNING(f'{len(diferencias)} periodos con diferencias'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Los saldos mensuales coinciden con los asientos'))
+            return
+
+        cantidad = SaldosService.reconstruir(ejercicio_id)
+        self.stdout.write(self.style.SUCCESS(f'Saldos reconstruidos: {cantidad} registros'))
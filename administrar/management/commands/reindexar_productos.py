@@ -0,0 +1,17 @@
+"""
+Recalcula el texto de búsqueda normalizado (Producto.busqueda) de todos los productos.
+Necesario después de cargas masivas que no pasan por save() (bulk_create, importaciones SQL).
+Ejecutar con: python manage.py reindexar_productos
+"""
+
+from django.core.management.base import BaseCommand
+
+from administrar.services_productos import ProductoBuscador
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Producto.busqueda (texto normalizado para el buscador de productos)'
+
+    def handle(self, *args, **options):
+        cantidad = ProductoBuscador.reindexar()
+        self.stdout.write(self.style.SUCCESS(f'Productos reindexados: {cantidad}'))
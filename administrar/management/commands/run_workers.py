@@ -0,0 +1,85 @@
+"""
+Procesa la cola de jobs en segundo plano (asientos contables, backups, subidas a Drive, emails con PDFs).
+Corre de forma permanente con un pool de hilos, o de procesos con sus hilos cada uno, que toman jobs de
+la tabla Job; los fallidos se reintentan con backoff y al agotar los intentos quedan MUERTOS.
+Ejecutar con: python manage.py run_workers [--hilos 4] [--procesos 2] [--tipos asientos email] [--una-vez]
+"""
+
+import multiprocessing
+import threading
+
+from django.core.management.base import BaseCommand
+
+
+def _hilos(cantidad, tipos, intervalo, una_vez, detener):
+    # Import diferido: en --procesos el hijo (spawn) importa este módulo antes de django.setup()
+    from administrar.services_jobs import JobService
+    hilos = [
+        threading.Thread(target=JobService.trabajar, args=(tipos, intervalo, detener, una_vez),
+                         name=f'job-worker-{i}', daemon=True)
+        for i in range(cantidad)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    try:
+        # join con timeout para que Ctrl+C llegue al hilo principal
+        while any(hilo.is_alive() for hilo in hilos):
+            for hilo in hilos:
+                hilo.join(timeout=1)
+    except KeyboardInterrupt:
+        detener.set()
+        for hilo in hilos:
+            hilo.join()
+
+
+def _proceso(cantidad, tipos, intervalo, una_vez):
+    import django
+    django.setup()
+    _hilos(cantidad, tipos, intervalo, una_vez, threading.Event())
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los workers de la cola de jobs en segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=4, help='Hilos worker (por proceso)')
+        parser.add_argument('--procesos', type=int, default=0,
+                            help='Procesos worker; 0 = sólo hilos en este proceso')
+        parser.add_argument('--tipos', nargs='+', help='Procesar sólo estos tipos de job')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true', help='Vaciar la cola y terminar')
+        parser.add_argument('--reintentar-muertos', action='store_true',
+                            help='Volver a encolar los jobs MUERTOS antes de empezar')
+        parser.add_argument('--purgar', type=int, metavar='DIAS',
+                            help='Borrar los jobs completados hace más de DIAS días antes de empezar')
+
+    def handle(self, *args, **options):
+        from administrar.services_jobs import JobService
+
+        if options['reintentar_muertos']:
+            self.stdout.write(f"Jobs muertos reencolados: {JobService.reintentar()}")
+        if options['purgar'] is not None:
+            self.stdout.write(f"Jobs completados purgados: {JobService.purgar(options['purgar'])}")
+
+        hilos, procesos = max(options['hilos'], 1), options['procesos']
+        argumentos = (hilos, options['tipos'], options['intervalo'], options['una_vez'])
+
+        if procesos <= 0:
+            self.stdout.write(f"Workers: {hilos} hilos (Ctrl+C para detener)")
+            _hilos(*argumentos, threading.Event())
+        else:
+            self.stdout.write(f"Workers: {procesos} procesos x {hilos} hilos (Ctrl+C para detener)")
+            contexto = multiprocessing.get_context('spawn')
+            hijos = [contexto.Process(target=_proceso, args=argumentos) for _ in range(procesos)]
+            for hijo in hijos:
+                hijo.start()
+            try:
+                for hijo in hijos:
+                    hijo.join()
+            except KeyboardInterrupt:
+                # Los hijos reciben el mismo Ctrl+C y terminan el job en curso
+                for hijo in hijos:
+                    hijo.join()
+
+        self.stdout.write(self.style.SUCCESS("Workers detenidos"))
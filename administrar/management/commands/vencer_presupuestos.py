@@ -0,0 +1,28 @@
+"""
+Pasa a VENCIDO los presupuestos PENDIENTE cuya fecha de vencimiento ya pasó (1 UPDATE).
+Pensado para correr cada noche (cron); el listado ya los muestra vencidos aunque no haya corrido.
+Ejecutar con: python manage.py vencer_presupuestos [--dry-run]
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from administrar.models import Presupuesto
+from administrar.services_presupuestos import PresupuestoService
+
+
+class Command(BaseCommand):
+    help = 'Marca como VENCIDO los presupuestos pendientes con la validez cumplida'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa cuántos vencerían')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        if options['dry_run']:
+            cantidad = Presupuesto.objects.filter(estado='PENDIENTE', fecha_vencimiento__lt=hoy).count()
+            self.stdout.write(self.style.WARNING(f"Presupuestos a vencer: {cantidad} (simulación)"))
+            return
+
+        cantidad = PresupuestoService.vencer(hoy)
+        self.stdout.write(self.style.SUCCESS(f"Presupuestos vencidos: {cantidad}"))
@@ -0,0 +1,44 @@
+"""
+Verifica la cadena de saldos de las cuentas corrientes de clientes (MovimientoCuentaCorriente.saldo)
+y, con --reparar, corrige los saldos incorrectos y Cliente.saldo_actual.
+Ejecutar con: python manage.py verificar_ctacte [--cliente ID] [--reparar]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from administrar.models import Cliente, MovimientoCuentaCorriente
+from administrar.services_ctacte import CuentaCorrienteService
+
+
+class Command(BaseCommand):
+    help = 'Verifica (y opcionalmente repara) los saldos acumulados de cuenta corriente de clientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cliente', type=int, help='ID de cliente (por defecto, todos los que tienen movimientos)')
+        parser.add_argument('--reparar', action='store_true', help='Corrige los saldos incorrectos')
+
+    def handle(self, *args, **options):
+        if options['cliente']:
+            if not Cliente.objects.filter(pk=options['cliente']).exists():
+                raise CommandError(f"Cliente {options['cliente']} inexistente")
+            clientes = [options['cliente']]
+        else:
+            clientes = (
+                MovimientoCuentaCorriente.objects.order_by('cliente_id')
+                .values_list('cliente_id', flat=True).distinct()
+            )
+
+        revisados = con_errores = 0
+        for cliente_id in clientes:
+            incorrectos, saldo = CuentaCorrienteService.recalcular(cliente_id, reparar=options['reparar'])
+            revisados += 1
+            if incorrectos:
+                con_errores += 1
+                accion = 'reparados' if options['reparar'] else 'incorrectos'
+                self.stdout.write(f"Cliente {cliente_id}: {incorrectos} movimientos {accion} (saldo final {saldo})")
+
+        mensaje = f'Clientes revisados: {revisados}, con saldos incorrectos: {con_errores}'
+        if con_errores and not options['reparar']:
+            self.stdout.write(self.style.WARNING(mensaje + ' (usar --reparar para corregir)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(mensaje))
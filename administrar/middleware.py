@@ -1,6 +1,10 @@
 """
 Middleware para el sistema de seguridad
 """
+import threading
+import time
+from datetime import timedelta
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
 from django.dispatch import receiver
@@ -27,20 +31,40 @@ class ActiveSessionMiddleware(MiddlewareMixin):
     Middleware para actualizar la última actividad de las sesiones activas.
     NOTA: Este middleware solo ACTUALIZA sesiones existentes, no las crea.
     Las sesiones se crean únicamente en el signal user_logged_in.
+    La escritura se limita a 1 cada INTERVALO_SEGUNDOS por sesión: una marca en memoria del proceso
+    evita tocar la base en los requests intermedios (sin ir al cache compartido) y el UPDATE es
+    condicional (sin SELECT previo), así que varios workers no escriben más de 1 vez por intervalo.
     """
+    INTERVALO_SEGUNDOS = 60
+    MAXIMO_MARCAS = 10000
+
+    _lock = threading.Lock()
+    _marcas = {}   # session_key -> time.monotonic() del último intento de escritura
+
+    @classmethod
+    def _marcar(cls, session_key):
+        """True si pasó el intervalo desde la última marca de la sesión (y la renueva)"""
+        ahora = time.monotonic()
+        with cls._lock:
+            if ahora - cls._marcas.get(session_key, -cls.INTERVALO_SEGUNDOS) < cls.INTERVALO_SEGUNDOS:
+                return False
+            if len(cls._marcas) >= cls.MAXIMO_MARCAS:
+                cls._marcas = {k: v for k, v in cls._marcas.items() if ahora - v < cls.INTERVALO_SEGUNDOS}
+            cls._marcas[session_key] = ahora
+        return True
+
     def process_request(self, request):
         if request.user.is_authenticated and request.session.session_key:
-            try:
-                session = ActiveSession.objects.get(
-                    user=request.user,
-                    session_key=request.session.session_key
-                )
-                # El campo last_activity se actualiza automáticamente con auto_now=True
-                session.save()
-            except ActiveSession.DoesNotExist:
+            session_key = request.session.session_key
+            if self._marcar(session_key):
+                ahora = timezone.now()
                 # No crear sesión aquí - solo el signal de login debe crearlas
-                # Esto evita crear sesiones huérfanas por cookies de sesión antiguas
-                pass
+                # (si no existe, el UPDATE no afecta filas: sin sesiones huérfanas por cookies antiguas)
+                ActiveSession.objects.filter(
+                    user=request.user,
+                    session_key=session_key,
+                    last_activity__lt=ahora - timedelta(seconds=self.INTERVALO_SEGUNDOS),
+                ).update(last_activity=ahora)
         return None
 
 
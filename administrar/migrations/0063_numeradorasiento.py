@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0062_remove_empresa_comportamiento_lector_remitos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumeradorAsiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_numero', models.IntegerField(default=0)),
+                ('ejercicio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='numerador', to='administrar.ejerciciocontable')),
+            ],
+        ),
+    ]
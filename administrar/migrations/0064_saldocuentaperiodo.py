@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils import timezone
+
+
+def cargar_saldos_iniciales(apps, schema_editor):
+    """Primera carga de los snapshots desde los asientos existentes (igual que reconstruir_saldos)"""
+    ItemAsiento = apps.get_model('administrar', 'ItemAsiento')
+    SaldoCuentaPeriodo = apps.get_model('administrar', 'SaldoCuentaPeriodo')
+    # El mes se calcula en Python (hora local): TruncMonth con USE_TZ devuelve NULL en MySQL
+    # cuando el servidor no tiene cargadas las tablas de zonas horarias
+    saldos = {}
+    filas = (
+        ItemAsiento.objects
+        .values_list('cuenta_id', 'asiento__ejercicio_id', 'asiento__fecha')
+        .annotate(total_debe=Sum('debe'), total_haber=Sum('haber'))
+        .order_by()
+    )
+    for cuenta_id, ejercicio_id, fecha, debe, haber in filas.iterator():
+        if timezone.is_aware(fecha):
+            fecha = timezone.localtime(fecha)
+        clave = (cuenta_id, ejercicio_id, fecha.date().replace(day=1))
+        acumulado = saldos.get(clave, (0, 0))
+        saldos[clave] = (acumulado[0] + (debe or 0), acumulado[1] + (haber or 0))
+    SaldoCuentaPeriodo.objects.bulk_create([
+        SaldoCuentaPeriodo(cuenta_id=cuenta_id, ejercicio_id=ejercicio_id, periodo=periodo, debe=debe, haber=haber)
+        for (cuenta_id, ejercicio_id, periodo), (debe, haber) in saldos.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0063_numeradorasiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoCuentaPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(help_text='Primer día del mes')),
+                ('debe', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('haber', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_periodo', to='administrar.plancuenta')),
+                ('ejercicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_periodo', to='administrar.ejerciciocontable')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ejercicio', 'periodo'], name='administrar_ejercic_9caf9d_idx')],
+                'unique_together': {('cuenta', 'ejercicio', 'periodo')},
+            },
+        ),
+        migrations.RunPython(cargar_saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0064_saldocuentaperiodo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActualizacionPrecios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('tipo_actualizacion', models.CharField(choices=[('MONTO', 'Monto fijo'), ('PORCENTAJE', 'Porcentaje')], max_length=10)),
+                ('valor', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('campos', models.JSONField(default=list)),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('revertida', models.BooleanField(default=False)),
+                ('fecha_reversion', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('costo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_efectivo', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_tarjeta', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_ctacte', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_lista4', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('actualizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='administrar.actualizacionprecios')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_precios', to='administrar.producto')),
+            ],
+            options={
+                'unique_together': {('actualizacion', 'producto')},
+            },
+        ),
+    ]
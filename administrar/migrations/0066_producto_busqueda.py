@@ -0,0 +1,84 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:35
+
+import logging
+import re
+import unicodedata
+
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+
+# Copia de services_productos.normalizar/texto_busqueda al momento de la migración: la migración
+# no debe cambiar si el servicio cambia después
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', texto).split()
+
+
+def texto_busqueda(codigo, descripcion, marca='', rubro=''):
+    codigo_tokens = normalizar(codigo)
+    tokens = []
+    for token in (codigo_tokens + [''.join(codigo_tokens)] + normalizar(descripcion)
+                  + normalizar(marca) + normalizar(rubro)):
+        if token and token not in tokens:
+            tokens.append(token)
+    return ' '.join(tokens)
+
+
+def cargar_busqueda(apps, schema_editor):
+    """Completa Producto.busqueda para los productos existentes (igual que reindexar_productos)"""
+    Producto = apps.get_model('administrar', 'Producto')
+    filas = Producto.objects.values_list('id', 'codigo', 'descripcion', 'marca__nombre', 'rubro__nombre')
+    pendientes = [
+        Producto(id=producto_id, busqueda=texto_busqueda(codigo, descripcion, marca, rubro))
+        for producto_id, codigo, descripcion, marca, rubro in filas.iterator(chunk_size=2000)
+    ]
+    Producto.objects.bulk_update(pendientes, ['busqueda'], batch_size=1000)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    """Índice de texto según el motor: GIN pg_trgm (PostgreSQL) o FULLTEXT (MySQL). SQLite no usa índice"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception as e:
+            # Sin permisos para crear la extensión: la búsqueda funciona igual, sin índice
+            logger.warning("No se pudo habilitar pg_trgm (%s); se omite el índice de búsqueda", e)
+            return
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS administrar_producto_busqueda_trgm "
+            "ON administrar_producto USING gin (busqueda gin_trgm_ops)"
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            "ALTER TABLE administrar_producto ADD FULLTEXT INDEX administrar_producto_busqueda_ft (busqueda)"
+        )
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS administrar_producto_busqueda_trgm")
+    elif vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE administrar_producto DROP INDEX administrar_producto_busqueda_ft")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0065_actualizacionprecios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(cargar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
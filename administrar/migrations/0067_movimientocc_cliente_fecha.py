@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0066_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientocuentacorriente',
+            index=models.Index(fields=['cliente', 'fecha', 'id'], name='administrar_cliente_c7230d_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0067_movimientocc_cliente_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asiento',
+            index=models.Index(fields=['ejercicio', 'fecha', 'numero'], name='administrar_ejercic_c43166_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asiento',
+            index=models.Index(fields=['fecha', 'numero'], name='administrar_fecha_c2383e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cheque',
+            index=models.Index(fields=['estado', 'fecha_pago'], name='administrar_estado_e4d59d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cheque',
+            index=models.Index(fields=['tipo', 'estado'], name='administrar_tipo_38285a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['fecha', 'id'], name='administrar_fecha_011dd5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['proveedor', 'estado'], name='administrar_proveed_c522fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientocaja',
+            index=models.Index(fields=['caja_diaria', 'tipo'], name='administrar_caja_di_601484_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientocaja',
+            index=models.Index(fields=['tipo', 'fecha'], name='administrar_tipo_887f7e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientocaja',
+            index=models.Index(fields=['fecha'], name='administrar_fecha_e5587f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientocuentacorrienteproveedor',
+            index=models.Index(fields=['proveedor', 'fecha', 'id'], name='administrar_proveed_46c255_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', 'fecha'], name='administrar_product_dfe9bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['fecha'], name='administrar_fecha_3fcfea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notacredito',
+            index=models.Index(fields=['fecha', 'id'], name='administrar_fecha_4bef5c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'fecha'], name='administrar_estado_7c3612_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha', 'id'], name='administrar_fecha_3a9071_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remito',
+            index=models.Index(fields=['fecha', 'id'], name='administrar_fecha_d3d81c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='administrar_fecha_094c2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['cliente', 'fecha'], name='administrar_cliente_398ce3_idx'),
+        ),
+    ]
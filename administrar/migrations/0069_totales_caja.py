@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:55
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def cargar_totales(apps, schema_editor):
+    """Totales iniciales de cada CajaDiaria y de la posición global (igual que reconciliar_caja --reparar)"""
+    CajaDiaria = apps.get_model('administrar', 'CajaDiaria')
+    MovimientoCaja = apps.get_model('administrar', 'MovimientoCaja')
+    PosicionCaja = apps.get_model('administrar', 'PosicionCaja')
+    totales = {
+        'ingresos': Sum('monto', filter=Q(tipo='Ingreso')),
+        'egresos': Sum('monto', filter=Q(tipo='Egreso')),
+    }
+
+    pendientes = [
+        CajaDiaria(id=fila['caja_diaria_id'], total_ingresos=fila['ingresos'] or 0, total_egresos=fila['egresos'] or 0)
+        for fila in MovimientoCaja.objects.filter(caja_diaria__isnull=False)
+        .values('caja_diaria_id').order_by().annotate(**totales)
+    ]
+    CajaDiaria.objects.bulk_update(pendientes, ['total_ingresos', 'total_egresos'], batch_size=1000)
+
+    total = MovimientoCaja.objects.aggregate(**totales)
+    PosicionCaja.objects.update_or_create(pk=1, defaults={
+        'total_ingresos': total['ingresos'] or Decimal('0'),
+        'total_egresos': total['egresos'] or Decimal('0'),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0068_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicionCaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_egresos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='total_egresos',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='cajadiaria',
+            name='total_ingresos',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(cargar_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0069_totales_caja'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientostock',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='CierreStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('costo_unitario', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres_stock', to='administrar.producto')),
+            ],
+            options={
+                'unique_together': {('fecha', 'producto')},
+            },
+        ),
+    ]
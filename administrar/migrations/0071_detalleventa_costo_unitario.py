@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0070_libro_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detalleventa',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
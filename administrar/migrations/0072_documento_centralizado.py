@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:10
+
+from datetime import date, datetime, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def marcar_centralizados(apps, schema_editor):
+    """Marca los documentos que las vistas de automatización ya habían centralizado"""
+    Asiento = apps.get_model('administrar', 'Asiento')
+    Venta = apps.get_model('administrar', 'Venta')
+    DocumentoCentralizado = apps.get_model('administrar', 'DocumentoCentralizado')
+
+    marcas = {}
+    # Ventas y compras: 1 asiento por documento con referencia_id
+    for asiento_id, origen, documento_id in Asiento.objects.filter(
+        origen__in=['VENTAS', 'COMPRAS'], referencia_id__isnull=False
+    ).values_list('id', 'origen', 'referencia_id').order_by('id'):
+        marcas.setdefault((origen, documento_id), asiento_id)
+
+    # CMV: 1 asiento por día ("ASIENTO CMV - CENTRALIZACION DIARIA AAAA-MM-DD") que cubre las ventas del día
+    for asiento_id, descripcion in Asiento.objects.filter(
+        descripcion__startswith='ASIENTO CMV - CENTRALIZACION DIARIA'
+    ).values_list('id', 'descripcion'):
+        try:
+            dia = date.fromisoformat(descripcion.rsplit(' ', 1)[-1])
+        except ValueError:
+            continue
+        inicio = timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+        for venta_id in Venta.objects.filter(
+            fecha__gte=inicio, fecha__lt=inicio + timedelta(days=1), estado__in=['Emitida', 'Pagada']
+        ).values_list('id', flat=True):
+            marcas.setdefault(('CMV', venta_id), asiento_id)
+
+    DocumentoCentralizado.objects.bulk_create([
+        DocumentoCentralizado(origen=origen, documento_id=documento_id, asiento_id=asiento_id)
+        for (origen, documento_id), asiento_id in marcas.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0071_detalleventa_costo_unitario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoCentralizado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origen', models.CharField(choices=[('VENTAS', 'Ventas'), ('COMPRAS', 'Compras'), ('CMV', 'Costo de ventas')], max_length=10)),
+                ('documento_id', models.IntegerField()),
+                ('asiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documentos_centralizados', to='administrar.asiento')),
+            ],
+            options={
+                'unique_together': {('origen', 'documento_id')},
+            },
+        ),
+        migrations.RunPython(marcar_centralizados, migrations.RunPython.noop),
+    ]
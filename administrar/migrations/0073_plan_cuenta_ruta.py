@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+def cargar_rutas(apps, schema_editor):
+    """Camino materializado inicial desde (id, padre_id), igual que PlanCuentasService.reconstruir_rutas()"""
+    PlanCuenta = apps.get_model('administrar', 'PlanCuenta')
+    padres = dict(PlanCuenta.objects.values_list('id', 'padre_id'))
+    rutas = {}
+
+    def ruta(cuenta_id, visitadas=()):
+        if cuenta_id not in rutas:
+            padre_id = padres[cuenta_id]
+            base = '' if padre_id not in padres or padre_id in visitadas else ruta(padre_id, visitadas + (cuenta_id,))
+            rutas[cuenta_id] = base + f'{cuenta_id:08d}/'
+        return rutas[cuenta_id]
+
+    PlanCuenta.objects.bulk_update(
+        [PlanCuenta(id=cuenta_id, ruta=ruta(cuenta_id)) for cuenta_id in padres], ['ruta'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0072_documento_centralizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plancuenta',
+            name='ruta',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(cargar_rutas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:05
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def cargar_vencimientos(apps, schema_editor):
+    """fecha_vencimiento = día local de la fecha + validez (igual que Presupuesto.save())"""
+    Presupuesto = apps.get_model('administrar', 'Presupuesto')
+    pendientes = []
+    for presupuesto in Presupuesto.objects.only('id', 'fecha', 'validez').iterator(chunk_size=2000):
+        presupuesto.fecha_vencimiento = timezone.localdate(presupuesto.fecha) + timedelta(days=presupuesto.validez)
+        pendientes.append(presupuesto)
+        if len(pendientes) >= 2000:
+            Presupuesto.objects.bulk_update(pendientes, ['fecha_vencimiento'])
+            pendientes = []
+    Presupuesto.objects.bulk_update(pendientes, ['fecha_vencimiento'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0073_plan_cuenta_ruta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='presupuesto',
+            name='fecha_vencimiento',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='administrar_estado_d72839_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['fecha', 'id'], name='administrar_fecha_1d93d2_idx'),
+        ),
+        migrations.RunPython(cargar_vencimientos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0074_presupuesto_vencimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADO', 'Completado'), ('MUERTO', 'Agotó los reintentos')], default='PENDIENTE', max_length=10)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('ejecutar_desde', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bloqueado_hasta', models.DateTimeField(blank=True, help_text='Fin del lease del worker que lo tomó', null=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('finalizado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['estado', 'ejecutar_desde'], name='administrar_estado_2f3b41_idx')],
+            },
+        ),
+    ]
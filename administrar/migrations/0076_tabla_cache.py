@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 21:05
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def crear_tabla_cache(apps, schema_editor):
+    # Tabla de settings.CACHES (DatabaseCache); si se usa Redis no hace nada
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrar', '0075_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tabla_cache, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
+from datetime import timedelta
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 # ð¹ Condiciones fiscales posibles
@@ -299,10 +301,51 @@ class Producto(models.Model):
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    # Texto normalizado para búsquedas (ver services_productos.ProductoBuscador)
+    busqueda = models.TextField(blank=True, default='', editable=False)
+
     def __str__(self):
         return f"{self.descripcion} ({self.codigo})"
 
 
+class ActualizacionPrecios(models.Model):
+    """Cabecera de una actualización masiva de precios (permite revertirla)"""
+    TIPOS = [("MONTO", "Monto fijo"), ("PORCENTAJE", "Porcentaje")]
+
+    fecha = models.DateTimeField(auto_now_add=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    tipo_actualizacion = models.CharField(max_length=10, choices=TIPOS)
+    valor = models.DecimalField(max_digits=12, decimal_places=4)
+    campos = models.JSONField(default=list)
+    filtros = models.JSONField(default=dict, blank=True)
+    cantidad = models.IntegerField(default=0)
+    revertida = models.BooleanField(default=False)
+    fecha_reversion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"Actualización {self.id} - {self.tipo_actualizacion} {self.valor} ({self.cantidad} productos)"
+
+
+class HistorialPrecio(models.Model):
+    """Precios anteriores de un producto en una actualización masiva (sólo los de actualizacion.campos)"""
+    actualizacion = models.ForeignKey(ActualizacionPrecios, on_delete=models.CASCADE, related_name='items')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='historial_precios')
+    costo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_efectivo = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_tarjeta = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_ctacte = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_lista4 = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        unique_together = ('actualizacion', 'producto')
+
+    def __str__(self):
+        return f"Historial {self.actualizacion_id} - Producto {self.producto_id}"
+
+
 # ð¹ Modelo de Venta
 class Venta(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT)
@@ -328,10 +371,21 @@ class Venta(models.Model):
     # Referencia al pedido que originó esta venta (si aplica)
     pedido_origen = models.ForeignKey('Pedido', on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas_generadas')
 
-    def numero_factura_formateado(self):
-        """Retorna el nÃºmero de factura con formato: {punto_venta}-{id:08d}"""
-        empresa = Empresa.objects.first()
-        punto_venta = empresa.punto_venta if empresa else "0001"
+    class Meta:
+        # Listados por cursor (fecha, id), rangos de fecha del dashboard e historial por cliente
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+            models.Index(fields=['cliente', 'fecha']),
+        ]
+
+    def numero_factura_formateado(self, punto_venta=None):
+        """
+        Retorna el nÃºmero de factura con formato: {punto_venta}-{id:08d}
+        En listados pasar `punto_venta` (resuelto una vez) para no consultar Empresa por cada venta.
+        """
+        if punto_venta is None:
+            from .services import ConfiguracionEmpresa
+            punto_venta = ConfiguracionEmpresa.valor('punto_venta', "0001")
         return f"{punto_venta}-{self.id:08d}"
 
     def __str__(self):
@@ -347,6 +401,8 @@ class DetalleVenta(models.Model):
     neto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     iva_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    # Costo del producto al momento de la venta (CMV histórico); null = venta anterior sin backfill
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     def __str__(self):
         return f"{self.producto.descripcion} x {self.cantidad}"
@@ -362,11 +418,34 @@ class CajaDiaria(models.Model):
     monto_cierre_real = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     estado = models.CharField(max_length=10, choices=[('ABIERTA', 'Abierta'), ('CERRADA', 'Cerrada')], default='ABIERTA')
     observaciones = models.TextField(blank=True)
+    # Totales de los movimientos de la sesión: los mantiene CajaService (signals de MovimientoCaja)
+    total_ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_egresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    @property
+    def saldo_sistema(self):
+        return self.total_ingresos - self.total_egresos
 
     def __str__(self):
         return f"Caja {self.id} - {self.fecha_apertura.date()} ({self.estado})"
 
 
+class PosicionCaja(models.Model):
+    """
+    Totales de todos los movimientos de caja (fila única, pk=1): saldo global sin recorrer el historial.
+    Lo mantiene CajaService; se verifica/repara con `manage.py reconciliar_caja`.
+    """
+    total_ingresos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_egresos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    @property
+    def saldo(self):
+        return self.total_ingresos - self.total_egresos
+
+    def __str__(self):
+        return f"Posición de caja: ${self.saldo}"
+
+
 class MovimientoCaja(models.Model):
     caja_diaria = models.ForeignKey(CajaDiaria, on_delete=models.CASCADE, related_name='movimientos', null=True)
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
@@ -375,6 +454,14 @@ class MovimientoCaja(models.Model):
     descripcion = models.CharField(max_length=150)
     monto = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        # Totales por caja y tipo, reportes de ingresos/egresos por rango y movimientos del día
+        indexes = [
+            models.Index(fields=['caja_diaria', 'tipo']),
+            models.Index(fields=['tipo', 'fecha']),
+            models.Index(fields=['fecha']),
+        ]
+
     def __str__(self):
         return f"{self.tipo} - {self.descripcion} (${self.monto})"
 
@@ -394,12 +481,39 @@ class MovimientoStock(models.Model):
     cantidad = models.DecimalField(max_digits=10, decimal_places=2)
     referencia = models.CharField(max_length=50, blank=True)  # Ej: "Compra 15", "Venta 8"
     observaciones = models.TextField(blank=True)
+    # Costo unitario del producto al momento del movimiento (valorización del inventario a una fecha)
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        # Kardex por producto ordenado por fecha y movimientos por rango
+        indexes = [
+            models.Index(fields=['producto', 'fecha']),
+            models.Index(fields=['fecha']),
+        ]
 
     def __str__(self):
         signo = "+" if self.tipo == "IN" else "-"
         return f"{self.producto.descripcion} {signo}{self.cantidad} ({self.referencia})"
 
 
+class CierreStock(models.Model):
+    """
+    Foto del inventario al cierre de un día (fin de mes): cantidad y costo valorizado por producto.
+    La genera `manage.py cerrar_stock`; LibroStockService.inventario_al() parte del cierre más cercano.
+    """
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='cierres_stock')
+    cantidad = models.DecimalField(max_digits=12, decimal_places=2)
+    costo_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    valor = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('fecha', 'producto')  # El índice único sirve también para buscar por fecha
+
+    def __str__(self):
+        return f"Cierre {self.fecha} - {self.producto_id}: {self.cantidad}"
+
+
 # =========================================
 # ð¹ ORDEN DE COMPRA (OC)
 # =========================================
@@ -467,6 +581,13 @@ class Compra(models.Model):
     estado = models.CharField(max_length=10, choices=ESTADO_COMPRA, default="REGISTRADA")
     observaciones = models.TextField(blank=True)
 
+    class Meta:
+        # Rangos de fecha (dashboard, reportes) y compras pendientes por proveedor
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+            models.Index(fields=['proveedor', 'estado']),
+        ]
+
     def __str__(self):
         return f"Compra {self.id} - {self.proveedor.nombre}"
 
@@ -506,6 +627,13 @@ class Pedido(models.Model):
     # vÃ­nculo cuando el pedido ya fue facturado
     venta = models.ForeignKey("Venta", on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        # Pedidos por estado (pendientes, listos) y listado por cursor (fecha, id)
+        indexes = [
+            models.Index(fields=['estado', 'fecha']),
+            models.Index(fields=['fecha', 'id']),
+        ]
+
     def __str__(self):
         return f"Pedido {self.id} - {self.cliente.nombre}"
 
@@ -545,6 +673,26 @@ class Presupuesto(models.Model):
     # Vínculo si se convirtió en pedido
     pedido = models.ForeignKey("Pedido", on_delete=models.SET_NULL, null=True, blank=True, related_name='presupuesto_origen')
 
+    # Día (hora local) de la fecha + validez, mantenido por save(). Los PENDIENTE con vencimiento anterior
+    # a hoy se muestran VENCIDO (PresupuestoService) y `manage.py vencer_presupuestos` los pasa a VENCIDO
+    fecha_vencimiento = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'fecha_vencimiento']),
+            models.Index(fields=['fecha', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.fecha_vencimiento = timezone.localdate(self.fecha or timezone.now()) + timedelta(days=self.validez)
+        # Reactivado o con más validez: deja de estar vencido
+        if self.estado == 'VENCIDO' and self.fecha_vencimiento >= timezone.localdate():
+            self.estado = 'PENDIENTE'
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'fecha', 'validez'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'fecha_vencimiento', 'estado'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Presupuesto #{self.id} - {self.cliente.nombre}"
 
@@ -577,6 +725,10 @@ class MovimientoCuentaCorriente(models.Model):
     venta = models.ForeignKey('Venta', on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_cc')
     recibo = models.ForeignKey('Recibo', on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_cc')
 
+    class Meta:
+        # Rango por fecha, último saldo y cursor (fecha, id) por cliente
+        indexes = [models.Index(fields=['cliente', 'fecha', 'id'])]
+
     def __str__(self):
         return f"{self.fecha.date()} - {self.tipo} ${self.monto} ({self.cliente.nombre})"
 
@@ -592,6 +744,12 @@ class MovimientoCuentaCorrienteProveedor(models.Model):
     # Referencias opcionales para trazabilidad
     recibo = models.ForeignKey('Recibo', on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_cc_proveedor')
 
+    class Meta:
+        # Cuenta corriente del proveedor en orden cronológico
+        indexes = [
+            models.Index(fields=['proveedor', 'fecha', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.fecha.date()} - {self.tipo} ${self.monto} ({self.proveedor.nombre})"
 
@@ -644,6 +802,9 @@ class PlanCuenta(models.Model):
     imputable = models.BooleanField(default=True, help_text="Si es True, recibe asientos. Si es False, es rubro agrupador.")
     nivel = models.IntegerField(default=1)
     padre = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='hijos')
+    # Camino materializado desde la raíz ("00000001/00000007/"): lo mantiene PlanCuentasService (signals.py)
+    # y permite obtener todas las descendientes de una cuenta con un filtro por rango sobre el índice
+    ruta = models.CharField(max_length=255, blank=True, default='', db_index=True)
 
     class Meta:
         ordering = ['codigo']
@@ -691,6 +852,11 @@ class Asiento(models.Model):
     class Meta:
         ordering = ['-fecha', '-numero']
         unique_together = ['ejercicio', 'numero']
+        # Libro diario / centralización por ejercicio y rango; listado general por (fecha, numero)
+        indexes = [
+            models.Index(fields=['ejercicio', 'fecha', 'numero']),
+            models.Index(fields=['fecha', 'numero']),
+        ]
 
     def __str__(self):
         return f"Asiento #{self.numero} - {self.descripcion}"
@@ -706,6 +872,57 @@ class ItemAsiento(models.Model):
     def __str__(self):
         return f"{self.cuenta.nombre} | D: {self.debe} | H: {self.haber}"
 
+
+class SaldoCuentaPeriodo(models.Model):
+    """
+    Totales mensuales de Debe/Haber por cuenta y ejercicio.
+    Lo mantiene SaldosService al registrar/eliminar asientos; se reconstruye con `manage.py reconstruir_saldos`.
+    """
+    cuenta = models.ForeignKey(PlanCuenta, on_delete=models.CASCADE, related_name='saldos_periodo')
+    ejercicio = models.ForeignKey(EjercicioContable, on_delete=models.CASCADE, related_name='saldos_periodo')
+    periodo = models.DateField(help_text="Primer día del mes")
+    debe = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    haber = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['cuenta', 'ejercicio', 'periodo']
+        indexes = [models.Index(fields=['ejercicio', 'periodo'])]
+
+    def __str__(self):
+        return f"{self.cuenta.codigo} {self.periodo:%m/%Y} | D: {self.debe} | H: {self.haber}"
+
+
+class NumeradorAsiento(models.Model):
+    """Último número de asiento emitido por ejercicio. Se bloquea con select_for_update al numerar."""
+    ejercicio = models.OneToOneField(EjercicioContable, on_delete=models.CASCADE, related_name='numerador')
+    ultimo_numero = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.ejercicio} - Último asiento #{self.ultimo_numero}"
+
+
+class DocumentoCentralizado(models.Model):
+    """
+    Documento ya centralizado en el libro diario y el asiento que lo incluye (uno por documento o
+    consolidado por día). CentralizacionService excluye los centralizados con un anti-join sobre esta tabla;
+    al borrar el asiento se borran sus marcas y los documentos vuelven a quedar pendientes.
+    """
+    ORIGEN_CHOICES = [
+        ('VENTAS', 'Ventas'),
+        ('COMPRAS', 'Compras'),
+        ('CMV', 'Costo de ventas'),
+    ]
+
+    origen = models.CharField(max_length=10, choices=ORIGEN_CHOICES)
+    documento_id = models.IntegerField()
+    asiento = models.ForeignKey(Asiento, on_delete=models.CASCADE, related_name='documentos_centralizados')
+
+    class Meta:
+        unique_together = ['origen', 'documento_id']
+
+    def __str__(self):
+        return f"{self.origen} #{self.documento_id} -> Asiento #{self.asiento_id}"
+
 # 🔹 Perfil de Usuario para Permisos
 
 class PerfilUsuario(models.Model):
@@ -865,6 +1082,41 @@ class Backup(models.Model):
         else:
             return f"{self.tamanio / (1024 * 1024 * 1024):.2f} GB"
 
+
+class Job(models.Model):
+    """
+    Tarea en segundo plano (asientos, backups, emails, PDFs) que se ejecuta después del commit de la operación.
+    La encola JobService.encolar y la procesa `manage.py run_workers`; la cola vive en la misma base de datos.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_CURSO', 'En curso'),
+        ('COMPLETADO', 'Completado'),
+        ('MUERTO', 'Agotó los reintentos'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='PENDIENTE')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    ejecutar_desde = models.DateTimeField(default=timezone.now)
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True, help_text="Fin del lease del worker que lo tomó")
+    worker = models.CharField(max_length=100, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_desde']),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.tipo} ({self.estado})"
+
 # =========================================
 # ðx ¹ NOTAS DE CRÃ0 DITO Y DÃ0 BITO
 # =========================================
@@ -887,6 +1139,12 @@ class NotaCredito(models.Model):
     # Para impresiÃ³n
     punto_venta = models.CharField(max_length=5, default="0001")
 
+    class Meta:
+        # Listado por cursor (fecha, id)
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+        ]
+
     def numero_formateado(self):
         return f"{self.punto_venta}-{self.id:08d}"
 
@@ -981,6 +1239,12 @@ class Remito(models.Model):
     
     punto_venta = models.CharField(max_length=5, default="0001")
 
+    class Meta:
+        # Listado por cursor (fecha, id)
+        indexes = [
+            models.Index(fields=['fecha', 'id']),
+        ]
+
     def numero_formateado(self):
         return f"R-{self.punto_venta}-{self.id:08d}"
 
@@ -1036,6 +1300,13 @@ class Cheque(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Cartera por estado y vencimiento, cheques por tipo y estado
+        indexes = [
+            models.Index(fields=['estado', 'fecha_pago']),
+            models.Index(fields=['tipo', 'estado']),
+        ]
+
     def __str__(self):
         return f"Cheque {self.banco} #{self.numero} - ${self.monto}"
 
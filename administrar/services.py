@@ -1,8 +1,246 @@
-from django.db import transaction
+import threading
+import unicodedata
+from django.db import transaction, IntegrityError
+from django.db.models import Max
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 from decimal import Decimal
 from datetime import date, datetime
-from .models import Cheque, Asiento, ItemAsiento, PlanCuenta, EjercicioContable, Cliente, MovimientoCaja
+from .models import Cheque, Asiento, ItemAsiento, NumeradorAsiento, PlanCuenta, EjercicioContable, Cliente, MovimientoCaja, Empresa
+from .services_contabilidad import SaldosService
+from .utils_cache import CacheVersionado
+
+
+def _normalizar_texto(texto):
+    """Minúsculas y sin acentos (aproxima la collation *_ci de MySQL para icontains)"""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).casefold().strip()
+
+
+class ResolverContable:
+    """
+    Cache de proceso del plan de cuentas imputable y de los ejercicios abiertos.
+    - Primer uso: 1 consulta para todas las cuentas imputables + 1 para ejercicios.
+    - Luego las resoluciones (por código o nombre) se hacen en memoria y se memorizan,
+      incluso las que no encuentran cuenta (fallbacks como "Gastos Varios").
+    - Se invalida con post_save/post_delete de PlanCuenta y EjercicioContable (signals.py), que cambian
+      la versión del espacio 'contable' (CacheVersionado): los demás workers y run_workers recargan en
+      su próximo request o job. TTL_SEGUNDOS es sólo un resguardo.
+    - Un ejercicio cerrado en otro proceso se vuelve a verificar en AsientoBuilder.registrar().
+    """
+    ESPACIO = CacheVersionado.registrar('contable')
+    TTL_SEGUNDOS = 300
+
+    _lock = threading.RLock()
+
+    @classmethod
+    def invalidar(cls, **kwargs):
+        """Receptor de señales: descarta todo lo cacheado, en este y en los demás procesos"""
+        CacheVersionado.invalidar(cls.ESPACIO)
+
+    @staticmethod
+    def _cargar_plan():
+        cuentas = list(PlanCuenta.objects.filter(imputable=True).order_by('codigo'))
+        return {
+            'cuentas': [(c, _normalizar_texto(c.nombre)) for c in cuentas],   # Ordenadas por código
+            'por_codigo': {c.codigo: c for c in cuentas},
+            'resueltas': {},
+        }
+
+    @classmethod
+    def _plan(cls):
+        return CacheVersionado.obtener(cls.ESPACIO, 'plan', cls._cargar_plan, cls.TTL_SEGUNDOS)
+
+    @staticmethod
+    def _resolver(plan, nombre_o_codigo):
+        """Misma prioridad que la consulta original: código exacto, nombre exacto, nombre parcial"""
+        por_codigo = plan['por_codigo'].get(nombre_o_codigo)
+        if por_codigo:
+            return por_codigo
+
+        buscado = _normalizar_texto(nombre_o_codigo)
+        if not buscado:
+            return None
+        primera = None
+        for cuenta, nombre in plan['cuentas']:
+            if buscado in nombre:
+                if nombre == buscado:
+                    return cuenta
+                if primera is None:
+                    primera = cuenta
+        return primera
+
+    @classmethod
+    def cuenta(cls, nombre_o_codigo, precargar=()):
+        if nombre_o_codigo is None:
+            return None
+        plan = cls._plan()
+        with cls._lock:
+            resueltas = plan['resueltas']
+            if not resueltas:
+                # Resolver de una vez las cuentas conocidas (sin consultas adicionales)
+                for nombre in precargar:
+                    resueltas[nombre] = cls._resolver(plan, nombre)
+            if nombre_o_codigo not in resueltas:
+                resueltas[nombre_o_codigo] = cls._resolver(plan, nombre_o_codigo)
+            return resueltas[nombre_o_codigo]
+
+    @classmethod
+    def ejercicio_vigente(cls, fecha=None):
+        if not fecha:
+            fecha = date.today()
+        if isinstance(fecha, datetime):
+            if timezone.is_aware(fecha):
+                fecha = timezone.localtime(fecha)
+            fecha = fecha.date()
+
+        ejercicios = CacheVersionado.obtener(
+            cls.ESPACIO, 'ejercicios', lambda: list(EjercicioContable.objects.filter(cerrado=False)),
+            cls.TTL_SEGUNDOS
+        )
+        for ejercicio in ejercicios:
+            if ejercicio.fecha_inicio <= fecha <= ejercicio.fecha_fin:
+                return ejercicio
+        return None
+
+
+class ConfiguracionEmpresa:
+    """
+    Cache de proceso de la configuración de la empresa (singleton: Empresa.objects.first()).
+    - obtener() retorna la misma instancia de Empresa (o None) sin consultar la base; es de
+      SOLO LECTURA: para modificar la configuración leer la fila con Empresa.objects.first().
+    - La fila vive en el proceso y la versión en el cache compartido (CacheVersionado, espacio
+      'empresa'), verificada 1 vez por request: si otro worker guardó la empresa se recarga.
+      TTL_SEGUNDOS es sólo un resguardo.
+    - Se invalida con post_save/post_delete de Empresa (signals.py).
+    """
+    ESPACIO = CacheVersionado.registrar('empresa')
+    TTL_SEGUNDOS = 300
+
+    @classmethod
+    def invalidar(cls, **kwargs):
+        """Receptor de señales: descarta la copia local y cambia la versión para los demás procesos"""
+        CacheVersionado.invalidar(cls.ESPACIO)
+
+    @classmethod
+    def obtener(cls):
+        return CacheVersionado.obtener(cls.ESPACIO, 'empresa', Empresa.objects.first, cls.TTL_SEGUNDOS)
+
+    @classmethod
+    def valor(cls, campo, defecto=None):
+        """Campo de configuración, o `defecto` si no hay empresa cargada"""
+        empresa = cls.obtener()
+        return getattr(empresa, campo) if empresa else defecto
+
+
+class AsientoBuilder:
+    """
+    Arma un asiento en memoria y lo registra en bloque:
+        asiento = (AsientoBuilder(ejercicio, fecha, "Descripción", origen='VENTAS')
+                   .debe(cuenta_deudores, total)
+                   .haber(cuenta_ventas, neto)
+                   .haber(cuenta_iva, iva)
+                   .registrar())
+    - Los importes se redondean a 2 decimales (precisión de ItemAsiento) y se valida Debe == Haber
+      antes de escribir nada (ValueError si no balancea).
+    - El número sale del NumeradorAsiento del ejercicio, bloqueado con select_for_update: dos cajas
+      registrando a la vez quedan serializadas y no se repiten ni se saltean números.
+    - El ejercicio se relee bloqueado al reservar el número: si está cerrado, ValueError.
+    - Escritura: 1 INSERT de Asiento + 1 INSERT (bulk) de todos los ItemAsiento
+      + 1 UPDATE de SaldoCuentaPeriodo por cuenta.
+    """
+    CENTAVO = Decimal('0.01')
+
+    def __init__(self, ejercicio, fecha, descripcion, origen='MANUAL', usuario='Sistema', referencia_id=None):
+        self.ejercicio = ejercicio
+        self.fecha = fecha
+        self.descripcion = descripcion
+        self.origen = origen
+        self.usuario = usuario
+        self.referencia_id = referencia_id
+        self.lineas = []
+
+    def linea(self, cuenta, debe=0, haber=0, descripcion=''):
+        self.lineas.append(ItemAsiento(
+            cuenta=cuenta,
+            debe=Decimal(str(debe)).quantize(self.CENTAVO),
+            haber=Decimal(str(haber)).quantize(self.CENTAVO),
+            descripcion=descripcion
+        ))
+        return self
+
+    def debe(self, cuenta, monto, descripcion=''):
+        return self.linea(cuenta, monto, 0, descripcion)
+
+    def haber(self, cuenta, monto, descripcion=''):
+        return self.linea(cuenta, 0, monto, descripcion)
+
+    @property
+    def total_debe(self):
+        return sum((linea.debe for linea in self.lineas), Decimal('0'))
+
+    @property
+    def total_haber(self):
+        return sum((linea.haber for linea in self.lineas), Decimal('0'))
+
+    def validar(self):
+        if len(self.lineas) < 2:
+            raise ValueError("El asiento debe tener al menos 2 movimientos")
+        if self.total_debe != self.total_haber:
+            raise ValueError(f"El asiento está descuadrado. Debe: {self.total_debe}, Haber: {self.total_haber}")
+
+    @classmethod
+    def siguiente_numero(cls, ejercicio):
+        """
+        Reserva el próximo número del ejercicio. Debe llamarse dentro de transaction.atomic():
+        el bloqueo del numerador se mantiene hasta el commit, y si la transacción se revierte
+        el número vuelve a quedar libre (numeración sin huecos).
+        """
+        return cls.reservar_numeros(ejercicio, 1)
+
+    @staticmethod
+    def reservar_numeros(ejercicio, cantidad):
+        """Reserva un bloque de `cantidad` números consecutivos y retorna el primero (mismas reglas que siguiente_numero)"""
+        # El ejercicio pudo cerrarse en otro proceso después de que este lo cacheó (ResolverContable):
+        # se relee bloqueado, así que cerrarlo espera a que se confirme el asiento y viceversa
+        cerrado = (EjercicioContable.objects.select_for_update().filter(pk=ejercicio.pk)
+                   .values_list('cerrado', flat=True).first())
+        if cerrado is not False:
+            raise ValueError(f"El ejercicio {ejercicio} está cerrado: no se pueden registrar asientos")
+        numerador = NumeradorAsiento.objects.select_for_update().filter(ejercicio=ejercicio).first()
+        if numerador is None:
+            # Primera vez en el ejercicio: continuar desde los asientos ya existentes
+            ultimo = Asiento.objects.filter(ejercicio=ejercicio).aggregate(m=Max('numero'))['m'] or 0
+            try:
+                with transaction.atomic():
+                    NumeradorAsiento.objects.create(ejercicio=ejercicio, ultimo_numero=ultimo)
+            except IntegrityError:
+                pass  # Otro proceso lo creó en paralelo
+            numerador = NumeradorAsiento.objects.select_for_update().get(ejercicio=ejercicio)
+
+        numerador.ultimo_numero += cantidad
+        numerador.save(update_fields=['ultimo_numero'])
+        return numerador.ultimo_numero - cantidad + 1
+
+    def registrar(self):
+        self.validar()
+        with transaction.atomic():
+            asiento = Asiento.objects.create(
+                numero=self.siguiente_numero(self.ejercicio),
+                fecha=self.fecha,
+                descripcion=self.descripcion,
+                ejercicio=self.ejercicio,
+                origen=self.origen,
+                referencia_id=self.referencia_id,
+                usuario=self.usuario
+            )
+            for linea in self.lineas:
+                linea.asiento = asiento
+            ItemAsiento.objects.bulk_create(self.lineas)
+            # bulk_create no dispara señales: actualizar los saldos mensuales acá
+            SaldosService.registrar_items(asiento, self.lineas)
+        return asiento
+
 
 class AccountingService:
     """
@@ -29,33 +267,25 @@ class AccountingService:
     CUENTA_RETENCIONES_A_DEPOSITAR = "Retenciones a Depositar" # Pasivo (Pago a Proveedor)
     CUENTA_RETENCIONES_SUFRIDAS = "Retenciones Sufridas"     # Activo (Cobro a Cliente)
 
+    # Se resuelven todas juntas en la primera carga del ResolverContable
+    CUENTAS_CONOCIDAS = (
+        CUENTA_VALORES_A_DEPOSITAR, CUENTA_DEUDORES_POR_VENTAS, CUENTA_BANCO, CUENTA_PROVEEDORES,
+        CUENTA_VENTAS, CUENTA_COMPRAS, CUENTA_IVA_DEBITO, CUENTA_IVA_CREDITO, CUENTA_COSTO_MERCADERIAS,
+        CUENTA_CAJA, CUENTA_TARJETAS_A_COBRAR, CUENTA_COMISIONES_TARJETA,
+        CUENTA_RETENCIONES_A_DEPOSITAR, CUENTA_RETENCIONES_SUFRIDAS,
+        "Gastos Varios", "Gastos Generales", "Ingresos Varios", "Otros Ingresos", "Cuentas de Orden",
+    )
+
 
     @classmethod
     def _obtener_ejercicio_vigente(cls, fecha=None):
-        if not fecha:
-            fecha = date.today()
-        
-        try:
-            return EjercicioContable.objects.get(
-                fecha_inicio__lte=fecha, 
-                fecha_fin__gte=fecha,
-                cerrado=False
-            )
-        except EjercicioContable.DoesNotExist:
-            return None
+        """Ejercicio abierto que contiene la fecha (cacheado en ResolverContable)"""
+        return ResolverContable.ejercicio_vigente(fecha)
 
     @classmethod
     def _obtener_cuenta(cls, nombre_o_codigo):
-        """Busca una cuenta por nombre parcial O codigo, priorizando coincidencia exacta"""
-        # Intentar buscar por CODIGO exacto primero
-        por_codigo = PlanCuenta.objects.filter(codigo=nombre_o_codigo, imputable=True).first()
-        if por_codigo: return por_codigo
-
-        # Buscar por Nombre
-        matches = PlanCuenta.objects.filter(nombre__icontains=nombre_o_codigo, imputable=True)
-        exact = matches.filter(nombre__iexact=nombre_o_codigo).first()
-        if exact: return exact
-        return matches.first()
+        """Busca una cuenta por nombre parcial O codigo, priorizando coincidencia exacta (cacheado)"""
+        return ResolverContable.cuenta(nombre_o_codigo, precargar=cls.CUENTAS_CONOCIDAS)
 
     @classmethod
     def registrar_alta_cheque(cls, cheque):
@@ -92,35 +322,11 @@ class AccountingService:
         if existing:
             return
 
-        with transaction.atomic():
-            # Buscar último número de asiento
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=cheque.fecha_emision,
-                descripcion=descripcion,
-                ejercicio=ejercicio,
-                origen='COBROS',
-                usuario='Sistema' # Idealmente el usuario logueado
-            )
-
-            # Item Debe
-            ItemAsiento.objects.create(
-                asiento=asiento,
-                cuenta=cuenta_debe,
-                debe=cheque.monto,
-                haber=0
-            )
-
-            # Item Haber
-            ItemAsiento.objects.create(
-                asiento=asiento,
-                cuenta=cuenta_haber,
-                debe=0,
-                haber=cheque.monto
-            )
+        asiento = AsientoBuilder(ejercicio, cheque.fecha_emision, descripcion, origen='COBROS',
+                                 usuario='Sistema')  # Idealmente el usuario logueado
+        asiento.debe(cuenta_debe, cheque.monto)
+        asiento.haber(cuenta_haber, cheque.monto)
+        asiento.registrar()
             
     @classmethod
     def registrar_cambio_estado(cls, cheque, estado_anterior, cuenta_destino=None):
@@ -186,23 +392,14 @@ class AccountingService:
             print("DEBUG: Faltan cuentas para deposito")
             return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-            
-            desc_banco = cuenta_destino.banco if cuenta_destino else "Banco"
-            
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha_asiento,
-                descripcion=f"Depósito Cheque {cheque.numero} en {desc_banco}",
-                ejercicio=ejercicio,
-                origen='COBROS', 
-                usuario='Sistema'
-            )
+        desc_banco = cuenta_destino.banco if cuenta_destino else "Banco"
+
+        asiento = AsientoBuilder(ejercicio, fecha_asiento, f"Depósito Cheque {cheque.numero} en {desc_banco}",
+                                 origen='COBROS')
+        asiento.debe(cuenta_banco, cheque.monto)
+        asiento.haber(cuenta_valores, cheque.monto)
+        asiento.registrar()
 
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_banco, debe=cheque.monto, haber=0)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_valores, debe=0, haber=cheque.monto)
     @classmethod
     def _registrar_cobro_por_ventanilla(cls, cheque):
         """
@@ -233,22 +430,13 @@ class AccountingService:
             )
 
             # 2. Asiento Contable
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-            
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha_asiento,
-                descripcion=f"Cobro Cheque #{cheque.numero} (Efectivo)",
-                ejercicio=ejercicio,
-                origen='COBROS', 
-                usuario='Sistema'
-            )
-
+            asiento = AsientoBuilder(ejercicio, fecha_asiento, f"Cobro Cheque #{cheque.numero} (Efectivo)",
+                                     origen='COBROS')
             # Debe Caja
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=cheque.monto, haber=0)
+            asiento.debe(cuenta_caja, cheque.monto)
             # Haber Valores a Depositar
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_valores, debe=0, haber=cheque.monto)
+            asiento.haber(cuenta_valores, cheque.monto)
+            asiento.registrar()
             
             print(f"DEBUG: Cobro Ventanilla Cheque {cheque.numero} registrado.")
 
@@ -270,25 +458,15 @@ class AccountingService:
         if not cuenta_proveedores or not cuenta_valores:
              return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-            
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha_asiento,
-                descripcion=f"Pago a Proveedor con Cheque #{cheque.numero} (Endoso)",
-                ejercicio=ejercicio,
-                origen='PAGOS', 
-                usuario='Sistema'
-            )
+        asiento = AsientoBuilder(ejercicio, fecha_asiento, f"Pago a Proveedor con Cheque #{cheque.numero} (Endoso)",
+                                 origen='PAGOS')
+        # Debe Proveedores
+        asiento.debe(cuenta_proveedores, cheque.monto)
+        # Haber Valores a Depositar
+        asiento.haber(cuenta_valores, cheque.monto)
+        asiento.registrar()
 
-            # Debe Proveedores
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_proveedores, debe=cheque.monto, haber=0)
-            # Haber Valores a Depositar
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_valores, debe=0, haber=cheque.monto)
-            
-            print(f"DEBUG: Entrega Cheque {cheque.numero} registrada.")
+        print(f"DEBUG: Entrega Cheque {cheque.numero} registrada.")
 
     @classmethod
     def registrar_movimiento_banco(cls, movimiento):
@@ -318,31 +496,24 @@ class AccountingService:
              print(f"Faltan cuentas par movimiento banco: {movimiento.tipo}")
              return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-            
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha_asiento,
-                descripcion=f"Movimiento Banco {movimiento.tipo}: {movimiento.descripcion}",
-                ejercicio=ejercicio,
-                origen='PAGOS' if movimiento.tipo == 'DEBITO' else 'COBROS',
-                usuario='Sistema'
-            )
+        asiento = AsientoBuilder(
+            ejercicio, fecha_asiento, f"Movimiento Banco {movimiento.tipo}: {movimiento.descripcion}",
+            origen='PAGOS' if movimiento.tipo == 'DEBITO' else 'COBROS'
+        )
 
-            monto = abs(movimiento.monto)
+        monto = abs(movimiento.monto)
 
-            if movimiento.tipo == 'DEBITO':
-                # Egreso: Haber Banco, Debe Gasto
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_contrapartida, debe=monto, haber=0)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_banco, debe=0, haber=monto)
-            else:
-                # Ingreso: Debe Banco, Haber Ingreso
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_banco, debe=monto, haber=0)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_contrapartida, debe=0, haber=monto)
-                
-            print(f"DEBUG: Asiento {nuevo_numero} creado para movimiento banco manual")
+        if movimiento.tipo == 'DEBITO':
+            # Egreso: Haber Banco, Debe Gasto
+            asiento.debe(cuenta_contrapartida, monto)
+            asiento.haber(cuenta_banco, monto)
+        else:
+            # Ingreso: Debe Banco, Haber Ingreso
+            asiento.debe(cuenta_banco, monto)
+            asiento.haber(cuenta_contrapartida, monto)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento {registrado.numero} creado para movimiento banco manual")
 
     @classmethod
     def _registrar_rechazo(cls, cheque):
@@ -362,26 +533,16 @@ class AccountingService:
             print(f"Faltan cuentas para pago contado compra: Prov={cuenta_proveedores}, Caja={cuenta_caja}")
             return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
+        asiento = AsientoBuilder(ejercicio, fecha, f"Pago Compra #{compra.id} (Efectivo)", origen='PAGOS')
 
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha,
-                descripcion=f"Pago Compra #{compra.id} (Efectivo)",
-                ejercicio=ejercicio,
-                origen='PAGOS',
-                usuario='Sistema'
-            )
+        # Debe: Proveedores (Baja el pasivo)
+        asiento.debe(cuenta_proveedores, compra.total)
 
-            # Debe: Proveedores (Baja el pasivo)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_proveedores, debe=compra.total, haber=0)
-            
-            # Haber: Caja (Sale dinero)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=0, haber=compra.total)
-            
-            print(f"DEBUG: Asiento Pago Contado {nuevo_numero} generado para Compra {compra.id}.")
+        # Haber: Caja (Sale dinero)
+        asiento.haber(cuenta_caja, compra.total)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Pago Contado {registrado.numero} generado para Compra {compra.id}.")
 
     @classmethod
     def registrar_pago_compra_cheque_propio(cls, compra, cheque):
@@ -408,26 +569,16 @@ class AccountingService:
             print(f"Faltan cuentas para pago cheque propio (Banco: {cheque.banco})")
             return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
+        asiento = AsientoBuilder(ejercicio, fecha, f"Pago Compra #{compra.id} (Ch/{cheque.numero})", origen='PAGOS')
 
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha,
-                descripcion=f"Pago Compra #{compra.id} (Ch/{cheque.numero})",
-                ejercicio=ejercicio,
-                origen='PAGOS',
-                usuario='Sistema'
-            )
+        # Debe: Proveedores
+        asiento.debe(cuenta_proveedores, compra.total)
 
-            # Debe: Proveedores
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_proveedores, debe=compra.total, haber=0)
-            
-            # Haber: Banco
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_haber, debe=0, haber=compra.total)
+        # Haber: Banco
+        asiento.haber(cuenta_haber, compra.total)
 
-            print(f"DEBUG: Asiento Pago Cheque {nuevo_numero} generado para Compra {compra.id}.")
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Pago Cheque {registrado.numero} generado para Compra {compra.id}.")
 
     @classmethod
     def registrar_venta(cls, venta):
@@ -458,44 +609,36 @@ class AccountingService:
 
         # Cálculos Venta (Asumimos Total es Bruto, IVA 21%)
         total = venta.total
-        neto = total / Decimal("1.21")
+        neto = (total / Decimal("1.21")).quantize(AsientoBuilder.CENTAVO)
         iva = total - neto
 
-        # Cálculos Costo
-        total_costo = Decimal("0.00")
-        for detalle in venta.detalles.all():
-            costo_unitario = detalle.producto.costo
-            total_costo += (detalle.cantidad * costo_unitario)
-
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=venta.fecha,
-                descripcion=f"Venta {venta.tipo_comprobante} {venta.numero_factura_formateado()} - {venta.cliente.nombre}",
-                ejercicio=ejercicio,
-                origen='VENTAS',
-                usuario='Sistema'
-            )
-
-            # 1. Asiento de Venta
-            # D: Deudores (Total)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=total, haber=0)
-            # H: Ventas (Neto)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_ventas, debe=0, haber=neto)
-            # H: IVA Débito
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_iva_debito, debe=0, haber=iva)
-
-            # 2. Asiento de Costo (en el mismo asiento contable o separado? Generalmente juntos es mas limpio)
-            if total_costo > 0:
-                # D: CMV
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_cmv, debe=total_costo, haber=0)
-                # H: Mercaderías (Activo)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_mercaderias, debe=0, haber=total_costo)
-            
-            print(f"DEBUG: Asiento Venta {nuevo_numero} creado (Neto: {neto}, IVA: {iva}, Costo: {total_costo})")
+        # Cálculos Costo (costo capturado en cada línea al vender, 1 aggregate)
+        from .services_ventas import VentaService
+        total_costo = VentaService.costo_ventas([venta.pk]).quantize(AsientoBuilder.CENTAVO)
+
+        asiento = AsientoBuilder(
+            ejercicio, venta.fecha,
+            f"Venta {venta.tipo_comprobante} {venta.numero_factura_formateado()} - {venta.cliente.nombre}",
+            origen='VENTAS'
+        )
+
+        # 1. Asiento de Venta
+        # D: Deudores (Total)
+        asiento.debe(cuenta_deudores, total)
+        # H: Ventas (Neto)
+        asiento.haber(cuenta_ventas, neto)
+        # H: IVA Débito
+        asiento.haber(cuenta_iva_debito, iva)
+
+        # 2. Asiento de Costo (en el mismo asiento contable o separado? Generalmente juntos es mas limpio)
+        if total_costo > 0:
+            # D: CMV
+            asiento.debe(cuenta_cmv, total_costo)
+            # H: Mercaderías (Activo)
+            asiento.haber(cuenta_mercaderias, total_costo)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Venta {registrado.numero} creado (Neto: {neto}, IVA: {iva}, Costo: {total_costo})")
 
     @classmethod
     def registrar_compra(cls, compra):
@@ -518,35 +661,25 @@ class AccountingService:
 
         # Cálculos (Asumimos Total Bruto, IVA 21%)
         total = compra.total
-        neto = total / Decimal("1.21")
+        neto = (total / Decimal("1.21")).quantize(AsientoBuilder.CENTAVO)
         iva = total - neto
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
+        # Intentar obtener info del proveedor
+        prov_nombre = compra.proveedor.nombre if compra.proveedor else "Proveedor desconoc."
 
-            # Intentar obtener info del proveedor
-            prov_nombre = compra.proveedor.nombre if compra.proveedor else "Proveedor desconoc."
+        asiento = AsientoBuilder(ejercicio, fecha, f"Compra - {prov_nombre}", origen='COMPRAS')
 
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha,
-                descripcion=f"Compra - {prov_nombre}",
-                ejercicio=ejercicio,
-                origen='COMPRAS',
-                usuario='Sistema'
-            )
+        # Item Debe (Mercaderías - Neto)
+        asiento.debe(cuenta_mercaderias, neto)
 
-            # Item Debe (Mercaderías - Neto)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_mercaderias, debe=neto, haber=0)
+        # Item Debe (IVA Crédito)
+        asiento.debe(cuenta_iva_credito, iva)
 
-            # Item Debe (IVA Crédito)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_iva_credito, debe=iva, haber=0)
-            
-            # Item Haber (Proveedores - Total)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_proveedores, debe=0, haber=total)
-            
-            print(f"DEBUG: Asiento Compra {nuevo_numero} creado (Neto: {neto}, IVA: {iva})")
+        # Item Haber (Proveedores - Total)
+        asiento.haber(cuenta_proveedores, total)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Compra {registrado.numero} creado (Neto: {neto}, IVA: {iva})")
 
     @classmethod
     def registrar_cobro_venta_contado(cls, venta):
@@ -560,25 +693,15 @@ class AccountingService:
             print("Faltan cuentas para cobro (Caja o Deudores)")
             return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=venta.fecha,
-                descripcion=f"Cobro Venta #{venta.id} - {venta.cliente.nombre}",
-                ejercicio=ejercicio,
-                origen='COBROS',
-                usuario='Sistema'
-            )
-
-            # Debe Caja
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=venta.total, haber=0)
-            # Haber Deudores
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=0, haber=venta.total)
+        asiento = AsientoBuilder(ejercicio, venta.fecha, f"Cobro Venta #{venta.id} - {venta.cliente.nombre}",
+                                 origen='COBROS')
+        # Debe Caja
+        asiento.debe(cuenta_caja, venta.total)
+        # Haber Deudores
+        asiento.haber(cuenta_deudores, venta.total)
 
-            print(f"DEBUG: Asiento Cobro {nuevo_numero} creado para Venta {venta.id}")
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Cobro {registrado.numero} creado para Venta {venta.id}")
 
     @classmethod
     def registrar_cobro_venta_tarjeta(cls, venta, comision_porcentaje=Decimal("0.03")):
@@ -599,33 +722,24 @@ class AccountingService:
 
         # Calcular montos
         total = venta.total
-        comision = total * comision_porcentaje if cuenta_comisiones else Decimal("0")
+        comision = (total * comision_porcentaje).quantize(AsientoBuilder.CENTAVO) if cuenta_comisiones else Decimal("0")
         neto_tarjeta = total - comision
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
+        asiento = AsientoBuilder(ejercicio, venta.fecha, f"Cobro Tarjeta Venta #{venta.id} - {venta.cliente.nombre}",
+                                 origen='COBROS')
 
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=venta.fecha,
-                descripcion=f"Cobro Tarjeta Venta #{venta.id} - {venta.cliente.nombre}",
-                ejercicio=ejercicio,
-                origen='COBROS',
-                usuario='Sistema'
-            )
+        # Debe Tarjetas a Cobrar (neto)
+        asiento.debe(cuenta_tarjetas, neto_tarjeta)
 
-            # Debe Tarjetas a Cobrar (neto)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_tarjetas, debe=neto_tarjeta, haber=0)
-            
-            # Debe Comisiones (si existe la cuenta y hay comisión)
-            if cuenta_comisiones and comision > 0:
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_comisiones, debe=comision, haber=0)
-            
-            # Haber Deudores (total)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=0, haber=total)
+        # Debe Comisiones (si existe la cuenta y hay comisión)
+        if cuenta_comisiones and comision > 0:
+            asiento.debe(cuenta_comisiones, comision)
 
-            print(f"DEBUG: Asiento Cobro Tarjeta {nuevo_numero} creado para Venta {venta.id} (Neto: {neto_tarjeta}, Comisión: {comision})")
+        # Haber Deudores (total)
+        asiento.haber(cuenta_deudores, total)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Cobro Tarjeta {registrado.numero} creado para Venta {venta.id} (Neto: {neto_tarjeta}, Comisión: {comision})")
 
     @classmethod
     def registrar_cobro_venta_cheque(cls, venta, cheque):
@@ -639,25 +753,17 @@ class AccountingService:
             print("Faltan cuentas para cobro cheque (Valores o Deudores)")
             return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=venta.fecha,
-                descripcion=f"Cobro Cheque #{cheque.numero} Venta #{venta.id} - {venta.cliente.nombre}",
-                ejercicio=ejercicio,
-                origen='COBROS',
-                usuario='Sistema'
-            )
-
-            # Debe Valores a Depositar
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_valores, debe=cheque.monto, haber=0)
-            # Haber Deudores
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=0, haber=cheque.monto)
+        asiento = AsientoBuilder(
+            ejercicio, venta.fecha, f"Cobro Cheque #{cheque.numero} Venta #{venta.id} - {venta.cliente.nombre}",
+            origen='COBROS'
+        )
+        # Debe Valores a Depositar
+        asiento.debe(cuenta_valores, cheque.monto)
+        # Haber Deudores
+        asiento.haber(cuenta_deudores, cheque.monto)
 
-            print(f"DEBUG: Asiento Cobro Cheque {nuevo_numero} creado para Venta {venta.id}, Cheque {cheque.numero}")
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Cobro Cheque {registrado.numero} creado para Venta {venta.id}, Cheque {cheque.numero}")
 
 
     @classmethod
@@ -683,62 +789,56 @@ class AccountingService:
         items = recibo.items.all()
         if not items: return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=datetime.combine(fecha, datetime.min.time()),
-                descripcion=f"{descripcion_prefix} {recibo.observaciones[:50]}",
-                ejercicio=ejercicio,
-                origen=origen,
-                usuario='Sistema'
-            )
-
-            # 1. Registrar Items (Contrapartidas)
-            for item in items:
-                cuenta_item = None
-                if item.forma_pago == 'EFECTIVO':
-                    cuenta_item = cls._obtener_cuenta(cls.CUENTA_CAJA) or cls._obtener_cuenta("Caja en Pesos")
-                elif item.forma_pago == 'CHEQUE':
-                    if recibo.tipo == 'CLIENTE':
-                        cuenta_item = cls._obtener_cuenta(cls.CUENTA_VALORES_A_DEPOSITAR)
-                    else:
-                        # Pago a proveedor con cheque propio o de tercero (endosado)
-                        # Por simplicidad, si es pago usamos la cuenta del banco o valores
-                        cuenta_item = cls._obtener_cuenta(item.banco) or cls._obtener_cuenta(cls.CUENTA_BANCO)
-                elif item.forma_pago == 'TRANSFERENCIA':
+        asiento = AsientoBuilder(
+            ejercicio, datetime.combine(fecha, datetime.min.time()),
+            f"{descripcion_prefix} {recibo.observaciones[:50]}",
+            origen=origen
+        )
+
+        # 1. Registrar Items (Contrapartidas)
+        for item in items:
+            cuenta_item = None
+            if item.forma_pago == 'EFECTIVO':
+                cuenta_item = cls._obtener_cuenta(cls.CUENTA_CAJA) or cls._obtener_cuenta("Caja en Pesos")
+            elif item.forma_pago == 'CHEQUE':
+                if recibo.tipo == 'CLIENTE':
+                    cuenta_item = cls._obtener_cuenta(cls.CUENTA_VALORES_A_DEPOSITAR)
+                else:
+                    # Pago a proveedor con cheque propio o de tercero (endosado)
+                    # Por simplicidad, si es pago usamos la cuenta del banco o valores
                     cuenta_item = cls._obtener_cuenta(item.banco) or cls._obtener_cuenta(cls.CUENTA_BANCO)
-                elif item.forma_pago == 'RETENCION':
-                    if recibo.tipo == 'CLIENTE':
-                        cuenta_item = cls._obtener_cuenta(cls.CUENTA_RETENCIONES_SUFRIDAS)
-                    else:
-                        cuenta_item = cls._obtener_cuenta(cls.CUENTA_RETENCIONES_A_DEPOSITAR)
-                elif item.forma_pago in ['DEBITO', 'CREDITO', 'TARJETA']:
-                    cuenta_item = cls._obtener_cuenta(cls.CUENTA_TARJETAS_A_COBRAR)
-                    if not cuenta_item:
-                         # Fallback a Valores o Caja si no existe cuenta especifica de Tarjetas
-                         cuenta_item = cls._obtener_cuenta(cls.CUENTA_VALORES_A_DEPOSITAR) or cls._obtener_cuenta(cls.CUENTA_CAJA)
-                
-                if not cuenta_item: 
-                    cuenta_item = cls._obtener_cuenta("Cuentas de Orden") # Fallback
-
-                # Asignar Debe/Haber según tipo de recibo
+            elif item.forma_pago == 'TRANSFERENCIA':
+                cuenta_item = cls._obtener_cuenta(item.banco) or cls._obtener_cuenta(cls.CUENTA_BANCO)
+            elif item.forma_pago == 'RETENCION':
                 if recibo.tipo == 'CLIENTE':
-                    # Cobro: Entra Activo (Debe), Baja Deuda Cliente (Haber)
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_item, debe=item.monto, haber=0, descripcion=f"{item.forma_pago} {item.referencia}")
+                    cuenta_item = cls._obtener_cuenta(cls.CUENTA_RETENCIONES_SUFRIDAS)
                 else:
-                    # Pago: Sale Activo (Haber), Baja Deuda Proveedor (Debe)
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_item, debe=0, haber=item.monto, descripcion=f"{item.forma_pago} {item.referencia}")
+                    cuenta_item = cls._obtener_cuenta(cls.CUENTA_RETENCIONES_A_DEPOSITAR)
+            elif item.forma_pago in ['DEBITO', 'CREDITO', 'TARJETA']:
+                cuenta_item = cls._obtener_cuenta(cls.CUENTA_TARJETAS_A_COBRAR)
+                if not cuenta_item:
+                     # Fallback a Valores o Caja si no existe cuenta especifica de Tarjetas
+                     cuenta_item = cls._obtener_cuenta(cls.CUENTA_VALORES_A_DEPOSITAR) or cls._obtener_cuenta(cls.CUENTA_CAJA)
 
-            # 2. Registrar Cuenta de Entidad (Deudores/Proveedores)
+            if not cuenta_item:
+                cuenta_item = cls._obtener_cuenta("Cuentas de Orden") # Fallback
+
+            # Asignar Debe/Haber según tipo de recibo
             if recibo.tipo == 'CLIENTE':
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_entidad, debe=0, haber=recibo.total)
+                # Cobro: Entra Activo (Debe), Baja Deuda Cliente (Haber)
+                asiento.debe(cuenta_item, item.monto, descripcion=f"{item.forma_pago} {item.referencia}")
             else:
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_entidad, debe=recibo.total, haber=0)
+                # Pago: Sale Activo (Haber), Baja Deuda Proveedor (Debe)
+                asiento.haber(cuenta_item, item.monto, descripcion=f"{item.forma_pago} {item.referencia}")
+
+        # 2. Registrar Cuenta de Entidad (Deudores/Proveedores)
+        if recibo.tipo == 'CLIENTE':
+            asiento.haber(cuenta_entidad, recibo.total)
+        else:
+            asiento.debe(cuenta_entidad, recibo.total)
 
-            print(f"DEBUG: Asiento consolidado {nuevo_numero} generado para Recibo {recibo.numero}")
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento consolidado {registrado.numero} generado para Recibo {recibo.numero}")
 
     @classmethod
     def registrar_nota_credito(cls, nc):
@@ -755,30 +855,20 @@ class AccountingService:
             return
 
         total = nc.total
-        neto = total / Decimal("1.21")
+        neto = (total / Decimal("1.21")).quantize(AsientoBuilder.CENTAVO)
         iva = total - neto
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=nc.fecha,
-                descripcion=f"NC {nc.numero_formateado()} - {nc.cliente.nombre}",
-                ejercicio=ejercicio,
-                origen='VENTAS',
-                usuario='Sistema'
-            )
-
-            # Debe: Ventas (Baja ingreso)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_ventas, debe=neto, haber=0)
-            # Debe: IVA Débito (Baja deuda fiscal)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_iva, debe=iva, haber=0)
-            # Haber: Deudores por Ventas (Baja crédito)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=0, haber=total)
+        asiento = AsientoBuilder(ejercicio, nc.fecha, f"NC {nc.numero_formateado()} - {nc.cliente.nombre}",
+                                 origen='VENTAS')
+        # Debe: Ventas (Baja ingreso)
+        asiento.debe(cuenta_ventas, neto)
+        # Debe: IVA Débito (Baja deuda fiscal)
+        asiento.debe(cuenta_iva, iva)
+        # Haber: Deudores por Ventas (Baja crédito)
+        asiento.haber(cuenta_deudores, total)
 
-            print(f"DEBUG: Asiento NC {nuevo_numero} generado para {nc.id}")
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento NC {registrado.numero} generado para {nc.id}")
 
 
     @classmethod
@@ -820,32 +910,25 @@ class AccountingService:
              print(f"Falta cuenta contrapartida para movimiento caja: {movimiento.tipo}")
              return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-            
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha_asiento,
-                descripcion=f"Movimiento Caja {movimiento.tipo}: {movimiento.descripcion}",
-                ejercicio=ejercicio,
-                origen='COBROS' if movimiento.tipo == 'Ingreso' else 'PAGOS',
-                usuario='Sistema'
-            )
+        asiento = AsientoBuilder(
+            ejercicio, fecha_asiento, f"Movimiento Caja {movimiento.tipo}: {movimiento.descripcion}",
+            origen='COBROS' if movimiento.tipo == 'Ingreso' else 'PAGOS'
+        )
 
-            # Debe: Caja (Ingreso) / Contrapartida (Egreso)
-            # Haber: Contrapartida (Ingreso) / Caja (Egreso)
-            
-            if movimiento.tipo == 'Ingreso':
-                # D: Caja, H: Ingreso
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=movimiento.monto, haber=0)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_contrapartida, debe=0, haber=movimiento.monto)
-            else:
-                # D: Gasto, H: Caja
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_contrapartida, debe=movimiento.monto, haber=0)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=0, haber=movimiento.monto)
-            
-            print(f"DEBUG: Asiento {nuevo_numero} creado para movimiento caja manual")
+        # Debe: Caja (Ingreso) / Contrapartida (Egreso)
+        # Haber: Contrapartida (Ingreso) / Caja (Egreso)
+
+        if movimiento.tipo == 'Ingreso':
+            # D: Caja, H: Ingreso
+            asiento.debe(cuenta_caja, movimiento.monto)
+            asiento.haber(cuenta_contrapartida, movimiento.monto)
+        else:
+            # D: Gasto, H: Caja
+            asiento.debe(cuenta_contrapartida, movimiento.monto)
+            asiento.haber(cuenta_caja, movimiento.monto)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento {registrado.numero} creado para movimiento caja manual")
 
     @classmethod
     def registrar_arqueo_caja(cls, movimiento, diferencia):
@@ -874,31 +957,22 @@ class AccountingService:
             print(f"Falta cuenta ajuste caja ({'Faltante' if diferencia < 0 else 'Sobrante'})")
             return
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-            
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=fecha_asiento,
-                descripcion=f"Ajuste Arqueo: {movimiento.descripcion}",
-                ejercicio=ejercicio,
-                origen=tipo_asiento,
-                usuario='Sistema'
-            )
+        asiento = AsientoBuilder(ejercicio, fecha_asiento, f"Ajuste Arqueo: {movimiento.descripcion}",
+                                 origen=tipo_asiento)
 
-            monto_abs = abs(diferencia)
+        monto_abs = abs(diferencia)
 
-            if diferencia < 0: # Faltante
-                # D: Faltante, H: Caja
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_contrapartida, debe=monto_abs, haber=0)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=0, haber=monto_abs)
-            else: # Sobrante
-                # D: Caja, H: Sobrante
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_caja, debe=monto_abs, haber=0)
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_contrapartida, debe=0, haber=monto_abs)
+        if diferencia < 0: # Faltante
+            # D: Faltante, H: Caja
+            asiento.debe(cuenta_contrapartida, monto_abs)
+            asiento.haber(cuenta_caja, monto_abs)
+        else: # Sobrante
+            # D: Caja, H: Sobrante
+            asiento.debe(cuenta_caja, monto_abs)
+            asiento.haber(cuenta_contrapartida, monto_abs)
 
-            print(f"DEBUG: Asiento Arqueo {nuevo_numero} generado. Dif: {diferencia}")
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento Arqueo {registrado.numero} generado. Dif: {diferencia}")
 
 
     @classmethod
@@ -916,28 +990,18 @@ class AccountingService:
             return
 
         total = nd.total
-        neto = total / Decimal("1.21")
+        neto = (total / Decimal("1.21")).quantize(AsientoBuilder.CENTAVO)
         iva = total - neto
 
-        with transaction.atomic():
-            ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-            nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-
-            asiento = Asiento.objects.create(
-                numero=nuevo_numero,
-                fecha=nd.fecha,
-                descripcion=f"ND {nd.numero_formateado()} - {nd.cliente.nombre}",
-                ejercicio=ejercicio,
-                origen='VENTAS',
-                usuario='Sistema'
-            )
-
-            # Debe: Deudores por Ventas
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=total, haber=0)
-            # Haber: Ventas
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_ventas, debe=0, haber=neto)
-            # Haber: IVA Débito
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_iva, debe=0, haber=iva)
-
-            print(f"DEBUG: Asiento ND {nuevo_numero} generado para {nd.id}")
+        asiento = AsientoBuilder(ejercicio, nd.fecha, f"ND {nd.numero_formateado()} - {nd.cliente.nombre}",
+                                 origen='VENTAS')
+        # Debe: Deudores por Ventas
+        asiento.debe(cuenta_deudores, total)
+        # Haber: Ventas
+        asiento.haber(cuenta_ventas, neto)
+        # Haber: IVA Débito
+        asiento.haber(cuenta_iva, iva)
+
+        registrado = asiento.registrar()
+        print(f"DEBUG: Asiento ND {registrado.numero} generado para {nd.id}")
 
@@ -0,0 +1,165 @@
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import zipfile
+from django.conf import settings
+from .models import Backup, Empresa
+
+
+class BackupService:
+    """
+    Generación de backups (dump de la base, dumpdata JSON o archivos del sistema) y subida a Google Drive.
+    Se ejecuta desde el worker de jobs (tipos 'backup' y 'backup_drive'), no dentro del request.
+    Los errores se informan con ValueError (mensaje para el usuario).
+    """
+    TIPOS = ('DB', 'DB_JSON', 'SOLO_SISTEMA', 'SISTEMA')
+    TIMEOUT_DUMP = 600
+    EXCLUIR_DIRECTORIOS = ['venv', '.git', '__pycache__', 'backups', 'node_modules', 'dist', '.idea', '.vscode']
+
+    @staticmethod
+    def ejecutable_mysql(name):
+        """Busca el ejecutable de MySQL en el PATH o en rutas comunes de Windows"""
+        path = shutil.which(name)
+        if path:
+            return path
+
+        common_paths = [
+            r"C:\Program Files\MySQL\MySQL Server 8.0\bin",
+            r"C:\Program Files\MySQL\MySQL Workbench 8.0",
+            r"C:\Program Files\MySQL\MySQL Workbench 8.0 CE",
+            r"C:\Program Files\MySQL\MySQL Server 5.7\bin",
+            r"C:\xampp\mysql\bin",
+        ]
+        for base_path in common_paths:
+            exe_path = os.path.join(base_path, f"{name}.exe")
+            if os.path.exists(exe_path):
+                return exe_path
+        return name
+
+    @staticmethod
+    def directorio_local():
+        """Ruta configurada en la empresa o la por defecto (BASE_DIR/backups/local)"""
+        empresa = Empresa.objects.filter(id=1).only('backup_local_path').first()
+        if empresa and empresa.backup_local_path and empresa.backup_local_path.strip():
+            directorio = empresa.backup_local_path.strip()
+        else:
+            directorio = os.path.join(settings.BASE_DIR, 'backups', 'local')
+        os.makedirs(directorio, exist_ok=True)
+        return directorio
+
+    @staticmethod
+    def _comprimir(origen, destino):
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.write(origen, arcname=os.path.basename(origen))
+        os.remove(origen)
+
+    @classmethod
+    def _comprimir_sistema(cls, destino):
+        project_root = settings.BASE_DIR
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for root, dirs, files in os.walk(project_root):
+                # Excluir directorios pesados o innecesarios
+                dirs[:] = [d for d in dirs if d not in cls.EXCLUIR_DIRECTORIOS]
+                for file in files:
+                    if file.endswith(('.pyc', '.zip', '.rar')):
+                        continue
+                    file_path = os.path.join(root, file)
+                    zipf.write(file_path, arcname=os.path.relpath(file_path, project_root))
+
+    @classmethod
+    def _dump_mysql(cls, file_path):
+        db_settings = settings.DATABASES['default']
+        dump_cmd = [
+            cls.ejecutable_mysql('mysqldump'),
+            f"--host={db_settings['HOST']}",
+            f"--user={db_settings['USER']}",
+            '--routines',
+            '--triggers',
+            '--events',
+        ]
+        if db_settings['PASSWORD']:
+            dump_cmd.append(f"--password={db_settings['PASSWORD']}")
+        dump_cmd.append(db_settings['NAME'])
+
+        with open(file_path, 'w') as f:
+            try:
+                process = subprocess.run(dump_cmd, stdout=f, stderr=subprocess.PIPE, check=False,
+                                         timeout=cls.TIMEOUT_DUMP)
+            except subprocess.TimeoutExpired:
+                raise ValueError(f'El proceso de backup excedió el tiempo límite ({cls.TIMEOUT_DUMP}s).')
+            except FileNotFoundError:
+                raise ValueError('No se encontró el ejecutable "mysqldump". Por favor instale MySQL Server '
+                                 'o agregue la carpeta bin al PATH del sistema.')
+        if process.returncode != 0:
+            raise ValueError(f"Error al ejecutar mysqldump: {process.stderr.decode('utf-8')}. "
+                             "Verifique que MySQL esté instalado y accesible.")
+
+    @classmethod
+    def generar(cls, tipo, usuario_id=None):
+        """Genera el archivo ZIP en el directorio local y registra el Backup"""
+        if tipo not in cls.TIPOS:
+            raise ValueError('Tipo de backup no válido')
+
+        directorio = cls.directorio_local()
+        timestamp = datetime.datetime.now().strftime('%d%m%Y_%H%M%S')
+
+        if tipo == 'DB':
+            file_path = os.path.join(directorio, f"backup_datos_{timestamp}.sql")
+            cls._dump_mysql(file_path)
+            final_zip_path = os.path.join(directorio, f"backup_datos_{timestamp}.zip")
+            cls._comprimir(file_path, final_zip_path)
+            nombre_backup = f"Backup Datos SQL {timestamp}"
+
+        elif tipo == 'DB_JSON':
+            from django.core.management import call_command
+            file_path = os.path.join(directorio, f"backup_datos_{timestamp}.json")
+            with open(file_path, 'w', encoding='utf-8') as f:
+                # Excluir sessions y contenttypes para evitar conflictos al restaurar
+                call_command('dumpdata', exclude=['auth.permission', 'contenttypes', 'sessions', 'admin'], stdout=f)
+            final_zip_path = os.path.join(directorio, f"backup_datos_json_{timestamp}.zip")
+            cls._comprimir(file_path, final_zip_path)
+            nombre_backup = f"Backup Datos JSON {timestamp}"
+
+        elif tipo == 'SOLO_SISTEMA':
+            final_zip_path = os.path.join(directorio, f"backup_solo_sistema_{timestamp}.zip")
+            cls._comprimir_sistema(final_zip_path)
+            nombre_backup = f"Backup Solo Sistema {timestamp}"
+
+        else:
+            final_zip_path = os.path.join(directorio, f"backup_sistema_{timestamp}.zip")
+            cls._comprimir_sistema(final_zip_path)
+            nombre_backup = f"Backup Sistema {timestamp}"
+
+        return Backup.objects.create(
+            nombre=nombre_backup,
+            tipo=tipo,
+            archivo=final_zip_path,
+            tamanio=os.path.getsize(final_zip_path),
+            ubicacion='LOCAL',
+            creado_por_id=usuario_id,
+        )
+
+    @staticmethod
+    def credenciales_drive():
+        """Credenciales de Google Drive si la subida está habilitada en la empresa, si no None"""
+        empresa = Empresa.objects.filter(id=1).first()
+        if not (empresa and empresa.backup_google_drive_enabled and empresa.backup_google_drive_credentials):
+            return None
+        return json.loads(empresa.backup_google_drive_credentials), empresa.backup_google_drive_folder_id or None
+
+    @classmethod
+    def subir_drive(cls, backup_id):
+        """Sube el archivo del backup a Google Drive y deja el enlace en la descripción"""
+        configuracion = cls.credenciales_drive()
+        if configuracion is None:
+            return None
+        credenciales, carpeta = configuracion
+
+        from .google_drive_utils import upload_to_google_drive
+        backup = Backup.objects.get(pk=backup_id)
+        archivo = upload_to_google_drive(backup.archivo, credenciales, carpeta)
+        backup.descripcion = f"{backup.descripcion}\nGoogle Drive: {archivo['webViewLink']}".strip()
+        backup.save(update_fields=['descripcion'])
+        return archivo
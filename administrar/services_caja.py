@@ -0,0 +1,100 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, F, Q, DecimalField, Value
+from django.db.models.functions import Coalesce
+from .models import CajaDiaria, MovimientoCaja, PosicionCaja
+
+
+class CajaService:
+    """
+    Totales de caja mantenidos en forma incremental.
+    CajaDiaria.total_ingresos/total_egresos (por sesión) y PosicionCaja (global, pk=1) se
+    actualizan con F() en cada alta/edición/baja de MovimientoCaja (ver signals), así el saldo
+    se lee sin agregar el historial. Las escrituras masivas (queryset.update, bulk_create) no
+    disparan signals: reconciliar() recalcula los totales y reporta/corrige las diferencias.
+    """
+
+    POSICION_ID = 1
+
+    @staticmethod
+    def _campo(tipo):
+        return 'total_ingresos' if tipo == 'Ingreso' else 'total_egresos'
+
+    @classmethod
+    def posicion(cls):
+        """Fila global de totales (se crea en 0 si no existe)"""
+        posicion, _ = PosicionCaja.objects.get_or_create(pk=cls.POSICION_ID)
+        return posicion
+
+    @classmethod
+    def aplicar(cls, caja_id, tipo, monto, signo=1):
+        """Suma (signo=1) o resta (signo=-1) `monto` al total de `tipo` de la caja y de la posición global"""
+        if not monto:
+            return
+        delta = {cls._campo(tipo): F(cls._campo(tipo)) + signo * Decimal(str(monto))}
+        if caja_id:
+            CajaDiaria.objects.filter(pk=caja_id).update(**delta)
+        if not PosicionCaja.objects.filter(pk=cls.POSICION_ID).update(**delta):
+            # Primera vez: crear la fila y aplicar el delta sobre ella
+            cls.posicion()
+            PosicionCaja.objects.filter(pk=cls.POSICION_ID).update(**delta)
+
+    @classmethod
+    def movimiento_guardado(cls, movimiento, anterior=None):
+        """Alta o edición de un movimiento. `anterior`: dict caja_diaria_id/tipo/monto antes del save"""
+        with transaction.atomic():
+            if anterior:
+                cls.aplicar(anterior['caja_diaria_id'], anterior['tipo'], anterior['monto'], signo=-1)
+            cls.aplicar(movimiento.caja_diaria_id, movimiento.tipo, movimiento.monto)
+
+    @classmethod
+    def movimiento_eliminado(cls, movimiento):
+        cls.aplicar(movimiento.caja_diaria_id, movimiento.tipo, movimiento.monto, signo=-1)
+
+    @staticmethod
+    def _totales():
+        tipo_decimal = DecimalField(max_digits=16, decimal_places=2)
+        return {
+            'ingresos': Coalesce(Sum('monto', filter=Q(tipo='Ingreso')), Value(Decimal('0')), output_field=tipo_decimal),
+            'egresos': Coalesce(Sum('monto', filter=Q(tipo='Egreso')), Value(Decimal('0')), output_field=tipo_decimal),
+        }
+
+    @classmethod
+    def reconciliar(cls, reparar=False):
+        """
+        Recalcula los totales desde MovimientoCaja (1 consulta agrupada por caja + 1 global).
+        Retorna (diferencias por caja [(caja_id, guardado, calculado)], diferencia global o None),
+        con guardado/calculado como tuplas (ingresos, egresos). Con reparar=True los corrige.
+        """
+        calculados = {
+            fila['caja_diaria_id']: (fila['ingresos'], fila['egresos'])
+            for fila in MovimientoCaja.objects.filter(caja_diaria__isnull=False)
+            .values('caja_diaria_id').order_by().annotate(**cls._totales())
+        }
+        cero = (Decimal('0'), Decimal('0'))
+        diferencias = []
+        with transaction.atomic():
+            cajas = CajaDiaria.objects.values_list('id', 'total_ingresos', 'total_egresos')
+            if reparar:
+                cajas = cajas.select_for_update()
+            for caja_id, ingresos, egresos in cajas.iterator():
+                calculado = calculados.get(caja_id, cero)
+                if (ingresos, egresos) != calculado:
+                    diferencias.append((caja_id, (ingresos, egresos), calculado))
+            if reparar and diferencias:
+                CajaDiaria.objects.bulk_update(
+                    [CajaDiaria(id=caja_id, total_ingresos=calculado[0], total_egresos=calculado[1])
+                     for caja_id, _, calculado in diferencias],
+                    ['total_ingresos', 'total_egresos'], batch_size=1000,
+                )
+
+            total = MovimientoCaja.objects.aggregate(**cls._totales())
+            calculado = (total['ingresos'], total['egresos'])
+            posicion = cls.posicion()
+            guardado = (posicion.total_ingresos, posicion.total_egresos)
+            diferencia_global = (guardado, calculado) if guardado != calculado else None
+            if reparar and diferencia_global:
+                PosicionCaja.objects.filter(pk=cls.POSICION_ID).update(
+                    total_ingresos=calculado[0], total_egresos=calculado[1]
+                )
+        return diferencias, diferencia_global
@@ -0,0 +1,273 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.utils import timezone
+from .models import Venta, Compra, DetalleVenta, Asiento, ItemAsiento, PlanCuenta, DocumentoCentralizado
+from .services import AsientoBuilder, ResolverContable
+from .services_contabilidad import SaldosService
+from .services_ventas import VentaService
+
+
+class CentralizacionService:
+    """
+    Centralización de ventas, compras y CMV en el libro diario para un rango de fechas.
+    - Los documentos ya centralizados se excluyen con 1 anti-join contra DocumentoCentralizado.
+    - Los asientos se arman en memoria (AsientoBuilder, validados antes de escribir) y se persisten
+      por bloques de LOTE asientos, cada uno en su transacción: 1 reserva de números por ejercicio
+      + bulk_create de asientos, ítems y marcas + 1 UPDATE de SaldoCuentaPeriodo por cuenta y mes.
+    - consolidado=True: 1 asiento por día y tipo de comprobante en lugar de 1 por documento.
+      El CMV siempre se centraliza en 1 asiento por día.
+    Retorna {'documentos', 'asientos', 'total', 'sin_ejercicio'}.
+    """
+    LOTE = 500
+    ESTADOS_VENTA = ['Emitida', 'Pagada']
+    ESTADOS_COMPRA = ['REGISTRADA']
+
+    # Cuentas: códigos preferidos y, si no existen, nombre aproximado de una cuenta imputable
+    CUENTAS = {
+        'ventas': (['4.1.01', '4.1.01.001'], 'Venta'),
+        'deudores': (['1.1.02.001', '1.1.03.001'], 'Deudor'),
+        'iva_debito': (['2.1.02.001', '2.1.03.001'], 'IVA D'),
+        'mercaderia': (['1.1.03.001', '1.1.05.001'], 'Mercader'),
+        'proveedores': (['2.1.01.001'], 'Proveedor'),
+        'iva_credito': (['1.1.04.001'], 'IVA C'),
+        'percepciones_pagar': (['2.1.04.006', '2.1.3.04'], 'Percepciones a Pagar'),
+        'percepciones_sufridas': (['1.1.04.005', '1.1.4.05'], 'Percepciones IIBB Sufridas'),
+        'cmv': (['5.1.01.001'], 'CMV'),
+        'stock': (['1.1.05.001', '1.1.03.001'], 'Mercader'),
+    }
+
+    @classmethod
+    def cuenta(cls, clave):
+        codigos, nombre = cls.CUENTAS[clave]
+        return (
+            PlanCuenta.objects.filter(codigo__in=codigos).first()
+            or PlanCuenta.objects.filter(nombre__icontains=nombre, imputable=True).first()
+        )
+
+    @staticmethod
+    def _rango(desde, hasta):
+        inicio = timezone.make_aware(datetime.combine(desde, datetime.min.time()))
+        fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+        return {'fecha__gte': inicio, 'fecha__lt': fin}
+
+    @staticmethod
+    def _pendientes(queryset, origen):
+        """Anti-join: documentos sin marca de centralización para `origen`"""
+        return queryset.exclude(Exists(
+            DocumentoCentralizado.objects.filter(origen=origen, documento_id=OuterRef('pk'))
+        ))
+
+    # ----------------------------------------------------------------- Ventas / Compras
+
+    @staticmethod
+    def _importes(total, neto, iva, cta_iva, cta_otros):
+        """
+        (neto, iva, otros) a imputar de un comprobante: se registra el neto guardado y `otros` es lo que
+        el total tiene por encima de neto + IVA (percepciones). Si falta la cuenta de IVA o de
+        percepciones, ese importe va al neto; una diferencia negativa (redondeo) también, para que
+        el asiento balancee al centavo. Comprobantes viejos sin neto guardado: neto = total - IVA.
+        """
+        iva = iva if iva > 0 else Decimal('0')
+        neto = neto if neto > 0 else total - iva
+        otros = total - neto - iva
+        if not cta_iva:
+            neto, iva = neto + iva, Decimal('0')
+        if otros < 0 or not cta_otros:
+            neto, otros = neto + otros, Decimal('0')
+        return neto, iva, otros
+
+    @classmethod
+    def ventas(cls, desde, hasta, consolidado=False, usuario='Sistema', lote=None):
+        cta_ventas, cta_deudores, cta_iva = cls.cuenta('ventas'), cls.cuenta('deudores'), cls.cuenta('iva_debito')
+        cta_percepciones = cls.cuenta('percepciones_pagar')
+        if not (cta_ventas and cta_deudores):
+            raise ValueError("No se encontraron las cuentas de Ventas o Deudores en el Plan de Cuentas")
+
+        ventas = cls._pendientes(
+            Venta.objects.filter(estado__in=cls.ESTADOS_VENTA, **cls._rango(desde, hasta)), 'VENTAS'
+        ).values('id', 'fecha', 'tipo_comprobante', 'neto', 'total', 'iva_amount', 'cliente__nombre').order_by('fecha', 'id')
+
+        documentos = []
+        for v in ventas.iterator(chunk_size=2000):
+            neto, iva, percepciones = cls._importes(v['total'], v['neto'], v['iva_amount'], cta_iva, cta_percepciones)
+            lineas = [(cta_deudores, v['total'], 0), (cta_ventas, 0, neto)]
+            if iva:
+                lineas.append((cta_iva, 0, iva))
+            if percepciones:
+                lineas.append((cta_percepciones, 0, percepciones))
+            documentos.append((
+                v['id'], v['fecha'], v['tipo_comprobante'],
+                f"Centralización Venta #{v['id']} - {v['cliente__nombre'][:50]}", lineas
+            ))
+        return cls._centralizar(documentos, 'VENTAS', 'Ventas', consolidado, usuario, lote)
+
+    @classmethod
+    def compras(cls, desde, hasta, consolidado=False, usuario='Sistema', lote=None):
+        cta_mercaderia, cta_proveedores = cls.cuenta('mercaderia'), cls.cuenta('proveedores')
+        cta_iva, cta_percepciones = cls.cuenta('iva_credito'), cls.cuenta('percepciones_sufridas')
+        if not (cta_mercaderia and cta_proveedores):
+            raise ValueError("No se encontraron las cuentas de Mercaderías o Proveedores")
+
+        compras = cls._pendientes(
+            Compra.objects.filter(estado__in=cls.ESTADOS_COMPRA, **cls._rango(desde, hasta)), 'COMPRAS'
+        ).values('id', 'fecha', 'tipo_comprobante', 'neto', 'total', 'iva', 'proveedor__nombre').order_by('fecha', 'id')
+
+        documentos = []
+        for c in compras.iterator(chunk_size=2000):
+            neto, iva, percepciones = cls._importes(c['total'], c['neto'], c['iva'], cta_iva, cta_percepciones)
+            lineas = [(cta_mercaderia, neto, 0)]
+            if iva:
+                lineas.append((cta_iva, iva, 0))
+            if percepciones:
+                lineas.append((cta_percepciones, percepciones, 0))
+            lineas.append((cta_proveedores, 0, c['total']))
+            documentos.append((
+                c['id'], c['fecha'], c['tipo_comprobante'] or '-',
+                f"Centralización Compra #{c['id']} - {c['proveedor__nombre'][:50]}", lineas
+            ))
+        return cls._centralizar(documentos, 'COMPRAS', 'Compras', consolidado, usuario, lote)
+
+    @classmethod
+    def cmv(cls, desde, hasta, usuario='Sistema', lote=None):
+        """1 asiento por día (CMV a Mercaderías) con el costo capturado en las ventas aún no incluidas"""
+        cta_cmv, cta_stock = cls.cuenta('cmv'), cls.cuenta('stock')
+        if not (cta_cmv and cta_stock):
+            raise ValueError("No se encontraron las cuentas de CMV o Mercaderías")
+
+        ventas = cls._pendientes(
+            Venta.objects.filter(estado__in=cls.ESTADOS_VENTA, **cls._rango(desde, hasta)), 'CMV'
+        )
+        # Costo por venta en 1 consulta agrupada
+        costos = DetalleVenta.objects.filter(venta__in=ventas).values('venta_id', 'venta__fecha').annotate(
+            costo=Sum(VentaService.costo_linea())
+        ).order_by('venta__fecha', 'venta_id')
+
+        documentos = [
+            (fila['venta_id'], fila['venta__fecha'], 'CMV', '', [(cta_cmv, fila['costo'], 0), (cta_stock, 0, fila['costo'])])
+            for fila in costos.iterator(chunk_size=2000)
+            if fila['costo']
+        ]
+        return cls._centralizar(documentos, 'CMV', 'CMV', True, usuario, lote, origen_asiento='MANUAL')
+
+    # ----------------------------------------------------------------- Armado y persistencia
+
+    @staticmethod
+    def _dia(fecha):
+        return timezone.localtime(fecha).date() if timezone.is_aware(fecha) else fecha.date()
+
+    @classmethod
+    def _centralizar(cls, documentos, marca, titulo, consolidado, usuario, lote=None, origen_asiento=None):
+        """
+        documentos: (id, fecha, tipo, descripción, [(cuenta, debe, haber)]) ordenados por fecha.
+        Agrupa (por documento o por día y tipo), arma los asientos y los persiste por bloques.
+        """
+        origen_asiento = origen_asiento or marca
+        grupos = {}
+        for documento_id, fecha, tipo, descripcion, lineas in documentos:
+            clave = (cls._dia(fecha), tipo) if consolidado else documento_id
+            grupo = grupos.get(clave)
+            if grupo is None:
+                grupo = grupos[clave] = {'fecha': fecha, 'tipo': tipo, 'descripcion': descripcion,
+                                         'documentos': [], 'lineas': defaultdict(Decimal)}
+            grupo['fecha'] = max(grupo['fecha'], fecha)
+            grupo['documentos'].append(documento_id)
+            for cuenta, debe, haber in lineas:
+                if debe:
+                    grupo['lineas'][(cuenta, 'debe')] += Decimal(str(debe))
+                if haber:
+                    grupo['lineas'][(cuenta, 'haber')] += Decimal(str(haber))
+
+        asientos, sin_ejercicio, total = [], 0, Decimal('0')
+        for clave, grupo in grupos.items():
+            ejercicio = ResolverContable.ejercicio_vigente(grupo['fecha'])
+            if ejercicio is None:
+                sin_ejercicio += len(grupo['documentos'])
+                continue
+            if consolidado:
+                dia, tipo = clave
+                descripcion = (
+                    f"ASIENTO CMV - CENTRALIZACION DIARIA {dia}" if marca == 'CMV'
+                    else f"Centralización {titulo} {dia:%d/%m/%Y} - Tipo {tipo} ({len(grupo['documentos'])} comprobantes)"
+                )
+                referencia_id = None
+            else:
+                descripcion, referencia_id = grupo['descripcion'], clave
+
+            builder = AsientoBuilder(
+                ejercicio, grupo['fecha'], descripcion[:200],
+                origen=origen_asiento, usuario=usuario, referencia_id=referencia_id
+            )
+            for (cuenta, lado), monto in grupo['lineas'].items():
+                builder.linea(cuenta, monto if lado == 'debe' else 0, monto if lado == 'haber' else 0)
+            builder.validar()
+            asientos.append((builder, grupo['documentos']))
+            total += builder.total_debe
+
+        lote = lote or cls.LOTE
+        for inicio in range(0, len(asientos), lote):
+            cls._persistir(asientos[inicio:inicio + lote], marca)
+
+        return {
+            'documentos': sum(len(documentos) for _, documentos in asientos),
+            'asientos': len(asientos),
+            'total': total,
+            'sin_ejercicio': sin_ejercicio,
+        }
+
+    @staticmethod
+    @transaction.atomic
+    def _persistir(bloque, marca):
+        """Escribe un bloque de (AsientoBuilder, ids de documentos) con números consecutivos por ejercicio"""
+        ejercicios = {builder.ejercicio.pk: builder.ejercicio for builder, _ in bloque}
+        cantidades = Counter(builder.ejercicio.pk for builder, _ in bloque)
+        numeros = {
+            ejercicio_id: AsientoBuilder.reservar_numeros(ejercicios[ejercicio_id], cantidad)
+            for ejercicio_id, cantidad in cantidades.items()
+        }
+
+        nuevos = []
+        for builder, _ in bloque:
+            ejercicio_id = builder.ejercicio.pk
+            nuevos.append(Asiento(
+                numero=numeros[ejercicio_id],
+                fecha=builder.fecha,
+                descripcion=builder.descripcion,
+                ejercicio=builder.ejercicio,
+                origen=builder.origen,
+                referencia_id=builder.referencia_id,
+                usuario=builder.usuario,
+            ))
+            numeros[ejercicio_id] += 1
+        Asiento.objects.bulk_create(nuevos)
+        if nuevos and nuevos[0].pk is None:
+            # MySQL no devuelve los ids en bulk_create: se leen por (ejercicio, numero), reservados y únicos
+            ids = {
+                (ejercicio_id, numero): pk
+                for pk, ejercicio_id, numero in Asiento.objects.filter(
+                    ejercicio_id__in=ejercicios, numero__in=[asiento.numero for asiento in nuevos]
+                ).values_list('pk', 'ejercicio_id', 'numero')
+            }
+            for asiento in nuevos:
+                asiento.pk = ids[(asiento.ejercicio_id, asiento.numero)]
+                asiento._state.adding = False
+
+        items, marcas = [], []
+        for asiento, (builder, documentos) in zip(nuevos, bloque):
+            for linea in builder.lineas:
+                linea.asiento = asiento
+                items.append(linea)
+            marcas.extend(
+                DocumentoCentralizado(origen=marca, documento_id=documento_id, asiento=asiento)
+                for documento_id in documentos
+            )
+        ItemAsiento.objects.bulk_create(items)
+        # La restricción única (origen, documento_id) aborta el bloque si otra centralización lo tomó en paralelo
+        DocumentoCentralizado.objects.bulk_create(marcas)
+        # bulk_create no dispara señales: actualizar los saldos mensuales acá
+        SaldosService.aplicar(
+            (linea.cuenta_id, linea.asiento.ejercicio_id, linea.asiento.fecha, linea.debe, linea.haber)
+            for linea in items
+        )
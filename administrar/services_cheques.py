@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from django.db.models import Sum, Count, Q
+from django.utils import timezone
+from .models import Cheque
+from .utils_cache import CacheVersionado
+
+
+class CarteraChequesService:
+    """
+    Cartera de cheques: KPIs del listado y vencimientos por fecha de pago.
+    Los KPIs salen de 1 consulta con agregados condicionales y se cachean brevemente en el proceso;
+    signals.py cambia la versión del espacio 'cheques' (CacheVersionado) cuando cambia un Cheque.
+    """
+
+    ESPACIO = CacheVersionado.registrar('cheques')
+    TTL_SEGUNDOS = 60
+
+    # Cheques a cobrar (de terceros en cartera) y a pagar (propios emitidos o entregados)
+    A_COBRAR = Q(tipo='TERCERO', estado='CARTERA')
+    A_PAGAR = Q(tipo='PROPIO', estado__in=['CARTERA', 'ENTREGADO'])
+
+    @classmethod
+    def invalidar(cls, **kwargs):
+        CacheVersionado.invalidar(cls.ESPACIO)
+
+    @classmethod
+    def _cacheado(cls, nombre, parametros, calcular):
+        return CacheVersionado.obtener(cls.ESPACIO, (nombre, parametros), calcular, cls.TTL_SEGUNDOS)
+
+    @classmethod
+    def kpis(cls, hoy=None):
+        """KPIs de api_cheques_listar (cartera de terceros, propios a pagar, depositados del mes, rechazados)"""
+        hoy = hoy or timezone.localdate()
+        return cls._cacheado('kpis', hoy.isoformat(), lambda: cls._calcular_kpis(hoy))
+
+    @classmethod
+    def _calcular_kpis(cls, hoy):
+        inicio_mes = hoy.replace(day=1)
+        fin_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
+        # Rango sobre fecha_modificacion en hora local (en lugar de __month/__year, que no usan índice)
+        depositados_mes = Q(
+            estado='DEPOSITADO',
+            fecha_modificacion__gte=cls._inicio(inicio_mes),
+            fecha_modificacion__lt=cls._inicio(fin_mes),
+        )
+        totales = Cheque.objects.aggregate(
+            cartera_terceros_total=Sum('monto', filter=cls.A_COBRAR),
+            cartera_terceros_count=Count('id', filter=cls.A_COBRAR),
+            apagar_propios_total=Sum('monto', filter=cls.A_PAGAR),
+            depositados_mes_total=Sum('monto', filter=depositados_mes),
+            rechazados_total=Sum('monto', filter=Q(estado='RECHAZADO')),
+        )
+        return {
+            'cartera_terceros': {
+                'total': totales['cartera_terceros_total'] or 0,
+                'count': totales['cartera_terceros_count'],
+            },
+            'apagar_propios': {'total': totales['apagar_propios_total'] or 0},
+            'depositados_mes': {'total': totales['depositados_mes_total'] or 0},
+            'rechazados': {'total': totales['rechazados_total'] or 0},
+        }
+
+    @staticmethod
+    def _inicio(dia):
+        return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+
+    @classmethod
+    def montos_por_dia(cls, desde, hasta):
+        """
+        {fecha_pago: {'cobrar', 'pagar', 'cantidad'}} de los cheques a cobrar/pagar con vencimiento
+        entre desde y hasta (inclusive), en 1 consulta agrupada. Los días sin cheques no aparecen.
+        """
+        filas = Cheque.objects.filter(
+            cls.A_COBRAR | cls.A_PAGAR, fecha_pago__gte=desde, fecha_pago__lte=hasta
+        ).values('fecha_pago').annotate(
+            cobrar=Sum('monto', filter=cls.A_COBRAR),
+            pagar=Sum('monto', filter=cls.A_PAGAR),
+            cantidad=Count('id'),
+        ).order_by('fecha_pago')
+        return {
+            fila['fecha_pago']: {
+                'cobrar': fila['cobrar'] or 0,
+                'pagar': fila['pagar'] or 0,
+                'cantidad': fila['cantidad'],
+            }
+            for fila in filas
+        }
+
+    @classmethod
+    def escalera_vencimientos(cls, desde=None, semanas=8):
+        """Montos a cobrar/pagar agrupados por semana (lunes a domingo) de fecha_pago, desde la semana de `desde`"""
+        desde = desde or timezone.localdate()
+        return cls._cacheado(
+            'escalera', f'{desde.isoformat()}:{semanas}', lambda: cls._calcular_escalera(desde, semanas)
+        )
+
+    @classmethod
+    def _calcular_escalera(cls, desde, semanas):
+        lunes = desde - timedelta(days=desde.weekday())
+        hasta = lunes + timedelta(weeks=semanas, days=-1)
+        por_dia = cls.montos_por_dia(lunes, hasta)
+
+        escalera = []
+        for semana in range(semanas):
+            inicio = lunes + timedelta(weeks=semana)
+            dias = [por_dia.get(inicio + timedelta(days=i)) for i in range(7)]
+            dias = [d for d in dias if d]
+            escalera.append({
+                'desde': inicio.isoformat(),
+                'hasta': (inicio + timedelta(days=6)).isoformat(),
+                'cobrar': float(sum(d['cobrar'] for d in dias)),
+                'pagar': float(sum(d['pagar'] for d in dias)),
+                'cantidad': sum(d['cantidad'] for d in dias),
+            })
+
+        # Cheques ya vencidos (anteriores a la escalera) que siguen pendientes
+        vencidos = Cheque.objects.filter(cls.A_COBRAR | cls.A_PAGAR, fecha_pago__lt=lunes).aggregate(
+            cobrar=Sum('monto', filter=cls.A_COBRAR),
+            pagar=Sum('monto', filter=cls.A_PAGAR),
+        )
+        return {
+            'semanas': escalera,
+            'vencidos': {'cobrar': float(vencidos['cobrar'] or 0), 'pagar': float(vencidos['pagar'] or 0)},
+        }
@@ -0,0 +1,471 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, F, Q, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import PlanCuenta, Asiento, ItemAsiento, SaldoCuentaPeriodo
+
+
+def _a_fecha(valor):
+    """Normaliza str/date/datetime a date (hora local), como se agrupan los asientos por mes"""
+    if isinstance(valor, str):
+        valor = parse_datetime(valor) or parse_date(valor)
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.date()
+    return valor
+
+
+def _inicio_dia(fecha):
+    """00:00 hora local del día indicado (límite para filtrar Asiento.fecha)"""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _mes_siguiente(fecha):
+    return (fecha.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class PlanCuentasService:
+    """
+    Jerarquía del plan de cuentas con camino materializado (PlanCuenta.ruta).
+    - ruta = ruta del padre + id de la cuenta con DIGITOS dígitos y '/': "00000001/00000007/".
+    - La cuenta y sus descendientes son el rango [ruta, ruta con la '/' final cambiada por '0'):
+      '/' precede a '0' en ASCII, así que el rango cubre exactamente las rutas con ese prefijo
+      y lo resuelve el índice de `ruta` en cualquier motor.
+    - signals.py la asigna al crear y la corrige al cambiar de padre (el subárbol se reescribe con 1 UPDATE).
+    - Las altas con bulk_create no disparan señales: llamar a reconstruir_rutas() después.
+    """
+    DIGITOS = 8
+
+    @classmethod
+    def segmento(cls, cuenta_id):
+        return f'{cuenta_id:0{cls.DIGITOS}d}/'
+
+    @staticmethod
+    def rango(ruta, prefijo=''):
+        """Q de las cuentas cuya ruta empieza con `ruta`; prefijo p. ej. 'cuenta__' para filtrar ItemAsiento"""
+        return Q(**{f'{prefijo}ruta__gte': ruta, f'{prefijo}ruta__lt': ruta[:-1] + '0'})
+
+    @classmethod
+    def descendientes(cls, cuenta, prefijo=''):
+        """Q de la cuenta y todas sus descendientes"""
+        return cls.rango(cuenta.ruta or cls.ruta_de(cuenta), prefijo)
+
+    @classmethod
+    def ruta_de(cls, cuenta):
+        """Ruta según el padre actual (si un ancestro no tiene ruta, se completa subiendo por `padre`)"""
+        segmentos = [cls.segmento(cuenta.pk)]
+        visitadas = {cuenta.pk}
+        padre_id = cuenta.padre_id
+        while padre_id is not None and padre_id not in visitadas:  # Protege contra ciclos mal cargados
+            visitadas.add(padre_id)
+            padre = PlanCuenta.objects.filter(pk=padre_id).values('ruta', 'padre_id').first()
+            if padre is None:
+                break
+            if padre['ruta']:
+                segmentos.append(padre['ruta'])
+                break
+            segmentos.append(cls.segmento(padre_id))
+            padre_id = padre['padre_id']
+        return ''.join(reversed(segmentos))
+
+    @classmethod
+    def guardada(cls, cuenta):
+        """post_save: asigna la ruta de una cuenta nueva o, si cambió de padre, la de todo su subárbol"""
+        anterior, nueva = cuenta.ruta, cls.ruta_de(cuenta)
+        if anterior == nueva:
+            return
+        if anterior:
+            # El subárbol (incluida la cuenta) conserva el sufijo y cambia el prefijo
+            PlanCuenta.objects.filter(cls.rango(anterior)).update(
+                ruta=Concat(Value(nueva), Substr('ruta', len(anterior) + 1))
+            )
+        else:
+            PlanCuenta.objects.filter(pk=cuenta.pk).update(ruta=nueva)
+        cuenta.ruta = nueva
+
+    @classmethod
+    def reconstruir_rutas(cls):
+        """Recalcula todas las rutas desde (id, padre_id): 1 consulta + bulk_update de las que difieren"""
+        cuentas = {c['id']: c for c in PlanCuenta.objects.values('id', 'padre_id', 'ruta')}
+        rutas = {}
+
+        def ruta(cuenta_id, visitadas=()):
+            if cuenta_id not in rutas:
+                padre_id = cuentas[cuenta_id]['padre_id']
+                base = '' if padre_id not in cuentas or padre_id in visitadas else ruta(padre_id, visitadas + (cuenta_id,))
+                rutas[cuenta_id] = base + cls.segmento(cuenta_id)
+            return rutas[cuenta_id]
+
+        cambios = [
+            PlanCuenta(id=cuenta_id, ruta=ruta(cuenta_id))
+            for cuenta_id, cuenta in cuentas.items() if ruta(cuenta_id) != cuenta['ruta']
+        ]
+        PlanCuenta.objects.bulk_update(cambios, ['ruta'], batch_size=1000)
+        return len(cambios)
+
+    @staticmethod
+    def arbol():
+        """Árbol completo (dicts con 'hijos', hermanos por código) desde 1 consulta ordenada"""
+        cuentas = list(PlanCuenta.objects.order_by('codigo').values(
+            'id', 'codigo', 'nombre', 'tipo', 'imputable', 'nivel', 'padre_id'
+        ))
+        nodos = {cuenta['id']: dict(cuenta, hijos=[]) for cuenta in cuentas}
+        raices = []
+        for cuenta in cuentas:
+            padre = nodos.get(cuenta['padre_id'])
+            (padre['hijos'] if padre else raices).append(nodos[cuenta['id']])
+        return raices
+
+
+class SaldosService:
+    """
+    Mantiene y consulta SaldoCuentaPeriodo (Debe/Haber mensual por cuenta y ejercicio).
+    - AsientoBuilder.registrar() aplica los ítems nuevos en bloque.
+    - Las altas/ediciones/bajas sueltas de ItemAsiento llegan por signals.py (incluye el borrado
+      en cascada al eliminar un Asiento).
+    - totales() combina los meses cerrados desde el snapshot con los ítems en vivo sólo para el
+      mes abierto y los meses parciales del rango pedido.
+    """
+
+    @staticmethod
+    def periodo_de(fecha):
+        return _a_fecha(fecha).replace(day=1)
+
+    @classmethod
+    def aplicar(cls, movimientos, signo=1):
+        """
+        movimientos: iterable de (cuenta_id, ejercicio_id, fecha, debe, haber).
+        Agrupa por (cuenta, ejercicio, mes) y hace 1 UPDATE (o INSERT) por grupo.
+        """
+        deltas = {}
+        for cuenta_id, ejercicio_id, fecha, debe, haber in movimientos:
+            clave = (cuenta_id, ejercicio_id, cls.periodo_de(fecha))
+            d, h = deltas.get(clave, (Decimal('0'), Decimal('0')))
+            deltas[clave] = (d + signo * Decimal(str(debe)), h + signo * Decimal(str(haber)))
+
+        for (cuenta_id, ejercicio_id, periodo), (debe, haber) in deltas.items():
+            saldo = SaldoCuentaPeriodo.objects.filter(cuenta_id=cuenta_id, ejercicio_id=ejercicio_id, periodo=periodo)
+            if saldo.update(debe=F('debe') + debe, haber=F('haber') + haber):
+                continue
+            try:
+                with transaction.atomic():
+                    SaldoCuentaPeriodo.objects.create(
+                        cuenta_id=cuenta_id, ejercicio_id=ejercicio_id, periodo=periodo, debe=debe, haber=haber
+                    )
+            except IntegrityError:
+                # Otro proceso creó la fila en paralelo
+                saldo.update(debe=F('debe') + debe, haber=F('haber') + haber)
+
+    @classmethod
+    def registrar_items(cls, asiento, items):
+        cls.aplicar(
+            (item.cuenta_id, asiento.ejercicio_id, asiento.fecha, item.debe, item.haber) for item in items
+        )
+
+    @classmethod
+    def item_guardado(cls, item, anterior=None):
+        """anterior: dict con cuenta_id/debe/haber del ítem antes de editarlo (None si es alta)"""
+        asiento = Asiento.objects.filter(pk=item.asiento_id).values('ejercicio_id', 'fecha').first()
+        if not asiento:
+            return
+        if anterior:
+            cls.aplicar([(anterior['cuenta_id'], asiento['ejercicio_id'], asiento['fecha'],
+                          anterior['debe'], anterior['haber'])], signo=-1)
+        cls.aplicar([(item.cuenta_id, asiento['ejercicio_id'], asiento['fecha'], item.debe, item.haber)])
+
+    @classmethod
+    def item_eliminado(cls, item):
+        asiento = Asiento.objects.filter(pk=item.asiento_id).values('ejercicio_id', 'fecha').first()
+        if asiento:
+            cls.aplicar([(item.cuenta_id, asiento['ejercicio_id'], asiento['fecha'], item.debe, item.haber)], signo=-1)
+
+    @classmethod
+    def agrupar(cls, items):
+        """
+        {(cuenta_id, ejercicio_id, periodo): (debe, haber)} de un queryset de ItemAsiento.
+        La base suma por fecha exacta del asiento y el mes se calcula acá con periodo_de (hora local):
+        TruncMonth con USE_TZ depende de las tablas de zonas horarias de MySQL y sin ellas devuelve NULL.
+        """
+        saldos = {}
+        filas = (
+            items.values_list('cuenta_id', 'asiento__ejercicio_id', 'asiento__fecha')
+            .annotate(total_debe=Sum('debe'), total_haber=Sum('haber'))
+            .order_by()
+        )
+        for cuenta_id, ejercicio_id, fecha, debe, haber in filas.iterator():
+            clave = (cuenta_id, ejercicio_id, cls.periodo_de(fecha))
+            acumulado = saldos.get(clave, (Decimal('0'), Decimal('0')))
+            saldos[clave] = (acumulado[0] + (debe or 0), acumulado[1] + (haber or 0))
+        return saldos
+
+    @classmethod
+    @transaction.atomic
+    def reconstruir(cls, ejercicio_id=None):
+        """Recalcula los snapshots desde ItemAsiento (1 consulta agrupada + INSERT en bloque)"""
+        snapshots = SaldoCuentaPeriodo.objects.all()
+        items = ItemAsiento.objects.all()
+        if ejercicio_id:
+            snapshots = snapshots.filter(ejercicio_id=ejercicio_id)
+            items = items.filter(asiento__ejercicio_id=ejercicio_id)
+        snapshots.delete()
+
+        nuevos = SaldoCuentaPeriodo.objects.bulk_create([
+            SaldoCuentaPeriodo(cuenta_id=cuenta_id, ejercicio_id=ej_id, periodo=periodo, debe=debe, haber=haber)
+            for (cuenta_id, ej_id, periodo), (debe, haber) in cls.agrupar(items).items()
+        ], batch_size=1000)
+        return len(nuevos)
+
+    @classmethod
+    def totales(cls, ejercicio_id=None, fecha_desde=None, fecha_hasta=None, cuentas_ids=None):
+        """
+        Retorna {cuenta_id: (debe, haber)} de los movimientos directos entre fecha_desde y
+        fecha_hasta (ambas inclusive, por día completo; None = sin límite).
+        Meses completos anteriores al mes en curso: SaldoCuentaPeriodo.
+        Resto (mes abierto y meses parciales en los extremos): ItemAsiento en vivo.
+        Siempre 2 consultas como máximo.
+        """
+        desde = _a_fecha(fecha_desde) if fecha_desde else None
+        hasta = _a_fecha(fecha_hasta) if fecha_hasta else None
+        mes_abierto = timezone.localdate().replace(day=1)
+
+        # Rango de meses completos [snap_desde, snap_hasta) cubierto por snapshots
+        snap_desde = None if desde is None else (desde if desde.day == 1 else _mes_siguiente(desde))
+        if hasta is None:
+            snap_hasta = mes_abierto
+        else:
+            dia_siguiente = hasta + timedelta(days=1)
+            snap_hasta = min(dia_siguiente if dia_siguiente.day == 1 else hasta.replace(day=1), mes_abierto)
+
+        rangos_vivos = []
+        totales = {}
+        if snap_desde is None or snap_desde < snap_hasta:
+            snapshots = SaldoCuentaPeriodo.objects.filter(periodo__lt=snap_hasta)
+            if snap_desde:
+                snapshots = snapshots.filter(periodo__gte=snap_desde)
+            if ejercicio_id:
+                snapshots = snapshots.filter(ejercicio_id=ejercicio_id)
+            if cuentas_ids is not None:
+                snapshots = snapshots.filter(cuenta_id__in=cuentas_ids)
+            for f in snapshots.values('cuenta_id').annotate(total_debe=Sum('debe'), total_haber=Sum('haber')).order_by():
+                totales[f['cuenta_id']] = (f['total_debe'] or Decimal('0'), f['total_haber'] or Decimal('0'))
+
+            if desde and desde < snap_desde:
+                rangos_vivos.append(Q(asiento__fecha__gte=_inicio_dia(desde), asiento__fecha__lt=_inicio_dia(snap_desde)))
+            if hasta is None:
+                rangos_vivos.append(Q(asiento__fecha__gte=_inicio_dia(snap_hasta)))
+            elif snap_hasta <= hasta:
+                rangos_vivos.append(Q(asiento__fecha__gte=_inicio_dia(snap_hasta),
+                                      asiento__fecha__lt=_inicio_dia(hasta + timedelta(days=1))))
+        else:
+            rango = Q()
+            if desde:
+                rango &= Q(asiento__fecha__gte=_inicio_dia(desde))
+            if hasta:
+                rango &= Q(asiento__fecha__lt=_inicio_dia(hasta + timedelta(days=1)))
+            rangos_vivos.append(rango)
+
+        if not rangos_vivos:
+            return totales
+
+        filtro = Q()
+        for rango in rangos_vivos:
+            filtro |= rango
+        items = ItemAsiento.objects.filter(filtro)
+        if ejercicio_id:
+            items = items.filter(asiento__ejercicio_id=ejercicio_id)
+        if cuentas_ids is not None:
+            items = items.filter(cuenta_id__in=cuentas_ids)
+        for f in items.values('cuenta_id').annotate(total_debe=Sum('debe'), total_haber=Sum('haber')).order_by():
+            d, h = totales.get(f['cuenta_id'], (Decimal('0'), Decimal('0')))
+            totales[f['cuenta_id']] = (d + (f['total_debe'] or Decimal('0')), h + (f['total_haber'] or Decimal('0')))
+        return totales
+
+
+class MayorService:
+    """
+    Motor del libro mayor.
+    - Descendientes de una cuenta agrupadora: 1 consulta por rango de PlanCuenta.ruta.
+    - Saldo inicial y totales del período: SaldosService.totales() (snapshots mensuales).
+    - Movimientos: iterador paginado por keyset sobre (asiento.fecha, asiento.numero, item.id),
+      sin cargar el mayor completo en memoria.
+    """
+
+    CAMPOS = ('id', 'debe', 'haber', 'asiento_id', 'asiento__fecha', 'asiento__numero', 'asiento__descripcion')
+
+    @classmethod
+    def cuentas_ids(cls, cuenta):
+        """La cuenta y, si es agrupadora, todas sus descendientes (1 consulta por rango de ruta)"""
+        if cuenta.imputable:
+            return [cuenta.id]
+        return list(
+            PlanCuenta.objects.filter(PlanCuentasService.descendientes(cuenta)).order_by('ruta').values_list('id', flat=True)
+        )
+
+    @classmethod
+    def _items(cls, cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta):
+        items = ItemAsiento.objects.filter(cuenta_id__in=cuentas_ids)
+        if ejercicio_id:
+            items = items.filter(asiento__ejercicio_id=ejercicio_id)
+        if fecha_desde:
+            items = items.filter(asiento__fecha__gte=_inicio_dia(_a_fecha(fecha_desde)))
+        if fecha_hasta:
+            items = items.filter(asiento__fecha__lt=_inicio_dia(_a_fecha(fecha_hasta) + timedelta(days=1)))
+        return items
+
+    @staticmethod
+    def _posteriores_a(cursor):
+        """Filtro keyset: movimientos estrictamente posteriores a (fecha, numero, id)"""
+        fecha, numero, item_id = cursor
+        return (
+            Q(asiento__fecha__gt=fecha)
+            | Q(asiento__fecha=fecha, asiento__numero__gt=numero)
+            | Q(asiento__fecha=fecha, asiento__numero=numero, id__gt=item_id)
+        )
+
+    @staticmethod
+    def codificar_cursor(movimiento):
+        return f"{movimiento['fecha']}|{movimiento['asiento_numero']}|{movimiento['id']}"
+
+    @staticmethod
+    def decodificar_cursor(cursor):
+        """'fecha_iso|numero|id' -> (datetime, numero, id). ValueError si está mal formado"""
+        fecha, numero, item_id = cursor.split('|')
+        fecha = parse_datetime(fecha)
+        if fecha is None:
+            raise ValueError('Cursor inválido')
+        return fecha, int(numero), int(item_id)
+
+    @classmethod
+    def resumen(cls, cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta):
+        """saldo_inicial, total_debe, total_haber y saldo_final (Decimal) sin recorrer los movimientos"""
+        saldo_inicial = Decimal('0')
+        if fecha_desde:
+            anteriores = SaldosService.totales(
+                ejercicio_id, None, _a_fecha(fecha_desde) - timedelta(days=1), cuentas_ids
+            )
+            saldo_inicial = sum((debe - haber for debe, haber in anteriores.values()), Decimal('0'))
+        periodo = SaldosService.totales(ejercicio_id, fecha_desde, fecha_hasta, cuentas_ids)
+        total_debe = sum((debe for debe, _ in periodo.values()), Decimal('0'))
+        total_haber = sum((haber for _, haber in periodo.values()), Decimal('0'))
+        return {
+            'saldo_inicial': saldo_inicial,
+            'total_debe': total_debe,
+            'total_haber': total_haber,
+            'saldo_final': saldo_inicial + total_debe - total_haber,
+        }
+
+    @classmethod
+    def movimientos(cls, cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta, saldo_inicial,
+                    cursor=None, limite=None, chunk_size=2000):
+        """
+        Genera los movimientos (dicts) con saldo acumulado, en orden (fecha, numero, id).
+        cursor: tupla de decodificar_cursor(); el saldo previo al cursor se obtiene con 1 SUM.
+        """
+        items = cls._items(cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta)
+        saldo = saldo_inicial
+        if cursor:
+            previos = items.exclude(cls._posteriores_a(cursor)).aggregate(
+                debe=Sum('debe'), haber=Sum('haber')
+            )
+            saldo += (previos['debe'] or Decimal('0')) - (previos['haber'] or Decimal('0'))
+            items = items.filter(cls._posteriores_a(cursor))
+
+        items = items.order_by('asiento__fecha', 'asiento__numero', 'id').values(*cls.CAMPOS)
+        if limite:
+            items = items[:limite]
+        for item in items.iterator(chunk_size=chunk_size):
+            saldo += item['debe'] - item['haber']
+            yield {
+                'id': item['id'],
+                'fecha': item['asiento__fecha'].isoformat(),
+                'asiento_id': item['asiento_id'],
+                'asiento_numero': item['asiento__numero'],
+                'descripcion': item['asiento__descripcion'],
+                'debe': item['debe'],
+                'haber': item['haber'],
+                'saldo': saldo,
+            }
+
+
+class BalanceService:
+    """
+    Motor del balance de sumas y saldos.
+    - Totales por cuenta con SaldosService.totales(): snapshots mensuales + 1 consulta agrupada
+      (GROUP BY cuenta) sobre ItemAsiento sólo para el mes abierto / meses parciales.
+    - 1 consulta para el plan de cuentas.
+    - Los totales se propagan en memoria por la jerarquía `padre`, de modo que los rubros
+      no imputables muestran el subtotal de sus cuentas hijas.
+    La cantidad de consultas no depende del tamaño del plan de cuentas ni de los asientos.
+    """
+
+    @classmethod
+    def totales_por_cuenta(cls, ejercicio_id, fecha_desde, fecha_hasta):
+        """Retorna {cuenta_id: (debe, haber)} con los movimientos directos de cada cuenta"""
+        return SaldosService.totales(ejercicio_id, fecha_desde, fecha_hasta)
+
+    @classmethod
+    def acumular_por_jerarquia(cls, cuentas, directos):
+        """
+        Suma los movimientos directos de cada cuenta en ella misma y en todos sus ancestros.
+        cuentas: {id: PlanCuenta} (con padre_id)
+        directos: {cuenta_id: (debe, haber)}
+        """
+        acumulados = {}
+        for cuenta_id, (debe, haber) in directos.items():
+            visitadas = set()
+            actual = cuenta_id
+            while actual is not None and actual not in visitadas:
+                visitadas.add(actual)  # Protege contra ciclos mal cargados en el plan
+                d, h = acumulados.get(actual, (Decimal('0'), Decimal('0')))
+                acumulados[actual] = (d + debe, h + haber)
+                cuenta = cuentas.get(actual)
+                actual = cuenta.padre_id if cuenta else None
+        return acumulados
+
+    @classmethod
+    def generar(cls, ejercicio_id, fecha_desde, fecha_hasta, nivel=None, solo_con_movimientos=True):
+        """
+        Arma el balance completo.
+        Retorna (filas, totales):
+        - filas: lista ordenada por código de dicts con cuenta, debe, haber y saldo (Decimal)
+        - totales: total_debe, total_haber, total_saldo_deudor, total_saldo_acreedor,
+          calculados sobre los movimientos directos (sin duplicar los subtotales de rubros)
+        """
+        directos = cls.totales_por_cuenta(ejercicio_id, fecha_desde, fecha_hasta)
+        cuentas = {c.id: c for c in PlanCuenta.objects.all().order_by('codigo')}
+        acumulados = cls.acumular_por_jerarquia(cuentas, directos)
+
+        filas = []
+        for cuenta in cuentas.values():
+            if nivel and cuenta.nivel > int(nivel):
+                continue
+            debe, haber = acumulados.get(cuenta.id, (Decimal('0'), Decimal('0')))
+            if solo_con_movimientos and debe == 0 and haber == 0:
+                continue
+            filas.append({
+                'cuenta': cuenta,
+                'debe': debe,
+                'haber': haber,
+                'saldo': debe - haber,
+            })
+
+        totales = {
+            'total_debe': Decimal('0'),
+            'total_haber': Decimal('0'),
+            'total_saldo_deudor': Decimal('0'),
+            'total_saldo_acreedor': Decimal('0'),
+        }
+        for debe, haber in directos.values():
+            saldo = debe - haber
+            totales['total_debe'] += debe
+            totales['total_haber'] += haber
+            if saldo > 0:
+                totales['total_saldo_deudor'] += saldo
+            else:
+                totales['total_saldo_acreedor'] += abs(saldo)
+
+        return filas, totales
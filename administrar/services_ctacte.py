@@ -0,0 +1,127 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, Case, When, F, Q, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from .models import Cliente, MovimientoCuentaCorriente
+
+
+class CuentaCorrienteService:
+    """
+    Cuenta corriente de clientes.
+    MovimientoCuentaCorriente.saldo es el saldo acumulado luego de cada movimiento, en orden
+    (fecha, id). Todas las altas pasan por registrar(), que bloquea al cliente y encadena el
+    saldo desde el último movimiento; recalcular() verifica/repara la cadena completa.
+    """
+
+    DEBE = ('DEBE', 'VENTA')  # Aumentan la deuda; el resto (HABER) la disminuye
+
+    @classmethod
+    def signo(cls, tipo):
+        return 1 if tipo in cls.DEBE else -1
+
+    @classmethod
+    def _importe_con_signo(cls):
+        return Case(
+            When(tipo__in=cls.DEBE, then=F('monto')),
+            default=-F('monto'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+
+    @staticmethod
+    def ultimo_saldo(cliente_id):
+        saldo = (
+            MovimientoCuentaCorriente.objects.filter(cliente_id=cliente_id)
+            .order_by('-fecha', '-id').values_list('saldo', flat=True).first()
+        )
+        return saldo if saldo is not None else Decimal('0')
+
+    @classmethod
+    @transaction.atomic
+    def registrar(cls, cliente, tipo, monto, descripcion, venta=None, recibo=None):
+        """Crea el movimiento con su saldo acumulado y actualiza Cliente.saldo_actual (también en `cliente`)"""
+        monto = Decimal(str(monto))
+        # Bloqueo del cliente: dos movimientos simultáneos no pueden partir del mismo saldo
+        Cliente.objects.select_for_update().filter(pk=cliente.pk).values_list('pk', flat=True).first()
+        saldo = cls.ultimo_saldo(cliente.pk) + cls.signo(tipo) * monto
+
+        movimiento = MovimientoCuentaCorriente.objects.create(
+            cliente=cliente,
+            tipo=tipo,
+            descripcion=descripcion,
+            monto=monto,
+            saldo=saldo,
+            venta=venta,
+            recibo=recibo,
+        )
+        Cliente.objects.filter(pk=cliente.pk).update(saldo_actual=saldo)
+        cliente.saldo_actual = saldo
+        return movimiento
+
+    @classmethod
+    def saldo_al(cls, cliente_id, antes_de):
+        """Saldo acumulado de los movimientos anteriores a `antes_de` (datetime), en 1 aggregate"""
+        return MovimientoCuentaCorriente.objects.filter(cliente_id=cliente_id, fecha__lt=antes_de).aggregate(
+            saldo=Coalesce(Sum(cls._importe_con_signo()), Decimal('0'),
+                           output_field=DecimalField(max_digits=14, decimal_places=2))
+        )['saldo']
+
+    @staticmethod
+    def codificar_cursor(movimiento):
+        return f"{movimiento.fecha.isoformat()}|{movimiento.id}"
+
+    @staticmethod
+    def decodificar_cursor(cursor):
+        """'fecha_iso|id' -> (datetime, id). ValueError si está mal formado"""
+        fecha, movimiento_id = cursor.split('|')
+        fecha = parse_datetime(fecha)
+        if fecha is None:
+            raise ValueError('Cursor inválido')
+        return fecha, int(movimiento_id)
+
+    @staticmethod
+    def movimientos(cliente_id, desde=None, hasta=None, cursor=None):
+        """
+        Movimientos del cliente del más nuevo al más viejo (sin JOINs: el listado sólo usa venta_id/recibo_id).
+        desde/hasta: datetimes (hasta exclusivo). cursor: (fecha, id) del último movimiento ya enviado.
+        """
+        movimientos = MovimientoCuentaCorriente.objects.filter(cliente_id=cliente_id)
+        if desde:
+            movimientos = movimientos.filter(fecha__gte=desde)
+        if hasta:
+            movimientos = movimientos.filter(fecha__lt=hasta)
+        if cursor:
+            fecha, movimiento_id = cursor
+            movimientos = movimientos.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=movimiento_id))
+        return movimientos.order_by('-fecha', '-id')
+
+    @classmethod
+    def recalcular(cls, cliente_id, reparar=False, batch_size=1000):
+        """
+        Recorre la cadena de saldos del cliente. Retorna (movimientos con saldo incorrecto, saldo final).
+        Con reparar=True corrige los saldos (bulk_update) y Cliente.saldo_actual.
+        """
+        saldo = Decimal('0')
+        incorrectos = 0
+        pendientes = []
+        filas = (
+            MovimientoCuentaCorriente.objects.filter(cliente_id=cliente_id)
+            .order_by('fecha', 'id').values_list('id', 'tipo', 'monto', 'saldo')
+        )
+        with transaction.atomic():
+            if reparar:
+                Cliente.objects.select_for_update().filter(pk=cliente_id).values_list('pk', flat=True).first()
+            for movimiento_id, tipo, monto, saldo_guardado in filas.iterator(chunk_size=batch_size):
+                saldo += cls.signo(tipo) * (monto or Decimal('0'))
+                if saldo_guardado != saldo:
+                    incorrectos += 1
+                    if reparar:
+                        pendientes.append(MovimientoCuentaCorriente(id=movimiento_id, saldo=saldo))
+                        if len(pendientes) >= batch_size:
+                            MovimientoCuentaCorriente.objects.bulk_update(pendientes, ['saldo'])
+                            pendientes = []
+            if reparar:
+                if pendientes:
+                    MovimientoCuentaCorriente.objects.bulk_update(pendientes, ['saldo'])
+                Cliente.objects.filter(pk=cliente_id).update(saldo_actual=saldo)
+        return incorrectos, saldo
@@ -0,0 +1,312 @@
+from datetime import datetime, timedelta
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import (
+    Venta, DetalleVenta, Compra, MovimientoCaja, CajaDiaria, Pedido, Producto, Cliente, Cheque
+)
+from .services_cheques import CarteraChequesService
+from .services_ventas import VentaService
+from .utils_cache import CacheVersionado
+
+MESES_ES = {1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun',
+            7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'}
+
+
+def _inicio(fecha):
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
+def _fin(fecha):
+    return timezone.make_aware(datetime.combine(fecha, datetime.max.time()))
+
+
+class DashboardService:
+    """
+    Datos de api_dashboard_stats, cacheados por sección con distinto TTL.
+    Cada sección es un espacio de CacheVersionado ('dashboard:kpi', ...): los datos viven en el
+    proceso y signals.py cambia la versión compartida (al confirmar la transacción) cuando cambian
+    ventas, compras, caja, pedidos o cheques. Una venta registrada en un worker invalida el dashboard
+    de todos en su próximo request, sin esperar al TTL.
+    """
+
+    # Segundos de vida de cada sección
+    TTL = {
+        'kpi': 30,              # Tiempo real: hoy, caja abierta, pendientes, stock bajo, actividad
+        'rentabilidad': 300,    # Depende del rango pedido
+        'mensual': 3600,        # Gráfico de 6 meses y top productos de 30 días
+        'proyeccion': 900,      # Cheques de los próximos 30 días
+    }
+
+    # Secciones afectadas por cada modelo (usado por signals.py)
+    INVALIDACIONES = {
+        Venta: ('kpi', 'rentabilidad', 'mensual'),
+        DetalleVenta: ('kpi', 'rentabilidad', 'mensual'),
+        Compra: ('kpi', 'mensual'),
+        MovimientoCaja: ('kpi', 'rentabilidad'),
+        CajaDiaria: ('kpi',),
+        Pedido: ('kpi',),
+        Cheque: ('proyeccion',),
+    }
+
+    @staticmethod
+    def _espacio(seccion):
+        return f'dashboard:{seccion}'
+
+    @classmethod
+    def invalidar(cls, *secciones):
+        for seccion in secciones or cls.TTL.keys():
+            CacheVersionado.invalidar(cls._espacio(seccion))
+
+    @classmethod
+    def _cacheado(cls, seccion, parametros, calcular):
+        return CacheVersionado.obtener(cls._espacio(seccion), parametros, calcular, cls.TTL[seccion])
+
+    @staticmethod
+    def costo_ventas(ventas):
+        """CMV con el costo capturado en cada línea de venta, en 1 aggregate"""
+        return VentaService.costo_ventas(ventas)
+
+    # ----------------------------------------------------------------- Secciones
+
+    @classmethod
+    def rentabilidad(cls, dt_start, dt_end):
+        return cls._cacheado(
+            'rentabilidad', f'{dt_start.isoformat()}:{dt_end.isoformat()}',
+            lambda: cls._calcular_rentabilidad(dt_start, dt_end)
+        )
+
+    @classmethod
+    def _calcular_rentabilidad(cls, dt_start, dt_end):
+        ventas_rango = Venta.objects.filter(fecha__range=(dt_start, dt_end))
+        agregado_ventas = ventas_rango.aggregate(total=Sum('total'), cantidad=Count('id'))
+        total_ventas = agregado_ventas['total'] or 0
+        cantidad_ventas = agregado_ventas['cantidad'] or 0
+
+        ticket_promedio = float(total_ventas) / cantidad_ventas if cantidad_ventas > 0 else 0
+        total_costo = cls.costo_ventas(ventas_rango)
+        ganancia_bruta = float(total_ventas) - float(total_costo)
+
+        # Gastos Operativos (Egresos de Caja en el rango)
+        total_gastos = MovimientoCaja.objects.filter(
+            fecha__range=(dt_start, dt_end),
+            tipo='Egreso'
+        ).aggregate(total=Sum('monto'))['total'] or 0
+
+        ganancia_neta = ganancia_bruta - float(total_gastos)
+
+        top_clientes_qs = ventas_rango.values('cliente__nombre')\
+            .annotate(total_comprado=Sum('total'), cantidad_compras=Count('id'))\
+            .order_by('-total_comprado')[:5]
+
+        return {
+            'rentabilidad': {
+                'start': dt_start.strftime('%d/%m/%Y'),
+                'end': dt_end.strftime('%d/%m/%Y'),
+                'ventas': float(total_ventas),
+                'cantidad_ventas': cantidad_ventas,
+                'ticket_promedio': float(ticket_promedio),
+                'costos': float(total_costo),
+                'ganancia_bruta': float(ganancia_bruta),
+                'gastos': float(total_gastos),
+                'ganancia_neta': float(ganancia_neta),
+                'margen': round((float(ganancia_neta) / float(total_ventas) * 100), 1) if total_ventas > 0 else 0
+            },
+            'top_clientes': [{
+                'cliente': c['cliente__nombre'],
+                'total': float(c['total_comprado']),
+                'cantidad': c['cantidad_compras']
+            } for c in top_clientes_qs],
+        }
+
+    @classmethod
+    def kpis(cls, hoy_date):
+        return cls._cacheado('kpi', hoy_date.isoformat(), lambda: cls._calcular_kpis(hoy_date))
+
+    @classmethod
+    def _calcular_kpis(cls, hoy_date):
+        start_of_day, end_of_day = _inicio(hoy_date), _fin(hoy_date)
+
+        # Ventas de Hoy y utilidad estimada por costo de productos
+        ventas_hoy_qs = Venta.objects.filter(fecha__range=(start_of_day, end_of_day))
+        agregado_hoy = ventas_hoy_qs.aggregate(total=Sum('total'), cantidad=Count('id'))
+        ventas_hoy = agregado_hoy['total'] or 0
+        utilidad_hoy = float(ventas_hoy) - float(cls.costo_ventas(ventas_hoy_qs))
+
+        # Caja Disponible (Saldo de la Caja Activa)
+        caja_abierta = CajaDiaria.objects.filter(estado='ABIERTA').first()
+        caja_disponible = 0
+        ingresos_caja_hoy = 0
+        if caja_abierta:
+            # Totales incrementales de la sesión (CajaService): sin agregar sus movimientos
+            ingresos_caja_hoy = caja_abierta.total_ingresos
+            caja_disponible = float(caja_abierta.monto_apertura) + float(ingresos_caja_hoy) - float(caja_abierta.total_egresos)
+
+        # Pendientes
+        pedidos_pendientes_qs = Pedido.objects.filter(estado__in=['PENDIENTE', 'PREPARACION'])
+        pendientes = pedidos_pendientes_qs.aggregate(cantidad=Count('id'), total=Sum('total'))
+        pedidos_pendientes_list = [{
+            'id': p.id,
+            'cliente': p.cliente.nombre,
+            'total': float(p.total),
+            'fecha': p.fecha.strftime('%d/%m %H:%M'),
+            'estado': p.estado
+        } for p in pedidos_pendientes_qs.select_related('cliente').order_by('-fecha')[:10]]
+
+        # Stock bajo
+        stock_bajo_qs = Producto.objects.filter(Q(stock__lte=F('stock_minimo')) | Q(stock__lte=10))
+        stock_bajo_list = [{
+            'id': p.id,
+            'nombre': p.descripcion,
+            'stock': float(p.stock),
+            'minimo': float(p.stock_minimo)
+        } for p in stock_bajo_qs.order_by('stock')[:10]]
+
+        return {
+            'kpi': {
+                'ventas_hoy': float(ventas_hoy),
+                'cantidad_ventas_hoy': agregado_hoy['cantidad'],
+                'utilidad_hoy': float(utilidad_hoy),
+                'caja_hoy': float(caja_disponible),
+                'ingresos_caja_hoy': float(ingresos_caja_hoy),
+                'pedidos_pendientes': pendientes['cantidad'],
+                'monto_pedidos_pendientes': float(pendientes['total'] or 0),
+                'stock_bajo': stock_bajo_qs.count(),
+                'clientes_activos': Cliente.objects.count(),
+                'cantidad_pedidos_hoy': Pedido.objects.filter(fecha__range=(start_of_day, end_of_day)).count(),
+            },
+            'actividad_reciente': cls._actividad_reciente(),
+            'stock_bajo_list': stock_bajo_list,
+            'pedidos_pendientes_list': pedidos_pendientes_list,
+        }
+
+    @staticmethod
+    def _actividad_reciente():
+        recientes = []
+        for v in Venta.objects.select_related('cliente').order_by('-fecha')[:8]:
+            recientes.append({
+                'timestamp': v.fecha.timestamp(),
+                'tipo': 'VENTA',
+                'icono': 'ShoppingCart',
+                'color': 'primary',
+                'fecha': (v.fecha - timedelta(hours=3)).strftime('%d/%m %H:%M'),
+                'texto': f"Venta #{v.id} - ${v.total}",
+                'subtexto': v.cliente.nombre if v.cliente else 'Cliente Final'
+            })
+        for c in Compra.objects.select_related('proveedor').order_by('-fecha')[:8]:
+            recientes.append({
+                'timestamp': c.fecha.timestamp(),
+                'tipo': 'COMPRA',
+                'icono': 'Truck',
+                'color': 'danger',
+                'fecha': (c.fecha - timedelta(hours=3)).strftime('%d/%m %H:%M'),
+                'texto': f"Compra #{c.id} - ${c.total}",
+                'subtexto': c.proveedor.nombre if c.proveedor else 'Proveedor General'
+            })
+        recientes.sort(key=lambda x: x['timestamp'], reverse=True)
+        return recientes[:10]
+
+    @classmethod
+    def mensual(cls, hoy_date):
+        return cls._cacheado('mensual', hoy_date.isoformat(), lambda: cls._calcular_mensual(hoy_date))
+
+    @staticmethod
+    def totales_por_mes(modelo, desde):
+        """{primer día del mes: total} de `modelo` desde `desde` en 1 consulta agrupada"""
+        filas = (
+            modelo.objects.filter(fecha__gte=desde)
+            .annotate(mes=TruncMonth('fecha'))
+            .values('mes')
+            .annotate(total=Sum('total'))
+            .order_by()
+        )
+        return {timezone.localtime(f['mes']).date() if isinstance(f['mes'], datetime) else f['mes']: f['total'] or 0
+                for f in filas}
+
+    @classmethod
+    def _calcular_mensual(cls, hoy_date):
+        # Primer día de cada uno de los últimos 6 meses (incluido el actual)
+        meses = [hoy_date.replace(day=1)]
+        for _ in range(5):
+            meses.insert(0, (meses[0] - timedelta(days=1)).replace(day=1))
+
+        desde = _inicio(meses[0])
+        ventas_mes = cls.totales_por_mes(Venta, desde)
+        compras_mes = cls.totales_por_mes(Compra, desde)
+        data_ventas = [float(ventas_mes.get(mes, 0)) for mes in meses]
+        data_compras = [float(compras_mes.get(mes, 0)) for mes in meses]
+
+        # Top Productos (últimos 30 días)
+        top_productos = DetalleVenta.objects.filter(venta__fecha__gte=_inicio(hoy_date - timedelta(days=30)))\
+            .values('producto__descripcion')\
+            .annotate(total_vendido=Sum('cantidad'))\
+            .order_by('-total_vendido')[:5]
+
+        return {
+            'chart': {
+                'labels': [MESES_ES[mes.month] for mes in meses],
+                'data': data_ventas,
+                'datasets': [
+                    {'label': 'Ventas', 'data': data_ventas, 'borderColor': '#0d6efd', 'backgroundColor': 'rgba(13, 110, 253, 0.1)'},
+                    {'label': 'Compras', 'data': data_compras, 'borderColor': '#dc3545', 'backgroundColor': 'rgba(220, 53, 69, 0.1)'}
+                ]
+            },
+            'top_productos': [{
+                'producto': p['producto__descripcion'] or "Producto Desconocido",
+                'total': float(p['total_vendido'] or 0)
+            } for p in top_productos],
+        }
+
+    @classmethod
+    def proyeccion(cls, hoy_date):
+        return cls._cacheado('proyeccion', hoy_date.isoformat(), lambda: cls._calcular_proyeccion(hoy_date))
+
+    @staticmethod
+    def _calcular_proyeccion(hoy_date):
+        """Cheques por cobrar (terceros en cartera) vs cheques propios a pagar, próximos 30 días, en 1 consulta"""
+        fecha_limite = hoy_date + timedelta(days=30)
+        por_fecha = CarteraChequesService.montos_por_dia(hoy_date, fecha_limite)
+
+        labels, data_ingresos, data_egresos = [], [], []
+        dia = hoy_date
+        while dia <= fecha_limite:
+            fila = por_fecha.get(dia, {})
+            labels.append(dia.strftime('%d/%m'))
+            data_ingresos.append(float(fila.get('cobrar') or 0))
+            data_egresos.append(float(fila.get('pagar') or 0))
+            dia += timedelta(days=1)
+
+        return {
+            'proyeccion': {
+                'labels': labels,
+                'datasets': [
+                    {
+                        'label': 'Ingresos (Cheques)',
+                        'data': data_ingresos,
+                        'borderColor': '#198754',
+                        'backgroundColor': 'rgba(25, 135, 84, 0.1)'
+                    },
+                    {
+                        'label': 'Egresos (Pagos)',
+                        'data': data_egresos,
+                        'borderColor': '#dc3545',
+                        'backgroundColor': 'rgba(220, 53, 69, 0.1)'
+                    }
+                ]
+            }
+        }
+
+    @classmethod
+    def stats(cls, dt_start, dt_end, hoy_date=None):
+        """Respuesta completa de api_dashboard_stats"""
+        hoy_date = hoy_date or timezone.localdate()
+        data = {}
+        data.update(cls.kpis(hoy_date))
+        data.update(cls.rentabilidad(dt_start, dt_end))
+        data.update(cls.mensual(hoy_date))
+        data.update(cls.proyeccion(hoy_date))
+        return data
+
+
+# Las secciones se leen junto con las demás versiones (1 lectura del cache compartido por request)
+CacheVersionado.registrar(*(DashboardService._espacio(seccion) for seccion in DashboardService.TTL))
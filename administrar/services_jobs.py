@@ -0,0 +1,275 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+from .utils_cache import CacheVersionado
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorPermanente(Exception):
+    """Error de un job que no tiene sentido reintentar: pasa directo a MUERTO"""
+
+
+class JobService:
+    """
+    Cola de tareas en segundo plano sobre la tabla Job (sin broker: sólo la base de datos de la app).
+    - encolar() inserta el Job recién al confirmarse la transacción en curso (transaction.on_commit):
+      si la operación se revierte no queda tarea y el worker nunca lee datos sin confirmar.
+    - tomar() reclama 1 job con un UPDATE condicional (estado + lease), portable a MySQL y SQLite.
+      Un job EN_CURSO con el lease vencido (worker caído) vuelve a quedar disponible.
+    - ejecutar() corre el handler; si es atómico, en la misma transacción que la marca de COMPLETADO.
+      Si falla se reprograma con backoff exponencial y al agotar max_intentos queda MUERTO (dead-letter).
+    - settings.JOBS_EN_LINEA = True ejecuta los jobs en el mismo proceso al commit (desarrollo, sin worker).
+    """
+    LEASE_SEGUNDOS = 300
+    MAX_INTENTOS = 5
+    BACKOFF_SEGUNDOS = 30
+    BACKOFF_MAXIMO = 3600
+    CANDIDATOS = 20
+    HANDLERS = {}
+
+    @classmethod
+    def registrar(cls, tipo, atomico=True, lease=None, max_intentos=None):
+        """Decorador: registra la función que procesa los jobs de `tipo` (recibe el payload como kwargs)"""
+        def decorador(funcion):
+            cls.HANDLERS[tipo] = {
+                'funcion': funcion,
+                'atomico': atomico,
+                'lease': lease or cls.LEASE_SEGUNDOS,
+                'max_intentos': max_intentos or cls.MAX_INTENTOS,
+            }
+            return funcion
+        return decorador
+
+    @staticmethod
+    def worker_id():
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:100]
+
+    # ----------------------------------------------------------------- Encolado
+
+    @classmethod
+    def encolar(cls, tipo, payload=None, demora=0):
+        """
+        Encola un job de `tipo` con `payload` (dict JSON: kwargs del handler) para después del commit.
+        Retorna el Job si se insertó en el momento (fuera de una transacción), None si quedó diferido.
+        """
+        if tipo not in cls.HANDLERS:
+            raise ValueError(f"Tipo de job desconocido: {tipo}")
+        creados = []
+
+        def insertar():
+            job = Job.objects.create(
+                tipo=tipo,
+                payload=payload or {},
+                max_intentos=cls.HANDLERS[tipo]['max_intentos'],
+                ejecutar_desde=timezone.now() + timedelta(seconds=demora),
+            )
+            creados.append(job)
+            if getattr(settings, 'JOBS_EN_LINEA', False):
+                cls.procesar_pendientes(ids=[job.pk])
+
+        transaction.on_commit(insertar)
+        return creados[0] if creados else None
+
+    @classmethod
+    def asientos(cls, *operaciones):
+        """
+        Encola asientos de AccountingService que se registran juntos en 1 transacción.
+        operaciones: tuplas (método, instancia, ...), p. ej. ('registrar_venta', venta).
+        """
+        return cls.encolar('asientos', {'operaciones': [
+            [metodo, [[objeto._meta.object_name, objeto.pk] for objeto in objetos]]
+            for metodo, *objetos in operaciones
+        ]})
+
+    # ----------------------------------------------------------------- Ejecución
+
+    @staticmethod
+    def _disponibles(ahora):
+        return Q(estado='PENDIENTE', ejecutar_desde__lte=ahora) | Q(estado='EN_CURSO', bloqueado_hasta__lt=ahora)
+
+    @classmethod
+    def tomar(cls, worker, tipos=None, ids=None):
+        """Reclama el próximo job disponible para `worker` (o None); a lo sumo 1 worker gana cada job"""
+        ahora = timezone.now()
+        candidatos = Job.objects.filter(cls._disponibles(ahora))
+        if tipos:
+            candidatos = candidatos.filter(tipo__in=tipos)
+        if ids:
+            candidatos = candidatos.filter(pk__in=ids)
+
+        for job_id, tipo in candidatos.order_by('ejecutar_desde', 'id').values_list('id', 'tipo')[:cls.CANDIDATOS]:
+            lease = cls.HANDLERS.get(tipo, {}).get('lease', cls.LEASE_SEGUNDOS)
+            tomado = Job.objects.filter(cls._disponibles(ahora), pk=job_id).update(
+                estado='EN_CURSO',
+                worker=worker,
+                intentos=F('intentos') + 1,
+                bloqueado_hasta=ahora + timedelta(seconds=lease),
+            )
+            if tomado:
+                return Job.objects.get(pk=job_id)
+        return None
+
+    @classmethod
+    def _propio(cls, job):
+        """El job sigue tomado por este worker (no venció el lease ni lo reclamó otro)"""
+        return Job.objects.filter(pk=job.pk, worker=job.worker, estado='EN_CURSO')
+
+    @classmethod
+    def ejecutar(cls, job):
+        """Corre el job tomado; retorna True si quedó COMPLETADO"""
+        handler = cls.HANDLERS.get(job.tipo)
+        # Como un request: ve las invalidaciones de caches hechas por otros procesos
+        CacheVersionado.nueva_solicitud()
+        try:
+            if handler is None:
+                raise ErrorPermanente(f"Tipo de job desconocido: {job.tipo}")
+            if job.intentos > job.max_intentos:
+                # Se retomó por lease vencido más veces que las permitidas (el worker se cae con este job)
+                raise ErrorPermanente("Se agotaron los intentos (lease vencido)")
+
+            if handler['atomico']:
+                with transaction.atomic():
+                    resultado = handler['funcion'](**job.payload)
+                    cls._completar(job, resultado)
+            else:
+                resultado = handler['funcion'](**job.payload)
+                cls._completar(job, resultado)
+        except Exception as e:
+            cls._fallar(job, e)
+            return False
+        return True
+
+    @classmethod
+    def _completar(cls, job, resultado):
+        actualizados = cls._propio(job).update(
+            estado='COMPLETADO', resultado=resultado, ultimo_error='',
+            bloqueado_hasta=None, finalizado=timezone.now(),
+        )
+        if not actualizados:
+            # Otro worker lo retomó: en un job atómico esto revierte lo hecho
+            raise RuntimeError(f"Job #{job.pk}: el lease venció durante la ejecución")
+
+    @classmethod
+    def _fallar(cls, job, error):
+        muerto = isinstance(error, ErrorPermanente) or job.intentos >= job.max_intentos
+        espera = min(cls.BACKOFF_SEGUNDOS * 2 ** max(job.intentos - 1, 0), cls.BACKOFF_MAXIMO)
+        ahora = timezone.now()
+        cls._propio(job).update(
+            estado='MUERTO' if muerto else 'PENDIENTE',
+            ultimo_error=''.join(traceback.format_exception(error))[-4000:],
+            bloqueado_hasta=None,
+            ejecutar_desde=ahora if muerto else ahora + timedelta(seconds=espera),
+            finalizado=ahora if muerto else None,
+        )
+        logger.warning("Job #%s (%s) falló en el intento %s%s: %s", job.pk, job.tipo, job.intentos,
+                       ' [MUERTO]' if muerto else '', error)
+
+    @classmethod
+    def procesar_pendientes(cls, tipos=None, ids=None, worker=None):
+        """Ejecuta los jobs disponibles hasta vaciar la cola; retorna (completados, fallidos)"""
+        worker = worker or cls.worker_id()
+        completados = fallidos = 0
+        while True:
+            job = cls.tomar(worker, tipos, ids)
+            if job is None:
+                return completados, fallidos
+            if cls.ejecutar(job):
+                completados += 1
+            else:
+                fallidos += 1
+
+    @classmethod
+    def trabajar(cls, tipos=None, intervalo=2.0, detener=None, una_vez=False):
+        """Bucle de un hilo worker: toma y ejecuta jobs, esperando `intervalo` segundos si no hay"""
+        detener = detener or threading.Event()
+        worker = cls.worker_id()
+        try:
+            while not detener.is_set():
+                job = cls.tomar(worker, tipos)
+                if job is not None:
+                    cls.ejecutar(job)
+                elif una_vez:
+                    break
+                else:
+                    detener.wait(intervalo)
+        finally:
+            connection.close()
+
+    # ----------------------------------------------------------------- Mantenimiento
+
+    @staticmethod
+    def reintentar(ids=None):
+        """Vuelve a encolar los jobs MUERTOS (todos o los de `ids`)"""
+        muertos = Job.objects.filter(estado='MUERTO')
+        if ids:
+            muertos = muertos.filter(pk__in=ids)
+        return muertos.update(estado='PENDIENTE', intentos=0, ejecutar_desde=timezone.now(), finalizado=None)
+
+    @staticmethod
+    def purgar(dias):
+        """Borra los jobs COMPLETADOS hace más de `dias` días"""
+        limite = timezone.now() - timedelta(days=dias)
+        return Job.objects.filter(estado='COMPLETADO', finalizado__lt=limite).delete()[0]
+
+
+# ===================================================================== Handlers
+
+@JobService.registrar('asientos')
+def _asientos(operaciones):
+    from .services import AccountingService
+    for metodo, objetos in operaciones:
+        if not (metodo.startswith('registrar_') and hasattr(AccountingService, metodo)):
+            raise ErrorPermanente(f"Método contable inválido: {metodo}")
+        instancias = [apps.get_model('administrar', modelo).objects.get(pk=pk) for modelo, pk in objetos]
+        getattr(AccountingService, metodo)(*instancias)
+
+
+@JobService.registrar('backup', atomico=False, lease=1800, max_intentos=2)
+def _backup(tipo, usuario_id=None):
+    from .services_backup import BackupService
+    if tipo not in BackupService.TIPOS:
+        raise ErrorPermanente('Tipo de backup no válido')
+    backup = BackupService.generar(tipo, usuario_id)
+    if BackupService.credenciales_drive():
+        JobService.encolar('backup_drive', {'backup_id': backup.pk})
+    return {'backup_id': backup.pk, 'nombre': backup.nombre}
+
+
+@JobService.registrar('backup_drive', atomico=False, lease=1800)
+def _backup_drive(backup_id):
+    from .services_backup import BackupService
+    archivo = BackupService.subir_drive(backup_id)
+    return {'drive_id': archivo['id'], 'link': archivo['webViewLink']} if archivo else None
+
+
+@JobService.registrar('email', atomico=False)
+def _email(destinatarios, asunto, cuerpo, adjuntos=()):
+    """adjuntos: [tipo de ComprobantePdf.DOCUMENTOS, id]; los PDFs se generan (o salen del cache) en el worker"""
+    from django.core.mail import EmailMessage
+    from .services_pdf import ComprobantePdf
+    mensaje = EmailMessage(asunto, cuerpo, to=destinatarios)
+    for tipo, documento_id in adjuntos:
+        pdf = ComprobantePdf.generar(tipo, documento_id)
+        if pdf['contenido'] is None:
+            raise ValueError(f"No se pudo generar el PDF {pdf['nombre']}")
+        mensaje.attach(pdf['nombre'], pdf['contenido'], 'application/pdf')
+    mensaje.send()
+
+
+@JobService.registrar('pdf_lote', atomico=False, lease=3600, max_intentos=2)
+def _pdf_lote(desde, hasta, tipos=None, procesos=None):
+    """ZIP con los comprobantes de un período (ComprobantePdf.lote_zip); fechas YYYY-MM-DD"""
+    from datetime import date
+    from .services_pdf import ComprobantePdf
+    resultado = ComprobantePdf.lote_zip(date.fromisoformat(desde), date.fromisoformat(hasta), tipos, procesos)
+    return {**resultado, 'errores': resultado['errores'][:100]}
@@ -0,0 +1,106 @@
+import csv
+import json
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from .services import ConfiguracionEmpresa
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en lugar de escribirla"""
+
+    def write(self, valor):
+        return valor
+
+
+class ListadoKeyset:
+    """
+    Paginación por cursor (keyset) para los listados de comprobantes, del más nuevo al más viejo
+    sobre (fecha, id), y exportación en streaming (NDJSON/CSV) del listado completo.
+    Parámetros de request: limite, cursor ('fecha_iso|id') y formato (json | ndjson | csv).
+    """
+
+    LIMITE_MAXIMO = 500
+    FORMATOS = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv; charset=utf-8',
+    }
+
+    @staticmethod
+    def punto_venta():
+        """Punto de venta de la empresa (resuelto una vez por request, no por fila)"""
+        return ConfiguracionEmpresa.valor('punto_venta') or "0001"
+
+    @classmethod
+    def parametros(cls, request):
+        """(limite, cursor) del request; limite None = sin paginación por cursor. ValueError si son inválidos"""
+        limite = request.GET.get('limite')
+        cursor = request.GET.get('cursor')
+        limite = max(1, min(int(limite), cls.LIMITE_MAXIMO)) if limite else None
+        if cursor and not limite:
+            limite = cls.LIMITE_MAXIMO
+        return limite, cls.decodificar_cursor(cursor) if cursor else None
+
+    @staticmethod
+    def codificar_cursor(fecha, pk):
+        return f"{fecha.isoformat()}|{pk}"
+
+    @staticmethod
+    def decodificar_cursor(cursor):
+        """'fecha_iso|id' -> (datetime, id). ValueError si está mal formado"""
+        fecha, pk = cursor.split('|')
+        fecha = parse_datetime(fecha)
+        if fecha is None:
+            raise ValueError('Cursor inválido')
+        return fecha, int(pk)
+
+    @staticmethod
+    def ordenar(queryset, campo='fecha'):
+        # `id` desempata comprobantes con la misma fecha: el orden es total y el cursor estable
+        return queryset.order_by(f'-{campo}', '-id')
+
+    @classmethod
+    def pagina(cls, queryset, limite, cursor=None, campo='fecha'):
+        """
+        Una página de `limite` filas posteriores (más viejas) al cursor, con 1 consulta (LIMIT limite + 1).
+        Retorna (filas, siguiente); siguiente es None en la última página.
+        """
+        queryset = cls.ordenar(queryset, campo)
+        if cursor:
+            fecha, pk = cursor
+            queryset = queryset.filter(Q(**{f'{campo}__lt': fecha}) | Q(**{campo: fecha, 'id__lt': pk}))
+        filas = list(queryset[:limite + 1])
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            ultima = filas[-1]
+            if isinstance(ultima, dict):
+                siguiente = cls.codificar_cursor(ultima[campo], ultima['id'])
+            else:
+                siguiente = cls.codificar_cursor(getattr(ultima, campo), ultima.pk)
+        return filas, siguiente
+
+    @classmethod
+    def exportar(cls, filas, formato, nombre):
+        """
+        StreamingHttpResponse con `filas` (iterable de dicts) en NDJSON o CSV.
+        Las filas se serializan a medida que se leen: usar queryset.iterator() para no cargar todo en memoria.
+        """
+        if formato == 'ndjson':
+            contenido = (json.dumps(fila, ensure_ascii=False, default=str) + '\n' for fila in filas)
+        else:
+            contenido = cls._lineas_csv(filas)
+        response = StreamingHttpResponse(contenido, content_type=cls.FORMATOS[formato])
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+        return response
+
+    @staticmethod
+    def _lineas_csv(filas):
+        writer = csv.writer(_Eco())
+        columnas = None
+        yield '\ufeff'  # BOM: Excel abre el archivo como UTF-8
+        for fila in filas:
+            if columnas is None:
+                columnas = list(fila.keys())
+                yield writer.writerow(columnas)
+            yield writer.writerow([fila.get(columna) for columna in columnas])
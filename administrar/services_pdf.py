@@ -0,0 +1,300 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.template.loader import get_template
+from django.utils import timezone
+from .services import ConfiguracionEmpresa
+from .services_pdf_nativo import PdfNativo
+from .utils_pdf import html_a_pdf, inicializar_proceso_pdf, renderizar_para_lote
+
+logger = logging.getLogger(__name__)
+
+
+class PdfCache:
+    """
+    Cache en disco de los PDFs de comprobantes: MEDIA_ROOT/pdf_cache/<tipo>/<id>/<clave>.pdf
+    - La clave direcciona por contenido: hash del tipo, id, versión del diseño (hash de la fuente del
+      template o versión del motor ReportLab), configuración de la empresa y la fuente del PDF (HTML ya
+      renderizado o datos extraídos del comprobante). Si algo cambia, cambia la clave: no hay que invalidar.
+    - Al guardar una versión nueva se borran las anteriores del mismo comprobante.
+    - Eviction por tamaño: si el directorio supera settings.PDF_CACHE_MAX_MB se borran los PDFs usados
+      hace más tiempo (mtime, que se renueva en cada hit) hasta bajar al 80%. Se revisa al guardar,
+      como mucho cada EVICCION_SEGUNDOS por proceso.
+    """
+    DIRECTORIO = 'pdf_cache'
+    MAX_MB = 500
+    EVICCION_SEGUNDOS = 60
+    _versiones = {}
+    _ultima_eviccion = None
+
+    @classmethod
+    def raiz(cls):
+        return os.path.join(settings.MEDIA_ROOT, cls.DIRECTORIO)
+
+    @classmethod
+    def version_template(cls, template):
+        """Hash de la fuente del template (se calcula 1 vez por proceso)"""
+        version = cls._versiones.get(template)
+        if version is None:
+            fuente = get_template(template).template.source
+            version = cls._versiones[template] = hashlib.sha1(fuente.encode('utf-8')).hexdigest()[:12]
+        return version
+
+    @staticmethod
+    def hash_empresa(empresa):
+        if empresa is None:
+            return '-'
+        valores = {campo.attname: getattr(empresa, campo.attname) for campo in empresa._meta.concrete_fields}
+        return hashlib.sha1(json.dumps(valores, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def clave(cls, tipo, documento_id, version, empresa, fuente):
+        digest = hashlib.sha256()
+        for parte in (tipo, str(documento_id), version, cls.hash_empresa(empresa)):
+            digest.update(parte.encode('utf-8') + b'\0')
+        digest.update(fuente.encode('utf-8'))
+        return digest.hexdigest()
+
+    @classmethod
+    def _directorio(cls, tipo, documento_id):
+        return os.path.join(cls.raiz(), tipo, str(documento_id))
+
+    @classmethod
+    def obtener(cls, tipo, documento_id, clave):
+        ruta = os.path.join(cls._directorio(tipo, documento_id), f'{clave}.pdf')
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            os.utime(ruta)  # Marca de uso para la eviction
+        except OSError:
+            return None
+        return contenido
+
+    @classmethod
+    def guardar(cls, tipo, documento_id, clave, contenido):
+        directorio = cls._directorio(tipo, documento_id)
+        os.makedirs(directorio, exist_ok=True)
+        nombre = f'{clave}.pdf'
+        descriptor, temporal = tempfile.mkstemp(suffix='.tmp', dir=directorio)
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(contenido)
+        # Reemplazo atómico: un lector concurrente nunca ve un PDF a medio escribir
+        os.replace(temporal, os.path.join(directorio, nombre))
+
+        for anterior in os.listdir(directorio):
+            if anterior.endswith('.pdf') and anterior != nombre:
+                try:
+                    os.remove(os.path.join(directorio, anterior))
+                except OSError:
+                    pass
+
+        if cls._ultima_eviccion is None or time.monotonic() - cls._ultima_eviccion > cls.EVICCION_SEGUNDOS:
+            cls.evictar()
+
+    @classmethod
+    def evictar(cls, maximo_bytes=None):
+        """Borra los PDFs menos usados si el cache supera el máximo; retorna cuántos borró"""
+        cls._ultima_eviccion = time.monotonic()
+        if maximo_bytes is None:
+            maximo_bytes = getattr(settings, 'PDF_CACHE_MAX_MB', cls.MAX_MB) * 1024 * 1024
+
+        archivos, total = [], 0
+        for raiz, _, nombres in os.walk(cls.raiz()):
+            for nombre in nombres:
+                if not nombre.endswith('.pdf'):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except OSError:
+                    continue
+                archivos.append((estado.st_mtime, estado.st_size, ruta))
+                total += estado.st_size
+        if total <= maximo_bytes:
+            return 0
+
+        borrados = 0
+        for _, tamanio, ruta in sorted(archivos):
+            if total <= maximo_bytes * 0.8:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tamanio
+            borrados += 1
+        return borrados
+
+
+class ComprobantePdf:
+    """
+    PDFs de comprobantes A4 (facturas, notas de crédito y débito, remitos) a través de PdfCache,
+    y exportación en lote de un período a 1 ZIP renderizando en un pool de procesos.
+    settings.PDF_MOTOR elige el motor: 'reportlab' (PdfNativo, directo) o 'xhtml2pdf' (templates HTML).
+    """
+    # tipo -> (modelo, template, carpeta/prefijo del archivo, método del número)
+    DOCUMENTOS = {
+        'factura': ('Venta', 'administrar/comprobantes/factura_a_v4.html', 'Factura', 'numero_factura_formateado'),
+        'nc': ('NotaCredito', 'administrar/comprobantes/nc_nd_pdf.html', 'NotaCredito', 'numero_formateado'),
+        'nd': ('NotaDebito', 'administrar/comprobantes/nc_nd_pdf.html', 'NotaDebito', 'numero_formateado'),
+        'remito': ('Remito', 'administrar/comprobantes/rem_pdf.html', 'Remito', 'numero_formateado'),
+    }
+
+    @staticmethod
+    def motor():
+        return getattr(settings, 'PDF_MOTOR', 'reportlab')
+
+    @classmethod
+    def modelo(cls, tipo):
+        return apps.get_model('administrar', cls.DOCUMENTOS[tipo][0])
+
+    @staticmethod
+    def contexto(tipo, documento):
+        """Contexto del template (el mismo para el PDF y el fallback HTML de las vistas)"""
+        empresa = ConfiguracionEmpresa.obtener()
+        if tipo == 'factura':
+            return {'venta': documento, 'cliente': documento.cliente, 'detalles': documento.detalles.all(),
+                    'empresa': empresa}
+        if tipo == 'remito':
+            return {'remito': documento, 'empresa': empresa}
+        return {'nota': documento, 'empresa': empresa, 'detalles': documento.detalles.all()}
+
+    @classmethod
+    def nombre(cls, tipo, documento):
+        _, _, prefijo, numero = cls.DOCUMENTOS[tipo]
+        return f"{prefijo}_{getattr(documento, numero)().replace('-', '_')}.pdf"
+
+    @classmethod
+    def generar(cls, tipo, documento, usar_cache=True):
+        """
+        PDF de un comprobante (documento: instancia o pk).
+        Retorna {'contenido' (bytes o None si el motor falló), 'nombre', 'clave', 'contexto', 'cache'}.
+        """
+        if not hasattr(documento, 'pk'):
+            documento = cls.modelo(tipo).objects.get(pk=documento)
+        contexto = cls.contexto(tipo, documento)
+        if cls.motor() == 'reportlab':
+            datos = PdfNativo.datos(tipo, documento, contexto['empresa'])
+            version, fuente = f'reportlab-{PdfNativo.VERSION}', json.dumps(datos, sort_keys=True)
+        else:
+            template = cls.DOCUMENTOS[tipo][1]
+            datos, version, fuente = None, PdfCache.version_template(template), get_template(template).render(contexto)
+        clave = PdfCache.clave(tipo, documento.pk, version, contexto['empresa'], fuente)
+
+        contenido = PdfCache.obtener(tipo, documento.pk, clave) if usar_cache else None
+        desde_cache = contenido is not None
+        if contenido is None:
+            contenido = cls._nativo(datos) if datos is not None else html_a_pdf(fuente)
+            if contenido is not None and usar_cache:
+                PdfCache.guardar(tipo, documento.pk, clave, contenido)
+        return {'contenido': contenido, 'nombre': cls.nombre(tipo, documento), 'clave': clave,
+                'contexto': contexto, 'cache': desde_cache}
+
+    @classmethod
+    def respuesta(cls, request, tipo, documento):
+        """
+        (HttpResponse inline del PDF, contexto). La respuesta lleva ETag con la clave del cache: el
+        navegador revalida y recibe 304 si el comprobante no cambió. Es None si el motor falló.
+        """
+        pdf = cls.generar(tipo, documento)
+        if pdf['contenido'] is None:
+            return None, pdf['contexto']
+
+        etag = f'"{pdf["clave"][:32]}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(pdf['contenido'], content_type='application/pdf')
+            response['Content-Disposition'] = f'inline; filename="{pdf["nombre"]}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response, pdf['contexto']
+
+    @staticmethod
+    def _nativo(datos):
+        """PdfNativo.renderizar o None si falló (mismo contrato que html_a_pdf)"""
+        try:
+            return PdfNativo.renderizar(datos)
+        except Exception:
+            logger.exception("Error generando el PDF con ReportLab")
+            return None
+
+    @classmethod
+    def estado_cuenta(cls, contexto):
+        """PDF del estado de cuenta del cliente (contexto de cliente_imprimir_final.html); None si falló"""
+        if cls.motor() == 'reportlab':
+            return cls._nativo(PdfNativo.datos_estado_cuenta(contexto))
+        return html_a_pdf(get_template('administrar/ctacte/cliente_imprimir_final.html').render(contexto))
+
+    # ----------------------------------------------------------------- Lote del período
+
+    @classmethod
+    def documentos_periodo(cls, desde, hasta, tipos=None):
+        """[(tipo, id)] de los comprobantes con fecha entre desde y hasta (inclusive)"""
+        inicio = timezone.make_aware(datetime.combine(desde, datetime.min.time()))
+        fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+        documentos = []
+        for tipo in tipos or cls.DOCUMENTOS:
+            ids = cls.modelo(tipo).objects.filter(fecha__gte=inicio, fecha__lt=fin).order_by('fecha', 'id')
+            documentos.extend((tipo, pk) for pk in ids.values_list('pk', flat=True))
+        return documentos
+
+    @classmethod
+    def lote_zip(cls, desde, hasta, tipos=None, procesos=None, destino=None):
+        """
+        Renderiza los comprobantes del período (usando el cache) y los guarda en 1 ZIP con una carpeta
+        por tipo. procesos > 1 reparte el render en un pool de procesos (spawn, cada uno con su conexión).
+        Retorna {'archivo', 'documentos', 'errores'}.
+        """
+        documentos = cls.documentos_periodo(desde, hasta, tipos)
+        if destino is None:
+            destino = os.path.join(settings.MEDIA_ROOT, 'pdf_lotes',
+                                   f"comprobantes_{desde:%Y%m%d}_{hasta:%Y%m%d}.zip")
+        os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+        procesos = procesos or os.cpu_count() or 1
+
+        pool = None
+        if procesos > 1 and len(documentos) > 1:
+            pool = ProcessPoolExecutor(max_workers=min(procesos, len(documentos)),
+                                       mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=inicializar_proceso_pdf)
+            resultados = pool.map(renderizar_para_lote, documentos, chunksize=4)
+        else:
+            resultados = map(renderizar_para_lote, documentos)
+
+        # Archivo temporal propio: 2 lotes del mismo período en paralelo no se pisan
+        descriptor, temporal = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(destino) or '.')
+        os.close(descriptor)
+        nombres, errores = set(), []
+        try:
+            # Los PDFs ya vienen comprimidos: ZIP_STORED evita recomprimir
+            with zipfile.ZipFile(temporal, 'w', zipfile.ZIP_STORED) as archivo:
+                for (tipo, documento_id), (nombre, contenido) in zip(documentos, resultados):
+                    if contenido is None:
+                        errores.append(f"{tipo} #{documento_id}")
+                        continue
+                    ruta = f"{cls.DOCUMENTOS[tipo][2]}/{nombre}"
+                    if ruta in nombres:
+                        ruta = ruta.replace('.pdf', f'_{documento_id}.pdf')
+                    nombres.add(ruta)
+                    archivo.writestr(ruta, contenido)
+            os.replace(temporal, destino)
+        except BaseException:
+            # Si falla el render o la escritura no queda el .tmp a medias en pdf_lotes
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return {'archivo': destino, 'documentos': len(nombres), 'errores': errores}
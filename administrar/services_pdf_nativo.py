@@ -0,0 +1,692 @@
+import logging
+import os
+import threading
+from functools import partial
+from io import BytesIO
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.template.defaultfilters import date as formato_fecha
+from django.utils import formats
+from reportlab.graphics.barcode.qr import QrCode
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from reportlab.platypus import BaseDocTemplate, Frame, KeepTogether, NextPageTemplate, PageTemplate, Paragraph, \
+    Spacer, Table, TableStyle
+
+logger = logging.getLogger(__name__)
+
+ANCHO, ALTO = A4
+MARGEN = 1 * cm
+ANCHO_UTIL = ANCHO - 2 * MARGEN
+ALTO_PIE = 20
+ALTO_CABECERA = 100     # Cabecera de los comprobantes (se repite en cada página)
+ALTO_CABECERA_CC = 45   # Cabecera del estado de cuenta (sólo en la primera página)
+ALTO_LOGO = 32
+
+GRIS_LINEA = colors.HexColor('#cccccc')
+GRIS_TEXTO = colors.HexColor('#777777')
+
+
+class RecursosPdf:
+    """
+    Recursos del motor ReportLab que se cargan 1 vez por proceso (worker web o del pool de lotes):
+    - Fuentes: las TTF de settings.PDF_FUENTES_TTF ("normal,negrita") se registran en la primera
+      generación; sin configurar se usan Helvetica / Helvetica-Bold, que no requieren archivos.
+    - Logo de la empresa: ImageReader decodificado una vez y reutilizado mientras no cambie el archivo.
+    """
+    _lock = threading.Lock()
+    _fuentes = None
+    _logo = (None, None)  # ((ruta, mtime), ImageReader)
+
+    @classmethod
+    def fuentes(cls):
+        """(fuente normal, fuente negrita)"""
+        if cls._fuentes is None:
+            with cls._lock:
+                if cls._fuentes is None:
+                    cls._fuentes = cls._registrar_fuentes()
+        return cls._fuentes
+
+    @staticmethod
+    def _registrar_fuentes():
+        rutas = [ruta.strip() for ruta in getattr(settings, 'PDF_FUENTES_TTF', '').split(',') if ruta.strip()]
+        if len(rutas) == 2:
+            try:
+                pdfmetrics.registerFont(TTFont('Documento', rutas[0]))
+                pdfmetrics.registerFont(TTFont('Documento-Bold', rutas[1]))
+                return 'Documento', 'Documento-Bold'
+            except Exception as e:
+                logger.warning("No se pudieron registrar las fuentes PDF %s: %s", rutas, e)
+        return 'Helvetica', 'Helvetica-Bold'
+
+    @classmethod
+    def logo(cls, ruta):
+        """ImageReader del logo o None si no hay archivo (o no es una imagen válida)"""
+        if not ruta:
+            return None
+        try:
+            clave = (ruta, os.path.getmtime(ruta))
+        except OSError:
+            return None
+        version, imagen = cls._logo
+        if version != clave:
+            try:
+                imagen = ImageReader(ruta)
+                imagen.getSize()  # Decodifica ahora y no en cada documento
+            except Exception as e:
+                logger.warning("Logo inválido para PDF %s: %s", ruta, e)
+                imagen = None
+            cls._logo = (clave, imagen)
+        return imagen
+
+
+def _importe(valor):
+    """Mismo formato que floatformat:2 en los templates"""
+    return formats.number_format(valor or 0, 2)
+
+
+def _fecha(valor):
+    return formato_fecha(valor, 'd/m/Y') if hasattr(valor, 'strftime') else str(valor or '')
+
+
+class _CanvasNumerado(canvas.Canvas):
+    """Canvas que dibuja el pie al final, cuando ya se conoce el total de páginas ("Página X de Y")"""
+
+    def __init__(self, *args, pie=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pie = pie
+        self._paginas = []
+
+    def showPage(self):
+        self._paginas.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        total = len(self._paginas)
+        for estado in self._paginas:
+            self.__dict__.update(estado)
+            self._pie(self, total)
+            super().showPage()
+        super().save()
+
+
+class _Qr(QrCode):
+    """
+    QR que se codifica 1 vez al dibujarse, directo en el canvas (QrCodeWidget lo codifica 2 veces y arma
+    1 shape por módulo) y con la máscara 0 fija: elegir la "mejor" prueba las 8 y era 2/3 del tiempo de
+    una factura; cualquier máscara es válida para los lectores.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.qr.make = self._codificar
+
+    def _codificar(self):
+        if self.qr.version is None:
+            self.qr.version = self.qr.calculate_version()
+        self.qr.makeImpl(False, 0)
+
+
+class PdfNativo:
+    """
+    Motor PDF directo con ReportLab (Platypus) para los comprobantes A4 (factura, NC, ND, remito) y el
+    estado de cuenta del cliente, sin pasar por HTML/CSS + xhtml2pdf. Reproduce el diseño de los templates
+    (factura_a_v4.html, nc_nd_pdf.html, rem_pdf.html, cliente_imprimir_final.html).
+    - datos() / datos_estado_cuenta() extraen un dict de textos ya formateados (serializable a JSON):
+      es lo que se dibuja y, para los comprobantes, la fuente de la clave de PdfCache.
+    - renderizar(datos) retorna los bytes del PDF. El QR de AFIP se dibuja localmente (sin pedirlo a un
+      servicio externo en cada render) y la salida es determinística (mismos datos, mismos bytes).
+    Subir VERSION al cambiar el diseño: cambia la clave y se descartan los PDFs cacheados.
+    """
+    VERSION = '1'
+
+    # Códigos AFIP por letra
+    CODIGOS = {
+        'factura': {'A': '001', 'B': '006', 'C': '011'},
+        'nc': {'A': '003', 'B': '008', 'C': '013'},
+        'nd': {'A': '002', 'B': '007', 'C': '012'},
+    }
+    URL_QR = 'https://www.afip.gob.ar/generico/formulario-8011/declaracion.asp?id={}'
+
+    # ----------------------------------------------------------------- Extracción de datos
+
+    @staticmethod
+    def _empresa(empresa):
+        campos = ('nombre', 'direccion', 'localidad', 'provincia', 'telefono', 'cuit', 'iibb', 'punto_venta')
+        datos = {campo: str(getattr(empresa, campo, '') or '') for campo in campos}
+        datos['condicion_fiscal'] = (empresa.get_condicion_fiscal_display()
+                                     if empresa is not None and empresa.condicion_fiscal
+                                     else 'IVA Responsable Inscripto')
+        datos['logo'], datos['logo_mtime'] = '', None
+        if empresa is not None and empresa.logo:
+            try:
+                datos['logo'] = empresa.logo.path
+                datos['logo_mtime'] = os.path.getmtime(datos['logo'])
+            except (NotImplementedError, ValueError, OSError):
+                pass
+        return datos
+
+    @classmethod
+    def datos(cls, tipo, documento, empresa):
+        """Datos de un comprobante de ComprobantePdf.DOCUMENTOS"""
+        if tipo == 'factura':
+            return cls._datos_factura(documento, empresa)
+        if tipo == 'remito':
+            return cls._datos_remito(documento, empresa)
+        return cls._datos_nota(tipo, documento, empresa)
+
+    @classmethod
+    def _datos_factura(cls, venta, empresa):
+        empresa = cls._empresa(empresa)
+        cliente = venta.cliente
+        letra = venta.tipo_comprobante or 'A'
+        totales = [('Importe Neto Gravado:', f'$ {_importe(venta.neto)}')]
+        if venta.tipo_comprobante == 'A':
+            totales.append(('IVA 21%:', f'$ {_importe(venta.iva_amount)}'))
+        totales.append(('Importe Total:', f'$ {_importe(venta.total)}'))
+        return {
+            'documento': 'comprobante',
+            'empresa': empresa,
+            'titulo': 'FACTURA',
+            'letra': letra,
+            'codigo': f"Cod. {cls.CODIGOS['factura'].get(letra, '011')}",
+            'color': '#333333',
+            'cabecera': [
+                ('Punto de Venta', empresa['punto_venta'] or '0001'),
+                ('Número', venta.numero_factura_formateado()),
+                ('Fecha de Emisión', _fecha(venta.fecha)),
+                ('CUIT', empresa['cuit'] or '30-00000000-0'),
+                ('Ingresos Brutos', empresa['iibb'] or '-'),
+            ],
+            'cliente': [
+                ('CUIL/CUIT', cliente.cuit or '-'),
+                ('Condición de IVA', cliente.get_condicion_fiscal_display() or 'Consumidor Final'),
+                ('Nombre/R.Soc', cliente.nombre),
+                ('Condición de Venta', venta.get_medio_pago_display() or venta.medio_pago),
+                ('Domicilio', cliente.domicilio or '-'),
+            ],
+            'leyenda': None,
+            'columnas': [('Código', 0.10, 'LEFT'), ('Producto / Servicio', 0.45, 'LEFT'), ('Cant.', 0.10, 'CENTER'),
+                         ('U.M.', 0.10, 'CENTER'), ('Precio Unit.', 0.12, 'RIGHT'), ('Subtotal', 0.13, 'RIGHT')],
+            'filas': [
+                [str(item.producto_id), item.producto.descripcion, _importe(item.cantidad), 'un',
+                 _importe(item.precio_unitario), _importe(item.subtotal)]
+                for item in venta.detalles.select_related('producto').order_by('id')
+            ],
+            'totales': totales,
+            'cae': f"CAE Nº: {venta.cae or '-'}",
+            'qr': cls.URL_QR.format(venta.pk),
+            'firmas': False,
+        }
+
+    @classmethod
+    def _datos_nota(cls, tipo, nota, empresa):
+        empresa = cls._empresa(empresa)
+        cliente = nota.cliente
+        letra = (nota.tipo_comprobante or 'A')[-1]
+        cabecera = [('N°', nota.numero_formateado()), ('Fecha', _fecha(nota.fecha))]
+        if nota.venta_asociada_id:
+            cabecera.append(('Factura Ref', nota.venta_asociada.numero_factura_formateado()))
+        cabecera.append(('CUIT', empresa['cuit'] or '-'))
+        return {
+            'documento': 'comprobante',
+            'empresa': empresa,
+            'titulo': 'NOTA DE CRÉDITO' if tipo == 'nc' else 'NOTA DE DÉBITO',
+            'letra': letra,
+            'codigo': f"Cod. {cls.CODIGOS[tipo].get(letra, '')}",
+            'color': '#6a1b9a',
+            'cabecera': cabecera,
+            'cliente': [
+                ('Cliente', cliente.nombre),
+                ('Cond. IVA', cliente.get_condicion_fiscal_display() or 'Consumidor Final'),
+                ('CUIT', cliente.cuit or '-'),
+            ],
+            'leyenda': ('MOTIVO', nota.motivo or 'Ajuste de facturación'),
+            'columnas': [('Cod.', 0.15, 'LEFT'), ('Concepto', 0.65, 'LEFT'), ('Total', 0.20, 'RIGHT')],
+            'filas': [
+                [str(item.producto_id), item.producto.descripcion, f'$ {_importe(item.subtotal)}']
+                for item in nota.detalles.select_related('producto').order_by('id')
+            ],
+            'totales': [('TOTAL:', f'$ {_importe(nota.total)}')],
+            'cae': f"CAE N°: {nota.cae or '-'}",
+            'qr': None,
+            'firmas': False,
+        }
+
+    @classmethod
+    def _datos_remito(cls, remito, empresa):
+        empresa = cls._empresa(empresa)
+        cliente = remito.cliente
+        cabecera = [('N°', remito.numero_formateado()), ('Fecha', _fecha(remito.fecha))]
+        if remito.venta_asociada_id:
+            cabecera.append(('Venta Ref', remito.venta_asociada.numero_factura_formateado()))
+        return {
+            'documento': 'comprobante',
+            'empresa': empresa,
+            'titulo': 'REMITO',
+            'letra': 'R',
+            'codigo': 'REMITO',
+            'color': '#455a64',
+            'cabecera': cabecera,
+            'cliente': [
+                ('Destinatario', cliente.nombre),
+                ('CUIT', cliente.cuit or '-'),
+                ('Dirección Entrega', remito.direccion_entrega or cliente.domicilio or '-'),
+                ('Localidad', cliente.localidad.nombre if cliente.localidad_id else '-'),
+            ],
+            'leyenda': ('OBSERVACIONES', remito.observaciones) if remito.observaciones else None,
+            'columnas': [('Cod.', 0.20, 'LEFT'), ('Descripción de Mercadería', 0.60, 'LEFT'),
+                         ('Cantidad', 0.20, 'CENTER')],
+            'filas': [
+                [str(item.producto_id), item.producto.descripcion, _importe(item.cantidad)]
+                for item in remito.detalles.select_related('producto').order_by('id')
+            ],
+            'totales': [],
+            'cae': None,
+            'qr': None,
+            'firmas': True,
+        }
+
+    @classmethod
+    def datos_estado_cuenta(cls, contexto):
+        """Datos del estado de cuenta a partir del contexto de cliente_imprimir_final.html"""
+        cliente = contexto['cliente']
+        movimientos = []
+        for mov in contexto['movimientos']:
+            descripcion = mov['descripcion'] or ''
+            if len(descripcion) > 50:
+                descripcion = descripcion[:49] + '…'
+            movimientos.append([
+                _fecha(mov['fecha']), mov['tipo'], descripcion,
+                _importe(mov['debe']) if (mov['debe'] or 0) > 0 else '-',
+                _importe(mov['haber']) if (mov['haber'] or 0) > 0 else '-',
+                _importe(mov['saldo']),
+            ])
+        return {
+            'documento': 'estado_cuenta',
+            'empresa': cls._empresa(contexto['empresa']),
+            'titulo': 'ESTADO DE CUENTA',
+            'fecha_impresion': contexto['fecha_impresion'],
+            'cliente': {
+                'nombre': cliente.nombre,
+                'cuit': cliente.cuit or '--',
+                'telefono': cliente.telefono or '--',
+                'direccion': cliente.domicilio or 'No registrada',
+            },
+            'saldo': float(contexto['saldo_actual'] or 0),
+            'movimientos': movimientos,
+        }
+
+    # ----------------------------------------------------------------- Render
+
+    @staticmethod
+    def _marco(arriba):
+        return Frame(MARGEN, MARGEN + ALTO_PIE, ANCHO_UTIL, ALTO - 2 * MARGEN - ALTO_PIE - arriba,
+                     leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+
+    @classmethod
+    def renderizar(cls, datos):
+        """Bytes del PDF de datos() o datos_estado_cuenta()"""
+        fuentes = RecursosPdf.fuentes()
+        if datos['documento'] == 'estado_cuenta':
+            # La cabecera va sólo en la primera página: en las siguientes el marco ocupa toda la hoja
+            arriba = ALTO_CABECERA_CC + (ALTO_LOGO + 4 if RecursosPdf.logo(datos['empresa']['logo']) else 0)
+            plantillas = [
+                PageTemplate('primera', [cls._marco(arriba)],
+                             onPage=partial(cls._cabecera_estado_cuenta, datos=datos, fuentes=fuentes)),
+                PageTemplate('siguientes', [cls._marco(0)]),
+            ]
+            elementos = [NextPageTemplate('siguientes')] + cls._historia_estado_cuenta(datos, fuentes)
+            pie = cls._pie_estado_cuenta
+        else:
+            plantillas = [PageTemplate('comprobante', [cls._marco(ALTO_CABECERA)],
+                                       onPage=partial(cls._cabecera_comprobante, datos=datos, fuentes=fuentes))]
+            elementos = cls._historia_comprobante(datos, fuentes)
+            pie = cls._pie_comprobante
+
+        salida = BytesIO()
+        documento = BaseDocTemplate(
+            salida, pagesize=A4, leftMargin=MARGEN, rightMargin=MARGEN, topMargin=MARGEN, bottomMargin=MARGEN,
+            title=datos['titulo'], author=datos['empresa']['nombre'], invariant=1,
+        )
+        documento.addPageTemplates(plantillas)
+        documento.build(elementos, canvasmaker=partial(_CanvasNumerado, pie=partial(pie, fuentes=fuentes)))
+        return salida.getvalue()
+
+    @staticmethod
+    def _recortar(texto, fuente, tamanio, ancho):
+        if pdfmetrics.stringWidth(texto, fuente, tamanio) <= ancho:
+            return texto
+        while texto and pdfmetrics.stringWidth(texto + '…', fuente, tamanio) > ancho:
+            texto = texto[:-1]
+        return texto + '…'
+
+    @classmethod
+    def _linea(cls, c, x, y, etiqueta, valor, fuentes, tamanio=8.5, derecha=False, ancho=None):
+        """'Etiqueta: valor' con la etiqueta en negrita, alineado desde x (o hasta x si derecha)"""
+        normal, negrita = fuentes
+        etiqueta = f'{etiqueta}: ' if etiqueta else ''
+        ancho_etiqueta = pdfmetrics.stringWidth(etiqueta, negrita, tamanio)
+        if ancho:
+            valor = cls._recortar(valor, normal, tamanio, ancho - ancho_etiqueta)
+        if derecha:
+            x -= ancho_etiqueta + pdfmetrics.stringWidth(valor, normal, tamanio)
+        c.setFont(negrita, tamanio)
+        c.drawString(x, y, etiqueta)
+        c.setFont(normal, tamanio)
+        c.drawString(x + ancho_etiqueta, y, valor)
+
+    @classmethod
+    def _cabecera_comprobante(cls, c, documento, datos, fuentes):
+        normal, negrita = fuentes
+        empresa = datos['empresa']
+        color = colors.HexColor(datos['color'])
+        arriba = ALTO - MARGEN
+        ancho_bloque = ANCHO_UTIL * 0.42
+        c.saveState()
+
+        # Emisor
+        c.setFillColor(color)
+        c.setFont(negrita, 14)
+        c.drawString(MARGEN, arriba - 14, cls._recortar(empresa['nombre'].upper(), negrita, 14, ancho_bloque))
+        c.setFillColor(colors.black)
+        lineas = [('Razón Social', empresa['nombre']), ('', empresa['direccion'])]
+        if empresa['localidad'] or empresa['provincia']:
+            lineas.append(('', ', '.join(filter(None, (empresa['localidad'], empresa['provincia'])))))
+        lineas.append(('', empresa['condicion_fiscal']))
+        if datos['letra'] == 'R' and empresa['telefono']:
+            lineas.append(('Tel', empresa['telefono']))
+        for i, (etiqueta, valor) in enumerate(lineas):
+            cls._linea(c, MARGEN, arriba - 30 - i * 11, etiqueta, valor, fuentes, ancho=ancho_bloque)
+
+        # Recuadro con la letra
+        lado = 52
+        x = (ANCHO - lado) / 2
+        c.setStrokeColor(color)
+        c.setLineWidth(2)
+        c.rect(x, arriba - lado, lado, lado)
+        c.setFillColor(color)
+        c.setFont(negrita, 28)
+        c.drawCentredString(ANCHO / 2, arriba - 32, datos['letra'])
+        c.setFont(normal, 6.5)
+        c.drawCentredString(ANCHO / 2, arriba - 45, datos['codigo'])
+
+        # Datos del comprobante
+        derecha = ANCHO - MARGEN
+        c.setFillColor(colors.black)
+        c.setFont(negrita, 15)
+        c.drawRightString(derecha, arriba - 14, datos['titulo'])
+        for i, (etiqueta, valor) in enumerate(datos['cabecera']):
+            cls._linea(c, derecha, arriba - 30 - i * 11, etiqueta, valor, fuentes, derecha=True, ancho=ancho_bloque)
+
+        c.setStrokeColor(colors.black)
+        c.setLineWidth(1)
+        c.line(MARGEN, arriba - ALTO_CABECERA + 12, derecha, arriba - ALTO_CABECERA + 12)
+        c.restoreState()
+
+    @staticmethod
+    def _pie_comprobante(c, total, fuentes):
+        c.saveState()
+        c.setFont(fuentes[0], 8)
+        c.setFillColor(GRIS_TEXTO)
+        c.drawCentredString(ANCHO / 2, MARGEN, f"Sistema de Gestión CARsoft - Página {c.getPageNumber()} de {total}")
+        c.restoreState()
+
+    @staticmethod
+    def _estilo(fuentes, tamanio=8.5, negrita=False, **kwargs):
+        return ParagraphStyle('pdf', fontName=fuentes[1] if negrita else fuentes[0], fontSize=tamanio,
+                              leading=tamanio * 1.2, **kwargs)
+
+    @classmethod
+    def _celda(cls, texto, ancho, fuentes, estilo):
+        """Texto plano si entra en la columna (mucho más rápido); Paragraph con ajuste de línea si no"""
+        if pdfmetrics.stringWidth(texto, estilo.fontName, estilo.fontSize) <= ancho - 8:
+            return texto
+        return Paragraph(escape(texto), estilo)
+
+    @classmethod
+    def _historia_comprobante(cls, datos, fuentes):
+        normal, negrita = fuentes
+        color = colors.HexColor(datos['color'])
+        estilo = cls._estilo(fuentes)
+        historia = []
+
+        # Receptor: 2 pares etiqueta/valor por fila
+        anchos = [ANCHO_UTIL * f for f in (0.17, 0.33, 0.20, 0.30)]
+        pares = datos['cliente']
+        filas = []
+        for i in range(0, len(pares), 2):
+            fila = []
+            for j, (etiqueta, valor) in enumerate(pares[i:i + 2]):
+                fila += [f'{etiqueta}:', cls._celda(valor, anchos[j * 2 + 1], fuentes, estilo)]
+            filas.append(fila + [''] * (4 - len(fila)))
+        estilos = [
+            ('BOX', (0, 0), (-1, -1), 0.5, GRIS_LINEA),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9f9f9')),
+            ('FONT', (0, 0), (-1, -1), normal, 8.5),
+            ('FONT', (0, 0), (0, -1), negrita, 8.5),
+            ('FONT', (2, 0), (2, -1), negrita, 8.5),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ]
+        if len(pares) % 2:
+            estilos.append(('SPAN', (1, len(filas) - 1), (3, len(filas) - 1)))
+        historia += [Table(filas, colWidths=anchos, style=TableStyle(estilos)), Spacer(1, 10)]
+
+        if datos['leyenda']:
+            etiqueta, texto = datos['leyenda']
+            leyenda = Paragraph(f'<b>{etiqueta}:</b> {escape(texto)}', estilo)
+            historia += [Table([[leyenda]], colWidths=[ANCHO_UTIL], style=TableStyle([
+                ('LINEBEFORE', (0, 0), (0, 0), 3, color),
+                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fcfcfc')),
+            ])), Spacer(1, 10)]
+
+        # Ítems
+        anchos = [ANCHO_UTIL * fraccion for _, fraccion, _ in datos['columnas']]
+        filas = [[titulo for titulo, _, _ in datos['columnas']]]
+        for fila in datos['filas']:
+            filas.append([cls._celda(valor, anchos[i], fuentes, estilo) for i, valor in enumerate(fila)])
+        estilos = [
+            ('FONT', (0, 0), (-1, -1), normal, 8.5),
+            ('FONT', (0, 0), (-1, 0), negrita, 8.5),
+            ('BACKGROUND', (0, 0), (-1, 0), color),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('LINEBELOW', (0, 1), (-1, -1), 0.5, colors.HexColor('#eeeeee')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]
+        estilos += [('ALIGN', (i, 0), (i, -1), alineacion)
+                    for i, (_, _, alineacion) in enumerate(datos['columnas']) if alineacion != 'LEFT']
+        historia += [Table(filas, colWidths=anchos, repeatRows=1, style=TableStyle(estilos)), Spacer(1, 15)]
+
+        # Totales, CAE y QR
+        if datos['totales']:
+            totales = Table(datos['totales'], colWidths=[ANCHO_UTIL * 0.22, ANCHO_UTIL * 0.18], style=TableStyle([
+                ('FONT', (0, 0), (0, -1), negrita, 9),
+                ('FONT', (1, 0), (1, -1), normal, 9),
+                ('FONT', (0, -1), (-1, -1), negrita, 11),
+                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+                ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+            ]))
+            izquierda = []
+            if datos['qr']:
+                izquierda.append([cls._qr(datos['qr'], 70)])
+            if datos['cae']:
+                izquierda.append([datos['cae']])
+            izquierda = Table(izquierda or [['']], style=TableStyle([
+                ('FONT', (0, 0), (-1, -1), negrita, 9),
+                ('TEXTCOLOR', (0, 0), (-1, -1), color),
+                ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ]))
+            historia.append(KeepTogether(Table([[izquierda, totales]], colWidths=[ANCHO_UTIL * 0.6, ANCHO_UTIL * 0.4],
+                                               style=TableStyle([('VALIGN', (0, 0), (-1, -1), 'BOTTOM')]))))
+
+        if datos['firmas']:
+            firmas = Table([['Firma y Aclaración Receptor', '', 'DNI / Documento']],
+                           colWidths=[ANCHO_UTIL * 0.45, ANCHO_UTIL * 0.10, ANCHO_UTIL * 0.45],
+                           style=TableStyle([
+                               ('FONT', (0, 0), (-1, -1), normal, 9),
+                               ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                               ('LINEABOVE', (0, 0), (0, 0), 1, colors.HexColor('#333333')),
+                               ('LINEABOVE', (2, 0), (2, 0), 1, colors.HexColor('#333333')),
+                           ]))
+            conformidad = Paragraph('MERCADERÍA RECIBIDA EN CONFORMIDAD',
+                                    cls._estilo(fuentes, 9, alignment=1, textColor=colors.HexColor('#666666')))
+            historia.append(KeepTogether([Spacer(1, 50), firmas, Spacer(1, 25), conformidad]))
+        return historia
+
+    @staticmethod
+    def _qr(contenido, lado):
+        return _Qr(contenido, width=lado, height=lado, qrBorder=0)
+
+    # ----------------------------------------------------------------- Estado de cuenta
+
+    @classmethod
+    def _cabecera_estado_cuenta(cls, c, documento, datos, fuentes):
+        normal, negrita = fuentes
+        empresa = datos['empresa']
+        arriba = ALTO - MARGEN
+        c.saveState()
+        y = arriba
+        logo = RecursosPdf.logo(empresa['logo'])
+        if logo is not None:
+            ancho, alto = logo.getSize()
+            c.drawImage(logo, MARGEN, arriba - ALTO_LOGO, width=ALTO_LOGO * ancho / alto, height=ALTO_LOGO,
+                        mask='auto')
+            y -= ALTO_LOGO + 4
+        c.setFillColor(colors.HexColor('#1e293b'))
+        c.setFont(negrita, 14)
+        c.drawString(MARGEN, y - 14, cls._recortar(empresa['nombre'] or 'NOMBRE EMPRESA', negrita, 14,
+                                                   ANCHO_UTIL * 0.6))
+        c.setFillColor(colors.HexColor('#64748b'))
+        c.setFont(normal, 7.5)
+        contacto = empresa['direccion'] or 'Dirección'
+        if empresa['telefono']:
+            contacto += f" | Tel: {empresa['telefono']}"
+        c.drawString(MARGEN, y - 25, cls._recortar(contacto, normal, 7.5, ANCHO_UTIL * 0.6))
+
+        derecha = ANCHO - MARGEN
+        c.setFillColor(colors.HexColor('#2563eb'))
+        c.setFont(negrita, 15)
+        c.drawRightString(derecha, arriba - 14, datos['titulo'])
+        c.setFillColor(colors.HexColor('#64748b'))
+        c.setFont(normal, 7.5)
+        c.drawRightString(derecha, arriba - 26, f"EMISIÓN: {datos['fecha_impresion']}")
+
+        c.setStrokeColor(colors.HexColor('#1e293b'))
+        c.setLineWidth(2)
+        c.line(MARGEN, y - 33, derecha, y - 33)
+        c.restoreState()
+
+    @staticmethod
+    def _pie_estado_cuenta(c, total, fuentes):
+        c.saveState()
+        c.setStrokeColor(GRIS_LINEA)
+        c.setLineWidth(0.5)
+        c.line(MARGEN, MARGEN + 10, ANCHO - MARGEN, MARGEN + 10)
+        c.setFont(fuentes[0], 7.5)
+        c.setFillColor(colors.HexColor('#94a3b8'))
+        c.drawString(MARGEN, MARGEN, 'Comprobante no fiscal.')
+        c.drawRightString(ANCHO - MARGEN, MARGEN, f'Pág. {c.getPageNumber()} / {total}')
+        c.restoreState()
+
+    @classmethod
+    def _historia_estado_cuenta(cls, datos, fuentes):
+        normal, negrita = fuentes
+        gris, oscuro = colors.HexColor('#94a3b8'), colors.HexColor('#0f172a')
+        cliente = datos['cliente']
+        saldo = datos['saldo']
+        if saldo > 0:
+            color_saldo, estado = colors.HexColor('#dc2626'), 'DEUDA'
+        elif saldo < 0:
+            color_saldo, estado = colors.HexColor('#16a34a'), 'A FAVOR'
+        else:
+            color_saldo, estado = colors.HexColor('#1e293b'), 'AL DÍA'
+        saldo_texto = f'$ {_importe(saldo)}'
+
+        # Cliente y tarjeta de saldo
+        ancho_cliente = ANCHO_UTIL * 0.6 - 10
+        datos_cliente = Table(
+            [['CLIENTE:', ''],
+             [cls._recortar(cliente['nombre'], negrita, 13, ancho_cliente), ''],
+             ['CUIT:', cliente['cuit']],
+             ['TEL:', cliente['telefono']],
+             ['DIR:', cls._recortar(cliente['direccion'], normal, 8.5, ancho_cliente * 0.8)]],
+            colWidths=[ancho_cliente * 0.2, ancho_cliente * 0.8],
+            style=TableStyle([
+                ('FONT', (0, 0), (-1, -1), normal, 8.5),
+                ('FONT', (0, 0), (0, -1), negrita, 7.5),
+                ('TEXTCOLOR', (0, 0), (0, -1), gris),
+                ('SPAN', (0, 0), (1, 0)),
+                ('SPAN', (0, 1), (1, 1)),
+                ('FONT', (0, 1), (0, 1), negrita, 13),
+                ('TEXTCOLOR', (0, 1), (0, 1), oscuro),
+                ('BOTTOMPADDING', (0, 1), (-1, 1), 8),
+                ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ]))
+        tarjeta = Table([['SALDO ACTUAL'], [saldo_texto], [estado]], colWidths=[ANCHO_UTIL * 0.4], style=TableStyle([
+            ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.HexColor('#e2e8f0')),
+            ('LINEABOVE', (0, 2), (-1, 2), 0.5, colors.HexColor('#e2e8f0')),
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONT', (0, 0), (-1, 0), negrita, 7),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#64748b')),
+            ('FONT', (0, 1), (-1, 1), negrita, 20),
+            ('LEADING', (0, 1), (-1, 1), 24),
+            ('TOPPADDING', (0, 1), (-1, 1), 8),
+            ('BOTTOMPADDING', (0, 1), (-1, 1), 8),
+            ('TEXTCOLOR', (0, 1), (-1, 2), color_saldo),
+            ('FONT', (0, 2), (-1, 2), negrita, 8.5),
+        ]))
+        historia = [Table([[datos_cliente, tarjeta]], colWidths=[ANCHO_UTIL * 0.6, ANCHO_UTIL * 0.4],
+                          style=TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                                            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+                                            ('RIGHTPADDING', (0, 0), (-1, -1), 0)])),
+                    Spacer(1, 15)]
+
+        # Movimientos
+        anchos = [ANCHO_UTIL * f for f in (0.12, 0.12, 0.36, 0.13, 0.13, 0.14)]
+        filas = [['FECHA', 'TIPO', 'DESCRIPCIÓN', 'DEBE', 'HABER', 'SALDO']]
+        estilos = [
+            ('FONT', (0, 0), (-1, -1), normal, 8.5),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#334155')),
+            ('FONT', (0, 0), (-1, 0), negrita, 7.5),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e293b')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+            ('FONT', (5, 1), (5, -1), negrita, 8.5),
+            ('FONT', (1, 1), (1, -1), negrita, 7),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
+            ('LINEBELOW', (0, 1), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+            ('TOPPADDING', (0, 0), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ]
+        etiquetas = {'VENTA': 'FACTURA', 'NOTA_DEBITO': 'ND', 'NOTA_CREDITO': 'NC'}
+        for i, (fecha, tipo, descripcion, debe, haber, saldo_fila) in enumerate(datos['movimientos'], start=1):
+            filas.append([fecha, etiquetas.get(tipo, 'PAGO'), descripcion, debe, haber, saldo_fila])
+            color = '#991b1b' if tipo in ('VENTA', 'NOTA_DEBITO') else '#166534'
+            estilos.append(('TEXTCOLOR', (1, i), (1, i), colors.HexColor(color)))
+        if not datos['movimientos']:
+            filas.append(['Sin movimientos.', '', '', '', '', ''])
+            estilos += [('SPAN', (0, 1), (-1, 1)), ('ALIGN', (0, 1), (-1, 1), 'CENTER'),
+                        ('TOPPADDING', (0, 1), (-1, 1), 20), ('BOTTOMPADDING', (0, 1), (-1, 1), 20)]
+        historia += [Table(filas, colWidths=anchos, repeatRows=1, style=TableStyle(estilos)), Spacer(1, 20)]
+
+        total = Table([['TOTAL SALDO:', saldo_texto]], colWidths=[ANCHO_UTIL * 0.2, ANCHO_UTIL * 0.2],
+                      hAlign='RIGHT', style=TableStyle([
+                          ('LINEABOVE', (0, 0), (-1, 0), 2, colors.HexColor('#1e293b')),
+                          ('FONT', (0, 0), (0, 0), negrita, 10),
+                          ('FONT', (1, 0), (1, 0), negrita, 13),
+                          ('TEXTCOLOR', (1, 0), (1, 0), colors.HexColor('#2563eb')),
+                          ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+                          ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                          ('TOPPADDING', (0, 0), (-1, -1), 8),
+                      ]))
+        historia.append(KeepTogether(total))
+        return historia
@@ -0,0 +1,55 @@
+from .models import PerfilUsuario
+from .utils_cache import CacheVersionado
+
+
+class PermisosUsuario:
+    """
+    Permisos de acceso por módulo (campos acceso_* de PerfilUsuario) como máscara de bits por usuario.
+    - obtener() lee la máscara del cache del proceso; si no está, 1 consulta de los campos acceso_*.
+    - Se invalida con post_save/post_delete de PerfilUsuario (signals.py) cambiando la versión del
+      espacio 'permisos' (CacheVersionado, verificada 1 vez por request): un permiso revocado deja de
+      valer en todos los workers en el próximo request. TTL_SEGUNDOS es sólo un resguardo.
+    - Los usuarios staff tienen todos los permisos (no se consulta el perfil).
+    - 'auditoria' (acceso_auditoria): antes de esta clase verificar_permiso no lo conocía y se lo negaba
+      a todo usuario no staff (sólo lo respetaba el filtro has_perm de los templates). Ahora lo concede a
+      quien tenga el acceso marcado; hoy ninguna vista usa verificar_permiso('auditoria').
+    """
+    ESPACIO = CacheVersionado.registrar('permisos')
+    TTL_SEGUNDOS = 300
+
+    # El orden define el bit de cada permiso: agregar nuevos al final
+    PERMISOS = (
+        'ventas', 'compras', 'productos', 'clientes', 'proveedores', 'caja', 'contabilidad',
+        'configuracion', 'usuarios', 'reportes', 'pedidos', 'bancos', 'ctacte', 'remitos', 'auditoria',
+    )
+    BITS = {permiso: 1 << i for i, permiso in enumerate(PERMISOS)}
+    CAMPOS = tuple(f'acceso_{permiso}' for permiso in PERMISOS)
+
+    @classmethod
+    def mascara(cls, valores):
+        """Máscara a partir de un PerfilUsuario o de un dict {campo: bool}"""
+        if isinstance(valores, PerfilUsuario):
+            valores = {campo: getattr(valores, campo) for campo in cls.CAMPOS}
+        return sum(bit for permiso, bit in cls.BITS.items() if valores.get(f'acceso_{permiso}'))
+
+    @classmethod
+    def obtener(cls, user):
+        """Máscara de permisos del usuario (0 si no tiene perfil)"""
+        def calcular():
+            valores = PerfilUsuario.objects.filter(user_id=user.pk).values(*cls.CAMPOS).first()
+            return cls.mascara(valores) if valores else 0
+        return CacheVersionado.obtener(cls.ESPACIO, user.pk, calcular, cls.TTL_SEGUNDOS)
+
+    @classmethod
+    def tiene(cls, user, permiso):
+        if not user.is_authenticated:
+            return False
+        if user.is_staff:
+            return True
+        bit = cls.BITS.get(permiso)
+        return bool(bit and cls.obtener(user) & bit)
+
+    @classmethod
+    def invalidar(cls, user_id=None):
+        """Cambia la versión de todas las máscaras: se recargan a medida que cada usuario vuelve a entrar"""
+        CacheVersionado.invalidar(cls.ESPACIO)
@@ -0,0 +1,57 @@
+from django.db.models import Case, When, Value, F, Q, Sum, Count, CharField
+from django.utils import timezone
+from .models import Presupuesto
+
+
+class PresupuestoService:
+    """
+    Estado "real" de los presupuestos: un PENDIENTE con fecha_vencimiento anterior a hoy está VENCIDO.
+    - El estado se calcula en la base (anotación estado_real) y los filtros por estado se traducen a
+      condiciones sobre (estado, fecha_vencimiento), que resuelve el índice compuesto.
+    - KPIs en 1 aggregate y paginación en SQL: el listado no depende de la cantidad de presupuestos.
+    - vencer() persiste la transición PENDIENTE -> VENCIDO en 1 UPDATE (comando nocturno vencer_presupuestos).
+    """
+
+    @staticmethod
+    def estado_real(hoy=None):
+        hoy = hoy or timezone.localdate()
+        return Case(
+            When(estado='PENDIENTE', fecha_vencimiento__lt=hoy, then=Value('VENCIDO')),
+            default=F('estado'),
+            output_field=CharField(),
+        )
+
+    @staticmethod
+    def filtro_estado(estado, hoy=None):
+        hoy = hoy or timezone.localdate()
+        if estado == 'VENCIDO':
+            return Q(estado='VENCIDO') | Q(estado='PENDIENTE', fecha_vencimiento__lt=hoy)
+        if estado == 'PENDIENTE':
+            return Q(estado='PENDIENTE', fecha_vencimiento__gte=hoy)
+        return Q(estado=estado)
+
+    @classmethod
+    def estado_de(cls, presupuesto, hoy=None):
+        """Estado real de una instancia ya cargada (sin consultar)"""
+        hoy = hoy or timezone.localdate()
+        if presupuesto.estado == 'PENDIENTE' and presupuesto.fecha_vencimiento and presupuesto.fecha_vencimiento < hoy:
+            return 'VENCIDO'
+        return presupuesto.estado
+
+    @classmethod
+    def kpis(cls, presupuestos, hoy=None):
+        """Monto total, cantidad, pendientes y aprobados del conjunto filtrado en 1 aggregate"""
+        totales = presupuestos.order_by().aggregate(
+            total_monto=Sum('total'),
+            count=Count('id'),
+            pendientes=Count('id', filter=cls.filtro_estado('PENDIENTE', hoy)),
+            aprobados=Count('id', filter=Q(estado='APROBADO')),
+        )
+        totales['total_monto'] = float(totales['total_monto'] or 0)
+        return totales
+
+    @staticmethod
+    def vencer(hoy=None):
+        """Pasa a VENCIDO los PENDIENTE con vencimiento anterior a hoy; retorna la cantidad"""
+        hoy = hoy or timezone.localdate()
+        return Presupuesto.objects.filter(estado='PENDIENTE', fecha_vencimiento__lt=hoy).update(estado='VENCIDO')
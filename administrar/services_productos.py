@@ -0,0 +1,303 @@
+import json
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from decimal import Decimal, InvalidOperation
+from django.db import transaction, connections
+from django.db.models import F, Value, Case, When, IntegerField, DecimalField, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.utils import timezone
+from .models import Producto, ActualizacionPrecios, HistorialPrecio
+from .utils_cache import CacheVersionado
+
+
+class PrecioService:
+    """
+    Motor de actualización masiva de precios basado en operaciones de conjunto.
+    - previsualizar(): cantidad afectada + muestra con valores actuales y nuevos calculados en la base.
+    - aplicar(): guarda los precios anteriores en HistorialPrecio (bulk_create) y aplica el cambio
+      con 1 UPDATE usando expresiones F(), sin cargar ni guardar producto por producto.
+    - revertir(): restaura los precios anteriores de una actualización con 1 UPDATE.
+    """
+
+    CAMPOS = ('costo', 'precio_efectivo', 'precio_tarjeta', 'precio_ctacte', 'precio_lista4')
+    TIPOS = ('MONTO', 'PORCENTAJE')
+    DECIMAL = DecimalField(max_digits=10, decimal_places=2)
+
+    @classmethod
+    def validar(cls, tipo_actualizacion, valor, campos):
+        """Retorna el valor como Decimal. ValueError con mensaje para el usuario si algo es inválido"""
+        if tipo_actualizacion not in cls.TIPOS:
+            raise ValueError("Tipo de actualización inválido")
+        if not campos:
+            raise ValueError("Debe seleccionar al menos un campo para actualizar")
+        invalidos = [c for c in campos if c not in cls.CAMPOS]
+        if invalidos:
+            raise ValueError(f"Campos no actualizables: {', '.join(invalidos)}")
+        try:
+            return Decimal(str(valor))
+        except (InvalidOperation, ValueError):
+            raise ValueError("Valor inválido")
+
+    @staticmethod
+    def filtrar(productos_ids=None, rubros_ids=None, marcas_ids=None):
+        """Productos específicos si se indican; si no, filtro por rubro/marca (todos si no hay filtros)"""
+        productos = Producto.objects.all()
+        if productos_ids:
+            return productos.filter(id__in=productos_ids)
+        if rubros_ids:
+            productos = productos.filter(rubro_id__in=rubros_ids)
+        if marcas_ids:
+            productos = productos.filter(marca_id__in=marcas_ids)
+        return productos
+
+    @classmethod
+    def expresion(cls, campo, tipo_actualizacion, valor):
+        """Nuevo valor del campo como expresión SQL: redondeado a 2 decimales y nunca negativo"""
+        actual = Coalesce(F(campo), Value(Decimal('0')), output_field=cls.DECIMAL)
+        if tipo_actualizacion == 'MONTO':
+            nuevo = actual + Value(valor, output_field=cls.DECIMAL)
+        else:
+            factor = Value(1 + valor / 100, output_field=DecimalField(max_digits=12, decimal_places=6))
+            nuevo = actual * factor
+        return Greatest(
+            Round(nuevo, 2, output_field=cls.DECIMAL), Value(Decimal('0')), output_field=cls.DECIMAL
+        )
+
+    @classmethod
+    def previsualizar(cls, productos, campos, tipo_actualizacion, valor, muestra=20):
+        """Dry-run: {'cantidad', 'muestra': [{id, codigo, descripcion, cambios: {campo: {anterior, nuevo}}}]}"""
+        anotaciones = {f'nuevo_{campo}': cls.expresion(campo, tipo_actualizacion, valor) for campo in campos}
+        filas = (
+            productos.order_by('descripcion', 'id')
+            .annotate(**anotaciones)
+            .values('id', 'codigo', 'descripcion', *campos, *anotaciones)[:muestra]
+        )
+        return {
+            'cantidad': productos.count(),
+            'muestra': [{
+                'id': fila['id'],
+                'codigo': fila['codigo'],
+                'descripcion': fila['descripcion'],
+                'cambios': {
+                    campo: {
+                        'anterior': float(fila[campo]) if fila[campo] is not None else None,
+                        'nuevo': float(fila[f'nuevo_{campo}']),
+                    }
+                    for campo in campos
+                },
+            } for fila in filas],
+        }
+
+    @classmethod
+    @transaction.atomic
+    def aplicar(cls, productos, campos, tipo_actualizacion, valor, usuario=None, filtros=None, batch_size=2000):
+        """Registra el historial y actualiza los precios. Retorna la ActualizacionPrecios creada"""
+        actualizacion = ActualizacionPrecios.objects.create(
+            usuario=usuario if usuario and usuario.is_authenticated else None,
+            tipo_actualizacion=tipo_actualizacion,
+            valor=valor,
+            campos=list(campos),
+            filtros=filtros or {},
+        )
+
+        # Precios anteriores: se bloquean las filas para que no cambien entre la lectura y el UPDATE
+        anteriores = productos.select_for_update().order_by().values_list('id', *campos)
+        historial = [
+            HistorialPrecio(actualizacion=actualizacion, producto_id=fila[0], **dict(zip(campos, fila[1:])))
+            for fila in anteriores
+        ]
+        HistorialPrecio.objects.bulk_create(historial, batch_size=batch_size)
+
+        Producto.objects.filter(historial_precios__actualizacion=actualizacion).update(
+            fecha_actualizacion=timezone.now(),
+            **{campo: cls.expresion(campo, tipo_actualizacion, valor) for campo in campos}
+        )
+
+        actualizacion.cantidad = len(historial)
+        actualizacion.save(update_fields=['cantidad'])
+        return actualizacion
+
+    @classmethod
+    @transaction.atomic
+    def revertir(cls, actualizacion_id):
+        """
+        Restaura los valores anteriores de los campos modificados (1 UPDATE con subconsultas).
+        Pisa cualquier cambio posterior de esos campos en los productos afectados.
+        """
+        actualizacion = ActualizacionPrecios.objects.select_for_update().get(pk=actualizacion_id)
+        if actualizacion.revertida:
+            raise ValueError("La actualización ya fue revertida")
+
+        historial = HistorialPrecio.objects.filter(actualizacion=actualizacion, producto=OuterRef('pk'))
+        restaurados = Producto.objects.filter(historial_precios__actualizacion=actualizacion).update(
+            fecha_actualizacion=timezone.now(),
+            **{campo: Subquery(historial.values(campo)[:1]) for campo in actualizacion.campos}
+        )
+
+        actualizacion.revertida = True
+        actualizacion.fecha_reversion = timezone.now()
+        actualizacion.save(update_fields=['revertida', 'fecha_reversion'])
+        return restaurados
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y sólo [a-z0-9]: 'Tornillo Ñandú 3/8"' -> ['tornillo', 'nandu', '3', '8']"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', texto).split()
+
+
+def texto_busqueda(codigo, descripcion, marca='', rubro=''):
+    """Contenido de Producto.busqueda: tokens únicos + el código completo sin separadores"""
+    codigo_tokens = normalizar(codigo)
+    tokens = []
+    for token in (codigo_tokens + [''.join(codigo_tokens)] + normalizar(descripcion)
+                  + normalizar(marca) + normalizar(rubro)):
+        if token and token not in tokens:
+            tokens.append(token)
+    return ' '.join(tokens)
+
+
+class _IndicePrefijos:
+    """Índice en memoria token -> ids de producto, para bases sin índice de texto (SQLite)"""
+
+    RANGO_CHICO = 64  # Prefijos que abarcan pocos tokens distintos se resuelven por intersección
+
+    def __init__(self, version, filas):
+        self.version = version
+        ids_por_token = {}
+        tokens_por_id = {}
+        for producto_id, busqueda in filas:
+            tokens = tuple((busqueda or '').split())
+            tokens_por_id[producto_id] = tokens
+            for token in tokens:
+                ids_por_token.setdefault(token, []).append(producto_id)
+        self.tokens = sorted(ids_por_token)
+        self.ids_por_token = ids_por_token
+        self.tokens_por_id = tokens_por_id
+
+    def _rango(self, prefijo):
+        # Los tokens son [a-z0-9]: '{' ordena después de cualquier continuación del prefijo
+        return bisect_left(self.tokens, prefijo), bisect_left(self.tokens, prefijo + '{')
+
+    def _ids(self, desde, hasta):
+        ids = set()
+        for token in self.tokens[desde:hasta]:
+            ids.update(self.ids_por_token[token])
+        return ids
+
+    def buscar(self, prefijos):
+        """Ids de los productos que tienen, para cada prefijo, algún token que empieza con él"""
+        rangos = sorted((self._rango(p) + (p,) for p in prefijos), key=lambda r: r[1] - r[0])
+        desde, hasta, _ = rangos[0]
+        ids = self._ids(desde, hasta)
+        for desde, hasta, prefijo in rangos[1:]:
+            if not ids:
+                break
+            if hasta - desde <= self.RANGO_CHICO:
+                ids &= self._ids(desde, hasta)
+            else:
+                ids = {i for i in ids if any(t.startswith(prefijo) for t in self.tokens_por_id[i])}
+        return ids
+
+
+class ProductoBuscador:
+    """
+    Búsqueda de productos para autocompletado y listados, sobre la columna normalizada
+    Producto.busqueda (mantenida por signals.py, reconstruible con `reindexar_productos`).
+    - PostgreSQL: LIKE por token, acelerado por el índice GIN pg_trgm (coincidencia parcial).
+    - MySQL: MATCH ... AGAINST en modo booleano sobre el índice FULLTEXT (prefijo de palabra);
+      los tokens más cortos que innodb_ft_min_token_size se resuelven con LIKE.
+    - Otras bases (SQLite): índice de prefijos en memoria, recargado cuando cambian los productos.
+    Los resultados se ordenan con el código exacto primero, luego los códigos que empiezan
+    con el texto buscado y luego por descripción.
+    """
+
+    FT_MIN_TOKEN = 3
+    ESPACIO = CacheVersionado.registrar('productos:busqueda')
+
+    _indice = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def invalidar(cls):
+        CacheVersionado.invalidar(cls.ESPACIO)
+
+    @classmethod
+    def _indice_actual(cls, using):
+        version = CacheVersionado.version(cls.ESPACIO)
+        indice = cls._indice
+        if indice is None or indice.version != version:
+            with cls._lock:
+                if cls._indice is None or cls._indice.version != version:
+                    cls._indice = _IndicePrefijos(
+                        version, Producto.objects.using(using).values_list('id', 'busqueda').iterator(chunk_size=5000)
+                    )
+                indice = cls._indice
+        return indice
+
+    @classmethod
+    def texto_para(cls, producto):
+        return texto_busqueda(
+            producto.codigo, producto.descripcion,
+            producto.marca.nombre if producto.marca_id else '',
+            producto.rubro.nombre if producto.rubro_id else '',
+        )
+
+    @classmethod
+    def reindexar(cls, productos=None, batch_size=1000):
+        """Recalcula Producto.busqueda (todos o el queryset dado). Retorna la cantidad actualizada"""
+        productos = productos if productos is not None else Producto.objects.all()
+        filas = productos.order_by().values_list('id', 'codigo', 'descripcion', 'marca__nombre', 'rubro__nombre')
+        pendientes = []
+        actualizados = 0
+        for producto_id, codigo, descripcion, marca, rubro in filas.iterator(chunk_size=batch_size):
+            pendientes.append(Producto(id=producto_id, busqueda=texto_busqueda(codigo, descripcion, marca, rubro)))
+            if len(pendientes) >= batch_size:
+                actualizados += Producto.objects.bulk_update(pendientes, ['busqueda'])
+                pendientes = []
+        if pendientes:
+            actualizados += Producto.objects.bulk_update(pendientes, ['busqueda'])
+        cls.invalidar()
+        return actualizados
+
+    @classmethod
+    def filtrar(cls, texto, productos=None):
+        """Filtra y ordena por relevancia el queryset de productos (todos si no se indica)"""
+        productos = productos if productos is not None else Producto.objects.all()
+        texto = (texto or '').strip()
+        tokens = normalizar(texto)
+        if not tokens:
+            return productos.none() if texto else productos
+
+        vendor = connections[productos.db].vendor
+        if vendor == 'postgresql':
+            for token in tokens:
+                productos = productos.filter(busqueda__contains=token)
+        elif vendor == 'mysql':
+            largos = [t for t in tokens if len(t) >= cls.FT_MIN_TOKEN]
+            if largos:
+                columna = f'{Producto._meta.db_table}.busqueda'
+                productos = productos.annotate(
+                    coincidencia_ft=RawSQL(f'MATCH({columna}) AGAINST (%s IN BOOLEAN MODE)',
+                                           (' '.join(f'+{t}*' for t in largos),))
+                ).filter(coincidencia_ft__gt=0)
+            for token in tokens:
+                if len(token) < cls.FT_MIN_TOKEN:
+                    productos = productos.filter(busqueda__contains=token)
+        else:
+            ids = cls._indice_actual(productos.db).buscar(tokens)
+            # Los ids viajan como 1 solo parámetro JSON: sin límite de variables de SQLite
+            productos = productos.filter(id__in=RawSQL('SELECT value FROM json_each(%s)', (json.dumps(sorted(ids)),)))
+
+        return productos.annotate(
+            relevancia_codigo=Case(
+                When(codigo__iexact=texto, then=Value(0)),
+                When(codigo__istartswith=texto, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        ).order_by('relevancia_codigo', 'descripcion', 'id')
@@ -0,0 +1,367 @@
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Case, When, F, Q, Sum, Max, Value, IntegerField, DecimalField, OuterRef, Subquery
+from django.utils import timezone
+from .models import Producto, MovimientoStock, CierreStock, DetalleCompra
+
+
+class LibroStockService:
+    """
+    Libro de stock. Todo cambio de Producto.stock pasa por registrar(), que escribe los MovimientoStock
+    (con el costo del producto en ese momento) y aplica las diferencias con un único UPDATE ... CASE.
+    CierreStock guarda cantidad y costo valorizado por producto al cierre de cada mes;
+    inventario_al() parte del cierre más cercano y suma los movimientos posteriores.
+    """
+
+    @staticmethod
+    def _signo(tipo):
+        return 1 if tipo == 'IN' else -1
+
+    @classmethod
+    def registrar(cls, items, referencia, observaciones='', actualizar_stock=True):
+        """
+        items: iterable de (producto, tipo 'IN'/'OUT', cantidad). Crea los movimientos con bulk_create y
+        aplica el neto por producto con F() (sin leer-modificar-guardar). actualizar_stock=False solo
+        registra movimientos de un stock que ya se guardó (edición manual del producto).
+        """
+        movimientos = []
+        deltas = defaultdict(Decimal)
+        for producto, tipo, cantidad in items:
+            cantidad = Decimal(str(cantidad))
+            if not cantidad:
+                continue
+            movimientos.append(MovimientoStock(
+                producto=producto,
+                tipo=tipo,
+                cantidad=cantidad,
+                referencia=referencia[:50],
+                observaciones=observaciones,
+                costo_unitario=producto.costo,
+            ))
+            deltas[producto.pk] += cls._signo(tipo) * cantidad
+        if not movimientos:
+            return []
+        if len(movimientos) == 1:
+            # create() devuelve el id también en MySQL (bulk_create no): el ajuste individual lo informa
+            movimientos[0].save(force_insert=True)
+        else:
+            MovimientoStock.objects.bulk_create(movimientos)
+        if actualizar_stock:
+            cls.aplicar_deltas(deltas)
+        return movimientos
+
+    @classmethod
+    def registrar_ajuste(cls, producto, stock_anterior, referencia='Ajuste Manual', observaciones=''):
+        """Movimiento por la diferencia de un stock ya guardado (alta o edición del producto desde el formulario)"""
+        diferencia = Decimal(str(producto.stock or 0)) - Decimal(str(stock_anterior or 0))
+        return cls.registrar(
+            [(producto, 'IN' if diferencia > 0 else 'OUT', abs(diferencia))],
+            referencia, observaciones, actualizar_stock=False,
+        )
+
+    @staticmethod
+    def aplicar_deltas(deltas):
+        """{producto_id: diferencia} -> un UPDATE ... CASE con F('stock')"""
+        deltas = {producto_id: delta for producto_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        casos = [
+            When(pk=producto_id, then=F('stock') + Value(delta, output_field=DecimalField()))
+            for producto_id, delta in deltas.items()
+        ]
+        return Producto.objects.filter(pk__in=list(deltas)).update(
+            stock=Case(*casos, default=F('stock'), output_field=IntegerField()),
+            fecha_actualizacion=timezone.now(),
+        )
+
+    @staticmethod
+    def _inicio(dia):
+        return timezone.make_aware(datetime.combine(dia, datetime.min.time()))
+
+    @classmethod
+    def _neto(cls, movimientos):
+        """{producto_id: entradas - salidas} de un queryset de movimientos, en 1 consulta agrupada"""
+        filas = movimientos.values('producto_id').order_by().annotate(
+            entradas=Sum('cantidad', filter=Q(tipo='IN')),
+            salidas=Sum('cantidad', filter=Q(tipo='OUT')),
+        )
+        return {
+            fila['producto_id']: (fila['entradas'] or Decimal('0')) - (fila['salidas'] or Decimal('0'))
+            for fila in filas
+        }
+
+    @classmethod
+    def ultimo_cierre(cls, dia):
+        """Fecha del cierre más reciente con fecha <= dia (None si no hay)"""
+        return CierreStock.objects.filter(fecha__lte=dia).aggregate(fecha=Max('fecha'))['fecha']
+
+    @classmethod
+    def inventario_al(cls, dia):
+        """
+        Inventario al cierre de `dia` (movimientos hasta las 24 h, hora local): {producto_id: (cantidad, costo)}.
+        Parte del último CierreStock <= dia y suma los movimientos posteriores; sin cierres previos,
+        reconstruye hacia atrás desde el stock actual. Costo: el del último movimiento del período,
+        si no el del cierre, si no el costo actual del producto. Consultas constantes (no por producto).
+        """
+        hasta = cls._inicio(dia + timedelta(days=1))
+        cierre = cls.ultimo_cierre(dia)
+
+        if cierre:
+            desde = cls._inicio(cierre + timedelta(days=1))
+            base = {
+                producto_id: (cantidad, costo)
+                for producto_id, cantidad, costo in CierreStock.objects.filter(fecha=cierre)
+                .values_list('producto_id', 'cantidad', 'costo_unitario')
+            }
+            neto = cls._neto(MovimientoStock.objects.filter(fecha__gte=desde, fecha__lt=hasta))
+        else:
+            desde = None
+            base = {}
+            posteriores = cls._neto(MovimientoStock.objects.filter(fecha__gte=hasta))
+            neto = {}
+
+        ultimos_costos = MovimientoStock.objects.filter(
+            producto_id=OuterRef('pk'), fecha__lt=hasta, costo_unitario__isnull=False
+        )
+        if desde:
+            ultimos_costos = ultimos_costos.filter(fecha__gte=desde)
+        productos = Producto.objects.annotate(
+            costo_movimiento=Subquery(ultimos_costos.order_by('-fecha', '-id').values('costo_unitario')[:1])
+        ).values_list('id', 'stock', 'costo', 'costo_movimiento')
+
+        inventario = {}
+        for producto_id, stock, costo_actual, costo_movimiento in productos.iterator(chunk_size=2000):
+            if cierre:
+                cantidad_cierre, costo_cierre = base.get(producto_id, (Decimal('0'), None))
+                cantidad = cantidad_cierre + neto.get(producto_id, Decimal('0'))
+            else:
+                costo_cierre = None
+                cantidad = Decimal(stock) - posteriores.get(producto_id, Decimal('0'))
+            costo = next(c for c in (costo_movimiento, costo_cierre, costo_actual, Decimal('0')) if c is not None)
+            inventario[producto_id] = (cantidad, costo)
+        return inventario
+
+    @classmethod
+    def valor_al(cls, dia):
+        """Valor total del inventario al cierre de `dia`"""
+        return sum(
+            (cantidad * costo for cantidad, costo in cls.inventario_al(dia).values() if cantidad > 0),
+            Decimal('0'),
+        )
+
+    @classmethod
+    def generar_cierre(cls, dia, batch_size=1000):
+        """(Re)genera el CierreStock de `dia`. Retorna (productos, valor total)"""
+        inventario = cls.inventario_al(dia)
+        filas = [
+            CierreStock(
+                fecha=dia,
+                producto_id=producto_id,
+                cantidad=cantidad,
+                costo_unitario=costo,
+                valor=(cantidad * costo).quantize(Decimal('0.01')),
+            )
+            for producto_id, (cantidad, costo) in inventario.items()
+            if cantidad
+        ]
+        with transaction.atomic():
+            CierreStock.objects.filter(fecha=dia).delete()
+            CierreStock.objects.bulk_create(filas, batch_size=batch_size)
+        return len(filas), sum((fila.valor for fila in filas if fila.cantidad > 0), Decimal('0'))
+
+    @classmethod
+    def cmv(cls, desde, hasta):
+        """
+        Costo de mercadería vendida del período [desde, hasta] (fechas):
+        existencia inicial + compras - existencia final, con 2 inventarios desde cierres.
+        """
+        compras = DetalleCompra.objects.filter(
+            compra__fecha__gte=cls._inicio(desde), compra__fecha__lt=cls._inicio(hasta + timedelta(days=1))
+        ).exclude(compra__estado='ANULADA').aggregate(
+            total=Sum(F('cantidad') * F('precio'), output_field=DecimalField(max_digits=16, decimal_places=2))
+        )['total'] or Decimal('0')
+        inicial = cls.valor_al(desde - timedelta(days=1))
+        final = cls.valor_al(hasta)
+        return {'existencia_inicial': inicial, 'compras': compras, 'existencia_final': final,
+                'cmv': inicial + compras - final}
+
+
+class ErrorInventario(ValueError):
+    """Archivo de conteo ilegible (formato o columnas)"""
+
+
+class InventarioService:
+    """
+    Ajustes de stock masivos a partir de un conteo físico (codigo, cantidad contada).
+    Las diferencias contra el stock actual se calculan por lotes (1 consulta cada `batch_size` códigos),
+    y cada lote se registra con LibroStockService.registrar() (bulk_create de movimientos + un UPDATE ... CASE),
+    todo en una transacción. Sin aplicar=True solo informa.
+    """
+
+    REFERENCIA = 'Inventario físico'
+    COLUMNAS_CODIGO = ('codigo', 'código', 'sku')
+    COLUMNAS_CANTIDAD = ('cantidad', 'contado', 'conteo', 'stock')
+
+    @staticmethod
+    def cantidad_entera(valor):
+        """Entero a partir de '12', '12.0' o '12,00'. ValueError si no es un entero >= 0"""
+        try:
+            cantidad = Decimal(str(valor).strip().replace(',', '.'))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"Cantidad inválida: {valor!r}")
+        if not cantidad.is_finite() or cantidad != cantidad.to_integral_value():
+            raise ValueError(f"Cantidad no entera: {valor!r} (el stock se lleva en unidades)")
+        if cantidad < 0:
+            raise ValueError(f"Cantidad negativa: {valor!r}")
+        return int(cantidad)
+
+    @classmethod
+    def leer(cls, lineas, formato='csv'):
+        """
+        Itera (numero_linea, codigo, cantidad_cruda) desde un iterable de líneas de texto.
+        csv: separador ',' o ';', encabezado opcional (codigo/cantidad); json: lista de objetos o {codigo: cantidad};
+        ndjson: un objeto {codigo, cantidad} por línea.
+        """
+        if formato == 'csv':
+            return cls._leer_csv(lineas)
+        if formato == 'ndjson':
+            return cls._leer_ndjson(lineas)
+        if formato == 'json':
+            return cls._leer_json(''.join(lineas))
+        raise ErrorInventario(f"Formato no soportado: {formato}")
+
+    @classmethod
+    def _leer_csv(cls, lineas):
+        lineas = iter(lineas)
+        primera = next(lineas, '').lstrip('\ufeff')
+        separador = ';' if primera.count(';') > primera.count(',') else ','
+        lector = csv.reader(cls._encadenar(primera, lineas), delimiter=separador)
+        col_codigo, col_cantidad = 0, 1
+        for numero, fila in enumerate(lector, start=1):
+            if not fila or not any(celda.strip() for celda in fila):
+                continue
+            if numero == 1:
+                encabezado = [celda.strip().lower() for celda in fila]
+                if any(nombre in encabezado for nombre in cls.COLUMNAS_CODIGO):
+                    col_codigo = next(encabezado.index(n) for n in cls.COLUMNAS_CODIGO if n in encabezado)
+                    try:
+                        col_cantidad = next(encabezado.index(n) for n in cls.COLUMNAS_CANTIDAD if n in encabezado)
+                    except StopIteration:
+                        raise ErrorInventario('El encabezado no tiene columna de cantidad')
+                    continue
+            if len(fila) <= max(col_codigo, col_cantidad):
+                yield numero, (fila[col_codigo].strip() if len(fila) > col_codigo else ''), None
+                continue
+            yield numero, fila[col_codigo].strip(), fila[col_cantidad]
+
+    @staticmethod
+    def _encadenar(primera, resto):
+        yield primera
+        yield from resto
+
+    @staticmethod
+    def _leer_ndjson(lineas):
+        for numero, linea in enumerate(lineas, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except json.JSONDecodeError:
+                raise ErrorInventario(f"Línea {numero}: JSON inválido")
+            if not isinstance(fila, dict):
+                raise ErrorInventario(f"Línea {numero}: se esperaba un objeto {{codigo, cantidad}}")
+            yield numero, str(fila.get('codigo', '')).strip(), fila.get('cantidad')
+
+    @staticmethod
+    def _leer_json(texto):
+        try:
+            datos = json.loads(texto)
+        except json.JSONDecodeError:
+            raise ErrorInventario('JSON inválido')
+        if isinstance(datos, dict):
+            datos = [{'codigo': codigo, 'cantidad': cantidad} for codigo, cantidad in datos.items()]
+        if not isinstance(datos, list) or not all(isinstance(fila, dict) for fila in datos):
+            raise ErrorInventario('Se esperaba una lista de objetos {codigo, cantidad} o {codigo: cantidad}')
+        for numero, fila in enumerate(datos, start=1):
+            yield numero, str(fila.get('codigo', '')).strip(), fila.get('cantidad')
+
+    @classmethod
+    def conteo(cls, filas):
+        """
+        Agrupa las filas leídas en {codigo: cantidad}; un código contado en varias filas (distintas
+        ubicaciones) se suma. Retorna (conteo, errores [{linea, codigo, error}]).
+        """
+        conteo = defaultdict(int)
+        errores = []
+        for numero, codigo, valor in filas:
+            if not codigo:
+                errores.append({'linea': numero, 'codigo': codigo, 'error': 'Código vacío'})
+                continue
+            if valor is None:
+                errores.append({'linea': numero, 'codigo': codigo, 'error': 'Falta la cantidad'})
+                continue
+            try:
+                cantidad = cls.cantidad_entera(valor)
+            except ValueError as e:
+                errores.append({'linea': numero, 'codigo': codigo, 'error': str(e)})
+                continue
+            conteo[codigo] += cantidad
+        return dict(conteo), errores
+
+    @classmethod
+    def aplicar_conteo(cls, conteo, aplicar=False, observaciones='', batch_size=1000):
+        """
+        Compara {codigo: cantidad contada} con el stock actual. Con aplicar=True registra los ajustes
+        (MovimientoStock IN/OUT por la diferencia) y actualiza Producto.stock, en una transacción.
+        Retorna el informe: contados, sin_cambios, ajustes [{codigo, descripcion, stock_anterior,
+        contado, diferencia}], no_encontrados y aplicado.
+        """
+        codigos = list(conteo)
+        ajustes = []
+        no_encontrados = []
+        sin_cambios = 0
+        with transaction.atomic():
+            for inicio in range(0, len(codigos), batch_size):
+                lote = codigos[inicio:inicio + batch_size]
+                productos = Producto.objects.filter(codigo__in=lote)
+                if aplicar:
+                    # Bloqueo: una venta concurrente no puede cambiar el stock entre la lectura y el ajuste
+                    productos = productos.select_for_update()
+                actuales = {
+                    producto.codigo: producto
+                    for producto in productos.only('id', 'codigo', 'descripcion', 'stock', 'costo')
+                }
+
+                items = []
+                for codigo in lote:
+                    producto = actuales.get(codigo)
+                    if producto is None:
+                        no_encontrados.append(codigo)
+                        continue
+                    diferencia = conteo[codigo] - producto.stock
+                    if not diferencia:
+                        sin_cambios += 1
+                        continue
+                    ajustes.append({
+                        'codigo': codigo,
+                        'descripcion': producto.descripcion,
+                        'stock_anterior': producto.stock,
+                        'contado': conteo[codigo],
+                        'diferencia': diferencia,
+                    })
+                    items.append((producto, 'IN' if diferencia > 0 else 'OUT', abs(diferencia)))
+
+                if aplicar:
+                    LibroStockService.registrar(items, cls.REFERENCIA, observaciones)
+
+        return {
+            'contados': len(codigos),
+            'sin_cambios': sin_cambios,
+            'ajustes': ajustes,
+            'no_encontrados': no_encontrados,
+            'aplicado': bool(aplicar),
+        }
@@ -0,0 +1,184 @@
+from decimal import Decimal
+from django.db.models import F, Value, Sum, ExpressionWrapper, DecimalField, CharField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Concat, Cast
+from .models import Producto, DetalleVenta, MovimientoStock, Remito, DetalleRemito
+from .services_stock import LibroStockService
+
+
+class VentaService:
+    """
+    Motor de persistencia de ventas basado en operaciones de conjunto.
+    Carga todos los productos del comprobante en una sola consulta bloqueada,
+    valida stock en memoria y escribe detalles, remito y movimientos con bulk_create.
+    Debe ejecutarse dentro de transaction.atomic() (select_for_update lo exige).
+    """
+
+    @staticmethod
+    def costo_linea():
+        """
+        Expresión del costo de una línea de DetalleVenta: cantidad x costo al momento de la venta.
+        Las líneas sin costo_unitario (anteriores, sin backfill) usan el costo actual del producto.
+        """
+        return ExpressionWrapper(
+            F('cantidad') * Coalesce(F('costo_unitario'), F('producto__costo')),
+            output_field=DecimalField(max_digits=20, decimal_places=4),
+        )
+
+    @classmethod
+    def costo_ventas(cls, ventas):
+        """CMV de un conjunto de ventas (queryset, lista de Venta o de ids) en 1 aggregate"""
+        return DetalleVenta.objects.filter(venta__in=ventas).aggregate(
+            total=Coalesce(
+                Sum(cls.costo_linea()), Decimal('0'), output_field=DecimalField(max_digits=20, decimal_places=4)
+            )
+        )['total']
+
+    @classmethod
+    def completar_costos(cls, lote=1000, aplicar=True):
+        """
+        Completa costo_unitario de las líneas de venta anteriores a su captura. Orden de preferencia: el costo
+        del movimiento de stock de la propia venta ("Venta <id>"), el último costo registrado en MovimientoStock
+        para el producto hasta la fecha de la venta y, si no hay ninguno, el costo actual del producto.
+        Procesa por lotes de ids; devuelve (líneas completadas, CMV que suman).
+        """
+        con_costo = MovimientoStock.objects.filter(producto=OuterRef('producto'), costo_unitario__isnull=False)
+        de_la_venta = con_costo.filter(
+            referencia=Concat(Value('Venta '), Cast(OuterRef('venta_id'), CharField()))
+        ).order_by('-id').values('costo_unitario')[:1]
+        anterior = con_costo.filter(
+            fecha__lte=OuterRef('venta__fecha')
+        ).order_by('-fecha', '-id').values('costo_unitario')[:1]
+        pendientes = DetalleVenta.objects.filter(costo_unitario__isnull=True).order_by('id').annotate(
+            costo_historico=Coalesce(Subquery(de_la_venta), Subquery(anterior), F('producto__costo'))
+        ).only('id', 'cantidad')
+
+        completadas, total = 0, Decimal('0')
+        ultimo_id = 0
+        while True:
+            detalles = list(pendientes.filter(id__gt=ultimo_id)[:lote])
+            if not detalles:
+                break
+            ultimo_id = detalles[-1].id
+            for detalle in detalles:
+                detalle.costo_unitario = detalle.costo_historico
+                total += detalle.cantidad * detalle.costo_unitario
+            if aplicar:
+                DetalleVenta.objects.bulk_update(detalles, ['costo_unitario'])
+            completadas += len(detalles)
+        return completadas, total
+
+    @staticmethod
+    def _calcular_neto_iva(item, producto, subtotal):
+        """Replica el cálculo de neto/IVA por línea que hacía api_venta_guardar"""
+        item_neto = Decimal(str(item.get("neto", subtotal)))  # Default a subtotal si no viene
+        item_iva = Decimal(str(item.get("iva_amount", 0)))
+
+        # Si el frontend no discriminó, el subtotal SIEMPRE incluye IVA
+        if not item.get("discriminado", False):
+            alicuota = Decimal(str(producto.iva_alicuota)) if producto.iva_alicuota is not None else Decimal("21.0")
+            if alicuota > 0:
+                divisor = 1 + (alicuota / 100)
+                item_neto = subtotal / divisor
+                item_iva = subtotal - item_neto
+            else:
+                item_neto = subtotal
+                item_iva = Decimal('0')
+
+        return item_neto, item_iva
+
+    @classmethod
+    def cargar_productos(cls, items):
+        """
+        Trae todos los productos de la venta en una única consulta con select_for_update.
+        Lanza Producto.DoesNotExist si algún id no existe (mismo contrato que .get()).
+        """
+        ids = {int(item["id"]) for item in items}
+        productos = Producto.objects.select_for_update().in_bulk(ids)
+        faltantes = ids - set(productos)
+        if faltantes:
+            raise Producto.DoesNotExist(f"Producto no encontrado: {sorted(faltantes)}")
+        return productos
+
+    @classmethod
+    def validar_stock(cls, productos, cantidades, permitir_stock_negativo=False):
+        """Valida en memoria el stock requerido (agrupado por producto)"""
+        if permitir_stock_negativo:
+            return
+        for producto_id, cantidad in cantidades.items():
+            producto = productos[producto_id]
+            if producto.stock < cantidad:
+                raise ValueError(f"Stock insuficiente para {producto.descripcion}. Stock actual: {producto.stock}")
+
+    @classmethod
+    def registrar_items(cls, venta, items, permitir_stock_negativo=False, generar_remito=False, punto_venta="0001"):
+        """
+        Persiste los ítems de una venta ya creada.
+        - 1 SELECT ... FOR UPDATE de productos
+        - 1 INSERT (bulk) de DetalleVenta
+        - LibroStockService.registrar(): 1 INSERT (bulk) de MovimientoStock + 1 UPDATE ... CASE de stock
+        - Remito opcional: 1 INSERT cabecera + 1 INSERT (bulk) de DetalleRemito
+        Retorna (total_neto, total_iva, detalles).
+        """
+        productos = cls.cargar_productos(items)
+
+        cantidades = {}
+        detalles = []
+        total_neto = Decimal('0')
+        total_iva = Decimal('0')
+
+        for item in items:
+            producto = productos[int(item["id"])]
+            cantidad = Decimal(str(item["cantidad"]))
+            precio = Decimal(str(item["precio"]))
+            subtotal = Decimal(str(item["subtotal"]))
+
+            item_neto, item_iva = cls._calcular_neto_iva(item, producto, subtotal)
+
+            detalles.append(DetalleVenta(
+                venta=venta,
+                producto=producto,
+                cantidad=cantidad,
+                precio_unitario=precio,
+                subtotal=subtotal,
+                neto=item_neto,
+                iva_amount=item_iva,
+                costo_unitario=producto.costo,
+            ))
+
+            cantidades[producto.id] = cantidades.get(producto.id, Decimal('0')) + cantidad
+            total_neto += item_neto
+            total_iva += item_iva
+
+        # VALIDACIÓN DE STOCK (antes de escribir nada)
+        cls.validar_stock(productos, cantidades, permitir_stock_negativo)
+
+        DetalleVenta.objects.bulk_create(detalles)
+
+        LibroStockService.registrar(
+            [(productos[producto_id], 'OUT', cantidad) for producto_id, cantidad in cantidades.items()],
+            referencia=f"Venta {venta.id}",
+            observaciones=f"Venta {venta.tipo_comprobante} #{venta.id}",
+        )
+
+        if generar_remito:
+            cls.generar_remito(venta, detalles, punto_venta)
+
+        return total_neto, total_iva, detalles
+
+    @classmethod
+    def generar_remito(cls, venta, detalles, punto_venta="0001"):
+        """Genera el remito automático usando los detalles en memoria (sin releer venta.detalles)"""
+        cliente = venta.cliente
+        remito = Remito.objects.create(
+            cliente=cliente,
+            venta_asociada=venta,
+            fecha=venta.fecha,
+            direccion_entrega=cliente.domicilio or "Retiro en Local",
+            estado='ENTREGADO',
+            punto_venta=punto_venta
+        )
+        DetalleRemito.objects.bulk_create([
+            DetalleRemito(remito=remito, producto=det.producto, cantidad=det.cantidad)
+            for det in detalles
+        ])
+        return remito
@@ -0,0 +1,146 @@
+"""
+Señales de modelos: invalidación de caches (resolver contable, configuración de empresa, permisos,
+dashboard), mantenimiento de saldos mensuales y del texto de búsqueda de productos.
+Se registran en AdministrarConfig.ready()
+"""
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    PlanCuenta, EjercicioContable, ItemAsiento, Producto, Marca, Rubro, Empresa, MovimientoCaja, Cheque, PerfilUsuario
+)
+from .services import ResolverContable, ConfiguracionEmpresa
+from .services_caja import CajaService
+from .services_cheques import CarteraChequesService
+from .services_contabilidad import SaldosService, PlanCuentasService
+from .services_dashboard import DashboardService
+from .services_permisos import PermisosUsuario
+from .services_productos import ProductoBuscador
+from .utils_cache import CacheVersionado
+
+
+@receiver([post_save, post_delete], sender=PlanCuenta)
+@receiver([post_save, post_delete], sender=EjercicioContable)
+def invalidar_resolver_contable(sender, **kwargs):
+    """Cualquier alta/baja/modificación del plan o de ejercicios invalida el resolver"""
+    ResolverContable.invalidar()
+
+
+@receiver(post_save, sender=PlanCuenta)
+def mantener_ruta_plan_cuenta(sender, instance, raw=False, **kwargs):
+    """Camino materializado: se asigna al crear y se reescribe el subárbol si la cuenta cambió de padre"""
+    if not raw:
+        PlanCuentasService.guardada(instance)
+
+
+@receiver([post_save, post_delete], sender=Empresa)
+def invalidar_configuracion_empresa(sender, **kwargs):
+    """
+    Invalida ya (el propio proceso lee los cambios dentro de la transacción) y otra vez al confirmar:
+    otro worker pudo recargar la fila vieja entre el save y el commit
+    """
+    ConfiguracionEmpresa.invalidar()
+    transaction.on_commit(ConfiguracionEmpresa.invalidar)
+
+
+# Las versiones del cache compartido se releen 1 vez por request (ver CacheVersionado)
+request_started.connect(CacheVersionado.nueva_solicitud, dispatch_uid='cache_versionado_request')
+
+
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+def invalidar_permisos(sender, instance, **kwargs):
+    """Descarta la máscara cacheada ya y al confirmar (otro request pudo cachear la fila vieja en el medio)"""
+    PermisosUsuario.invalidar(instance.user_id)
+    transaction.on_commit(lambda: PermisosUsuario.invalidar(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Cheque)
+def invalidar_cartera_cheques(sender, **kwargs):
+    """KPIs y vencimientos de la cartera: se recalculan en la próxima consulta (ya y al confirmar)"""
+    CarteraChequesService.invalidar()
+    transaction.on_commit(CarteraChequesService.invalidar)
+
+
+@receiver(pre_save, sender=ItemAsiento)
+def recordar_item_asiento_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda los importes previos para poder revertirlos del snapshot si el ítem se edita"""
+    instance._saldo_anterior = None
+    if instance.pk and not raw:
+        instance._saldo_anterior = ItemAsiento.objects.filter(pk=instance.pk).values('cuenta_id', 'debe', 'haber').first()
+
+
+@receiver(post_save, sender=ItemAsiento)
+def actualizar_saldos_item_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        SaldosService.item_guardado(instance, getattr(instance, '_saldo_anterior', None))
+
+
+@receiver(pre_delete, sender=ItemAsiento)
+def actualizar_saldos_item_eliminado(sender, instance, **kwargs):
+    """También se dispara por cada ítem cuando se elimina el Asiento (borrado en cascada)"""
+    SaldosService.item_eliminado(instance)
+
+
+@receiver(pre_save, sender=MovimientoCaja)
+def recordar_movimiento_caja_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda caja/tipo/monto previos para revertirlos de los totales si el movimiento se edita"""
+    instance._caja_anterior = None
+    if instance.pk and not raw:
+        instance._caja_anterior = MovimientoCaja.objects.filter(pk=instance.pk).values('caja_diaria_id', 'tipo', 'monto').first()
+
+
+@receiver(post_save, sender=MovimientoCaja)
+def actualizar_totales_caja_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        CajaService.movimiento_guardado(instance, getattr(instance, '_caja_anterior', None))
+
+
+@receiver(post_delete, sender=MovimientoCaja)
+def actualizar_totales_caja_eliminado(sender, instance, **kwargs):
+    """También se dispara por cada movimiento cuando se elimina la CajaDiaria (borrado en cascada)"""
+    CajaService.movimiento_eliminado(instance)
+
+
+def invalidar_dashboard(sender, **kwargs):
+    """Invalida las secciones del dashboard afectadas, una vez confirmada la transacción"""
+    secciones = DashboardService.INVALIDACIONES[sender]
+    transaction.on_commit(lambda: DashboardService.invalidar(*secciones))
+
+
+for _modelo in DashboardService.INVALIDACIONES:
+    post_save.connect(invalidar_dashboard, sender=_modelo, dispatch_uid=f'dashboard_save_{_modelo.__name__}')
+    post_delete.connect(invalidar_dashboard, sender=_modelo, dispatch_uid=f'dashboard_delete_{_modelo.__name__}')
+
+
+@receiver(pre_save, sender=Producto)
+def calcular_busqueda_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Mantiene Producto.busqueda al día con código, descripción, marca y rubro"""
+    if raw or (update_fields is not None and not {'codigo', 'descripcion', 'marca', 'rubro'} & set(update_fields)):
+        instance._busqueda_modificada = False
+        return
+    busqueda = ProductoBuscador.texto_para(instance)
+    instance._busqueda_modificada = busqueda != instance.busqueda
+    instance.busqueda = busqueda
+
+
+@receiver(post_save, sender=Producto)
+def invalidar_indice_busqueda(sender, instance, created=False, **kwargs):
+    if created or getattr(instance, '_busqueda_modificada', False):
+        ProductoBuscador.invalidar()
+
+
+@receiver(post_delete, sender=Producto)
+def invalidar_indice_busqueda_baja(sender, **kwargs):
+    ProductoBuscador.invalidar()
+
+
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Rubro)
+def reindexar_productos_por_nombre(sender, instance, created=False, raw=False, **kwargs):
+    """Renombrar una marca o un rubro cambia el texto de búsqueda de sus productos"""
+    if created or raw:
+        return
+    filtro = {'marca': instance} if sender is Marca else {'rubro': instance}
+    ProductoBuscador.reindexar(Producto.objects.filter(**filtro))
@@ -1,5 +1,5 @@
 from django import template
-from ..models import PerfilUsuario
+from ..services_permisos import PermisosUsuario
 
 register = template.Library()
 
@@ -15,9 +15,4 @@ def has_perm(user, perm_name):
     if user.is_staff:
         return True
         
-    try:
-        perfil = user.perfilusuario
-        field_name = f'acceso_{perm_name}'
-        return getattr(perfil, field_name, False)
-    except (PerfilUsuario.DoesNotExist, AttributeError):
-        return False
+    return PermisosUsuario.tiene(user, perm_name)
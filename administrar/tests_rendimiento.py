@@ -0,0 +1,1670 @@
+import json
+import os
+import tempfile
+import zipfile
+from unittest import mock
+from io import BytesIO, StringIO
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.management import call_command
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import (
+    Cliente, Producto, Venta, DetalleVenta, MovimientoStock, Remito, DetalleRemito, Empresa,
+    PlanCuenta, EjercicioContable, Asiento, ItemAsiento, NumeradorAsiento, SaldoCuentaPeriodo,
+    Proveedor, Compra, Rubro, Marca, ActualizacionPrecios, MovimientoCuentaCorriente,
+    CajaDiaria, MovimientoCaja, Cheque, CierreStock, DocumentoCentralizado, PerfilUsuario, ActiveSession, Presupuesto,
+    Job, Backup, NotaCredito
+)
+from .services import AccountingService, ResolverContable, AsientoBuilder, ConfiguracionEmpresa
+from .services_contabilidad import BalanceService, SaldosService, MayorService, PlanCuentasService
+from .services_dashboard import DashboardService
+from .services_productos import PrecioService, ProductoBuscador, texto_busqueda
+from .services_ctacte import CuentaCorrienteService
+from .services_caja import CajaService
+from .services_cheques import CarteraChequesService
+from .services_stock import InventarioService, LibroStockService
+from .services_ventas import VentaService
+from .services_centralizacion import CentralizacionService
+from .services_listados import ListadoKeyset
+from .services_permisos import PermisosUsuario
+from .services_jobs import JobService
+from .services_pdf import ComprobantePdf, PdfCache
+from .services_pdf_nativo import PdfNativo, RecursosPdf
+from .utils_cache import CacheVersionado
+from .utils_pdf import paginas_pdf
+from .middleware import ActiveSessionMiddleware
+from .templatetags.admin_tags import has_perm
+from .views import (
+    verificar_permiso, invoice_print, api_plan_cuentas_lista, api_plan_cuentas_editar, api_presupuestos_listar,
+    api_presupuesto_reactivar, api_dashboard_stats, api_cc_cliente_movimientos, api_remitos_listar, api_caja_saldo_actual,
+    api_cheques_listar, api_cheques_vencimientos, api_cc_cliente_exportar_pdf, api_asientos_crear
+)
+from .views_backup import api_crear_backup, api_estado_backup
+from .views_comprobantes import api_comprobantes_lote_pdf, api_comprobantes_lote_pdf_estado
+from .views_stock import api_stock_ajuste_crear, api_stock_inventario, api_stock_inventario_al
+
+
+class VentaBulkTestCase(TestCase):
+    """Persistencia en bloque de api_venta_guardar (VentaService)"""
+
+    def setUp(self):
+        ResolverContable.invalidar()  # El rollback entre tests no dispara señales
+        self.cliente = Cliente.objects.create(nombre="Cliente Test", condicion_fiscal="CF")
+        self.productos = [
+            Producto.objects.create(
+                codigo=f"P{i:03d}", descripcion=f"Producto {i}", stock=100,
+                precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120
+            )
+            for i in range(10)
+        ]
+        Empresa.objects.create(nombre="Empresa Test", cuit="20123456789", direccion="Calle 1",
+                               condicion_fiscal="RI", habilita_remitos=True)
+        self.url = reverse('api_venta_guardar')
+
+    def _post(self, items):
+        data = {
+            "cliente_id": self.cliente.id,
+            "items": items,
+            "total_general": sum(i["subtotal"] for i in items),
+            "medio_pago": "EFECTIVO",
+        }
+        return self.client.post(self.url, json.dumps(data), content_type="application/json")
+
+    def test_venta_descuenta_stock_y_genera_movimientos(self):
+        items = [
+            {"id": self.productos[0].id, "cantidad": 3, "precio": 100, "subtotal": 300},
+            {"id": self.productos[1].id, "cantidad": 2, "precio": 100, "subtotal": 200},
+            {"id": self.productos[0].id, "cantidad": 1, "precio": 100, "subtotal": 100},
+        ]
+        antes = timezone.now()
+        response = self._post(items)
+        self.assertEqual(response.status_code, 200)
+        venta = Venta.objects.get(pk=response.json()["venta_id"])
+
+        self.assertEqual(DetalleVenta.objects.filter(venta=venta).count(), 3)
+        self.productos[0].refresh_from_db()
+        self.productos[1].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 96)
+        self.assertEqual(self.productos[1].stock, 98)
+        # El descuento pasa por LibroStockService: también marca la fecha de actualización
+        self.assertGreaterEqual(self.productos[0].fecha_actualizacion, antes)
+
+        self.assertEqual(MovimientoStock.objects.filter(referencia=f"Venta {venta.id}").count(), 2)
+        remito = Remito.objects.get(venta_asociada=venta)
+        self.assertEqual(DetalleRemito.objects.filter(remito=remito).count(), 3)
+        self.assertAlmostEqual(float(venta.neto + venta.iva_amount), 600.0, places=2)
+
+    def test_stock_insuficiente_no_persiste_nada(self):
+        items = [
+            {"id": self.productos[0].id, "cantidad": 60, "precio": 100, "subtotal": 6000},
+            {"id": self.productos[0].id, "cantidad": 60, "precio": 100, "subtotal": 6000},
+        ]
+        response = self._post(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Venta.objects.count(), 0)
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 100)
+
+    def test_consultas_constantes_por_linea(self):
+        def contar(lineas):
+            items = [{"id": p.id, "cantidad": 1, "precio": 100, "subtotal": 100} for p in self.productos[:lineas]]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._post(items)
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        contar(1)  # Calienta caches de proceso (plan de cuentas, etc.)
+        self.assertEqual(contar(1), contar(10))
+
+
+class ResolverContableTestCase(TestCase):
+    """Resolución cacheada de cuentas y ejercicios"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        self.ejercicio = EjercicioContable.objects.create(
+            descripcion="Actual", fecha_inicio=date(2000, 1, 1), fecha_fin=date(2099, 12, 31)
+        )
+        self.caja = PlanCuenta.objects.create(codigo="1.1.01.001", nombre="Caja en Pesos", tipo="ACTIVO")
+        self.deudores = PlanCuenta.objects.create(codigo="1.1.03.001", nombre="Deudores por Ventas", tipo="ACTIVO")
+        PlanCuenta.objects.create(codigo="2.1.02.001", nombre="IVA Débito Fiscal", tipo="PASIVO")
+        PlanCuenta.objects.create(codigo="1.1", nombre="Caja y Bancos", tipo="ACTIVO", imputable=False)
+
+    def test_resuelve_por_codigo_nombre_y_parcial(self):
+        self.assertEqual(AccountingService._obtener_cuenta("1.1.01.001"), self.caja)
+        self.assertEqual(AccountingService._obtener_cuenta("deudores por ventas"), self.deudores)
+        self.assertEqual(AccountingService._obtener_cuenta("Deudores"), self.deudores)
+        self.assertEqual(AccountingService._obtener_cuenta("IVA Debito").codigo, "2.1.02.001")
+        # Las cuentas no imputables no se resuelven
+        self.assertIsNone(AccountingService._obtener_cuenta("Caja y Bancos"))
+
+    def test_sin_consultas_en_estado_estable(self):
+        AccountingService._obtener_cuenta(AccountingService.CUENTA_CAJA)
+        AccountingService._obtener_ejercicio_vigente(date.today())
+        with self.assertNumQueries(0):
+            AccountingService._obtener_cuenta(AccountingService.CUENTA_CAJA)
+            AccountingService._obtener_cuenta(AccountingService.CUENTA_DEUDORES_POR_VENTAS)
+            AccountingService._obtener_cuenta("Gastos Varios")
+            self.assertEqual(AccountingService._obtener_ejercicio_vigente(date.today()), self.ejercicio)
+
+    def test_invalidacion_por_senales(self):
+        self.assertIsNone(AccountingService._obtener_cuenta("Gastos Varios"))
+        gastos = PlanCuenta.objects.create(codigo="5.2.01", nombre="Gastos Varios", tipo="R_NEG")
+        self.assertEqual(AccountingService._obtener_cuenta("Gastos Varios"), gastos)
+
+        self.ejercicio.cerrado = True
+        self.ejercicio.save()
+        self.assertIsNone(AccountingService._obtener_ejercicio_vigente(date.today()))
+
+    def test_cambios_de_otro_proceso(self):
+        self.assertIsNone(AccountingService._obtener_cuenta("Gastos Varios"))
+        self.assertEqual(AccountingService._obtener_ejercicio_vigente(date.today()), self.ejercicio)
+        # Otro worker crea una cuenta y cierra el ejercicio: sólo cambia la versión compartida
+        PlanCuenta.objects.bulk_create([PlanCuenta(codigo="5.2.01", nombre="Gastos Varios", tipo="R_NEG")])
+        EjercicioContable.objects.filter(pk=self.ejercicio.pk).update(cerrado=True)
+        cache.incr(CacheVersionado.clave_version(ResolverContable.ESPACIO))
+
+        # Dentro del mismo request sigue la copia local, pero el asiento no entra en el ejercicio cerrado
+        ejercicio = AccountingService._obtener_ejercicio_vigente(date.today())
+        builder = AsientoBuilder(ejercicio, date.today(), "Tardío").debe(self.caja, 10).haber(self.deudores, 10)
+        with self.assertRaisesMessage(ValueError, "cerrado"):
+            builder.registrar()
+        self.assertFalse(Asiento.objects.exists())
+
+        CacheVersionado.nueva_solicitud()  # Próximo request o job
+        self.assertEqual(AccountingService._obtener_cuenta("Gastos Varios").codigo, "5.2.01")
+        self.assertIsNone(AccountingService._obtener_ejercicio_vigente(date.today()))
+
+
+class AsientoBuilderTestCase(TestCase):
+    """Registro en bloque de asientos con numeración por NumeradorAsiento"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        self.ejercicio = EjercicioContable.objects.create(
+            descripcion="Actual", fecha_inicio=date(2000, 1, 1), fecha_fin=date(2099, 12, 31)
+        )
+        self.caja = PlanCuenta.objects.create(codigo="1.1.01.001", nombre="Caja en Pesos", tipo="ACTIVO")
+        self.deudores = PlanCuenta.objects.create(codigo="1.1.03.001", nombre="Deudores por Ventas", tipo="ACTIVO")
+        self.ventas = PlanCuenta.objects.create(codigo="4.1.01", nombre="Ventas", tipo="R_POS")
+        self.iva = PlanCuenta.objects.create(codigo="2.1.02.001", nombre="IVA Débito Fiscal", tipo="PASIVO")
+
+    def _builder(self):
+        return AsientoBuilder(self.ejercicio, date.today(), "Prueba", origen='VENTAS')
+
+    def test_numeracion_continua_desde_asientos_existentes(self):
+        Asiento.objects.create(numero=7, fecha=date.today(), descripcion="Previo", ejercicio=self.ejercicio)
+        primero = self._builder().debe(self.caja, 100).haber(self.deudores, 100).registrar()
+        segundo = self._builder().debe(self.caja, 50).haber(self.deudores, 50).registrar()
+        self.assertEqual((primero.numero, segundo.numero), (8, 9))
+        self.assertEqual(NumeradorAsiento.objects.get(ejercicio=self.ejercicio).ultimo_numero, 9)
+        self.assertEqual(ItemAsiento.objects.filter(asiento=segundo).count(), 2)
+
+    def test_asiento_descuadrado_no_escribe_nada(self):
+        builder = self._builder().debe(self.caja, 100).haber(self.deudores, Decimal("99.99"))
+        with self.assertRaises(ValueError):
+            builder.registrar()
+        self.assertEqual(Asiento.objects.count(), 0)
+        self.assertFalse(NumeradorAsiento.objects.exists())
+
+    def test_items_en_un_solo_insert(self):
+        def contar(lineas):
+            builder = self._builder()
+            for _ in range(lineas):
+                builder.debe(self.caja, 10).haber(self.deudores, 10)
+            with CaptureQueriesContext(connection) as ctx:
+                builder.registrar()
+            return len(ctx.captured_queries)
+
+        contar(1)  # Crea el numerador del ejercicio
+        self.assertEqual(contar(1), contar(20))
+
+    def test_registrar_nota_debito_balancea_al_centavo(self):
+        nd = type("ND", (), {
+            "id": 1, "total": Decimal("100.00"), "fecha": date.today(),
+            "cliente": Cliente(nombre="Cliente"), "numero_formateado": lambda self: "0001-00000001",
+        })()
+        AccountingService.registrar_nota_debito(nd)
+        asiento = Asiento.objects.get()
+        items = asiento.items.all()
+        self.assertEqual(sum(i.debe for i in items), Decimal("100.00"))
+        self.assertEqual(sum(i.haber for i in items), Decimal("100.00"))
+        self.assertEqual(items.get(cuenta=self.ventas).haber, Decimal("82.64"))
+
+
+class BalanceServiceTestCase(TestCase):
+    """Balance de sumas y saldos con una consulta agrupada y subtotales por rubro"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        self.ejercicio = EjercicioContable.objects.create(
+            descripcion="Actual", fecha_inicio=date(2000, 1, 1), fecha_fin=date(2099, 12, 31)
+        )
+        self.activo = PlanCuenta.objects.create(codigo="1", nombre="Activo", tipo="ACTIVO", imputable=False, nivel=1)
+        self.disponible = PlanCuenta.objects.create(codigo="1.1", nombre="Disponibilidades", tipo="ACTIVO",
+                                                    imputable=False, nivel=2, padre=self.activo)
+        self.caja = PlanCuenta.objects.create(codigo="1.1.01", nombre="Caja", tipo="ACTIVO", nivel=3, padre=self.disponible)
+        self.banco = PlanCuenta.objects.create(codigo="1.1.02", nombre="Banco", tipo="ACTIVO", nivel=3, padre=self.disponible)
+        self.ventas = PlanCuenta.objects.create(codigo="4.1", nombre="Ventas", tipo="R_POS", nivel=2)
+        PlanCuenta.objects.create(codigo="5.1", nombre="Sin movimientos", tipo="R_NEG", nivel=2)
+
+        AsientoBuilder(self.ejercicio, date.today(), "Venta").debe(self.caja, 100).haber(self.ventas, 100).registrar()
+        AsientoBuilder(self.ejercicio, date.today(), "Venta").debe(self.banco, 50).haber(self.ventas, 50).registrar()
+        AsientoBuilder(self.ejercicio, date.today(), "Depósito").debe(self.banco, 30).haber(self.caja, 30).registrar()
+
+    def _generar(self, **kwargs):
+        filas, totales = BalanceService.generar(self.ejercicio.id, date(2000, 1, 1), date(2099, 12, 31), **kwargs)
+        return {f['cuenta'].codigo: (f['debe'], f['haber']) for f in filas}, totales
+
+    def test_subtotales_por_jerarquia(self):
+        filas, totales = self._generar()
+        self.assertEqual(filas["1.1.01"], (Decimal("100"), Decimal("30")))
+        self.assertEqual(filas["1.1"], (Decimal("180"), Decimal("30")))
+        self.assertEqual(filas["1"], (Decimal("180"), Decimal("30")))
+        self.assertNotIn("5.1", filas)
+        # Los totales no duplican los subtotales de los rubros
+        self.assertEqual(totales["total_debe"], Decimal("180"))
+        self.assertEqual(totales["total_haber"], Decimal("180"))
+        self.assertEqual(totales["total_saldo_deudor"], Decimal("150"))
+
+    def test_filtro_por_nivel(self):
+        filas, totales = self._generar(nivel=1, solo_con_movimientos=False)
+        self.assertEqual(list(filas), ["1"])
+        self.assertEqual(totales["total_debe"], Decimal("180"))
+
+    def test_consultas_constantes(self):
+        # Snapshots mensuales + ítems del mes abierto + plan de cuentas
+        with self.assertNumQueries(3):
+            self._generar()
+
+    def test_endpoint_json(self):
+        response = self.client.get(reverse('api_balance_generar'), {"ejercicio_id": self.ejercicio.id})
+        self.assertEqual(response.status_code, 200)
+        cuentas = {c["codigo"]: c for c in response.json()["cuentas"]}
+        self.assertEqual(cuentas["1.1"]["saldo"], 150.0)
+        self.assertFalse(cuentas["1.1"]["imputable"])
+
+
+class SaldosServiceTestCase(TestCase):
+    """Snapshots mensuales SaldoCuentaPeriodo: mantenimiento y combinación con ítems en vivo"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        self.ejercicio = EjercicioContable.objects.create(
+            descripcion="Actual", fecha_inicio=date(2000, 1, 1), fecha_fin=date(2099, 12, 31)
+        )
+        self.caja = PlanCuenta.objects.create(codigo="1.1.01", nombre="Caja", tipo="ACTIVO")
+        self.ventas = PlanCuenta.objects.create(codigo="4.1", nombre="Ventas", tipo="R_POS")
+        self.hoy = date.today()
+        for fecha, monto in [(date(2024, 3, 5), 100), (date(2024, 3, 28), 40), (date(2024, 4, 10), 7),
+                             (date(2024, 6, 30), 3), (self.hoy, 1000)]:
+            self._asiento(fecha, monto)
+
+    def _asiento(self, fecha, monto):
+        return AsientoBuilder(self.ejercicio, fecha, "Venta").debe(self.caja, monto).haber(self.ventas, monto).registrar()
+
+    def _en_vivo(self, desde, hasta):
+        items = ItemAsiento.objects.filter(cuenta=self.caja)
+        if desde:
+            items = items.filter(asiento__fecha__date__gte=desde)
+        if hasta:
+            items = items.filter(asiento__fecha__date__lte=hasta)
+        return sum((i.debe for i in items), Decimal("0"))
+
+    def test_snapshot_se_mantiene_en_altas_y_bajas(self):
+        marzo = SaldoCuentaPeriodo.objects.get(cuenta=self.caja, periodo=date(2024, 3, 1))
+        self.assertEqual(marzo.debe, Decimal("140"))
+
+        self._asiento(date(2024, 3, 1), 10).delete()
+        asiento = Asiento.objects.filter(fecha__date=date(2024, 3, 5)).get()
+        ItemAsiento.objects.create(asiento=asiento, cuenta=self.caja, debe=5, haber=0)
+        asiento.items.filter(debe=100).update(debe=100)  # update() no pasa por señales: no debe afectar
+        marzo.refresh_from_db()
+        self.assertEqual(marzo.debe, Decimal("145"))
+
+        asiento.delete()
+        marzo.refresh_from_db()
+        self.assertEqual(marzo.debe, Decimal("40"))
+
+    def test_totales_coinciden_con_items_en_vivo(self):
+        rangos = [
+            (None, None), (date(2024, 3, 1), date(2024, 3, 31)), (date(2024, 3, 6), date(2024, 6, 30)),
+            (date(2024, 3, 1), date(2024, 6, 29)), (None, date(2024, 4, 9)), (date(2024, 4, 1), None),
+            (self.hoy.replace(day=1), self.hoy), (date(2024, 5, 1), date(2024, 5, 31)),
+        ]
+        for desde, hasta in rangos:
+            with self.subTest(desde=desde, hasta=hasta):
+                with CaptureQueriesContext(connection) as ctx:
+                    totales = SaldosService.totales(self.ejercicio.id, desde, hasta, [self.caja.id])
+                self.assertLessEqual(len(ctx.captured_queries), 2)
+                self.assertEqual(totales.get(self.caja.id, (Decimal("0"),))[0], self._en_vivo(desde, hasta))
+
+    def test_reconstruir_reproduce_los_snapshots(self):
+        antes = set(SaldoCuentaPeriodo.objects.values_list('cuenta_id', 'periodo', 'debe', 'haber'))
+        SaldoCuentaPeriodo.objects.all().delete()
+        SaldosService.reconstruir()
+        despues = set(SaldoCuentaPeriodo.objects.values_list('cuenta_id', 'periodo', 'debe', 'haber'))
+        self.assertEqual(antes, despues)
+
+    def test_reconstruir_agrupa_por_mes_en_hora_local(self):
+        # 30/04 23:30 en Buenos Aires ya es 1/05 en UTC: el snapshot debe quedar en abril
+        asiento = self._asiento(date(2024, 4, 1), 9)
+        Asiento.objects.filter(pk=asiento.pk).update(
+            fecha=timezone.make_aware(datetime(2024, 4, 30, 23, 30)))
+        SaldosService.reconstruir(self.ejercicio.id)
+        abril = SaldoCuentaPeriodo.objects.get(cuenta=self.caja, periodo=date(2024, 4, 1))
+        self.assertEqual(abril.debe, Decimal("16"))
+        self.assertFalse(SaldoCuentaPeriodo.objects.filter(cuenta=self.caja, periodo=date(2024, 5, 1)).exists())
+
+
+class MayorServiceTestCase(TestCase):
+    """Libro mayor: descendientes en 1 consulta, paginación keyset y streaming NDJSON"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        self.ejercicio = EjercicioContable.objects.create(
+            descripcion="Actual", fecha_inicio=date(2000, 1, 1), fecha_fin=date(2099, 12, 31)
+        )
+        # Códigos que no respetan el prefijo del padre: la jerarquía se toma de `padre`
+        self.rubro = PlanCuenta.objects.create(codigo="1", nombre="Activo", tipo="ACTIVO", imputable=False)
+        self.subrubro = PlanCuenta.objects.create(
+            codigo="7.7", nombre="Disponibilidades", tipo="ACTIVO", imputable=False, padre=self.rubro
+        )
+        self.caja = PlanCuenta.objects.create(codigo="1.1.01", nombre="Caja", tipo="ACTIVO", padre=self.subrubro)
+        self.banco = PlanCuenta.objects.create(codigo="1.2", nombre="Banco", tipo="ACTIVO", padre=self.rubro)
+        self.ventas = PlanCuenta.objects.create(codigo="4.1", nombre="Ventas", tipo="R_POS")
+        for i, fecha in enumerate([date(2024, 1, 10), date(2024, 2, 1), date(2024, 2, 1), date(2024, 2, 15),
+                                   date(2024, 3, 3)], start=1):
+            cuenta = self.caja if i % 2 else self.banco
+            AsientoBuilder(self.ejercicio, fecha, f"Mov {i}").debe(cuenta, i * 10).haber(self.ventas, i * 10).registrar()
+        self.url = reverse('api_mayor_consultar')
+        self.params = {"cuenta_id": self.rubro.id, "ejercicio_id": self.ejercicio.id,
+                       "fecha_desde": "2024-02-01", "fecha_hasta": "2024-03-31"}
+
+    def test_descendientes_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            ids = MayorService.cuentas_ids(self.rubro)
+        self.assertEqual(sorted(ids), sorted([self.rubro.id, self.subrubro.id, self.caja.id, self.banco.id]))
+        self.assertEqual(MayorService.cuentas_ids(self.caja), [self.caja.id])
+
+    def test_consulta_completa(self):
+        data = self.client.get(self.url, self.params).json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["resumen"]["saldo_inicial"], 10.0)
+        self.assertEqual(data["resumen"]["total_debe"], 140.0)
+        self.assertEqual(data["resumen"]["saldo_final"], 150.0)
+        self.assertEqual([m["debe"] for m in data["movimientos"]], [20.0, 30.0, 40.0, 50.0])
+        self.assertEqual(data["movimientos"][-1]["saldo"], 150.0)
+        self.assertIsNone(data["siguiente"])
+
+    def test_paginacion_keyset_reproduce_la_consulta(self):
+        completa = self.client.get(self.url, self.params).json()["movimientos"]
+        paginas, cursor = [], None
+        while True:
+            params = dict(self.params, limite=1)
+            if cursor:
+                params["cursor"] = cursor
+            data = self.client.get(self.url, params).json()
+            paginas.extend(data["movimientos"])
+            cursor = data["siguiente"]
+            if not cursor:
+                break
+        self.assertEqual(paginas, completa)
+
+    def test_ndjson_y_exportacion(self):
+        response = self.client.get(self.url, dict(self.params, formato="ndjson"))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lineas = [json.loads(l) for l in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lineas[0]["resumen"]["saldo_final"], 150.0)
+        self.assertEqual([m["saldo"] for m in lineas[1:]], [30.0, 60.0, 100.0, 150.0])
+
+        import openpyxl
+        from io import BytesIO
+        response = self.client.get(reverse('api_mayor_exportar'), self.params)
+        self.assertEqual(response.status_code, 200)
+        filas = list(openpyxl.load_workbook(BytesIO(response.content)).active.values)
+        self.assertEqual(filas[5][:2], ('Saldo Inicial:', 10))
+        self.assertEqual(filas[-1][0], 'TOTALES')
+        self.assertEqual(filas[-1][3:], (140, 0, 150))
+
+
+class DashboardServiceTestCase(TestCase):
+    """Dashboard: agregados en la base, cache por sección e invalidación por signals"""
+
+    def setUp(self):
+        CacheVersionado.limpiar()
+        self.hoy = timezone.localdate()
+        self.cliente = Cliente.objects.create(nombre="Cliente Test", condicion_fiscal="CF")
+        self.proveedor = Proveedor.objects.create(nombre="Proveedor Test")
+        self.producto = Producto.objects.create(
+            codigo="D1", descripcion="Producto D", stock=100, costo=Decimal("40.00"),
+            precio_efectivo=Decimal("100"), precio_tarjeta=Decimal("100"), precio_ctacte=Decimal("100")
+        )
+        self.usuario = User.objects.create_superuser("admin", "a@a.com", "x")
+        self.hace_dos_meses = (self.hoy.replace(day=1) - timedelta(days=40)).replace(day=15)
+        self._venta(self.hoy, 2)
+        self._venta(self.hace_dos_meses, 3)
+        compra = Compra.objects.create(proveedor=self.proveedor, total=Decimal("70"))
+        Compra.objects.filter(pk=compra.pk).update(fecha=self._dt(self.hace_dos_meses))
+
+    def _dt(self, fecha):
+        return timezone.make_aware(datetime.combine(fecha, datetime.min.time().replace(hour=12)))
+
+    def _venta(self, fecha, cantidad):
+        venta = Venta.objects.create(cliente=self.cliente, tipo_comprobante="B", total=Decimal(100 * cantidad))
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=cantidad,
+                                    precio_unitario=100, subtotal=100 * cantidad)
+        Venta.objects.filter(pk=venta.pk).update(fecha=self._dt(fecha))
+        return venta
+
+    def _stats(self):
+        return DashboardService.stats(self._dt(self.hoy.replace(day=1)), self._dt(self.hoy), self.hoy)
+
+    def test_costo_y_grafico_mensual_agregados(self):
+        self.assertEqual(DashboardService.costo_ventas(Venta.objects.all()), Decimal("200"))
+        with self.assertNumQueries(3):  # ventas por mes, compras por mes, top productos
+            mensual = DashboardService._calcular_mensual(self.hoy)
+        self.assertEqual(mensual["chart"]["data"][-1], 200.0)
+        self.assertEqual(mensual["chart"]["data"][-3], 300.0)
+        self.assertEqual(mensual["chart"]["datasets"][1]["data"][-3], 70.0)
+
+        data = self._stats()
+        self.assertEqual(data["kpi"]["utilidad_hoy"], 120.0)
+        self.assertEqual(data["rentabilidad"]["costos"], 80.0)
+
+    def test_cache_e_invalidacion(self):
+        self._stats()
+        with self.assertNumQueries(0):
+            data = self._stats()
+        self.assertEqual(data["kpi"]["ventas_hoy"], 200.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._venta(self.hoy, 1)
+        data = self._stats()
+        self.assertEqual(data["kpi"]["ventas_hoy"], 300.0)
+        self.assertEqual(data["chart"]["data"][-1], 300.0)
+
+    def test_endpoint(self):
+        request = RequestFactory().get(reverse('api_dashboard_stats'))
+        request.user = self.usuario
+        response = api_dashboard_stats(request)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data["kpi"]["cantidad_ventas_hoy"], 1)
+        self.assertEqual(len(data["proyeccion"]["labels"]), 31)
+
+
+class PrecioServiceTestCase(TestCase):
+    """Actualización masiva de precios: UPDATE de conjunto, dry-run, historial y reversión"""
+
+    def setUp(self):
+        self.rubro = Rubro.objects.create(nombre="Rubro Test")
+        self.productos = [
+            Producto.objects.create(
+                codigo=f"P{i}", descripcion=f"Producto {i}", rubro=self.rubro if i < 3 else None,
+                costo=Decimal("10.00") * (i + 1), precio_efectivo=Decimal("33.33"),
+                precio_tarjeta=Decimal("40"), precio_ctacte=Decimal("50"), precio_lista4=None
+            )
+            for i in range(4)
+        ]
+        self.url = reverse('api_actualizar_precios_masivo')
+
+    def _post(self, **data):
+        payload = {"tipo_actualizacion": "PORCENTAJE", "valor": 10, "campos": ["precio_efectivo"],
+                   "rubros": [self.rubro.id], "marcas": [], "productos": []}
+        payload.update(data)
+        return json.loads(self.client.post(self.url, json.dumps(payload), content_type="application/json").content)
+
+    def test_porcentaje_y_monto(self):
+        data = self._post(campos=["precio_efectivo", "precio_lista4"])
+        self.assertEqual(data["productos_actualizados"], 3)
+        p0 = Producto.objects.get(pk=self.productos[0].pk)
+        self.assertEqual(p0.precio_efectivo, Decimal("36.66"))
+        self.assertEqual(p0.precio_lista4, Decimal("0.00"))
+        self.assertEqual(Producto.objects.get(pk=self.productos[3].pk).precio_efectivo, Decimal("33.33"))
+
+        self._post(tipo_actualizacion="MONTO", valor=-15, campos=["costo"])
+        costos = list(Producto.objects.order_by('codigo').values_list('costo', flat=True))
+        self.assertEqual(costos, [Decimal("0"), Decimal("5"), Decimal("15"), Decimal("40")])
+
+    def test_dry_run_no_modifica(self):
+        data = self._post(dry_run=True)
+        self.assertTrue(data["dry_run"])
+        self.assertEqual(data["cantidad"], 3)
+        self.assertEqual(data["muestra"][0]["cambios"]["precio_efectivo"], {"anterior": 33.33, "nuevo": 36.66})
+        self.assertFalse(Producto.objects.exclude(precio_efectivo=Decimal("33.33")).exists())
+        self.assertFalse(ActualizacionPrecios.objects.exists())
+
+    def test_historial_y_reversion(self):
+        data = self._post(campos=["precio_efectivo", "precio_lista4"])
+        actualizacion = ActualizacionPrecios.objects.get(pk=data["actualizacion_id"])
+        self.assertEqual(actualizacion.items.count(), 3)
+
+        self.assertEqual(PrecioService.revertir(actualizacion.id), 3)
+        self.assertFalse(Producto.objects.exclude(precio_efectivo=Decimal("33.33")).exists())
+        self.assertFalse(Producto.objects.filter(precio_lista4__isnull=False).exists())
+        with self.assertRaises(ValueError):
+            PrecioService.revertir(actualizacion.id)
+
+    def test_consultas_constantes_y_campos_validados(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as ctx:
+                PrecioService.aplicar(Producto.objects.all(), ["costo"], "PORCENTAJE", Decimal("5"))
+            return len(ctx.captured_queries)
+
+        antes = consultas()
+        Producto.objects.bulk_create([
+            Producto(codigo=f"X{i}", descripcion="Extra", precio_efectivo=1, precio_tarjeta=1, precio_ctacte=1)
+            for i in range(50)
+        ])
+        self.assertEqual(consultas(), antes)
+
+        data = self._post(campos=["stock"])
+        self.assertFalse(data["ok"])
+
+
+class ProductoBuscadorTestCase(TestCase):
+    """Buscador de productos: texto normalizado, ranking por código e índice en memoria"""
+
+    def setUp(self):
+        ProductoBuscador.invalidar()
+        self.marca = Marca.objects.create(nombre="Acmé")
+        datos = [("779123", "Tornillo hexagonal 3/8"), ("AB-10", "Tuerca Ñandú"),
+                 ("X1", "Cinta aislante 779123"), ("779123-B", "Tornillo de bronce")]
+        self.productos = {
+            codigo: Producto.objects.create(
+                codigo=codigo, descripcion=descripcion, marca=self.marca if codigo == "AB-10" else None,
+                precio_efectivo=1, precio_tarjeta=1, precio_ctacte=1
+            )
+            for codigo, descripcion in datos
+        }
+
+    def _codigos(self, texto):
+        return list(ProductoBuscador.filtrar(texto).values_list('codigo', flat=True))
+
+    def test_texto_normalizado(self):
+        self.assertEqual(texto_busqueda("AB-10", "Tuerca Ñandú", "Acmé"), "ab 10 ab10 tuerca nandu acme")
+        self.assertEqual(Producto.objects.get(codigo="AB-10").busqueda, "ab 10 ab10 tuerca nandu acme")
+
+    def test_busqueda_y_ranking(self):
+        self.assertEqual(self._codigos("779123"), ["779123", "779123-B", "X1"])
+        self.assertEqual(self._codigos("torn hex"), ["779123"])
+        self.assertEqual(self._codigos("NANDU"), ["AB-10"])
+        self.assertEqual(self._codigos("ab10"), ["AB-10"])
+        self.assertEqual(self._codigos("acme"), ["AB-10"])
+        self.assertEqual(self._codigos("zzz"), [])
+
+    def test_indice_se_actualiza(self):
+        self.assertEqual(self._codigos("bronce"), ["779123-B"])
+        producto = self.productos["779123-B"]
+        producto.descripcion = "Tornillo de acero"
+        producto.save()
+        self.assertEqual(self._codigos("bronce"), [])
+        self.assertEqual(self._codigos("acero"), ["779123-B"])
+
+        self.marca.nombre = "Otra Marca"
+        self.marca.save()
+        self.assertEqual(self._codigos("otra"), ["AB-10"])
+
+        producto.delete()
+        self.assertEqual(self._codigos("acero"), [])
+
+    def test_endpoints(self):
+        data = json.loads(self.client.get(reverse('api_buscar_productos'), {"q": "779123"}).content)
+        self.assertEqual([p["codigo"] for p in data], ["779123", "779123-B", "X1"])
+        data = json.loads(self.client.get(reverse('api_productos_lista'), {"busqueda": "tornillo"}).content)
+        self.assertEqual(data["total"], 2)
+
+
+class CuentaCorrienteTestCase(TestCase):
+    """Saldo acumulado persistido y consulta por rango/cursor de la cuenta corriente de clientes"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente CC", condicion_fiscal="CF")
+        self.usuario = User.objects.create_superuser("cc", "cc@example.com", "x")
+        self.movimientos = [
+            CuentaCorrienteService.registrar(self.cliente, tipo, monto, f"Mov {i}")
+            for i, (tipo, monto) in enumerate([('DEBE', 100), ('DEBE', 50), ('HABER', 30), ('DEBE', 10)])
+        ]
+        # Fechas en días distintos (auto_now_add): hace 3, 2, 1 y 0 días
+        ahora = timezone.now()
+        for i, movimiento in enumerate(self.movimientos):
+            MovimientoCuentaCorriente.objects.filter(pk=movimiento.pk).update(fecha=ahora - timedelta(days=3 - i))
+
+    def _get(self, **params):
+        request = RequestFactory().get('/api/ctacte/', params)
+        request.user = self.usuario
+        return json.loads(api_cc_cliente_movimientos(request, self.cliente.id).content)
+
+    def test_registrar_encadena_saldo(self):
+        self.assertEqual([m.saldo for m in self.movimientos], [100, 150, 120, 130])
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.saldo_actual, Decimal("130"))
+        # El saldo parte del último movimiento aunque Cliente.saldo_actual esté desfasado
+        Cliente.objects.filter(pk=self.cliente.pk).update(saldo_actual=999)
+        movimiento = CuentaCorrienteService.registrar(self.cliente, 'HABER', 30, "Pago")
+        self.assertEqual(movimiento.saldo, Decimal("100"))
+        self.assertEqual(self.cliente.saldo_actual, Decimal("100"))
+
+    def test_rango_y_saldo_inicial(self):
+        hoy = timezone.localdate()
+        with CaptureQueriesContext(connection) as ctx:
+            data = self._get(desde=(hoy - timedelta(days=2)).isoformat(), hasta=(hoy - timedelta(days=1)).isoformat())
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+        # El listado sólo usa venta_id/recibo_id: sin JOIN a ventas ni recibos
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if 'JOIN' in q['sql']])
+        self.assertEqual([m["descripcion"] for m in data["movimientos"]], ["Mov 2", "Mov 1"])
+        self.assertEqual([m["saldo"] for m in data["movimientos"]], [120, 150])
+        self.assertEqual(data["saldo_inicial"], 100)
+        self.assertEqual(data["cliente"]["saldo_actual"], 130)
+
+    def test_cursor(self):
+        pagina = self._get(limite=3)
+        self.assertEqual([m["descripcion"] for m in pagina["movimientos"]], ["Mov 3", "Mov 2", "Mov 1"])
+        pagina = self._get(limite=3, cursor=pagina["siguiente"])
+        self.assertEqual([m["descripcion"] for m in pagina["movimientos"]], ["Mov 0"])
+        self.assertIsNone(pagina["siguiente"])
+        self.assertEqual(len(self._get()["movimientos"]), 4)
+
+    def test_recalcular(self):
+        MovimientoCuentaCorriente.objects.filter(pk=self.movimientos[1].pk).update(saldo=0)
+        self.assertEqual(CuentaCorrienteService.recalcular(self.cliente.id), (1, Decimal("130")))
+        CuentaCorrienteService.recalcular(self.cliente.id, reparar=True)
+        self.assertEqual(CuentaCorrienteService.recalcular(self.cliente.id), (0, Decimal("130")))
+        self.assertEqual(MovimientoCuentaCorriente.objects.get(pk=self.movimientos[1].pk).saldo, Decimal("150"))
+
+
+class ListadoKeysetTestCase(TestCase):
+    """Listados de comprobantes con cursor (fecha, id) y exportación en streaming"""
+
+    def setUp(self):
+        CacheVersionado.limpiar()
+        Empresa.objects.create(nombre="Empresa Test", cuit="20123456789", direccion="Calle 1",
+                               condicion_fiscal="RI", punto_venta="0003")
+        self.cliente = Cliente.objects.create(nombre="Cliente Listado", condicion_fiscal="CF")
+        Venta.objects.bulk_create([
+            Venta(cliente=self.cliente, tipo_comprobante='B', total=Decimal(i)) for i in range(1, 8)
+        ])
+        # Fechas repetidas: el desempate por id debe evitar filas duplicadas u omitidas entre páginas
+        self.ventas = list(Venta.objects.order_by('id'))
+        ahora = timezone.now()
+        Venta.objects.filter(id__in=[v.id for v in self.ventas[:4]]).update(fecha=ahora - timedelta(days=1))
+        Venta.objects.filter(id__in=[v.id for v in self.ventas[4:]]).update(fecha=ahora)
+        self.url = reverse('api_ventas_listar')
+
+    def test_paginas_sin_repetidos(self):
+        ids, cursor = [], None
+        while True:
+            params = {"limite": 3, **({"cursor": cursor} if cursor else {})}
+            with CaptureQueriesContext(connection) as ctx:
+                data = json.loads(self.client.get(self.url, params).content)
+            # Versiones del cache compartido (1 lectura por request) + Empresa (sólo la 1ra vez) + página
+            self.assertLessEqual(len(ctx.captured_queries), 3)
+            self.assertEqual(sum('cache_compartido' in q['sql'] for q in ctx.captured_queries), 1)
+            ids += [v["id"] for v in data["data"]]
+            cursor = data["siguiente"]
+            if not cursor:
+                break
+        esperado = [v.id for v in reversed(self.ventas[4:])] + [v.id for v in reversed(self.ventas[:4])]
+        self.assertEqual(ids, esperado)
+        self.assertEqual(data["data"][-1]["numero_factura"], f"0003-{self.ventas[0].id:08d}")
+
+    def test_listado_completo_consultas_constantes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = json.loads(self.client.get(self.url).content)
+        self.assertEqual(len(data["data"]), 7)
+        # Versiones del cache compartido + Empresa + página
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+    def test_pagina_por_defecto(self):
+        with mock.patch.object(ListadoKeyset, 'LIMITE_MAXIMO', 5):
+            data = json.loads(self.client.get(self.url).content)
+            self.assertEqual(len(data["data"]), 5)
+            resto = json.loads(self.client.get(self.url, {"cursor": data["siguiente"]}).content)
+        self.assertEqual(len(resto["data"]), 2)
+        self.assertIsNone(resto["siguiente"])
+
+    def test_exportacion(self):
+        response = self.client.get(self.url, {"formato": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lineas = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 7)
+        self.assertEqual(json.loads(lineas[0])["cliente"], "Cliente Listado")
+
+        response = self.client.get(self.url, {"formato": "csv"})
+        filas = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(filas[0].split(",")[0], "id")
+        self.assertEqual(len(filas), 8)
+
+    def test_remitos_con_cursor(self):
+        Remito.objects.bulk_create([Remito(cliente=self.cliente, venta_asociada=v) for v in self.ventas[:3]])
+        request = RequestFactory().get('/api/remitos/listar/', {"limite": 2})
+        request.user = User.objects.create_superuser("listado", "l@example.com", "x")
+        data = json.loads(api_remitos_listar(request).content)
+        self.assertEqual(len(data["remitos"]), 2)
+        self.assertIsNotNone(data["siguiente"])
+        self.assertEqual(data["remitos"][0]["venta_str"], f"0003-{self.ventas[2].id:08d}")
+
+
+class ConfiguracionEmpresaTestCase(TestCase):
+    """Cache de proceso de Empresa con versión compartida"""
+
+    def setUp(self):
+        CacheVersionado.limpiar()
+        self.empresa = Empresa.objects.create(nombre="Empresa Test", cuit="20123456789", direccion="Calle 1",
+                                              condicion_fiscal="RI", punto_venta="0007")
+        self.cliente = Cliente.objects.create(nombre="Cliente Config", condicion_fiscal="CF")
+
+    def test_sin_consultas_repetidas(self):
+        ConfiguracionEmpresa.obtener()
+        ventas = [Venta.objects.create(cliente=self.cliente, tipo_comprobante='B', total=1) for _ in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            numeros = [venta.numero_factura_formateado() for venta in ventas]
+            ConfiguracionEmpresa.obtener()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(numeros[0], f"0007-{ventas[0].id:08d}")
+
+    def test_invalidacion_al_guardar(self):
+        self.assertEqual(ConfiguracionEmpresa.valor('punto_venta'), "0007")
+        self.empresa.punto_venta = "0008"
+        self.empresa.save()
+        self.assertEqual(ConfiguracionEmpresa.valor('punto_venta'), "0008")
+
+    def test_version_de_otro_proceso(self):
+        ConfiguracionEmpresa.obtener()
+        # Otro worker guardó la empresa: cambia la versión compartida pero no la copia local
+        Empresa.objects.filter(pk=self.empresa.pk).update(habilita_remitos=False)
+        cache.incr(CacheVersionado.clave_version(ConfiguracionEmpresa.ESPACIO))
+        self.assertTrue(ConfiguracionEmpresa.valor('habilita_remitos'))  # Ya verificada en este request
+        CacheVersionado.nueva_solicitud()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(ConfiguracionEmpresa.valor('habilita_remitos'))
+            ConfiguracionEmpresa.valor('habilita_remitos')
+        # Con el cache de settings: 1 lectura de versiones + 1 de Empresa
+        self.assertEqual([q['sql'].count('cache_compartido') > 0 for q in ctx.captured_queries], [True, False])
+
+
+class CajaTotalesTestCase(TestCase):
+    """Totales incrementales de CajaDiaria y PosicionCaja mantenidos por CajaService"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser("caja", "caja@example.com", "x")
+        self.caja = CajaDiaria.objects.create(usuario=self.usuario, monto_apertura=100)
+        self.apertura = MovimientoCaja.objects.create(
+            caja_diaria=self.caja, usuario=self.usuario, tipo='Ingreso', descripcion="Apertura", monto=100
+        )
+
+    def _mov(self, tipo, monto, caja=None):
+        return MovimientoCaja.objects.create(
+            caja_diaria=caja or self.caja, usuario=self.usuario, tipo=tipo, descripcion=tipo, monto=monto
+        )
+
+    def _totales(self, caja=None):
+        caja = caja or self.caja
+        caja.refresh_from_db()
+        return caja.total_ingresos, caja.total_egresos
+
+    def test_alta_edicion_y_baja(self):
+        egreso = self._mov('Egreso', 30)
+        self._mov('Ingreso', 20)
+        self.assertEqual(self._totales(), (Decimal("120"), Decimal("30")))
+
+        egreso.monto = Decimal("45")
+        egreso.save()
+        self.assertEqual(self._totales(), (Decimal("120"), Decimal("45")))
+        egreso.tipo = 'Ingreso'
+        egreso.save()
+        self.assertEqual(self._totales(), (Decimal("165"), Decimal("0")))
+
+        otra = CajaDiaria.objects.create(usuario=self.usuario, monto_apertura=0)
+        egreso.caja_diaria = otra
+        egreso.save()
+        self.assertEqual(self._totales(), (Decimal("120"), Decimal("0")))
+        self.assertEqual(self._totales(otra), (Decimal("45"), Decimal("0")))
+
+        egreso.delete()
+        self.assertEqual(self._totales(otra), (Decimal("0"), Decimal("0")))
+        self.assertEqual(CajaService.posicion().saldo, Decimal("120"))
+
+    def test_saldo_actual_sin_agregar(self):
+        self._mov('Egreso', 30)
+        request = RequestFactory().get('/api/caja/saldo/')
+        request.user = self.usuario
+        with CaptureQueriesContext(connection) as ctx:
+            data = json.loads(api_caja_saldo_actual(request).content)
+        self.assertEqual(data, {'saldo': 70.0, 'ingresos': 100.0, 'egresos': 30.0})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('SUM(', ctx.captured_queries[0]['sql'].upper())
+
+    def test_reconciliar(self):
+        movimiento = self._mov('Egreso', 30)
+        self.assertEqual(CajaService.reconciliar(), ([], None))
+        # Las escrituras masivas no pasan por los signals: los totales quedan desfasados
+        MovimientoCaja.objects.filter(pk=movimiento.pk).update(monto=50)
+        diferencias, diferencia_global = CajaService.reconciliar(reparar=True)
+        self.assertEqual(diferencias, [(self.caja.id, (Decimal("100"), Decimal("30")), (Decimal("100"), Decimal("50")))])
+        self.assertEqual(diferencia_global, ((Decimal("100"), Decimal("30")), (Decimal("100"), Decimal("50"))))
+        self.assertEqual(self._totales(), (Decimal("100"), Decimal("50")))
+        self.assertEqual(CajaService.reconciliar(), ([], None))
+
+
+class CarteraChequesTestCase(TestCase):
+    """KPIs de cheques en 1 consulta cacheada, listado paginado y escalera de vencimientos"""
+
+    def setUp(self):
+        CacheVersionado.limpiar()
+        self.usuario = User.objects.create_superuser("cheques", "cheques@example.com", "x")
+        self.hoy = timezone.localdate()
+        self.lunes = self.hoy - timedelta(days=self.hoy.weekday())
+        for i in range(6):
+            cliente = Cliente.objects.create(nombre=f"Cliente Ch {i}", condicion_fiscal="CF")
+            self._cheque(f"T{i}", 100, self.lunes + timedelta(days=i * 3), cliente=cliente)
+        self._cheque("P1", 40, self.lunes + timedelta(days=8), tipo='PROPIO', estado='ENTREGADO')
+        self._cheque("R1", 25, self.lunes, estado='RECHAZADO')
+        self._cheque("V1", 10, self.lunes - timedelta(days=1))
+
+    def _cheque(self, numero, monto, fecha_pago, **kwargs):
+        return Cheque.objects.create(
+            numero=numero, banco="BN", fecha_emision=self.hoy, fecha_pago=fecha_pago, monto=monto, **kwargs
+        )
+
+    def _get(self, vista, **params):
+        request = RequestFactory().get('/api/cheques/', params)
+        request.user = self.usuario
+        return json.loads(vista(request).content)
+
+    def test_kpis_una_consulta_y_cache(self):
+        with CaptureQueriesContext(connection) as ctx:
+            kpis = CarteraChequesService.kpis()
+        self.assertEqual(len([q for q in ctx.captured_queries if 'administrar_cheque' in q['sql']]), 1)
+        self.assertEqual(kpis['cartera_terceros'], {'total': Decimal("610"), 'count': 7})
+        self.assertEqual(kpis['apagar_propios']['total'], Decimal("40"))
+        self.assertEqual(kpis['rechazados']['total'], Decimal("25"))
+        with CaptureQueriesContext(connection) as ctx:
+            CarteraChequesService.kpis()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        # Un cambio en cualquier cheque invalida el cache
+        Cheque.objects.get(numero="T0").delete()
+        self.assertEqual(CarteraChequesService.kpis()['cartera_terceros']['count'], 6)
+
+    def test_listado_sin_consultas_por_fila(self):
+        CarteraChequesService.kpis()
+        with CaptureQueriesContext(connection) as ctx:
+            data = self._get(api_cheques_listar, per_page=20)
+        self.assertEqual(data['total'], 9)
+        self.assertEqual(len(data['data']), 9)
+        self.assertEqual(data['data'][0]['origen_destino'], "Cliente Ch 5")
+        self.assertEqual(len([q for q in ctx.captured_queries if 'administrar_cheque' in q['sql']]), 2)
+
+    def test_escalera_vencimientos(self):
+        data = self._get(api_cheques_vencimientos, desde=self.hoy.isoformat(), semanas=3)
+        self.assertEqual([s['desde'] for s in data['semanas']],
+                         [(self.lunes + timedelta(weeks=i)).isoformat() for i in range(3)])
+        self.assertEqual([s['cobrar'] for s in data['semanas']], [300.0, 200.0, 100.0])
+        self.assertEqual([s['pagar'] for s in data['semanas']], [0.0, 40.0, 0.0])
+        self.assertEqual(data['vencidos'], {'cobrar': 10.0, 'pagar': 0.0})
+        self.assertEqual(self._get(api_cheques_vencimientos, semanas='x').get('ok'), False)
+
+
+class InventarioTestCase(TestCase):
+    """Conteo físico de inventario: diferencias por lote, bulk_create de movimientos y stock con F()"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser("inventario", "inventario@example.com", "x")
+        self.productos = [
+            Producto.objects.create(
+                codigo=f"INV{i:02d}", descripcion=f"Producto {i}", stock=10,
+                precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120
+            )
+            for i in range(6)
+        ]
+
+    def _stock(self):
+        return list(Producto.objects.order_by('codigo').values_list('stock', flat=True))
+
+    def test_leer_csv(self):
+        lineas = ["\ufeffCodigo;Cantidad\n", "INV00;12\n", "INV01;3,00\n", "INV00;1\n", "INV02;1,5\n", ";4\n"]
+        conteo, errores = InventarioService.conteo(InventarioService.leer(lineas, 'csv'))
+        self.assertEqual(conteo, {'INV00': 13, 'INV01': 3})
+        self.assertEqual([e['linea'] for e in errores], [5, 6])
+
+    def test_simulacion_y_aplicacion(self):
+        conteo = {'INV00': 13, 'INV01': 3, 'INV02': 10, 'INV03': 13, 'NOEXISTE': 1}
+        informe = InventarioService.aplicar_conteo(conteo)
+        self.assertFalse(informe['aplicado'])
+        self.assertEqual([a['diferencia'] for a in informe['ajustes']], [3, -7, 3])
+        self.assertEqual(informe['no_encontrados'], ['NOEXISTE'])
+        self.assertEqual(informe['sin_cambios'], 1)
+        self.assertEqual(MovimientoStock.objects.count(), 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            InventarioService.aplicar_conteo(conteo, aplicar=True)
+        # SELECT + INSERT + un UPDATE por diferencia distinta (+3, -7), sin consultas por producto
+        self.assertLessEqual(len([q for q in ctx.captured_queries if 'administrar_' in q['sql']]), 4)
+        self.assertEqual(self._stock(), [13, 3, 10, 13, 10, 10])
+        self.assertEqual(
+            sorted(MovimientoStock.objects.values_list('tipo', 'cantidad')),
+            [('IN', Decimal("3")), ('IN', Decimal("3")), ('OUT', Decimal("7"))]
+        )
+
+    def test_endpoint(self):
+        cuerpo = "codigo,cantidad\nINV00,15\nINV01,0\n"
+        request = RequestFactory().post('/api/stock/inventario/?aplicar=1', cuerpo, content_type='text/csv')
+        request.user = self.usuario
+        data = json.loads(api_stock_inventario(request).content)
+        self.assertTrue(data['aplicado'])
+        self.assertEqual(self._stock()[:2], [15, 0])
+
+    def test_endpoint_requiere_permiso_productos(self):
+        request = RequestFactory().post('/api/stock/inventario/?aplicar=1', "codigo,cantidad\nINV00,0\n", content_type='text/csv')
+        request.user = User.objects.create_user("vendedor_inventario", "vendedor@example.com", "x")
+        self.assertEqual(api_stock_inventario(request).status_code, 403)
+        self.assertEqual(self._stock()[0], 10)
+        self.assertEqual(MovimientoStock.objects.count(), 0)
+
+    def test_ajuste_individual_no_trunca(self):
+        def ajustar(cantidad):
+            request = RequestFactory().post(
+                '/api/stock/ajuste/', json.dumps({'producto_id': self.productos[0].id, 'tipo': 'OUT', 'cantidad': cantidad}),
+                content_type='application/json'
+            )
+            return api_stock_ajuste_crear(request)
+
+        self.assertEqual(ajustar("2.5").status_code, 400)
+        data = json.loads(ajustar(4).content)
+        self.assertEqual((data['stock_anterior'], data['stock_nuevo']), (10, 6))
+        Empresa.objects.create(nombre="Empresa Test", cuit="20123456789", direccion="Calle 1",
+                               condicion_fiscal="RI", permitir_stock_negativo=False)
+        self.assertEqual(ajustar(7).status_code, 400)
+        self.assertEqual(self._stock()[0], 6)
+
+
+class LibroStockTestCase(TestCase):
+    """Movimientos con costo, stock con F() e inventario a una fecha desde cierres"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser("libro", "libro@example.com", "x")
+        self.hoy = timezone.localdate()
+        self.producto = Producto.objects.create(
+            codigo="LIB01", descripcion="Producto libro", stock=10, costo=5,
+            precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120
+        )
+        # Stock previo al libro (10, sin movimiento); salida de 3 hace 40 días y entrada de 5 hace 10
+        for tipo, cantidad, dias in (('OUT', 3, 40), ('IN', 5, 10)):
+            movimiento, = LibroStockService.registrar([(self.producto, tipo, cantidad)], referencia="Test")
+            MovimientoStock.objects.filter(pk=movimiento.pk).update(fecha=timezone.now() - timedelta(days=dias))
+
+    def test_registrar(self):
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 12)
+        self.assertEqual(set(MovimientoStock.objects.values_list('costo_unitario', flat=True)), {Decimal("5")})
+
+    def test_inventario_al(self):
+        cantidad = lambda dia: LibroStockService.inventario_al(dia)[self.producto.id][0]
+        # Sin cierres: reconstrucción hacia atrás desde el stock actual
+        self.assertEqual(cantidad(self.hoy - timedelta(days=20)), 7)
+        self.assertEqual(cantidad(self.hoy - timedelta(days=50)), 10)
+
+        self.assertEqual(LibroStockService.generar_cierre(self.hoy - timedelta(days=20)), (1, Decimal("35.00")))
+        # Con cierre: parte de la foto (alterada para comprobarlo) y suma los movimientos posteriores
+        CierreStock.objects.update(cantidad=100)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(cantidad(self.hoy - timedelta(days=5)), 105)
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+    def test_api_inventario_al(self):
+        request = RequestFactory().get('/api/stock/inventario-al/', {'fecha': (self.hoy - timedelta(days=20)).isoformat()})
+        request.user = self.usuario
+        data = json.loads(api_stock_inventario_al(request).content)
+        self.assertEqual(data['productos'], [{
+            'codigo': "LIB01", 'descripcion': "Producto libro", 'cantidad': 7.0, 'costo_unitario': 5.0, 'valor': 35.0
+        }])
+        self.assertEqual(data['valor_total'], 35.0)
+
+
+class CostoVentasTestCase(TestCase):
+    """CMV con el costo capturado en cada línea al momento de la venta"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente CMV", condicion_fiscal="CF")
+        self.producto = Producto.objects.create(
+            codigo="CMV01", descripcion="Producto CMV", stock=100, costo=40,
+            precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120
+        )
+        self.venta = Venta.objects.create(cliente=self.cliente, tipo_comprobante="B", total=300)
+        VentaService.registrar_items(self.venta, [{"id": self.producto.id, "cantidad": 3, "precio": 100, "subtotal": 300}])
+
+    def test_costo_capturado_al_vender(self):
+        self.assertEqual(DetalleVenta.objects.get(venta=self.venta).costo_unitario, Decimal("40"))
+        # Un cambio de costo posterior no altera el CMV de la venta ya registrada
+        Producto.objects.filter(pk=self.producto.pk).update(costo=55)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(VentaService.costo_ventas(Venta.objects.filter(pk=self.venta.pk)), Decimal("120"))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_backfill(self):
+        # Línea previa a la captura: el costo sale del movimiento de stock de la propia venta
+        DetalleVenta.objects.update(costo_unitario=None)
+        Producto.objects.filter(pk=self.producto.pk).update(costo=55)
+        self.assertEqual(VentaService.costo_ventas([self.venta.pk]), Decimal("165"))
+
+        call_command('backfill_costo_ventas', '--dry-run', stdout=StringIO())
+        self.assertIsNone(DetalleVenta.objects.get(venta=self.venta).costo_unitario)
+
+        self.assertEqual(VentaService.completar_costos(lote=1), (1, Decimal("120")))
+        self.assertEqual(DetalleVenta.objects.get(venta=self.venta).costo_unitario, Decimal("40"))
+        self.assertEqual(VentaService.completar_costos(), (0, Decimal("0")))
+
+        # Sin movimiento propio: último costo registrado antes de la venta
+        DetalleVenta.objects.update(costo_unitario=None)
+        MovimientoStock.objects.filter(referencia=f"Venta {self.venta.pk}").update(referencia="Otro")
+        movimiento, = LibroStockService.registrar([(self.producto, 'IN', 1)], referencia="Compra")
+        MovimientoStock.objects.filter(pk=movimiento.pk).update(
+            costo_unitario=30, fecha=self.venta.fecha - timedelta(days=1)
+        )
+        self.assertEqual(VentaService.completar_costos(), (1, Decimal("90")))
+
+
+class CentralizacionTestCase(TestCase):
+    """Centralización en bloque de ventas y CMV por rango de fechas"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        EjercicioContable.objects.create(descripcion="Actual", fecha_inicio=date(2000, 1, 1), fecha_fin=date(2099, 12, 31))
+        self.ventas_cta = PlanCuenta.objects.create(codigo="4.1.01", nombre="Ventas", tipo="R_POS")
+        self.deudores = PlanCuenta.objects.create(codigo="1.1.02.001", nombre="Deudores por Ventas", tipo="ACTIVO")
+        self.iva = PlanCuenta.objects.create(codigo="2.1.02.001", nombre="IVA Débito Fiscal", tipo="PASIVO")
+        PlanCuenta.objects.create(codigo="5.1.01.001", nombre="CMV", tipo="R_NEG")
+        PlanCuenta.objects.create(codigo="1.1.05.001", nombre="Mercaderías", tipo="ACTIVO")
+        self.cliente = Cliente.objects.create(nombre="Cliente Centralización", condicion_fiscal="CF")
+        self.producto = Producto.objects.create(
+            codigo="CEN01", descripcion="Producto", stock=100, costo=10,
+            precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120
+        )
+        self.hoy = timezone.localdate()
+        # Dos ventas B hace 3 días, una A hace 3 días y una B hace 1 día
+        self.ventas = []
+        for tipo, dias in (("B", 3), ("B", 3), ("A", 3), ("B", 1)):
+            venta = Venta.objects.create(cliente=self.cliente, tipo_comprobante=tipo, total=121, iva_amount=21)
+            VentaService.registrar_items(venta, [{"id": self.producto.id, "cantidad": 2, "precio": 60, "subtotal": 121}])
+            Venta.objects.filter(pk=venta.pk).update(fecha=timezone.now() - timedelta(days=dias))
+            self.ventas.append(venta)
+        self.desde = self.hoy - timedelta(days=5)
+
+    def test_ventas_por_documento(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = CentralizacionService.ventas(self.desde, self.hoy)
+        self.assertEqual((resultado['documentos'], resultado['asientos']), (4, 4))
+        # Escritura en bloque: 1 INSERT de asientos y 1 de ítems para todos los documentos
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(sum('"administrar_asiento"' in sql for sql in inserts), 1)
+        self.assertEqual(sum('"administrar_itemasiento"' in sql for sql in inserts), 1)
+
+        asientos = Asiento.objects.filter(origen="VENTAS").order_by('numero')
+        self.assertEqual(list(asientos.values_list('numero', flat=True)), [1, 2, 3, 4])
+        self.assertEqual(sorted(asientos.values_list('referencia_id', flat=True)), sorted(v.pk for v in self.ventas))
+        self.assertEqual(ItemAsiento.objects.count(), 12)
+        saldo = SaldoCuentaPeriodo.objects.filter(cuenta=self.deudores).aggregate(d=Sum('debe'))['d']
+        self.assertEqual(saldo, Decimal("484"))
+
+    def test_ventas_sin_ids_de_bulk_create(self):
+        # Como en MySQL: bulk_create no completa los ids de los asientos insertados
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            resultado = CentralizacionService.ventas(self.desde, self.hoy)
+        self.assertEqual(resultado['asientos'], 4)
+        for asiento in Asiento.objects.filter(origen="VENTAS"):
+            self.assertEqual(asiento.items.count(), 3)
+        self.assertEqual(DocumentoCentralizado.objects.filter(asiento__origen="VENTAS").count(), 4)
+
+        # Segunda pasada: el anti-join no encuentra pendientes
+        self.assertEqual(CentralizacionService.ventas(self.desde, self.hoy)['asientos'], 0)
+
+    def test_ventas_consolidadas(self):
+        resultado = CentralizacionService.ventas(self.desde, self.hoy, consolidado=True)
+        # Día -3: tipo A y tipo B; día -1: tipo B
+        self.assertEqual((resultado['documentos'], resultado['asientos']), (4, 3))
+        asiento_b = Asiento.objects.get(origen="VENTAS", descripcion__contains="Tipo B (2 comprobantes)")
+        self.assertEqual(
+            dict(asiento_b.items.values_list('cuenta__codigo', 'haber').exclude(haber=0)),
+            {"4.1.01": Decimal("200.00"), "2.1.02.001": Decimal("42.00")}
+        )
+        self.assertEqual(DocumentoCentralizado.objects.filter(origen="VENTAS", asiento=asiento_b).count(), 2)
+
+        # Al borrar un asiento sus documentos vuelven a quedar pendientes
+        asiento_b.delete()
+        self.assertEqual(CentralizacionService.ventas(self.desde, self.hoy)['documentos'], 2)
+
+    def test_ventas_registran_neto_y_percepciones(self):
+        percepciones = PlanCuenta.objects.create(codigo="2.1.04.006", nombre="Percepciones a Pagar", tipo="PASIVO")
+        venta = Venta.objects.create(cliente=self.cliente, tipo_comprobante="A", neto=100, iva_amount=21,
+                                     percepcion_iibb=3, total=124)
+        CentralizacionService.ventas(self.hoy, self.hoy)
+        asiento = Asiento.objects.get(origen="VENTAS", referencia_id=venta.pk)
+        self.assertEqual(
+            dict(asiento.items.values_list('cuenta_id', 'haber').exclude(haber=0)),
+            {self.ventas_cta.id: Decimal("100.00"), self.iva.id: Decimal("21.00"), percepciones.id: Decimal("3.00")}
+        )
+
+    def _api_asiento(self, movimientos):
+        request = RequestFactory().post('/', json.dumps({
+            "ejercicio_id": EjercicioContable.objects.get().id, "fecha": self.hoy.isoformat(),
+            "descripcion": "Manual", "movimientos": movimientos
+        }), content_type="application/json")
+        respuesta = api_asientos_crear(request)
+        return respuesta.status_code, json.loads(respuesta.content)
+
+    def test_api_asiento_con_cuenta_inexistente(self):
+        estado, data = self._api_asiento([{"cuenta_id": self.deudores.id, "debe": 10, "haber": 0},
+                                          {"cuenta_id": 999999, "debe": 0, "haber": 10}])
+        self.assertEqual(estado, 400)
+        self.assertIn("999999", data['error'])
+        self.assertFalse(Asiento.objects.exists())
+
+    def test_api_asiento_validaciones_sin_error_500(self):
+        casos = [
+            # Descuadre de 1 centavo: AsientoBuilder exige igualdad exacta
+            [{"cuenta_id": self.deudores.id, "debe": "10.01", "haber": 0},
+             {"cuenta_id": self.ventas_cta.id, "debe": 0, "haber": "10.00"}],
+            # Importe sin cuenta: no se descarta en silencio
+            [{"cuenta_id": self.deudores.id, "debe": 10, "haber": 0},
+             {"cuenta_id": self.ventas_cta.id, "debe": 0, "haber": 5}, {"debe": 0, "haber": 5}],
+            # Cuadrado pero con 1 sola línea con importe
+            [{"cuenta_id": self.deudores.id, "debe": 0, "haber": 0},
+             {"cuenta_id": self.ventas_cta.id, "debe": 0, "haber": 0}],
+        ]
+        for movimientos in casos:
+            with self.subTest(movimientos=movimientos):
+                self.assertEqual(self._api_asiento(movimientos)[0], 400)
+        self.assertFalse(Asiento.objects.exists())
+
+        estado, data = self._api_asiento([{"cuenta_id": self.deudores.id, "debe": "10.006", "haber": 0},
+                                          {"cuenta_id": self.ventas_cta.id, "debe": 0, "haber": "10.01"}])
+        self.assertEqual((estado, data['ok']), (200, True))
+
+    def test_comando_cmv(self):
+        salida = StringIO()
+        call_command('centralizar', '--desde', self.desde.isoformat(), '--hasta', self.hoy.isoformat(),
+                     '--solo', 'cmv', '--lote', '1', stdout=salida)
+        self.assertIn("Cmv: 4 documentos en 2 asientos ($80.00)", salida.getvalue())
+        self.assertEqual(
+            sorted(Asiento.objects.filter(descripcion__startswith="ASIENTO CMV").values_list('numero', flat=True)), [1, 2]
+        )
+
+
+class PermisosTestCase(TestCase):
+    """Máscara de permisos cacheada y actualización limitada de la sesión activa"""
+
+    def setUp(self):
+        CacheVersionado.limpiar()
+        self.usuario = User.objects.create_user("vendedor", "vendedor@example.com", "x")
+        self.perfil = PerfilUsuario.objects.create(user=self.usuario, acceso_ventas=True, acceso_remitos=True)
+        self.vista = verificar_permiso('ventas')(lambda request: HttpResponse("ok"))
+
+    def _get(self, path='/api/ventas/'):
+        request = RequestFactory().get(path)
+        request.user = self.usuario
+        return request
+
+    def test_mascara_cacheada(self):
+        self.assertEqual(
+            PermisosUsuario.obtener(self.usuario), PermisosUsuario.BITS['ventas'] | PermisosUsuario.BITS['remitos']
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.vista(self._get()).status_code, 200)
+            self.assertTrue(has_perm(self.usuario, 'remitos'))
+            self.assertFalse(has_perm(self.usuario, 'caja'))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        # Guardar el perfil invalida la máscara
+        self.perfil.acceso_ventas = False
+        self.perfil.save()
+        self.assertEqual(self.vista(self._get()).status_code, 403)
+        self.assertFalse(PermisosUsuario.tiene(self.usuario, 'inexistente'))
+
+    def test_revocacion_de_otro_proceso(self):
+        self.assertEqual(self.vista(self._get()).status_code, 200)
+        # Otro worker revocó el permiso: la versión compartida cambia, la máscara local no
+        PerfilUsuario.objects.filter(pk=self.perfil.pk).update(acceso_ventas=False)
+        cache.incr(CacheVersionado.clave_version(PermisosUsuario.ESPACIO))
+        CacheVersionado.nueva_solicitud()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.vista(self._get()).status_code, 403)
+            self.assertTrue(has_perm(self.usuario, 'remitos'))
+        # Con el cache de settings: 1 lectura de versiones + 1 del perfil
+        self.assertEqual([q['sql'].count('cache_compartido') > 0 for q in ctx.captured_queries], [True, False])
+
+    def test_sin_perfil(self):
+        self.perfil.delete()
+        self.assertEqual(PermisosUsuario.obtener(self.usuario), 0)
+        self.assertEqual(self.vista(self._get()).status_code, 403)
+
+    def test_actividad_de_sesion_limitada(self):
+        sesion = SessionStore()
+        sesion.create()
+        ActiveSession.objects.create(user=self.usuario, session_key=sesion.session_key, ip_address="127.0.0.1")
+        hace_rato = timezone.now() - timedelta(minutes=10)
+        ActiveSession.objects.update(last_activity=hace_rato)
+
+        request = self._get('/')
+        request.session = sesion
+        middleware = ActiveSessionMiddleware(lambda request: HttpResponse())
+        with CaptureQueriesContext(connection) as ctx:
+            middleware.process_request(request)
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['UPDATE'])
+        self.assertGreater(ActiveSession.objects.get().last_activity, hace_rato)
+
+        # Dentro del intervalo no se vuelve a escribir
+        with CaptureQueriesContext(connection) as ctx:
+            middleware.process_request(request)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+
+class PlanCuentasRutaTestCase(TestCase):
+    """Camino materializado del plan de cuentas: árbol en 1 consulta y descendientes por rango"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser("plan", "plan@example.com", "x")
+        self.activo = PlanCuenta.objects.create(codigo="1", nombre="Activo", tipo="ACTIVO", imputable=False)
+        self.disponible = PlanCuenta.objects.create(
+            codigo="1.1", nombre="Disponibilidades", tipo="ACTIVO", imputable=False, padre=self.activo
+        )
+        self.caja = PlanCuenta.objects.create(codigo="1.1.01", nombre="Caja", tipo="ACTIVO", padre=self.disponible)
+        self.creditos = PlanCuenta.objects.create(
+            codigo="1.2", nombre="Créditos", tipo="ACTIVO", imputable=False, padre=self.activo
+        )
+        self.pasivo = PlanCuenta.objects.create(codigo="2", nombre="Pasivo", tipo="PASIVO", imputable=False)
+
+    def _ids(self, cuenta):
+        cuenta.refresh_from_db()
+        return set(PlanCuenta.objects.filter(PlanCuentasService.descendientes(cuenta)).values_list('id', flat=True))
+
+    def _editar(self, cuenta, padre):
+        request = RequestFactory().post('/', json.dumps({
+            "codigo": cuenta.codigo, "nombre": cuenta.nombre, "tipo": cuenta.tipo,
+            "imputable": cuenta.imputable, "nivel": cuenta.nivel, "padre_id": padre.id,
+        }), content_type="application/json")
+        request.user = self.usuario
+        return api_plan_cuentas_editar(request, cuenta.id)
+
+    def test_rutas_y_descendientes(self):
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.ruta, f"{self.activo.id:08d}/{self.disponible.id:08d}/{self.caja.id:08d}/")
+        self.assertEqual(self._ids(self.activo), {self.activo.id, self.disponible.id, self.caja.id, self.creditos.id})
+        self.assertEqual(self._ids(self.caja), {self.caja.id})
+
+    def test_arbol_en_una_consulta(self):
+        request = RequestFactory().get('/api/plan-cuentas/')
+        request.user = self.usuario
+        with CaptureQueriesContext(connection) as ctx:
+            data = json.loads(api_plan_cuentas_lista(request).content)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([c['codigo'] for c in data['cuentas']], ["1", "2"])
+        self.assertEqual([c['codigo'] for c in data['cuentas'][0]['hijos']], ["1.1", "1.2"])
+        self.assertEqual(data['cuentas'][0]['hijos'][0]['hijos'][0]['nombre'], "Caja")
+
+    def test_mover_reescribe_el_subarbol(self):
+        self.assertEqual(self._editar(self.disponible, self.pasivo).status_code, 200)
+        self.assertEqual(self._ids(self.pasivo), {self.pasivo.id, self.disponible.id, self.caja.id})
+        self.assertEqual(self._ids(self.activo), {self.activo.id, self.creditos.id})
+
+        # Mover una cuenta debajo de su propia subcuenta formaría un ciclo
+        self.assertEqual(self._editar(self.pasivo, self.caja).status_code, 400)
+
+        # reconstruir_rutas coincide con lo mantenido por las señales
+        self.assertEqual(PlanCuentasService.reconstruir_rutas(), 0)
+
+
+class PresupuestosTestCase(TestCase):
+    """Estado VENCIDO, KPIs y paginación de presupuestos en la base"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser("presu", "presu@example.com", "x")
+        cliente = Cliente.objects.create(nombre="Cliente Presupuesto", condicion_fiscal="CF")
+        self.vigente = Presupuesto.objects.create(cliente=cliente, total=100, validez=15)
+        self.vencido = Presupuesto.objects.create(cliente=cliente, total=200, validez=10)
+        self.vencido.fecha = timezone.now() - timedelta(days=30)
+        self.vencido.save()
+        self.aprobado = Presupuesto.objects.create(cliente=cliente, total=300, estado="APROBADO")
+
+    def _listar(self, **params):
+        request = RequestFactory().get('/api/presupuestos/listar/', params)
+        request.user = self.usuario
+        with CaptureQueriesContext(connection) as ctx:
+            data = json.loads(api_presupuestos_listar(request).content)
+        # 1 aggregate (KPIs y total) + 1 consulta de la página
+        self.assertEqual(len(ctx.captured_queries), 2)
+        return data
+
+    def test_estado_virtual_y_kpis(self):
+        self.assertEqual(self.vencido.fecha_vencimiento, timezone.localdate() - timedelta(days=20))
+        data = self._listar()
+        self.assertEqual({p['id']: p['estado'] for p in data['data']}, {
+            self.vigente.id: "PENDIENTE", self.vencido.id: "VENCIDO", self.aprobado.id: "APROBADO"
+        })
+        self.assertEqual(data['stats'], {'total_monto': 600.0, 'count': 3, 'pendientes': 1, 'aprobados': 1})
+
+        data = self._listar(estado="VENCIDO")
+        self.assertEqual([p['id'] for p in data['data']], [self.vencido.id])
+        self.assertEqual(self._listar(estado="PENDIENTE")['total'], 1)
+        self.assertEqual(len(self._listar(page=2, per_page=2)['data']), 1)
+
+    def test_vencer_y_reactivar(self):
+        call_command('vencer_presupuestos', stdout=StringIO())
+        self.vencido.refresh_from_db()
+        self.assertEqual(self.vencido.estado, "VENCIDO")
+        self.assertEqual(Presupuesto.objects.filter(estado="VENCIDO").count(), 1)
+        self.assertEqual(self._listar(estado="VENCIDO")['total'], 1)
+
+        request = RequestFactory().post('/')
+        request.user = self.usuario
+        self.assertTrue(json.loads(api_presupuesto_reactivar(request, self.vencido.id).content)['ok'])
+        self.vencido.refresh_from_db()
+        self.assertEqual(self.vencido.estado, "PENDIENTE")
+        self.assertEqual(self._listar(estado="PENDIENTE")['total'], 2)
+
+
+class JobsTestCase(TestCase):
+    """Cola de jobs en la base: encolado al commit, reclamo, reintentos y dead-letter"""
+
+    def setUp(self):
+        ResolverContable.invalidar()
+        self.usuario = User.objects.create_superuser("jobs", "jobs@example.com", "x")
+        hoy = timezone.localdate()
+        EjercicioContable.objects.create(descripcion="Actual", fecha_inicio=hoy.replace(month=1, day=1),
+                                         fecha_fin=hoy.replace(month=12, day=31))
+        for codigo, nombre, tipo in [
+            ("1.1.01.001", "Caja en Pesos", "ACTIVO"), ("1.1.03.001", "Deudores por Ventas", "ACTIVO"),
+            ("1.1.05.001", "Mercaderias", "ACTIVO"), ("2.1.02.001", "IVA Debito Fiscal", "PASIVO"),
+            ("4.1.01.001", "Ventas", "R_POS"), ("5.1.01", "Costo Mercaderias", "R_NEG"),
+        ]:
+            PlanCuenta.objects.create(codigo=codigo, nombre=nombre, tipo=tipo)
+        self.cliente = Cliente.objects.create(nombre="Cliente Jobs", condicion_fiscal="CF")
+        self.producto = Producto.objects.create(codigo="J1", descripcion="Producto J", stock=10, costo=50,
+                                                precio_efectivo=121, precio_tarjeta=130, precio_ctacte=140)
+        self.intentos = 0
+
+        def falla(veces):
+            self.intentos += 1
+            Rubro.objects.create(nombre=f"Rubro intento {self.intentos}")
+            if self.intentos <= veces:
+                raise RuntimeError("falla de prueba")
+        JobService.registrar('prueba', max_intentos=2)(falla)
+
+    def tearDown(self):
+        JobService.HANDLERS.pop('prueba', None)
+
+    def _encolar(self, tipo, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            JobService.encolar(tipo, payload)
+        return Job.objects.latest('id')
+
+    def _request(self, datos=None):
+        if datos is None:
+            request = RequestFactory().get('/')
+        else:
+            request = RequestFactory().post('/', json.dumps(datos), content_type="application/json")
+        request.user = self.usuario
+        return request
+
+    def test_venta_encola_asientos_y_el_worker_los_registra(self):
+        data = {
+            "cliente_id": self.cliente.id, "medio_pago": "EFECTIVO", "total_general": 121,
+            "items": [{"id": self.producto.id, "cantidad": 1, "precio": 121, "subtotal": 121}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('api_venta_guardar'), json.dumps(data), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        # El request no registra asientos: sólo deja el job
+        job = Job.objects.get()
+        self.assertEqual((job.tipo, job.estado), ('asientos', 'PENDIENTE'))
+        self.assertEqual([metodo for metodo, _ in job.payload['operaciones']],
+                         ['registrar_venta', 'registrar_cobro_venta_contado'])
+        self.assertFalse(Asiento.objects.exists())
+
+        self.assertEqual(JobService.procesar_pendientes(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), ('COMPLETADO', 1))
+        self.assertEqual(set(Asiento.objects.values_list('origen', flat=True)), {'VENTAS', 'COBROS'})
+
+    def test_rollback_no_encola(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    JobService.encolar('prueba', {'veces': 0})
+                    raise ValueError("rollback")
+            except ValueError:
+                pass
+        self.assertFalse(Job.objects.exists())
+        with self.assertRaises(ValueError):
+            JobService.encolar('inexistente')
+
+    def test_reclamo_unico_y_lease_vencido(self):
+        job = self._encolar('prueba', {'veces': 0})
+        self.assertEqual(JobService.tomar('w1').pk, job.pk)
+        self.assertIsNone(JobService.tomar('w2'))
+
+        # Worker caído: al vencer el lease otro worker lo retoma
+        Job.objects.filter(pk=job.pk).update(bloqueado_hasta=timezone.now() - timedelta(seconds=1))
+        retomado = JobService.tomar('w2')
+        self.assertEqual((retomado.worker, retomado.intentos), ('w2', 2))
+        self.assertTrue(JobService.ejecutar(retomado))
+
+    def test_reintentos_con_backoff_y_muerto(self):
+        job = self._encolar('prueba', {'veces': 5})
+        self.assertEqual(JobService.procesar_pendientes(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), ('PENDIENTE', 1))
+        self.assertGreater(job.ejecutar_desde, timezone.now())
+        self.assertIn("falla de prueba", job.ultimo_error)
+        # El handler es atómico: lo escrito en el intento fallido se revierte
+        self.assertFalse(Rubro.objects.exists())
+
+        # Hasta el backoff no se vuelve a tomar
+        self.assertEqual(JobService.procesar_pendientes(), (0, 0))
+        Job.objects.filter(pk=job.pk).update(ejecutar_desde=timezone.now())
+        self.assertEqual(JobService.procesar_pendientes(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), ('MUERTO', 2))
+
+        self.assertEqual(JobService.reintentar(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), ('PENDIENTE', 0))
+
+    def test_backup_se_genera_en_el_worker(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            Empresa.objects.create(nombre="Empresa", cuit="20123456789", direccion="Calle 1",
+                                   condicion_fiscal="RI", backup_local_path=directorio)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = api_crear_backup(self._request({'tipo': 'DB_JSON'}))
+            self.assertTrue(json.loads(response.content)['ok'], response.content)
+            self.assertFalse(Backup.objects.exists())
+
+            self.assertEqual(JobService.procesar_pendientes(tipos=['backup']), (1, 0))
+            backup = Backup.objects.get()
+            self.assertTrue(os.path.isfile(backup.archivo))
+            job = Job.objects.get(tipo='backup')
+            self.assertEqual(job.resultado['backup_id'], backup.id)
+            estado = json.loads(api_estado_backup(self._request(), job.id).content)
+            self.assertEqual(estado['estado'], 'COMPLETADO')
+
+
+class PdfCacheTestCase(TestCase):
+    """Cache de PDFs de comprobantes en disco y exportación en lote a ZIP"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=self.media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        ConfiguracionEmpresa.invalidar()
+        Empresa.objects.create(nombre="Empresa PDF", cuit="20123456789", direccion="Calle 1", condicion_fiscal="RI")
+        self.usuario = User.objects.create_superuser("pdf", "pdf@example.com", "x")
+        self.cliente = Cliente.objects.create(nombre="Cliente PDF", condicion_fiscal="CF")
+        producto = Producto.objects.create(codigo="PDF1", descripcion="Producto PDF", stock=10,
+                                           precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120)
+        self.venta = Venta.objects.create(cliente=self.cliente, tipo_comprobante="B", total=200)
+        DetalleVenta.objects.create(venta=self.venta, producto=producto, cantidad=2, precio_unitario=100, subtotal=200)
+        self.nc = NotaCredito.objects.create(cliente=self.cliente, venta_asociada=self.venta,
+                                             tipo_comprobante="NCB", total=100)
+
+    def _archivos(self):
+        return sorted(
+            os.path.join(raiz, nombre)
+            for raiz, _, nombres in os.walk(PdfCache.raiz()) for nombre in nombres if nombre.endswith('.pdf')
+        )
+
+    def test_cache_por_contenido(self):
+        primero = ComprobantePdf.generar('factura', self.venta.pk)
+        self.assertFalse(primero['cache'])
+        self.assertTrue(primero['contenido'].startswith(b'%PDF'))
+        self.assertEqual(len(self._archivos()), 1)
+
+        segundo = ComprobantePdf.generar('factura', self.venta.pk)
+        self.assertTrue(segundo['cache'])
+        self.assertEqual((segundo['clave'], segundo['contenido']), (primero['clave'], primero['contenido']))
+
+        # Cambia el comprobante: cambia la clave y la versión anterior se borra
+        Venta.objects.filter(pk=self.venta.pk).update(total=300)
+        tercero = ComprobantePdf.generar('factura', self.venta.pk)
+        self.assertFalse(tercero['cache'])
+        self.assertNotEqual(tercero['clave'], primero['clave'])
+        self.assertEqual([os.path.basename(ruta) for ruta in self._archivos()], [f"{tercero['clave']}.pdf"])
+
+    def test_invoice_print_con_etag(self):
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+        response = invoice_print(request, self.venta.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        request.user = self.usuario
+        self.assertEqual(invoice_print(request, self.venta.pk).status_code, 304)
+
+    def test_eviccion_por_tamanio(self):
+        ComprobantePdf.generar('factura', self.venta.pk)
+        ComprobantePdf.generar('nc', self.nc.pk)
+        factura, nc = (PdfCache._directorio('factura', self.venta.pk), PdfCache._directorio('nc', self.nc.pk))
+        # La factura es la menos usada
+        for nombre in os.listdir(factura):
+            os.utime(os.path.join(factura, nombre), (1, 1))
+        tamanio = max(os.path.getsize(ruta) for ruta in self._archivos())
+
+        self.assertEqual(PdfCache.evictar(maximo_bytes=tamanio * 1.5), 1)
+        self.assertEqual(os.listdir(factura), [])
+        self.assertEqual(len(os.listdir(nc)), 1)
+
+    def test_lote_zip_encolado(self):
+        remito = Remito.objects.create(cliente=self.cliente, venta_asociada=self.venta)
+        request = RequestFactory().post('/', json.dumps({'desde': str(timezone.localdate()), 'hasta': str(timezone.localdate())}),
+                                        content_type="application/json")
+        request.user = self.usuario
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(json.loads(api_comprobantes_lote_pdf(request).content)['ok'])
+        job = Job.objects.get(tipo='pdf_lote')
+        # En el worker, con 1 proceso (el pool de procesos no ve la base de los tests)
+        job.payload['procesos'] = 1
+        job.save()
+        self.assertEqual(JobService.procesar_pendientes(), (1, 0))
+
+        request = RequestFactory().get('/', {'descargar': '1'})
+        request.user = self.usuario
+        response = api_comprobantes_lote_pdf_estado(request, job.pk)
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archivo:
+            self.assertEqual(sorted(nombre.split('/')[0] for nombre in archivo.namelist()),
+                             ['Factura', 'NotaCredito', 'Remito'])
+        self.assertEqual(remito.pk, ComprobantePdf.documentos_periodo(timezone.localdate(), timezone.localdate(), ['remito'])[0][1])
+
+
+    def test_lote_zip_fallido_no_deja_temporal(self):
+        destino = os.path.join(self.media.name, 'pdf_lotes', 'lote.zip')
+        with mock.patch('administrar.services_pdf.renderizar_para_lote', side_effect=RuntimeError("sin memoria")):
+            with self.assertRaises(RuntimeError):
+                ComprobantePdf.lote_zip(timezone.localdate(), timezone.localdate(), procesos=1, destino=destino)
+        self.assertEqual(os.listdir(os.path.dirname(destino)), [])
+
+class ReportlabPdfTestCase(TestCase):
+    """Motor PDF directo con ReportLab para comprobantes y estado de cuenta"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=self.media.name, PDF_MOTOR='reportlab')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        ConfiguracionEmpresa.invalidar()
+        self.empresa = Empresa.objects.create(nombre="Empresa Ñandú", cuit="20123456789", direccion="Calle 1",
+                                              condicion_fiscal="RI")
+        self.usuario = User.objects.create_superuser("rl", "rl@example.com", "x")
+        self.cliente = Cliente.objects.create(nombre="Cliente Pérez", condicion_fiscal="CF")
+        producto = Producto.objects.create(codigo="RL1", descripcion="Producto ReportLab " * 8, stock=10,
+                                           precio_efectivo=100, precio_tarjeta=110, precio_ctacte=120)
+        self.venta = Venta.objects.create(cliente=self.cliente, tipo_comprobante="A", neto=100, iva_amount=21,
+                                          total=121)
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(venta=self.venta, producto=producto, cantidad=1, precio_unitario=121, subtotal=121)
+            for _ in range(120)
+        ])
+
+    def test_factura_multipagina_deterministica(self):
+        pdf = ComprobantePdf.generar('factura', self.venta.pk, usar_cache=False)
+        self.assertTrue(pdf['contenido'].startswith(b'%PDF'))
+        self.assertGreater(paginas_pdf(pdf['contenido']), 1)
+        # Mismos datos, mismos bytes (sin fechas de creación ni ids aleatorios)
+        self.assertEqual(ComprobantePdf.generar('factura', self.venta.pk, usar_cache=False)['contenido'],
+                         pdf['contenido'])
+
+        datos = PdfNativo.datos('factura', self.venta, self.empresa)
+        self.assertEqual((datos['letra'], datos['codigo']), ('A', 'Cod. 001'))
+        self.assertEqual([etiqueta for etiqueta, _ in datos['totales']],
+                         ['Importe Neto Gravado:', 'IVA 21%:', 'Importe Total:'])
+
+    def test_clave_por_motor(self):
+        reportlab = ComprobantePdf.generar('factura', self.venta.pk)
+        with override_settings(PDF_MOTOR='xhtml2pdf'):
+            xhtml2pdf = ComprobantePdf.generar('factura', self.venta.pk)
+        self.assertFalse(xhtml2pdf['cache'])
+        self.assertNotEqual(reportlab['clave'], xhtml2pdf['clave'])
+        self.assertTrue(xhtml2pdf['contenido'].startswith(b'%PDF'))
+
+    def test_estado_cuenta(self):
+        MovimientoCuentaCorriente.objects.bulk_create([
+            MovimientoCuentaCorriente(cliente=self.cliente, tipo='HABER', descripcion=f"Pago {i}", monto=10, saldo=0)
+            for i in range(150)
+        ])
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+        response = api_cc_cliente_exportar_pdf(request, self.cliente.pk)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertGreater(paginas_pdf(response.content), 1)
+
+    def test_logo_cargado_una_vez(self):
+        from PIL import Image
+        ruta = os.path.join(self.media.name, 'logo.png')
+        Image.new('RGB', (40, 20), 'red').save(ruta)
+        logo = RecursosPdf.logo(ruta)
+        self.assertIsNotNone(logo)
+        self.assertIs(RecursosPdf.logo(ruta), logo)
+        self.assertEqual(RecursosPdf.fuentes(), ('Helvetica', 'Helvetica-Bold'))
+
+        # Con logo el estado de cuenta lo dibuja; un archivo nuevo se vuelve a leer
+        self.empresa.logo = 'logo.png'
+        contexto = {'cliente': self.cliente, 'movimientos': [], 'saldo_actual': 0, 'empresa': self.empresa,
+                    'fecha_impresion': '01/01/2026 10:00'}
+        self.assertTrue(PdfNativo.renderizar(PdfNativo.datos_estado_cuenta(contexto)).startswith(b'%PDF'))
+        os.utime(ruta, (1, 1))
+        self.assertIsNot(RecursosPdf.logo(ruta), logo)
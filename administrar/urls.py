@@ -149,6 +149,7 @@ urlpatterns = [
     path("backups/", login_required(TemplateView.as_view(template_name="react_app.html")), name="backups"),
     path("api/backups/listar/", views_backup.api_listar_backups, name="api_listar_backups"),
     path("api/backups/crear/", views_backup.api_crear_backup, name="api_crear_backup"),
+    path("api/backups/estado/<int:job_id>/", views_backup.api_estado_backup, name="api_estado_backup"),
     path("api/backups/subir/", views_backup.api_subir_backup, name="api_subir_backup"),
     path("api/backups/<int:id>/descargar/", views_backup.api_descargar_backup, name="api_descargar_backup"),
     path("api/backups/<int:id>/restaurar/", views_backup.api_restaurar_backup, name="api_restaurar_backup"),
@@ -255,6 +256,8 @@ urlpatterns = [
     # API STOCK MANAGEMENT
     # ==========================
     path("api/stock/ajuste/", views_stock.api_stock_ajuste_crear, name="api_stock_ajuste_crear"),
+    path("api/stock/inventario/", views_stock.api_stock_inventario, name="api_stock_inventario"),
+    path("api/stock/inventario-al/", views_stock.api_stock_inventario_al, name="api_stock_inventario_al"),
     path("api/stock/movimientos/", views_stock.api_stock_movimientos_listar, name="api_stock_movimientos_listar"),
     path("api/stock/movimientos/<int:producto_id>/", views_stock.api_stock_movimientos_producto, name="api_stock_movimientos_producto"),
 
@@ -262,6 +265,8 @@ urlpatterns = [
     path("actualizar-precios/", views.actualizar_precios, name="actualizar_precios"),
     path("precios/actualizar/", login_required(TemplateView.as_view(template_name="react_app.html")), name="precios_actualizar_react"),
     path("api/precios/actualizar-masivo/", views.api_actualizar_precios_masivo, name="api_actualizar_precios_masivo"),
+    path("api/precios/historial/", views.api_historial_precios, name="api_historial_precios"),
+    path("api/precios/historial/<int:id>/revertir/", views.api_revertir_precios, name="api_revertir_precios"),
 
     # ==========================
     # API BUSCAR PRODUCTOS (para pedidos/ventas)
@@ -404,6 +409,8 @@ urlpatterns = [
     path("comprobantes/remito/<int:id>/imprimir/", views_comprobantes.imprimir_remito, name="imprimir_remito"),
     path("comprobantes/nc/<int:id>/imprimir/", views_comprobantes.imprimir_nc, name="imprimir_nc"),
     path("comprobantes/nd/<int:id>/imprimir/", views_comprobantes.imprimir_nd, name="imprimir_nd"),
+    path("api/comprobantes/lote-pdf/", views_comprobantes.api_comprobantes_lote_pdf, name="api_comprobantes_lote_pdf"),
+    path("api/comprobantes/lote-pdf/<int:job_id>/", views_comprobantes.api_comprobantes_lote_pdf_estado, name="api_comprobantes_lote_pdf_estado"),
 
     # ==========================
     # CTA. CTE. (CLIENTES Y PROVEEDORES)
@@ -458,6 +465,7 @@ urlpatterns = [
     path("api/cheques/<int:id>/editar/", views.api_cheques_editar, name="api_cheques_editar"),
     path("api/cheques/<int:id>/eliminar/", views.api_cheques_eliminar, name="api_cheques_eliminar"),
     path("api/cheques/<int:id>/cambiar-estado/", views.api_cheque_cambiar_estado, name="api_cheque_cambiar_estado"),
+    path("api/cheques/vencimientos/", views.api_cheques_vencimientos, name="api_cheques_vencimientos"),
 
     # CONFIGURACIÓN
     path("api/config/obtener/", views_config.api_config_obtener, name="api_config_obtener"),
@@ -0,0 +1,110 @@
+import threading
+import time
+from django.core.cache import cache
+
+
+class CacheVersionado:
+    """
+    Cache en memoria del proceso con invalidación entre procesos por número de versión.
+    - Los valores viven en el proceso; en el cache compartido de settings.CACHES (tabla de la base
+      o Redis) sólo se guarda 1 versión por espacio ('empresa', 'permisos', 'dashboard:kpi', ...).
+    - Las versiones de todos los espacios se leen juntas (1 get_many) la primera vez que se usan en
+      cada request (señal request_started) o job (JobService.ejecutar) y quedan fijas hasta el
+      siguiente: un acierto no toca el cache compartido. Fuera de un request se releen cada
+      VERIFICACION_SEGUNDOS.
+    - invalidar(espacio) incrementa la versión compartida: los demás procesos descartan sus valores
+      de ese espacio en su próximo request.
+    """
+    VERIFICACION_SEGUNDOS = 5
+    MAXIMO_VALORES = 5000
+
+    _espacios = set()
+    _lock = threading.RLock()
+    _local = threading.local()   # Versiones leídas en el request actual (por thread)
+    _valores = {}                # (espacio, clave) -> (versión, vence, valor)
+
+    @staticmethod
+    def clave_version(espacio):
+        return f'{espacio}:version'
+
+    @classmethod
+    def registrar(cls, *espacios):
+        """Agrega espacios a la lectura en bloque de versiones. Retorna el primero"""
+        cls._espacios.update(espacios)
+        return espacios[0]
+
+    @classmethod
+    def nueva_solicitud(cls, **kwargs):
+        """Receptor de request_started (y de cada job): la próxima lectura vuelve a comparar versiones"""
+        cls._local.versiones = None
+
+    @classmethod
+    def limpiar(cls):
+        """Descarta todos los valores del proceso y relee (o crea) las versiones compartidas (tests)"""
+        with cls._lock:
+            cls._valores = {}
+        cls.nueva_solicitud()
+        cls._versiones()
+
+    @classmethod
+    def _versiones(cls):
+        versiones = getattr(cls._local, 'versiones', None)
+        if versiones is None or time.monotonic() - cls._local.leidas_en > cls.VERIFICACION_SEGUNDOS:
+            claves = {cls.clave_version(espacio): espacio for espacio in cls._espacios}
+            leidas = cache.get_many(list(claves))
+            faltantes = [clave for clave in claves if clave not in leidas]
+            if faltantes:
+                # Versión nueva (nunca creada o expulsada): no coincide con ningún valor anterior.
+                # add() no pisa la de otro proceso que la haya creado en el medio
+                for clave in faltantes:
+                    cache.add(clave, time.time_ns(), None)
+                leidas.update(cache.get_many(faltantes))
+            versiones = {espacio: leidas.get(clave) for clave, espacio in claves.items()}
+            cls._local.versiones = versiones
+            cls._local.leidas_en = time.monotonic()
+        return versiones
+
+    @classmethod
+    def version(cls, espacio):
+        versiones = cls._versiones()
+        if espacio not in versiones:
+            cls.registrar(espacio)
+            cls.nueva_solicitud()
+            versiones = cls._versiones()
+        return versiones[espacio]
+
+    @classmethod
+    def invalidar(cls, espacio):
+        """Cambia la versión compartida y descarta los valores locales del espacio"""
+        try:
+            version = cache.incr(cls.clave_version(espacio))
+        except ValueError:
+            # La versión no estaba en cache (expulsada o nunca creada)
+            version = time.time_ns()
+            cache.set(cls.clave_version(espacio), version, None)
+        with cls._lock:
+            cls._valores = {clave: valor for clave, valor in cls._valores.items() if clave[0] != espacio}
+        versiones = getattr(cls._local, 'versiones', None)
+        if versiones is not None:
+            versiones[espacio] = version
+
+    @classmethod
+    def obtener(cls, espacio, clave, calcular, ttl=None):
+        """
+        Valor cacheado de `clave`, o calcular() si no está, es de otra versión o venció el ttl (segundos).
+        La versión se toma antes de calcular: una invalidación concurrente fuerza otro cálculo.
+        """
+        version = cls.version(espacio)
+        ahora = time.monotonic()
+        with cls._lock:
+            entrada = cls._valores.get((espacio, clave))
+        if entrada and entrada[0] == version and (entrada[1] is None or entrada[1] > ahora):
+            return entrada[2]
+        valor = calcular()
+        with cls._lock:
+            if len(cls._valores) >= cls.MAXIMO_VALORES:
+                cls._valores = {k: v for k, v in cls._valores.items() if v[1] is None or v[1] > ahora}
+                if len(cls._valores) >= cls.MAXIMO_VALORES:
+                    cls._valores = {}
+            cls._valores[(espacio, clave)] = (version, ahora + ttl if ttl else None, valor)
+        return valor
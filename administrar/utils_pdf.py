@@ -1,4 +1,7 @@
 import os
+import re
+import sys
+import time
 from io import BytesIO
 from django.conf import settings
 from django.http import HttpResponse
@@ -53,6 +56,18 @@ def render_to_pdf(template_src, context_dict=None):
         
     template = get_template(template_src)
     html = template.render(context_dict)
+    contenido = html_a_pdf(html)
+    
+    if contenido is not None:
+        return HttpResponse(contenido, content_type='application/pdf')
+    
+    return None
+
+
+def html_a_pdf(html):
+    """
+    Convierte HTML ya renderizado a PDF con xhtml2pdf. Retorna los bytes o None si hubo error.
+    """
     result = BytesIO()
     
     # Generar PDF
@@ -63,6 +78,59 @@ def render_to_pdf(template_src, context_dict=None):
     )
     
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+        return result.getvalue()
     
     return None
+
+
+
+# Pool de procesos para el render en lote (ComprobantePdf.lote_zip). Viven acá porque con spawn el
+# proceso hijo importa este módulo antes de django.setup(): no puede importar modelos al cargarse.
+
+def inicializar_proceso_pdf():
+    import django
+    django.setup()
+
+
+def renderizar_para_lote(documento):
+    """(tipo, id) -> (nombre de archivo, bytes del PDF o None si falló)"""
+    from .services_pdf import ComprobantePdf
+    tipo, documento_id = documento
+    try:
+        pdf = ComprobantePdf.generar(tipo, documento_id)
+    except Exception as e:
+        print(f"Error generando PDF {tipo} #{documento_id}: {e}")
+        return None, None
+    return pdf['nombre'], pdf['contenido']
+
+
+def paginas_pdf(contenido):
+    return len(re.findall(rb'/Type\s*/Page\b(?!s)', contenido or b''))
+
+
+def _rss_pico_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico // 1024 if sys.platform == 'darwin' else pico  # macOS informa bytes, Linux KB
+
+
+def medir_motor_pdf(motor, documentos, repeticiones):
+    """
+    Benchmark de un motor (manage.py benchmark_pdf), en un proceso propio para que el pico de RSS sea sólo
+    de ese motor. documentos: [(nombre, fuente)], HTML para 'xhtml2pdf' o datos de PdfNativo para 'reportlab'.
+    Retorna ({nombre: (páginas por render, segundos totales)}, rss al empezar, rss pico) en KB.
+    """
+    from .services_pdf_nativo import PdfNativo
+    convertir = PdfNativo.renderizar if motor == 'reportlab' else html_a_pdf
+    rss_inicial = _rss_pico_kb()
+    tiempos = {}
+    for nombre, fuente in documentos:
+        paginas = paginas_pdf(convertir(fuente))  # 1 render previo: carga de fuentes, logo, imports
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            convertir(fuente)
+        tiempos[nombre] = (paginas, time.perf_counter() - inicio)
+    return tiempos, rss_inicial, _rss_pico_kb()
@@ -30,9 +30,24 @@ from .models import (
     Presupuesto, DetallePresupuesto, ActiveSession
 )
 from .forms import InvoiceTemplateForm
+from .services import ConfiguracionEmpresa
+from .services_stock import LibroStockService
+from .services_permisos import PermisosUsuario
 from functools import wraps
 from django.core.exceptions import PermissionDenied
 
+
+def _inicio_dia(dia, dias=0):
+    """
+    Medianoche local (aware) de `dia` + `dias` (date o 'YYYY-MM-DD').
+    Para filtrar DateTimeField por rango [inicio, fin): fecha__date impide usar los índices por fecha
+    """
+    from django.utils import timezone
+    if isinstance(dia, str):
+        dia = datetime.datetime.strptime(dia, '%Y-%m-%d').date()
+    return timezone.make_aware(datetime.datetime.combine(dia + datetime.timedelta(days=dias), datetime.time.min))
+
+
 def verificar_permiso(permiso):
     def decorator(view_func):
         @wraps(view_func)
@@ -43,30 +58,9 @@ def verificar_permiso(permiso):
             if request.user.is_staff:
                 return view_func(request, *args, **kwargs)
                 
-            try:
-                perfil = request.user.perfilusuario
-                # Mapeo de permisos a campos del modelo
-                campos_permisos = {
-                    'ventas': perfil.acceso_ventas,
-                    'compras': perfil.acceso_compras,
-                    'productos': perfil.acceso_productos,
-                    'clientes': perfil.acceso_clientes,
-                    'proveedores': perfil.acceso_proveedores,
-                    'caja': perfil.acceso_caja,
-                    'contabilidad': perfil.acceso_contabilidad,
-                    'configuracion': perfil.acceso_configuracion,
-                    'usuarios': perfil.acceso_usuarios,
-                    'reportes': perfil.acceso_reportes,
-                    'pedidos': perfil.acceso_pedidos,
-                    'bancos': perfil.acceso_bancos,
-                    'ctacte': perfil.acceso_ctacte,
-                    'remitos': perfil.acceso_remitos,
-                }
-                
-                if campos_permisos.get(permiso, False):
-                    return view_func(request, *args, **kwargs)
-            except PerfilUsuario.DoesNotExist:
-                pass
+            # Máscara de permisos cacheada por usuario (sin consultar el perfil en cada request)
+            if PermisosUsuario.tiene(request.user, permiso):
+                return view_func(request, *args, **kwargs)
                 
             if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.path.startswith('/api/'):
                 return JsonResponse({'ok': False, 'error': 'No tienes permisos para acceder a esta sección.'}, status=403)
@@ -86,7 +80,7 @@ def login_view(request):
         next_url = request.GET.get('next') or '/'
         return redirect(next_url)
 
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
     
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -194,15 +188,15 @@ def dashboard(request):
     hoy = date.today()
     
     # 1. KPIs Principales
-    ventas_hoy = Venta.objects.filter(fecha__date=hoy).aggregate(total=Sum('total'))['total'] or 0
-    caja_hoy = MovimientoCaja.objects.filter(fecha__date=hoy).aggregate(total=Sum('monto'))['total'] or 0
+    ventas_hoy = Venta.objects.filter(fecha__gte=_inicio_dia(hoy), fecha__lt=_inicio_dia(hoy, dias=1)).aggregate(total=Sum('total'))['total'] or 0
+    caja_hoy = MovimientoCaja.objects.filter(fecha__gte=_inicio_dia(hoy), fecha__lt=_inicio_dia(hoy, dias=1)).aggregate(total=Sum('monto'))['total'] or 0
     pedidos_pendientes = Pedido.objects.filter(estado__in=['PENDIENTE', 'PREPARACION']).count()
     pedidos_listos = Pedido.objects.filter(estado='LISTO').count()
     stock_bajo_count = Producto.objects.filter(Q(stock__lte=F('stock_minimo')) | Q(stock__lte=10)).count() # Usando stock_minimo dinámico O hardcode 10
     
     # 2. Gráfico: Ventas últimos 7 días
     fecha_inicio_chart = hoy - timedelta(days=6)
-    ventas_chart = Venta.objects.filter(fecha__date__gte=fecha_inicio_chart)\
+    ventas_chart = Venta.objects.filter(fecha__gte=_inicio_dia(fecha_inicio_chart))\
         .extra(select={'day': 'date(fecha)'})\
         .values('day')\
         .annotate(total=Sum('total'))\
@@ -236,7 +230,7 @@ def dashboard(request):
     
     # 4. Top Productos (Últimos 30 días)
     fecha_inicio_top = hoy - timedelta(days=30)
-    top_productos = DetalleVenta.objects.filter(venta__fecha__date__gte=fecha_inicio_top)\
+    top_productos = DetalleVenta.objects.filter(venta__fecha__gte=_inicio_dia(fecha_inicio_top))\
         .values('producto__descripcion')\
         .annotate(total_vendido=Sum('cantidad'))\
         .order_by('-total_vendido')[:5]
@@ -505,15 +499,19 @@ def api_caja_movimientos_lista(request):
                 'usuario': m.usuario.username if m.usuario else 'Sistema',
             })
         
-        # Saldo Global (Cash on Hand)
-        global_ingresos = MovimientoCaja.objects.filter(tipo='Ingreso').aggregate(total=Sum('monto'))['total'] or 0
-        global_egresos = MovimientoCaja.objects.filter(tipo='Egreso').aggregate(total=Sum('monto'))['total'] or 0
-        saldo_global = float(global_ingresos) - float(global_egresos)
+        # Saldo Global (Cash on Hand): totales mantenidos por CajaService, sin agregar el historial
+        from .services_caja import CajaService
+        saldo_global = float(CajaService.posicion().saldo)
 
-        # Saldo Filtrado (Current View)
-        filt_ingresos = movimientos.filter(tipo='Ingreso').aggregate(total=Sum('monto'))['total'] or 0
-        filt_egresos = movimientos.filter(tipo='Egreso').aggregate(total=Sum('monto'))['total'] or 0
-        saldo_filtrado = float(filt_ingresos) - float(filt_egresos)
+        # Saldo Filtrado (Current View): sin filtros coincide con el global
+        if fecha_desde or fecha_hasta or tipo or busqueda:
+            filtrados = movimientos.aggregate(
+                ingresos=Sum('monto', filter=Q(tipo='Ingreso')),
+                egresos=Sum('monto', filter=Q(tipo='Egreso')),
+            )
+            saldo_filtrado = float(filtrados['ingresos'] or 0) - float(filtrados['egresos'] or 0)
+        else:
+            saldo_filtrado = saldo_global
         
         return JsonResponse({
             'movimientos': data,
@@ -572,10 +570,10 @@ def api_caja_movimiento_crear(request):
         )
 
         try:
-            from .services import AccountingService
-            AccountingService.registrar_movimiento_caja(movimiento)
+            from .services_jobs import JobService
+            JobService.asientos(('registrar_movimiento_caja', movimiento))
         except Exception as e:
-            print(f"Error generando asiento caja: {e}")
+            print(f"Error encolando asiento caja: {e}")
         
         return JsonResponse({
             'ok': True,
@@ -684,11 +682,13 @@ def api_caja_movimiento_detalle(request, id):
 @verificar_permiso('caja')
 def api_caja_saldo_actual(request):
     """API para obtener el saldo actual de caja"""
-    from django.db.models import Sum
-    
-    ingresos = MovimientoCaja.objects.filter(tipo='Ingreso').aggregate(total=Sum('monto'))['total'] or 0
-    egresos = MovimientoCaja.objects.filter(tipo='Egreso').aggregate(total=Sum('monto'))['total'] or 0
-    saldo = float(ingresos) - float(egresos)
+    from .services_caja import CajaService
+
+    # Totales globales mantenidos en forma incremental (1 fila, sin recorrer el historial)
+    posicion = CajaService.posicion()
+    ingresos = posicion.total_ingresos
+    egresos = posicion.total_egresos
+    saldo = float(posicion.saldo)
     
     return JsonResponse({
         'saldo': saldo,
@@ -703,7 +703,6 @@ def api_caja_saldo_actual(request):
 @verificar_permiso('caja')
 def api_caja_cierre(request):
     """API para realizar cierre de caja"""
-    from django.db.models import Sum
     from django.utils import timezone
     from decimal import Decimal
     from django.db import transaction
@@ -716,20 +715,24 @@ def api_caja_cierre(request):
         data = json.loads(request.body.decode('utf-8'))
         monto_real = Decimal(str(data.get('monto_real', 0)))
         
-        # Calcular el saldo de SISTEMA desde que se abrió la caja
-        ingresos = MovimientoCaja.objects.filter(caja_diaria=caja, tipo='Ingreso').aggregate(total=Sum('monto'))['total'] or 0
-        egresos = MovimientoCaja.objects.filter(caja_diaria=caja, tipo='Egreso').aggregate(total=Sum('monto'))['total'] or 0
-        saldo_sistema = Decimal(str(ingresos)) - Decimal(str(egresos))
-        
-        diferencia = monto_real - saldo_sistema
-        
         with transaction.atomic():
+            # Bloqueo de la caja: los totales (mantenidos por CajaService) no cambian hasta el cierre
+            caja = CajaDiaria.objects.select_for_update().get(pk=caja.pk)
+
+            # Saldo de SISTEMA desde que se abrió la caja
+            ingresos = caja.total_ingresos
+            egresos = caja.total_egresos
+            saldo_sistema = caja.saldo_sistema
+
+            diferencia = monto_real - saldo_sistema
+
             caja.fecha_cierre = timezone.now()
             caja.monto_cierre_sistema = saldo_sistema
             caja.monto_cierre_real = monto_real
             caja.estado = 'CERRADA'
             caja.observaciones = data.get('observaciones', '')
-            caja.save()
+            # Sin update_fields se pisarían los totales que actualiza el movimiento de ajuste
+            caja.save(update_fields=['fecha_cierre', 'monto_cierre_sistema', 'monto_cierre_real', 'estado', 'observaciones'])
             
             # Registrar movimiento de ajuste si hay diferencia (Sobrante/Faltante)
             if abs(diferencia) > 0.01:
@@ -922,34 +925,11 @@ def api_caja_cierre_detalle(request, id):
 @verificar_permiso('contabilidad')
 def api_plan_cuentas_lista(request):
     """API para listar el plan de cuentas en formato jerárquico"""
-    from administrar.models import PlanCuenta
-    
-    def construir_arbol(cuentas, padre_id=None):
-        """Construye el árbol jerárquico de cuentas"""
-        resultado = []
-        cuentas_nivel = cuentas.filter(padre_id=padre_id)
-        
-        for cuenta in cuentas_nivel:
-            cuenta_dict = {
-                'id': cuenta.id,
-                'codigo': cuenta.codigo,
-                'nombre': cuenta.nombre,
-                'tipo': cuenta.tipo,
-                'imputable': cuenta.imputable,
-                'nivel': cuenta.nivel,
-                'padre_id': cuenta.padre_id,
-                'hijos': construir_arbol(cuentas, cuenta.id)
-            }
-            resultado.append(cuenta_dict)
-        
-        return resultado
+    from administrar.services_contabilidad import PlanCuentasService
     
     try:
-        # Obtener todas las cuentas ordenadas por código
-        cuentas = PlanCuenta.objects.all().order_by('codigo')
-        
-        # Construir árbol jerárquico
-        arbol = construir_arbol(cuentas)
+        # Árbol jerárquico desde 1 consulta ordenada por código
+        arbol = PlanCuentasService.arbol()
         
         return JsonResponse({
             'success': True,
@@ -1081,6 +1061,9 @@ def api_plan_cuentas_editar(request, id):
             # No permitir que una cuenta sea padre de sí misma
             if padre.id == cuenta.id:
                 return JsonResponse({'error': 'Una cuenta no puede ser padre de sí misma'}, status=400)
+            # Ni moverla debajo de una de sus subcuentas (formaría un ciclo)
+            if cuenta.ruta and padre.ruta.startswith(cuenta.ruta):
+                return JsonResponse({'error': 'Una cuenta no puede depender de una de sus subcuentas'}, status=400)
         except PlanCuenta.DoesNotExist:
             return JsonResponse({'error': 'La cuenta padre no existe'}, status=400)
     
@@ -1511,9 +1494,13 @@ def actualizar_precios(request):
 @require_POST
 @csrf_protect
 def api_actualizar_precios_masivo(request):
-    """API para actualizar precios de forma masiva"""
+    """
+    API para actualizar precios de forma masiva.
+    Con "dry_run": true no modifica nada: retorna la cantidad afectada y una muestra antes/después.
+    Cada actualización aplicada queda registrada y puede revertirse con api_revertir_precios.
+    """
     import json
-    from decimal import Decimal
+    from .services_productos import PrecioService
     
     try:
         data = json.loads(request.body.decode('utf-8'))
@@ -1521,70 +1508,35 @@ def api_actualizar_precios_masivo(request):
         return JsonResponse({"ok": False, "error": "JSON inválido"}, status=400)
     
     tipo_actualizacion = data.get("tipo_actualizacion")  # "MONTO" o "PORCENTAJE"
-    valor = data.get("valor", 0)
     rubros_ids = data.get("rubros", [])  # Lista de IDs de rubros
     marcas_ids = data.get("marcas", [])  # Lista de IDs de marcas
     productos_ids = data.get("productos", [])  # Lista de IDs de productos específicos
     campos = data.get("campos", [])  # Lista de campos a actualizar
     
     # Validaciones
-    if not tipo_actualizacion or tipo_actualizacion not in ["MONTO", "PORCENTAJE"]:
-        return JsonResponse({"ok": False, "error": "Tipo de actualización inválido"}, status=400)
-    
-    if not campos:
-        return JsonResponse({"ok": False, "error": "Debe seleccionar al menos un campo para actualizar"}, status=400)
-    
     try:
-        valor = Decimal(str(valor))
-    except:
-        return JsonResponse({"ok": False, "error": "Valor inválido"}, status=400)
-    
-    # Filtrar productos
-    productos = Producto.objects.all()
-    
-    # Si hay productos específicos seleccionados, usar solo esos
-    if productos_ids:
-        productos = productos.filter(id__in=productos_ids)
-    else:
-        # Si no hay productos específicos, aplicar filtros de rubro/marca
-        if rubros_ids:
-            productos = productos.filter(rubro_id__in=rubros_ids)
-        
-        if marcas_ids:
-            productos = productos.filter(marca_id__in=marcas_ids)
+        valor = PrecioService.validar(tipo_actualizacion, data.get("valor", 0), campos)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
     
-    # Actualizar productos
-    productos_actualizados = 0
+    # Filtrar productos (específicos, o por rubro/marca)
+    productos = PrecioService.filtrar(productos_ids, rubros_ids, marcas_ids)
     
     try:
-        with transaction.atomic():
-            for producto in productos:
-                for campo in campos:
-                    # Obtener valor actual
-                    valor_actual = getattr(producto, campo, 0)
-                    if valor_actual is None:
-                        valor_actual = 0
-                    
-                    valor_actual = Decimal(str(valor_actual))
-                    
-                    # Calcular nuevo valor
-                    if tipo_actualizacion == "MONTO":
-                        nuevo_valor = valor_actual + valor
-                    else:  # PORCENTAJE
-                        nuevo_valor = valor_actual * (1 + valor / 100)
-                    
-                    # Asegurar que no sea negativo
-                    nuevo_valor = max(nuevo_valor, Decimal('0'))
-                    
-                    # Actualizar campo
-                    setattr(producto, campo, nuevo_valor)
-                
-                producto.save()
-                productos_actualizados += 1
+        if data.get("dry_run"):
+            preview = PrecioService.previsualizar(productos, campos, tipo_actualizacion, valor)
+            return JsonResponse({"ok": True, "dry_run": True, **preview})
+        
+        actualizacion = PrecioService.aplicar(
+            productos, campos, tipo_actualizacion, valor, usuario=request.user,
+            filtros={"rubros": rubros_ids, "marcas": marcas_ids, "productos": productos_ids}
+        )
+        productos_actualizados = actualizacion.cantidad
         
         return JsonResponse({
             "ok": True,
             "productos_actualizados": productos_actualizados,
+            "actualizacion_id": actualizacion.id,
             "mensaje": f"Se actualizaron {productos_actualizados} productos correctamente"
         })
     
@@ -1592,6 +1544,50 @@ def api_actualizar_precios_masivo(request):
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 
+@login_required
+@verificar_permiso('productos')
+@require_http_methods(["GET"])
+def api_historial_precios(request):
+    """API para listar las últimas actualizaciones masivas de precios"""
+    from .models import ActualizacionPrecios
+    
+    actualizaciones = ActualizacionPrecios.objects.select_related('usuario')[:50]
+    return JsonResponse({"ok": True, "actualizaciones": [{
+        "id": a.id,
+        "fecha": a.fecha.strftime('%d/%m/%Y %H:%M'),
+        "usuario": a.usuario.username if a.usuario else "Sistema",
+        "tipo_actualizacion": a.tipo_actualizacion,
+        "valor": float(a.valor),
+        "campos": a.campos,
+        "cantidad": a.cantidad,
+        "revertida": a.revertida,
+    } for a in actualizaciones]})
+
+
+@login_required
+@verificar_permiso('productos')
+@require_POST
+def api_revertir_precios(request, id):
+    """API para revertir una actualización masiva de precios a los valores anteriores"""
+    from .models import ActualizacionPrecios
+    from .services_productos import PrecioService
+    
+    try:
+        restaurados = PrecioService.revertir(id)
+    except ActualizacionPrecios.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "Actualización no encontrada"}, status=404)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+    
+    return JsonResponse({
+        "ok": True,
+        "productos_restaurados": restaurados,
+        "mensaje": f"Se restauraron los precios de {restaurados} productos"
+    })
+
+
 @login_required
 @verificar_permiso('productos')
 def producto_nuevo(request):
@@ -1600,7 +1596,7 @@ def producto_nuevo(request):
         rubro = Rubro.objects.get(id=request.POST["rubro"]) if request.POST.get("rubro") else None
         proveedor = Proveedor.objects.get(id=request.POST["proveedor"]) if request.POST.get("proveedor") else None
 
-        Producto.objects.create(
+        producto = Producto.objects.create(
             codigo=request.POST["codigo"],
             descripcion=request.POST["descripcion"],
             descripcion_larga=request.POST.get("descripcion_larga", ""),
@@ -1619,6 +1615,7 @@ def producto_nuevo(request):
             precio_lista4=request.POST.get("precio_lista4", 0),
             imagen=request.FILES.get("imagen"),
         )
+        LibroStockService.registrar_ajuste(producto, 0, referencia="Stock inicial")
         return redirect("productos")
 
     return redirect("productos")
@@ -1640,6 +1637,7 @@ def producto_editar(request, id):
 
         producto.tipo_bulto = request.POST.get("tipo_bulto", "UN")
         producto.stock_inicial = request.POST.get("stock_inicial", 0)
+        stock_anterior = producto.stock
         producto.stock = request.POST.get("stock", 0)
         producto.stock_minimo = request.POST.get("stock_minimo", 0)
         producto.stock_maximo = request.POST.get("stock_maximo", 0)
@@ -1654,6 +1652,7 @@ def producto_editar(request, id):
             producto.imagen = request.FILES["imagen"]
 
         producto.save()
+        LibroStockService.registrar_ajuste(producto, stock_anterior)
         return redirect("productos")
 
     return redirect("productos")
@@ -1807,10 +1806,8 @@ def api_buscar_productos(request):
     if len(q) < 1:
         return JsonResponse([], safe=False)
 
-    productos = Producto.objects.filter(
-        Q(codigo__icontains=q) |
-        Q(descripcion__icontains=q)
-    )[:20]
+    from .services_productos import ProductoBuscador
+    productos = ProductoBuscador.filtrar(q)[:20]
 
     data = []
 
@@ -2208,11 +2205,10 @@ def recepcionar_orden_interna(oc, medio_pago, datos_cheque=None, user=None):
         old_costo = prod.costo
         new_costo = det.precio
         
-        prod.stock += det.cantidad
         prod.costo = new_costo # Actualizar costo con el precio de esta compra
         
         # Lógica de actualización automática de precios de venta
-        empresa = Empresa.objects.first()
+        empresa = ConfiguracionEmpresa.obtener()
         if empresa and empresa.actualizar_precios_compra and old_costo > 0 and new_costo != old_costo:
             diferencia = new_costo - old_costo
             # Actualizamos todos los precios sumando la diferencia (mantiene margen absoluto)
@@ -2231,12 +2227,11 @@ def recepcionar_orden_interna(oc, medio_pago, datos_cheque=None, user=None):
                 if prod.precio_lista4:
                     prod.precio_lista4 = round(prod.precio_lista4 / r) * r
                 
-        prod.save()
+        # Sin `stock`: lo suma el libro de stock con F() (no pisa ventas concurrentes)
+        prod.save(update_fields=['costo', 'precio_efectivo', 'precio_tarjeta', 'precio_ctacte', 'precio_lista4', 'fecha_actualizacion'])
 
-        MovimientoStock.objects.create(
-            producto=prod,
-            tipo="IN",
-            cantidad=det.cantidad,
+        LibroStockService.registrar(
+            [(prod, "IN", det.cantidad)],
             referencia=f"Compra {compra.id}",
             observaciones=f"Recepción OC {oc.id}",
         )
@@ -2300,23 +2295,24 @@ def recepcionar_orden_interna(oc, medio_pago, datos_cheque=None, user=None):
             usuario=user
         )
 
-    # 5. Generar Asiento Contable
+    # 5. Asiento Contable (lo registra el worker de jobs después del commit)
     try:
-        from .services import AccountingService
-        AccountingService.registrar_compra(compra)
+        from .services_jobs import JobService
+        asientos = [('registrar_compra', compra)]
         
         if medio_pago == 'CTACTE':
             pass # Ya se registró la deuda en Cta Cte, y el asiento de compra genera Proveedores (H). 
                  # No hace falta asiento de pago.
         elif medio_pago == 'CHEQUE':
             if 'cheque' in locals() and cheque:
-                AccountingService.registrar_pago_compra_cheque_propio(compra, cheque)
+                asientos.append(('registrar_pago_compra_cheque_propio', compra, cheque))
         else:
              # Contado Efectivo
-             AccountingService.registrar_pago_compra_contado(compra)
+             asientos.append(('registrar_pago_compra_contado', compra))
+        JobService.asientos(*asientos)
 
     except Exception as e:
-        print(f"Error generando asiento de compra {compra.id}: {e}")
+        print(f"Error encolando asiento de compra {compra.id}: {e}")
 
 
 @require_POST
@@ -2780,12 +2776,10 @@ def api_productos_lista(request):
         # Query base
         productos = Producto.objects.select_related("marca", "rubro").all()
         
-        # Aplicar filtros
+        # Aplicar filtros (la búsqueda ya ordena por relevancia: código exacto primero)
         if busqueda:
-            productos = productos.filter(
-                Q(codigo__icontains=busqueda) |
-                Q(descripcion__icontains=busqueda)
-            )
+            from .services_productos import ProductoBuscador
+            productos = ProductoBuscador.filtrar(busqueda, productos)
         
         if rubro_id:
             productos = productos.filter(rubro_id=rubro_id)
@@ -2803,7 +2797,8 @@ def api_productos_lista(request):
             productos = productos.filter(Q(stock__lte=10) | Q(stock__lte=F('stock_minimo')))
         
         # Ordenar
-        productos = productos.order_by('descripcion')
+        if not busqueda:
+            productos = productos.order_by('descripcion')
         
         # Contar total
         total = productos.count()
@@ -3016,6 +3011,7 @@ def api_productos_nuevo(request):
             p.imagen = request.FILES["imagen"]
 
         p.save()
+        LibroStockService.registrar_ajuste(p, 0, referencia="Stock inicial")
         return JsonResponse({"ok": True})
 
     except Exception as e:
@@ -3068,6 +3064,7 @@ def api_productos_editar(request, id):
     p.tipo_bulto = data.get("tipo_bulto", p.tipo_bulto)
 
     p.stock_inicial = num(data.get("stock_inicial"))
+    stock_anterior = p.stock
     p.stock = num(data.get("stock"))
     p.stock_minimo = num(data.get("stock_minimo"))
     p.stock_maximo = num(data.get("stock_maximo"))
@@ -3088,6 +3085,7 @@ def api_productos_editar(request, id):
 
     try:
         p.save()
+        LibroStockService.registrar_ajuste(p, stock_anterior)
         return JsonResponse({"ok": True})
 
     except Exception as e:
@@ -3226,11 +3224,8 @@ def buscar_producto(request):
     if texto == "":
         return JsonResponse({"ok": False, "msg": "Vacío"}, status=400)
 
-    productos = Producto.objects.filter(
-        Q(codigo__icontains=texto) |
-        Q(descripcion__icontains=texto) |
-        Q(marca__nombre__icontains=texto)
-    ).select_related("marca")[:5]
+    from .services_productos import ProductoBuscador
+    productos = ProductoBuscador.filtrar(texto, Producto.objects.select_related("marca"))[:5]
 
     resultados = []
 
@@ -3251,12 +3246,8 @@ def buscar_producto(request):
 def buscar_productos(request):
     q = request.GET.get("q", "").strip()
 
-    productos = Producto.objects.filter(
-        Q(codigo__icontains=q) |
-        Q(descripcion__icontains=q) |
-        Q(marca__nombre__icontains=q) |
-        Q(rubro__nombre__icontains=q)
-    ).values(
+    from .services_productos import ProductoBuscador
+    productos = ProductoBuscador.filtrar(q).values(
         "id",
         "codigo",
         "descripcion",
@@ -3275,8 +3266,21 @@ def buscar_productos(request):
 # =======================================
 
 def api_ventas_listar(request):
-    """API para listar todas las ventas con soporte para filtros mejorados"""
+    """
+    API para listar todas las ventas con soporte para filtros mejorados.
+    Parámetros opcionales (ver ListadoKeyset):
+    - limite + cursor: paginación por keyset sobre (fecha, id); la respuesta incluye 'siguiente'
+    - formato=ndjson|csv: exportación en streaming del listado completo filtrado
+    Sin limite/cursor retorna la primera página de LIMITE_MAXIMO ventas; el resto se pide con 'siguiente'.
+    """
+    from .services_listados import ListadoKeyset
+
     q = request.GET.get("q", "").strip()
+    formato = request.GET.get("formato", "json")
+    try:
+        limite, cursor = ListadoKeyset.parametros(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Parámetros de paginación inválidos"}, status=400)
     fecha_start = request.GET.get("fecha_start")
     fecha_end = request.GET.get("fecha_end")
     
@@ -3293,8 +3297,6 @@ def api_ventas_listar(request):
         except (ValueError, TypeError):
             pass
 
-    ventas = ventas.order_by("-fecha")
-    
     if q:
         from django.db.models import Q
         
@@ -3319,20 +3321,28 @@ def api_ventas_listar(request):
             Q(fecha_str__icontains=q)
         )
     
-    data = []
     from django.utils import timezone
-    for v in ventas:
-        data.append({
+    punto_venta = ListadoKeyset.punto_venta()
+
+    def serializar(v):
+        return {
             "id": v.id,
             "fecha": timezone.localtime(v.fecha).strftime("%d/%m/%Y %H:%M"),
             "cliente": v.cliente.nombre if v.cliente else "Sin cliente",
             "tipo_comprobante": v.tipo_comprobante,
             "total": float(v.total),
             "estado": v.estado,
-            "numero_factura": v.numero_factura_formateado()
-        })
-    
-    return JsonResponse({"ok": True, "data": data})
+            "numero_factura": v.numero_factura_formateado(punto_venta)
+        }
+
+    ventas = ListadoKeyset.ordenar(ventas)
+    if formato in ListadoKeyset.FORMATOS:
+        return ListadoKeyset.exportar(
+            (serializar(v) for v in ventas.iterator(chunk_size=2000)), formato, "ventas"
+        )
+
+    pagina, siguiente = ListadoKeyset.pagina(ventas, limite or ListadoKeyset.LIMITE_MAXIMO, cursor)
+    return JsonResponse({"ok": True, "data": [serializar(v) for v in pagina], "siguiente": siguiente})
 
 @login_required
 def api_venta_detalle(request, id):
@@ -3433,83 +3443,34 @@ def api_venta_guardar(request):
                 percepcion_iibb=Decimal(str(data.get("percepcion_iibb", 0)))
             )
 
-            total_neto_acumulado = Decimal('0')
-            total_iva_acumulado = Decimal('0')
-
-            for item in items:
-                producto = Producto.objects.get(id=item["id"])
-                cantidad = Decimal(str(item["cantidad"]))
-                
-                # VALIDACIÓN DE STOCK
-                empresa_config = Empresa.objects.first()
-                if not (empresa_config and empresa_config.permitir_stock_negativo):
-                    if producto.stock < cantidad:
-                        raise ValueError(f"Stock insuficiente para {producto.descripcion}. Stock actual: {producto.stock}")
-
-                precio = Decimal(str(item["precio"]))
-                subtotal = Decimal(str(item["subtotal"]))
-                
-                # Obtener neto e iva si vienen del frontend
-                # Si no vienen, asumimos que subtotal es todo neto (o iva incluido sin discriminar)
-                # para mantener compatibilidad, si no se discrimina, neto=subtotal (o base) y iva=0
-                # Pero si guardamos para libro de IVA, deberíamos calcularlo siempre si es factura fiscal.
-                # Por ahora confiaremos en lo que mande el front.
-                
-                item_neto = Decimal(str(item.get("neto", subtotal))) # Default to subtotal if undefined
-                item_iva = Decimal(str(item.get("iva_amount", 0)))
-                
-                # Si el frontend mandó discriminado, confiamos. 
-                # Si no, calculamos para reportes internos (Libro IVA) ya que el total SIEMPRE incluye IVA.
-                if not item.get("discriminado", False):
-                     alicuota = Decimal(str(producto.iva_alicuota)) if producto.iva_alicuota is not None else Decimal("21.0")
-                     if alicuota > 0:
-                         divisor = 1 + (alicuota / 100)
-                         item_neto = subtotal / divisor
-                         item_iva = subtotal - item_neto
-                     else:
-                         item_neto = subtotal
-                         item_iva = Decimal('0')
-
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=precio,
-                    subtotal=subtotal,
-                    neto=item_neto,
-                    iva_amount=item_iva
-                )
-                
-                total_neto_acumulado += item_neto
-                total_iva_acumulado += item_iva
+            # Persistencia en bloque: productos bloqueados en 1 consulta, detalles,
+            # movimientos de stock y remito con bulk_create, stock con un UPDATE ... CASE
+            from .services_ventas import VentaService
+
+            empresa_config = ConfiguracionEmpresa.obtener()
+            total_neto_acumulado, total_iva_acumulado, _detalles = VentaService.registrar_items(
+                venta,
+                items,
+                permitir_stock_negativo=bool(empresa_config and empresa_config.permitir_stock_negativo),
+                generar_remito=bool(empresa_config and empresa_config.habilita_remitos),
+                punto_venta=empresa_config.punto_venta if empresa_config else "0001",
+            )
 
-                producto.stock -= cantidad
-                producto.save()
-            
             # Actualizar totales en cabecera
             venta.neto = total_neto_acumulado
             venta.iva_amount = total_iva_acumulado
-            venta.save()
+            venta.save(update_fields=['neto', 'iva_amount'])
 
             # Registrar movimiento segun medio de pago
             cheque_creado = None  # Para uso posterior en contabilidad
             
             if medio_pago == "CTACTE":
                 # Venta a cuenta corriente - No impacta caja, solo registra deuda del cliente
-                nuevo_saldo = cliente.saldo_actual + Decimal(total_general)
-                
-                MovimientoCuentaCorriente.objects.create(
-                    cliente=cliente,
-                    tipo='DEBE',
-                    descripcion=f"Venta #{venta.id} (Cta. Cte.)",
-                    monto=total_general,
-                    saldo=nuevo_saldo,
-                    venta=venta
+                from .services_ctacte import CuentaCorrienteService
+                CuentaCorrienteService.registrar(
+                    cliente, 'DEBE', total_general, f"Venta #{venta.id} (Cta. Cte.)", venta=venta
                 )
                 
-                cliente.saldo_actual = nuevo_saldo
-                cliente.save()
-                
             elif medio_pago == "CHEQUE":
                 # Venta con cheque - Crear cheque de tercero en cartera
                 # El cheque NO impacta caja hasta que se deposite
@@ -3555,52 +3516,32 @@ def api_venta_guardar(request):
                     monto=total_general,
                 )
 
-            # Generar Remito Automático (Si la empresa lo tiene habilitado)
-            # Ignoramos lo que venga del frontend, mandamos la configuración de la empresa
-            empresa_config = Empresa.objects.first()
-            if empresa_config and empresa_config.habilita_remitos:
-                # Buscar último número de remito para mantener correlatividad (opcional, o dejar que id lo maneje)
-                remito = Remito.objects.create(
-                    cliente=cliente,
-                    venta_asociada=venta,
-                    fecha=venta.fecha,
-                    direccion_entrega=cliente.domicilio or "Retiro en Local",
-                    estado='ENTREGADO',
-                    punto_venta=empresa_config.punto_venta
-                )
-                
-                for det in venta.detalles.all():
-                    DetalleRemito.objects.create(
-                        remito=remito,
-                        producto=det.producto,
-                        cantidad=det.cantidad
-                    )
-
-        # Generar Asientos Contables (fuera del transaction para que la venta ya exista)
+        # Asientos Contables: los registra el worker de jobs después del commit de la venta
         try:
-            from .services import AccountingService
+            from .services_jobs import JobService
             
             # 1. Asiento de Venta (común a todos los medios de pago)
             # Debe: Deudores por Ventas | Haber: Ventas + IVA + CMV
-            AccountingService.registrar_venta(venta)
+            asientos = [('registrar_venta', venta)]
 
             # 2. Asiento de Cobro (según medio de pago)
             if medio_pago == "EFECTIVO":
                 # Debe: Caja | Haber: Deudores por Ventas
-                AccountingService.registrar_cobro_venta_contado(venta)
+                asientos.append(('registrar_cobro_venta_contado', venta))
                 
             elif medio_pago == "TARJETA":
                 # Debe: Tarjetas a Cobrar + Comisiones | Haber: Deudores por Ventas
-                AccountingService.registrar_cobro_venta_tarjeta(venta)
+                asientos.append(('registrar_cobro_venta_tarjeta', venta))
                 
             elif medio_pago == "CHEQUE" and cheque_creado:
                 # Debe: Valores a Depositar | Haber: Deudores por Ventas
-                AccountingService.registrar_cobro_venta_cheque(venta, cheque_creado)
+                asientos.append(('registrar_cobro_venta_cheque', venta, cheque_creado))
                 
             # CTACTE: No genera asiento de cobro inmediato (el cliente debe, se cobra después)
+            JobService.asientos(*asientos)
                 
         except Exception as e:
-            print(f"Error generando asiento de venta {venta.id}: {e}")
+            print(f"Error encolando asiento de venta {venta.id}: {e}")
 
         return JsonResponse({"ok": True, "venta_id": venta.id})
 
@@ -3621,12 +3562,8 @@ def api_productos_buscar(request):
     if len(query) < 2:
         return JsonResponse({"data": []})
     
-    productos = Producto.objects.filter(
-        Q(codigo__icontains=query) |
-        Q(descripcion__icontains=query) |
-        Q(marca__nombre__icontains=query) |
-        Q(rubro__nombre__icontains=query)
-    ).select_related("marca", "rubro")[:15]
+    from .services_productos import ProductoBuscador
+    productos = ProductoBuscador.filtrar(query, Producto.objects.select_related("marca", "rubro"))[:15]
     
     data = []
     for p in productos:
@@ -3765,28 +3702,24 @@ def api_pedido_facturar(request, pedido_id):
 
         total = Decimal("0.00")
 
-        for det in pedido.detalles.all():
+        detalles = list(pedido.detalles.select_related("producto"))
+        for det in detalles:
             DetalleVenta.objects.create(
                 venta=venta,
                 producto=det.producto,
                 cantidad=det.cantidad,
                 precio_unitario=det.precio_unitario,
                 subtotal=det.subtotal,
+                costo_unitario=det.producto.costo,
             )
 
             total += det.subtotal
 
-            prod = det.producto
-            prod.stock = prod.stock - det.cantidad
-            prod.save()
-
-            MovimientoStock.objects.create(
-                producto=prod,
-                tipo="OUT",
-                cantidad=det.cantidad,
-                referencia=f"Venta {venta.id}",
-                observaciones=f"Desde pedido {pedido.id}",
-            )
+        LibroStockService.registrar(
+            [(det.producto, "OUT", det.cantidad) for det in detalles],
+            referencia=f"Venta {venta.id}",
+            observaciones=f"Desde pedido {pedido.id}",
+        )
 
         venta.total = total
         venta.save()
@@ -3818,10 +3751,10 @@ def pedidos_listado(request):
         pedidos = pedidos.filter(cliente_id=cliente_id)
 
     if fecha_desde:
-        pedidos = pedidos.filter(fecha__date__gte=fecha_desde)
+        pedidos = pedidos.filter(fecha__gte=_inicio_dia(fecha_desde))
 
     if fecha_hasta:
-        pedidos = pedidos.filter(fecha__date__lte=fecha_hasta)
+        pedidos = pedidos.filter(fecha__lt=_inicio_dia(fecha_hasta, dias=1))
 
     clientes = Cliente.objects.filter(activo=True).order_by("nombre")
 
@@ -4201,12 +4134,12 @@ def invoice_template_edit(request, template_id=None):
 
 @login_required
 def invoice_print(request, venta_id):
-    from .utils_pdf import render_to_pdf
+    from .services_pdf import ComprobantePdf
     venta = get_object_or_404(Venta, pk=venta_id)
     
     # Obtener el modelo solicitado
     model_param = request.GET.get('model')
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
     
     # Si es ticket, mantenemos el renderizado HTML por ahora (impresora térmica)
     if model_param == 'ticket' or (not model_param and empresa and empresa.papel_impresion in ['T80', 'T58']):
@@ -4218,26 +4151,13 @@ def invoice_print(request, venta_id):
         }
         return render(request, 'administrar/comprobantes/inv_ticket.html', context)
 
-    # Para facturas A4, generamos PDF profesional
-    context = {
-        'venta': venta,
-        'cliente': venta.cliente,
-        'detalles': venta.detalles.all(),
-        'empresa': empresa,
-        'is_preview': request.GET.get('preview') == 'true'
-    }
-    
-    print(f"--- GENERANDO PDF V4 (REDISEÑO) para Venta #{venta.id} ---")
-    response = render_to_pdf('administrar/comprobantes/factura_a_v4.html', context)
+    # Para facturas A4, PDF profesional (cacheado en disco; ETag para que el navegador revalide)
+    response, context = ComprobantePdf.respuesta(request, 'factura', venta)
     if response:
-        filename = f"Factura_{venta.numero_factura_formateado().replace('-', '_')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        # Force no-cache headers
-        response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-        response['Pragma'] = 'no-cache'
         return response
         
     # Fallback to HTML if PDF fails
+    context['is_preview'] = request.GET.get('preview') == 'true'
     return render(request, 'administrar/comprobantes/inv_modern.html', context)
 
 
@@ -4287,7 +4207,7 @@ def invoice_print_preview(request):
         d.subtotal = d.cantidad * d.precio_unitario
         detalles.append(d)
 
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
     if not empresa:
         empresa = MockObj()
         empresa.nombre = "Mi Empresa S.R.L."
@@ -4544,10 +4464,21 @@ def pedidos(request):
 
 
 def api_pedidos_lista(request):
-    """API para listar pedidos con paginación y filtros"""
+    """
+    API para listar pedidos con paginación y filtros.
+    Con limite/cursor pagina por keyset (respuesta con 'siguiente', sin total); formato=ndjson|csv exporta todo.
+    """
+    from django.db.models import Count
+    from .services_listados import ListadoKeyset
+
     # Parámetros de paginación
     page = int(request.GET.get('page', 1))
     per_page = int(request.GET.get('per_page', 10))
+    formato = request.GET.get('formato', 'json')
+    try:
+        limite, cursor = ListadoKeyset.parametros(request)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros de paginación inválidos'}, status=400)
     
     # Filtros
     busqueda = request.GET.get('busqueda', '').strip()
@@ -4557,7 +4488,7 @@ def api_pedidos_lista(request):
     fecha_hasta = request.GET.get('fecha_hasta', '').strip()
     
     # Query base
-    pedidos = Pedido.objects.select_related('cliente', 'venta').prefetch_related('detalles__producto').all()
+    pedidos = Pedido.objects.select_related('cliente').annotate(num_items=Count('detalles'))
     
     # Aplicar filtros
     if busqueda:
@@ -4602,35 +4533,42 @@ def api_pedidos_lista(request):
             pass
     
     # Ordenar
-    pedidos = pedidos.order_by('-fecha')
-    
-    # Contar total
-    total = pedidos.count()
+    pedidos = ListadoKeyset.ordenar(pedidos)
     
-    # Paginación
-    start = (page - 1) * per_page
-    end = start + per_page
-    pedidos_page = pedidos[start:end]
-    
-    # Serializar
-    data = []
     from django.utils import timezone
-    for p in pedidos_page:
-        # Contar items
-        num_items = p.detalles.count()
-        
-        data.append({
+
+    def serializar(p):
+        return {
             'id': p.id,
             'fecha': timezone.localtime(p.fecha).strftime('%d/%m/%Y %H:%M'),
-            'cliente_id': p.cliente.id,
+            'cliente_id': p.cliente_id,
             'cliente_nombre': p.cliente.nombre,
             'total': float(p.total),
             'estado': p.estado,
             'estado_display': p.get_estado_display(),
             'observaciones': p.observaciones or '',
             'venta_id': p.venta_id,
-            'num_items': num_items,
-        })
+            'num_items': p.num_items,
+        }
+
+    if formato in ListadoKeyset.FORMATOS:
+        return ListadoKeyset.exportar(
+            (serializar(p) for p in pedidos.iterator(chunk_size=2000)), formato, "pedidos"
+        )
+
+    if limite:
+        pagina, siguiente = ListadoKeyset.pagina(pedidos, limite, cursor)
+        return JsonResponse({'pedidos': [serializar(p) for p in pagina], 'siguiente': siguiente})
+
+    # Contar total
+    total = pedidos.count()
+    
+    # Paginación
+    start = (page - 1) * per_page
+    end = start + per_page
+    
+    # Serializar
+    data = [serializar(p) for p in pedidos[start:end]]
     
     return JsonResponse({
         'pedidos': data,
@@ -4695,7 +4633,7 @@ def pedido_print(request, pedido_id):
     
     context = {
         'pedido': pedido,
-        'empresa': Empresa.objects.first(),
+        'empresa': ConfiguracionEmpresa.obtener(),
     }
     
     try:
@@ -4710,7 +4648,7 @@ def api_pedido_pdf(request, pedido_id):
     from .utils_pdf import render_to_pdf
     
     pedido = get_object_or_404(Pedido, pk=pedido_id)
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
     
     context = {
         'pedido': pedido,
@@ -4948,20 +4886,23 @@ def api_pedido_cambiar_estado(request, id):
                 )
                 
                 # Crear detalles y descontar stock
-                detalles_pedido = DetallePedido.objects.filter(pedido=pedido)
+                detalles_pedido = DetallePedido.objects.filter(pedido=pedido).select_related('producto')
                 for det in detalles_pedido:
                     DetalleVenta.objects.create(
                         venta=venta,
                         producto=det.producto,
                         cantidad=det.cantidad,
                         precio_unitario=det.precio_unitario,
-                        subtotal=det.subtotal
+                        subtotal=det.subtotal,
+                        costo_unitario=det.producto.costo
                     )
                     
-                    # Descontar stock
-                    producto = det.producto
-                    producto.stock -= det.cantidad
-                    producto.save()
+                # Descontar stock (movimientos + UPDATE con F(), sin leer-modificar-guardar)
+                LibroStockService.registrar(
+                    [(det.producto, "OUT", det.cantidad) for det in detalles_pedido],
+                    referencia=f"Venta {venta.id}",
+                    observaciones=f"Desde pedido {pedido.id}",
+                )
                 
                 # Vincular pedido con venta
                 pedido.venta = venta
@@ -5015,20 +4956,23 @@ def api_pedido_facturar(request, id):
             )
             
             # Crear detalles y descontar stock
-            detalles_pedido = DetallePedido.objects.filter(pedido=pedido)
+            detalles_pedido = DetallePedido.objects.filter(pedido=pedido).select_related('producto')
             for det in detalles_pedido:
                 DetalleVenta.objects.create(
                     venta=venta,
                     producto=det.producto,
                     cantidad=det.cantidad,
                     precio_unitario=det.precio_unitario,
-                    subtotal=det.subtotal
+                    subtotal=det.subtotal,
+                    costo_unitario=det.producto.costo
                 )
                 
-                # Descontar stock
-                producto = det.producto
-                producto.stock -= det.cantidad
-                producto.save()
+            # Descontar stock (movimientos + UPDATE con F(), sin leer-modificar-guardar)
+            LibroStockService.registrar(
+                [(det.producto, "OUT", det.cantidad) for det in detalles_pedido],
+                referencia=f"Venta {venta.id}",
+                observaciones=f"Desde pedido {pedido.id}",
+            )
             
             # Vincular pedido con venta
             pedido.venta = venta
@@ -5039,8 +4983,8 @@ def api_pedido_facturar(request, id):
             # GENERACIÓN AUTOMÁTICA DE ASIENTO CONTABLE
             # ==========================================
             try:
-                from administrar.models import EjercicioContable, PlanCuenta, Asiento, ItemAsiento
-                from django.db.models import Max
+                from administrar.models import EjercicioContable, PlanCuenta
+                from administrar.services import AsientoBuilder
                 
                 # Buscar ejercicio vigente
                 ejercicio = EjercicioContable.objects.filter(
@@ -5065,47 +5009,29 @@ def api_pedido_facturar(request, id):
                         monto_neto = venta.total
                         
                         if venta.tipo_comprobante == 'A':
-                            monto_neto = venta.total / Decimal('1.21')
+                            monto_neto = (venta.total / Decimal('1.21')).quantize(Decimal('0.01'))
                             monto_iva = venta.total - monto_neto
                         
-                        # Obtener correlativo
-                        numero = (Asiento.objects.filter(ejercicio=ejercicio).aggregate(m=Max('numero'))['m'] or 0) + 1
-                        
-                        asiento = Asiento.objects.create(
-                            numero=numero,
-                            fecha=venta.fecha,
-                            descripcion=f"Venta Fac-{venta.tipo_comprobante} {venta.id} - {pedido.cliente.nombre}",
-                            ejercicio=ejercicio,
+                        asiento = AsientoBuilder(
+                            ejercicio, venta.fecha,
+                            f"Venta Fac-{venta.tipo_comprobante} {venta.id} - {pedido.cliente.nombre}",
                             origen='VENTAS'
                         )
-                        
+
                         # DEBE: Deudores por Venta (Total)
-                        ItemAsiento.objects.create(
-                            asiento=asiento,
-                            cuenta=cta_deudores,
-                            debe=venta.total,
-                            haber=0,
-                            descripcion=f"Factura {venta.tipo_comprobante}-{venta.id}"
-                        )
-                        
-                        # HABER: Ventas (Neto)
-                        ItemAsiento.objects.create(
-                            asiento=asiento,
-                            cuenta=cta_ventas,
-                            debe=0,
-                            haber=monto_neto,
-                            descripcion=f"Venta Artículos"
-                        )
-                        
+                        asiento.debe(cta_deudores, venta.total, descripcion=f"Factura {venta.tipo_comprobante}-{venta.id}")
+
+                        # HABER: Ventas (Neto) - si no hay cuenta de IVA, el IVA queda en Ventas para balancear
+                        if monto_iva > 0 and not cta_iva:
+                            monto_neto = venta.total
+                        asiento.haber(cta_ventas, monto_neto, descripcion=f"Venta Artículos")
+
                         # HABER: IVA (si aplica y > 0)
                         if monto_iva > 0 and cta_iva:
-                            ItemAsiento.objects.create(
-                                asiento=asiento,
-                                cuenta=cta_iva,
-                                debe=0,
-                                haber=monto_iva,
-                                descripcion=f"IVA Débito Fiscal"
-                            )
+                            asiento.haber(cta_iva, monto_iva, descripcion=f"IVA Débito Fiscal")
+
+                        # Número correlativo tomado del NumeradorAsiento del ejercicio
+                        asiento.registrar()
                             
             except Exception as e:
                 print(f"Error generando asiento contable para venta {venta.id}: {str(e)}")
@@ -5313,7 +5239,8 @@ def api_asientos_listar(request):
 @require_http_methods(["POST"])
 def api_asientos_crear(request):
     """API para crear un nuevo asiento contable"""
-    from administrar.models import Asiento, ItemAsiento, EjercicioContable
+    from administrar.models import PlanCuenta, EjercicioContable
+    from administrar.services import AsientoBuilder
     import json
     from decimal import Decimal
     
@@ -5339,33 +5266,46 @@ def api_asientos_crear(request):
                 'error': 'Debe haber al menos 2 movimientos'
             }, status=400)
         
-        total_debe = sum(Decimal(str(m.get('debe', 0))) for m in movimientos)
-        total_haber = sum(Decimal(str(m.get('haber', 0))) for m in movimientos)
-        
-        if abs(total_debe - total_haber) > Decimal('0.01'):
+        # Importes al centavo, como los registra AsientoBuilder: el asiento tiene que cuadrar exacto
+        lineas = []
+        try:
+            for mov in movimientos:
+                debe = Decimal(str(mov.get('debe') or 0)).quantize(AsientoBuilder.CENTAVO)
+                haber = Decimal(str(mov.get('haber') or 0)).quantize(AsientoBuilder.CENTAVO)
+                if debe < 0 or haber < 0:
+                    return JsonResponse({'ok': False, 'error': 'Los importes no pueden ser negativos'}, status=400)
+                if not (debe or haber):
+                    continue
+                if not mov.get('cuenta_id'):
+                    return JsonResponse({'ok': False, 'error': 'Hay movimientos con importe y sin cuenta'}, status=400)
+                lineas.append((int(mov['cuenta_id']), debe, haber))
+        except (TypeError, ValueError, ArithmeticError):
+            return JsonResponse({'ok': False, 'error': 'Cuenta o importe inválido en los movimientos'}, status=400)
+
+        total_debe = sum((debe for _, debe, _ in lineas), Decimal('0'))
+        total_haber = sum((haber for _, _, haber in lineas), Decimal('0'))
+        if total_debe != total_haber:
             return JsonResponse({
                 'ok': False,
                 'error': f'El asiento está descuadrado. Debe: {total_debe}, Haber: {total_haber}'
             }, status=400)
-        
-        # Crear asiento
-        asiento = Asiento.objects.create(
-            numero=data['numero'],
-            fecha=data['fecha'],
-            descripcion=data['descripcion'],
-            ejercicio_id=data['ejercicio_id'],
-            tipo=data.get('tipo', 'MANUAL')
-        )
-        
-        # Crear items
-        for mov in movimientos:
-            if mov.get('cuenta_id') and (mov.get('debe', 0) > 0 or mov.get('haber', 0) > 0):
-                ItemAsiento.objects.create(
-                    asiento=asiento,
-                    cuenta_id=mov['cuenta_id'],
-                    debe=Decimal(str(mov.get('debe', 0))),
-                    haber=Decimal(str(mov.get('haber', 0)))
-                )
+
+        cuentas = PlanCuenta.objects.in_bulk({cuenta_id for cuenta_id, _, _ in lineas})
+        faltantes = sorted({cuenta_id for cuenta_id, _, _ in lineas} - set(cuentas))
+        if faltantes:
+            return JsonResponse({
+                'ok': False,
+                'error': f"Cuenta(s) inexistente(s): {', '.join(map(str, faltantes))}"
+            }, status=400)
+
+        # Crear asiento (el número lo asigna el NumeradorAsiento del ejercicio, no el cliente)
+        builder = AsientoBuilder(ejercicio, data['fecha'], data['descripcion'], origen=data.get('tipo', 'MANUAL'))
+        for cuenta_id, debe, haber in lineas:
+            builder.linea(cuentas[cuenta_id], debe=debe, haber=haber)
+        try:
+            asiento = builder.registrar()
+        except ValueError as e:
+            return JsonResponse({'ok': False, 'error': str(e)}, status=400)
         
         return JsonResponse({
             'ok': True,
@@ -5375,7 +5315,7 @@ def api_asientos_crear(request):
                 'fecha': str(asiento.fecha),
                 'descripcion': asiento.descripcion,
                 'ejercicio_id': asiento.ejercicio_id,
-                'tipo': asiento.tipo
+                'tipo': asiento.origen
             }
         })
         
@@ -5455,9 +5395,8 @@ def api_asientos_eliminar(request, id):
 @require_http_methods(["GET"])
 def api_balance_generar(request):
     """API para generar el balance de sumas y saldos"""
-    from administrar.models import PlanCuenta, Asiento, ItemAsiento, EjercicioContable
-    from decimal import Decimal
-    from django.db.models import Sum, Q
+    from administrar.models import EjercicioContable
+    from administrar.services_contabilidad import BalanceService
     
     try:
         ejercicio_id = request.GET.get('ejercicio_id')
@@ -5481,65 +5420,31 @@ def api_balance_generar(request):
         if not fecha_hasta:
             fecha_hasta = ejercicio.fecha_fin
         
-        # Obtener todas las cuentas
-        cuentas_query = PlanCuenta.objects.all().order_by('codigo')
-        
-        # Filtrar por nivel si se especifica
-        if nivel_filtro:
-            cuentas_query = cuentas_query.filter(nivel__lte=int(nivel_filtro))
+        # Totales por cuenta en una sola consulta agrupada (rubros con subtotales)
+        filas, totales = BalanceService.generar(
+            ejercicio_id, fecha_desde, fecha_hasta,
+            nivel=nivel_filtro, solo_con_movimientos=solo_con_movimientos
+        )
         
         cuentas_data = []
-        total_debe = Decimal('0')
-        total_haber = Decimal('0')
-        total_saldo_deudor = Decimal('0')
-        total_saldo_acreedor = Decimal('0')
-        
-        for cuenta in cuentas_query:
-            # Obtener movimientos de la cuenta en el período
-            items = ItemAsiento.objects.filter(
-                cuenta=cuenta,
-                asiento__ejercicio_id=ejercicio_id,
-                asiento__fecha__gte=fecha_desde,
-                asiento__fecha__lte=fecha_hasta
-            )
-            
-            # Calcular totales
-            debe = items.aggregate(total=Sum('debe'))['total'] or Decimal('0')
-            haber = items.aggregate(total=Sum('haber'))['total'] or Decimal('0')
-            saldo = debe - haber
-            
-            # Si solo queremos cuentas con movimientos, saltar las que no tienen
-            if solo_con_movimientos and debe == 0 and haber == 0:
-                continue
-            
+        for fila in filas:
+            cuenta = fila['cuenta']
             cuentas_data.append({
                 'id': cuenta.id,
                 'codigo': cuenta.codigo,
                 'nombre': cuenta.nombre,
                 'nivel': cuenta.nivel,
                 'tipo': cuenta.tipo,
-                'debe': float(debe),
-                'haber': float(haber),
-                'saldo': float(saldo)
+                'imputable': cuenta.imputable,
+                'debe': float(fila['debe']),
+                'haber': float(fila['haber']),
+                'saldo': float(fila['saldo'])
             })
-            
-            # Acumular totales
-            total_debe += debe
-            total_haber += haber
-            if saldo > 0:
-                total_saldo_deudor += saldo
-            else:
-                total_saldo_acreedor += abs(saldo)
         
         return JsonResponse({
             'success': True,
             'cuentas': cuentas_data,
-            'totales': {
-                'total_debe': float(total_debe),
-                'total_haber': float(total_haber),
-                'total_saldo_deudor': float(total_saldo_deudor),
-                'total_saldo_acreedor': float(total_saldo_acreedor)
-            },
+            'totales': {clave: float(valor) for clave, valor in totales.items()},
             'ejercicio': {
                 'id': ejercicio.id,
                 'descripcion': ejercicio.descripcion,
@@ -5555,9 +5460,8 @@ def api_balance_generar(request):
 @require_http_methods(["GET"])
 def api_balance_exportar(request):
     """API para exportar el balance a Excel"""
-    from administrar.models import PlanCuenta, Asiento, ItemAsiento, EjercicioContable
-    from decimal import Decimal
-    from django.db.models import Sum
+    from administrar.models import EjercicioContable
+    from administrar.services_contabilidad import BalanceService
     import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     from io import BytesIO
@@ -5614,36 +5518,21 @@ def api_balance_exportar(request):
             cell.alignment = Alignment(horizontal='center')
             cell.border = border
         
-        # Datos
-        cuentas_query = PlanCuenta.objects.all().order_by('codigo')
-        if nivel_filtro:
-            cuentas_query = cuentas_query.filter(nivel__lte=int(nivel_filtro))
+        # Datos (mismo motor que api_balance_generar)
+        filas, totales = BalanceService.generar(
+            ejercicio_id, fecha_desde, fecha_hasta,
+            nivel=nivel_filtro, solo_con_movimientos=solo_con_movimientos
+        )
         
         row = 6
-        total_debe = Decimal('0')
-        total_haber = Decimal('0')
-        total_saldo_deudor = Decimal('0')
-        total_saldo_acreedor = Decimal('0')
-        
-        for cuenta in cuentas_query:
-            items = ItemAsiento.objects.filter(
-                cuenta=cuenta,
-                asiento__ejercicio_id=ejercicio_id,
-                asiento__fecha__gte=fecha_desde,
-                asiento__fecha__lte=fecha_hasta
-            )
-            
-            debe = items.aggregate(total=Sum('debe'))['total'] or Decimal('0')
-            haber = items.aggregate(total=Sum('haber'))['total'] or Decimal('0')
-            saldo = debe - haber
-            
-            if solo_con_movimientos and debe == 0 and haber == 0:
-                continue
+        for fila in filas:
+            cuenta = fila['cuenta']
+            saldo = fila['saldo']
             
             ws.cell(row=row, column=1).value = cuenta.codigo
             ws.cell(row=row, column=2).value = cuenta.nombre
-            ws.cell(row=row, column=3).value = float(debe)
-            ws.cell(row=row, column=4).value = float(haber)
+            ws.cell(row=row, column=3).value = float(fila['debe'])
+            ws.cell(row=row, column=4).value = float(fila['haber'])
             ws.cell(row=row, column=5).value = float(saldo) if saldo > 0 else 0
             ws.cell(row=row, column=6).value = float(abs(saldo)) if saldo < 0 else 0
             
@@ -5651,22 +5540,20 @@ def api_balance_exportar(request):
             for col in range(3, 7):
                 ws.cell(row=row, column=col).number_format = '#,##0.00'
             
-            total_debe += debe
-            total_haber += haber
-            if saldo > 0:
-                total_saldo_deudor += saldo
-            else:
-                total_saldo_acreedor += abs(saldo)
+            # Rubros (no imputables) en negrita
+            if not cuenta.imputable:
+                for col in range(1, 7):
+                    ws.cell(row=row, column=col).font = Font(bold=True)
             
             row += 1
         
         # Totales
         ws.cell(row=row, column=1).value = 'TOTALES'
         ws.cell(row=row, column=1).font = Font(bold=True)
-        ws.cell(row=row, column=3).value = float(total_debe)
-        ws.cell(row=row, column=4).value = float(total_haber)
-        ws.cell(row=row, column=5).value = float(total_saldo_deudor)
-        ws.cell(row=row, column=6).value = float(total_saldo_acreedor)
+        ws.cell(row=row, column=3).value = float(totales['total_debe'])
+        ws.cell(row=row, column=4).value = float(totales['total_haber'])
+        ws.cell(row=row, column=5).value = float(totales['total_saldo_deudor'])
+        ws.cell(row=row, column=6).value = float(totales['total_saldo_acreedor'])
         
         for col in range(1, 7):
             ws.cell(row=row, column=col).font = Font(bold=True)
@@ -5706,88 +5593,45 @@ def api_balance_exportar(request):
 
 @require_http_methods(["GET"])
 def api_mayor_consultar(request):
-    """API para consultar el libro mayor de una cuenta"""
-    from administrar.models import PlanCuenta, ItemAsiento, Asiento
-    from decimal import Decimal
-    from django.db.models import Q
+    """
+    API para consultar el libro mayor de una cuenta.
+    Parámetros opcionales:
+    - limite + cursor: paginación por keyset (la respuesta incluye 'siguiente')
+    - formato=ndjson: streaming, 1 línea de cabecera (cuenta + resumen) y 1 línea por movimiento
+    """
+    from administrar.models import PlanCuenta
+    from administrar.services_contabilidad import MayorService
+    from django.http import StreamingHttpResponse
     
     try:
         cuenta_id = request.GET.get('cuenta_id')
         ejercicio_id = request.GET.get('ejercicio_id')
         fecha_desde = request.GET.get('fecha_desde')
         fecha_hasta = request.GET.get('fecha_hasta')
+        formato = request.GET.get('formato', 'json')
         
         if not cuenta_id:
             return JsonResponse({'success': False, 'error': 'Debe especificar una cuenta'}, status=400)
         
+        try:
+            limite = int(request.GET['limite']) if request.GET.get('limite') else None
+            cursor = MayorService.decodificar_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Parámetros de paginación inválidos'}, status=400)
+        
         # Obtener cuenta
         try:
             cuenta = PlanCuenta.objects.get(id=cuenta_id)
         except PlanCuenta.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Cuenta no encontrada'}, status=404)
         
-        # Construir lista de cuentas a consultar (incluyendo hijos si es agrupadora)
-        cuentas_ids = [cuenta.id]
-        if not cuenta.imputable:
-            # Función auxiliar para obtener descendientes
-            def obtener_descendientes(cuenta_padre):
-                descendientes = []
-                for hijo in cuenta_padre.hijos.all():
-                    descendientes.append(hijo.id)
-                    descendientes.extend(obtener_descendientes(hijo))
-                return descendientes
-            
-            cuentas_ids.extend(obtener_descendientes(cuenta))
-        
-        # Construir query de movimientos
-        query = Q(cuenta_id__in=cuentas_ids)
-        
-        if ejercicio_id:
-            query &= Q(asiento__ejercicio_id=ejercicio_id)
-        if fecha_desde:
-            query &= Q(asiento__fecha__gte=fecha_desde)
-        if fecha_hasta:
-            query &= Q(asiento__fecha__lte=fecha_hasta)
-        
-        # Obtener movimientos ordenados por fecha
-        items = ItemAsiento.objects.filter(query).select_related('asiento').order_by('asiento__fecha', 'asiento__numero')
-        
-        # Calcular saldo inicial (movimientos anteriores a fecha_desde)
-        saldo_inicial = Decimal('0')
-        if fecha_desde:
-            items_anteriores = ItemAsiento.objects.filter(
-                cuenta_id__in=cuentas_ids,
-                asiento__fecha__lt=fecha_desde
-            )
-            if ejercicio_id:
-                items_anteriores = items_anteriores.filter(asiento__ejercicio_id=ejercicio_id)
-            
-            for item in items_anteriores:
-                saldo_inicial += item.debe - item.haber
-        
-        # Procesar movimientos
-        movimientos = []
-        saldo_acumulado = saldo_inicial
-        total_debe = Decimal('0')
-        total_haber = Decimal('0')
+        # La cuenta y sus descendientes si es agrupadora (1 consulta)
+        cuentas_ids = MayorService.cuentas_ids(cuenta)
         
-        for item in items:
-            saldo_acumulado += item.debe - item.haber
-            total_debe += item.debe
-            total_haber += item.haber
-            
-            movimientos.append({
-                'id': item.id,
-                'fecha': str(item.asiento.fecha),
-                'asiento_id': item.asiento.id,
-                'asiento_numero': item.asiento.numero,
-                'descripcion': item.asiento.descripcion,
-                'debe': float(item.debe),
-                'haber': float(item.haber),
-                'saldo': float(saldo_acumulado)
-            })
+        # Saldo inicial y totales del período desde los saldos mensuales
+        resumen = MayorService.resumen(cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta)
         
-        return JsonResponse({
+        cabecera = {
             'success': True,
             'cuenta': {
                 'id': cuenta.id,
@@ -5796,14 +5640,31 @@ def api_mayor_consultar(request):
                 'tipo': cuenta.tipo,
                 'nivel': cuenta.nivel
             },
-            'resumen': {
-                'saldo_inicial': float(saldo_inicial),
-                'total_debe': float(total_debe),
-                'total_haber': float(total_haber),
-                'saldo_final': float(saldo_acumulado)
-            },
-            'movimientos': movimientos
-        })
+            'resumen': {clave: float(valor) for clave, valor in resumen.items()},
+        }
+        
+        def serializar(mov):
+            return {**mov, 'debe': float(mov['debe']), 'haber': float(mov['haber']), 'saldo': float(mov['saldo'])}
+        
+        movimientos = MayorService.movimientos(
+            cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta, resumen['saldo_inicial'],
+            cursor=cursor, limite=limite + 1 if limite else None
+        )
+        
+        if formato == 'ndjson':
+            def lineas():
+                yield json.dumps(cabecera) + '\n'
+                for mov in movimientos:
+                    yield json.dumps(serializar(mov)) + '\n'
+            return StreamingHttpResponse(lineas(), content_type='application/x-ndjson')
+        
+        pagina = [serializar(mov) for mov in movimientos]
+        siguiente = None
+        if limite and len(pagina) > limite:
+            pagina = pagina[:limite]
+            siguiente = MayorService.codificar_cursor(pagina[-1])
+        
+        return JsonResponse({**cabecera, 'movimientos': pagina, 'siguiente': siguiente})
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -5811,11 +5672,14 @@ def api_mayor_consultar(request):
 
 @require_http_methods(["GET"])
 def api_mayor_exportar(request):
-    """API para exportar el libro mayor a Excel"""
-    from administrar.models import PlanCuenta, ItemAsiento
-    from decimal import Decimal
-    from django.db.models import Q
+    """
+    API para exportar el libro mayor a Excel.
+    Usa un workbook write-only: las filas se escriben a medida que se leen de la base.
+    """
+    from administrar.models import PlanCuenta
+    from administrar.services_contabilidad import MayorService
     import openpyxl
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     from io import BytesIO
     
@@ -5829,31 +5693,20 @@ def api_mayor_exportar(request):
             return JsonResponse({'error': 'Debe especificar una cuenta'}, status=400)
         
         cuenta = PlanCuenta.objects.get(id=cuenta_id)
-        
-        # Construir query
-        query = Q(cuenta=cuenta)
-        if ejercicio_id:
-            query &= Q(asiento__ejercicio_id=ejercicio_id)
-        if fecha_desde:
-            query &= Q(asiento__fecha__gte=fecha_desde)
-        if fecha_hasta:
-            query &= Q(asiento__fecha__lte=fecha_hasta)
-        
-        items = ItemAsiento.objects.filter(query).select_related('asiento').order_by('asiento__fecha', 'asiento__numero')
-        
-        # Calcular saldo inicial
-        saldo_inicial = Decimal('0')
-        if fecha_desde:
-            items_anteriores = ItemAsiento.objects.filter(cuenta=cuenta, asiento__fecha__lt=fecha_desde)
-            if ejercicio_id:
-                items_anteriores = items_anteriores.filter(asiento__ejercicio_id=ejercicio_id)
-            for item in items_anteriores:
-                saldo_inicial += item.debe - item.haber
+        cuentas_ids = MayorService.cuentas_ids(cuenta)
+        resumen = MayorService.resumen(cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta)
         
         # Crear workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Libro Mayor"
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Libro Mayor")
+        
+        # Ajustar anchos (en modo write-only debe hacerse antes de escribir filas)
+        ws.column_dimensions['A'].width = 12
+        ws.column_dimensions['B'].width = 10
+        ws.column_dimensions['C'].width = 50
+        ws.column_dimensions['D'].width = 15
+        ws.column_dimensions['E'].width = 15
+        ws.column_dimensions['F'].width = 15
         
         # Estilos
         header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
@@ -5865,80 +5718,60 @@ def api_mayor_exportar(request):
             bottom=Side(style='thin')
         )
         
+        def celda(valor, font=None, numero=False, **estilos):
+            cell = WriteOnlyCell(ws, value=valor)
+            if font:
+                cell.font = font
+            if numero:
+                cell.number_format = '#,##0.00'
+            for atributo, estilo in estilos.items():
+                setattr(cell, atributo, estilo)
+            return cell
+        
         # Título
-        ws.merge_cells('A1:F1')
-        ws['A1'] = 'LIBRO MAYOR'
-        ws['A1'].font = Font(bold=True, size=16)
-        ws['A1'].alignment = Alignment(horizontal='center')
+        ws.append([celda('LIBRO MAYOR', Font(bold=True, size=16))])
         
         # Información de la cuenta
-        ws['A2'] = f'Cuenta: {cuenta.codigo} - {cuenta.nombre}'
-        ws['A2'].font = Font(bold=True)
-        ws['A3'] = f'Tipo: {cuenta.tipo} | Nivel: {cuenta.nivel}'
-        
-        if fecha_desde and fecha_hasta:
-            ws['A4'] = f'Período: {fecha_desde} al {fecha_hasta}'
+        ws.append([celda(f'Cuenta: {cuenta.codigo} - {cuenta.nombre}', Font(bold=True))])
+        ws.append([f'Tipo: {cuenta.tipo} | Nivel: {cuenta.nivel}'])
+        ws.append([f'Período: {fecha_desde} al {fecha_hasta}' if fecha_desde and fecha_hasta else None])
+        ws.append([])
         
         # Saldo inicial
-        ws['A6'] = 'Saldo Inicial:'
-        ws['A6'].font = Font(bold=True)
-        ws['B6'] = float(saldo_inicial)
-        ws['B6'].number_format = '#,##0.00'
+        ws.append([celda('Saldo Inicial:', Font(bold=True)), celda(float(resumen['saldo_inicial']), numero=True)])
+        ws.append([])
         
         # Encabezados
         headers = ['Fecha', 'Asiento', 'Descripción', 'Debe', 'Haber', 'Saldo']
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=8, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = border
+        ws.append([
+            celda(header, header_font, fill=header_fill, alignment=Alignment(horizontal='center'), border=border)
+            for header in headers
+        ])
         
         # Datos
-        row = 9
-        saldo_acumulado = saldo_inicial
-        total_debe = Decimal('0')
-        total_haber = Decimal('0')
-        
-        for item in items:
-            saldo_acumulado += item.debe - item.haber
-            total_debe += item.debe
-            total_haber += item.haber
-            
-            ws.cell(row=row, column=1).value = str(item.asiento.fecha)
-            ws.cell(row=row, column=2).value = item.asiento.numero
-            ws.cell(row=row, column=3).value = item.asiento.descripcion
-            ws.cell(row=row, column=4).value = float(item.debe)
-            ws.cell(row=row, column=5).value = float(item.haber)
-            ws.cell(row=row, column=6).value = float(saldo_acumulado)
-            
-            # Formato numérico
-            for col in [4, 5, 6]:
-                ws.cell(row=row, column=col).number_format = '#,##0.00'
-            
-            row += 1
+        movimientos = MayorService.movimientos(
+            cuentas_ids, ejercicio_id, fecha_desde, fecha_hasta, resumen['saldo_inicial']
+        )
+        for mov in movimientos:
+            ws.append([
+                mov['fecha'],
+                mov['asiento_numero'],
+                mov['descripcion'],
+                celda(float(mov['debe']), numero=True),
+                celda(float(mov['haber']), numero=True),
+                celda(float(mov['saldo']), numero=True),
+            ])
         
         # Totales
-        ws.cell(row=row, column=1).value = 'TOTALES'
-        ws.cell(row=row, column=1).font = Font(bold=True)
-        ws.cell(row=row, column=4).value = float(total_debe)
-        ws.cell(row=row, column=5).value = float(total_haber)
-        ws.cell(row=row, column=6).value = float(saldo_acumulado)
-        
-        for col in range(1, 7):
-            ws.cell(row=row, column=col).font = Font(bold=True)
-            ws.cell(row=row, column=col).border = border
-            if col >= 4:
-                ws.cell(row=row, column=col).number_format = '#,##0.00'
-        
-        # Ajustar anchos
-        ws.column_dimensions['A'].width = 12
-        ws.column_dimensions['B'].width = 10
-        ws.column_dimensions['C'].width = 50
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 15
-        ws.column_dimensions['F'].width = 15
+        negrita = Font(bold=True)
+        ws.append([
+            celda('TOTALES', negrita, border=border),
+            celda(None, negrita, border=border),
+            celda(None, negrita, border=border),
+            celda(float(resumen['total_debe']), negrita, numero=True, border=border),
+            celda(float(resumen['total_haber']), negrita, numero=True, border=border),
+            celda(float(resumen['saldo_final']), negrita, numero=True, border=border),
+        ])
         
         # Guardar
         output = BytesIO()
@@ -6051,9 +5884,9 @@ def api_reporte_libro_diario(request):
 @require_http_methods(["GET"])
 def api_reporte_estado_resultados(request):
     """API para generar Estado de Resultados"""
-    from administrar.models import PlanCuenta, ItemAsiento, EjercicioContable
+    from administrar.models import PlanCuenta, EjercicioContable
+    from administrar.services_contabilidad import SaldosService
     from decimal import Decimal
-    from django.db.models import Sum
     import openpyxl
     from openpyxl.styles import Font, Alignment
     from io import BytesIO
@@ -6065,8 +5898,12 @@ def api_reporte_estado_resultados(request):
         
         ejercicio = EjercicioContable.objects.get(id=ejercicio_id)
         
-        cuentas_ingresos = PlanCuenta.objects.filter(tipo='INGRESO')
-        cuentas_egresos = PlanCuenta.objects.filter(tipo='EGRESO')
+        cuentas_ingresos = PlanCuenta.objects.filter(tipo='R_POS').order_by('codigo')
+        cuentas_egresos = PlanCuenta.objects.filter(tipo='R_NEG').order_by('codigo')
+        
+        # Totales del ejercicio por cuenta: meses cerrados desde snapshots + mes abierto en vivo
+        totales_cuentas = SaldosService.totales(ejercicio_id)
+        cero = (Decimal('0'), Decimal('0'))
         
         total_ingresos = Decimal('0')
         total_egresos = Decimal('0')
@@ -6088,9 +5925,7 @@ def api_reporte_estado_resultados(request):
         row += 1
         
         for cuenta in cuentas_ingresos:
-            items = ItemAsiento.objects.filter(cuenta=cuenta, asiento__ejercicio_id=ejercicio_id)
-            haber = items.aggregate(total=Sum('haber'))['total'] or Decimal('0')
-            debe = items.aggregate(total=Sum('debe'))['total'] or Decimal('0')
+            debe, haber = totales_cuentas.get(cuenta.id, cero)
             saldo = haber - debe
             
             if saldo != 0:
@@ -6112,9 +5947,7 @@ def api_reporte_estado_resultados(request):
         row += 1
         
         for cuenta in cuentas_egresos:
-            items = ItemAsiento.objects.filter(cuenta=cuenta, asiento__ejercicio_id=ejercicio_id)
-            debe = items.aggregate(total=Sum('debe'))['total'] or Decimal('0')
-            haber = items.aggregate(total=Sum('haber'))['total'] or Decimal('0')
+            debe, haber = totales_cuentas.get(cuenta.id, cero)
             saldo = debe - haber
             
             if saldo != 0:
@@ -6157,9 +5990,9 @@ def api_reporte_estado_resultados(request):
 @require_http_methods(["GET"])
 def api_reporte_balance_general(request):
     """API para generar Balance General (Estado de Situación Patrimonial)"""
-    from administrar.models import PlanCuenta, ItemAsiento, EjercicioContable
+    from administrar.models import PlanCuenta, EjercicioContable
+    from administrar.services_contabilidad import SaldosService
     from decimal import Decimal
-    from django.db.models import Sum
     import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     from io import BytesIO
@@ -6171,20 +6004,22 @@ def api_reporte_balance_general(request):
         
         ejercicio = EjercicioContable.objects.get(id=ejercicio_id)
         
+        # Totales del ejercicio por cuenta: meses cerrados desde snapshots + mes abierto en vivo
+        totales_cuentas = SaldosService.totales(ejercicio_id)
+        cero = (Decimal('0'), Decimal('0'))
+        
+        def saldo_deudor(cuenta_id):
+            debe, haber = totales_cuentas.get(cuenta_id, cero)
+            return debe - haber
+        
         # 1. Calcular Resultado del Ejercicio
-        ingresos = ItemAsiento.objects.filter(
-            cuenta__tipo='R_POS', 
-            asiento__ejercicio_id=ejercicio_id
-        ).aggregate(
-            total=Sum('haber') - Sum('debe')
-        )['total'] or Decimal('0')
-        
-        egresos = ItemAsiento.objects.filter(
-            cuenta__tipo='R_NEG', 
-            asiento__ejercicio_id=ejercicio_id
-        ).aggregate(
-            total=Sum('debe') - Sum('haber')
-        )['total'] or Decimal('0')
+        ingresos = Decimal('0')
+        egresos = Decimal('0')
+        for cuenta_id, tipo in PlanCuenta.objects.filter(tipo__in=['R_POS', 'R_NEG']).values_list('id', 'tipo'):
+            if tipo == 'R_POS':
+                ingresos -= saldo_deudor(cuenta_id)
+            else:
+                egresos += saldo_deudor(cuenta_id)
         
         resultado_ejercicio = ingresos - egresos
         
@@ -6221,12 +6056,7 @@ def api_reporte_balance_general(request):
         total_activo = Decimal('0')
         
         for cuenta in cuentas_activo:
-            saldo = ItemAsiento.objects.filter(
-                cuenta=cuenta, 
-                asiento__ejercicio_id=ejercicio_id
-            ).aggregate(
-                total=Sum('debe') - Sum('haber')
-            )['total'] or Decimal('0')
+            saldo = saldo_deudor(cuenta.id)
             
             # Mostrar solo si tiene saldo o es imputable con movimiento
             if saldo != 0:
@@ -6252,12 +6082,7 @@ def api_reporte_balance_general(request):
         total_pasivo = Decimal('0')
         
         for cuenta in cuentas_pasivo:
-            saldo = ItemAsiento.objects.filter(
-                cuenta=cuenta, 
-                asiento__ejercicio_id=ejercicio_id
-            ).aggregate(
-                total=Sum('haber') - Sum('debe')
-            )['total'] or Decimal('0')
+            saldo = -saldo_deudor(cuenta.id)
             
             if saldo != 0:
                 ws.cell(row=row, column=1).value = f"{cuenta.codigo} - {cuenta.nombre}"
@@ -6282,12 +6107,7 @@ def api_reporte_balance_general(request):
         total_pn = Decimal('0')
         
         for cuenta in cuentas_pn:
-            saldo = ItemAsiento.objects.filter(
-                cuenta=cuenta, 
-                asiento__ejercicio_id=ejercicio_id
-            ).aggregate(
-                total=Sum('haber') - Sum('debe')
-            )['total'] or Decimal('0')
+            saldo = -saldo_deudor(cuenta.id)
             
             if saldo != 0:
                 ws.cell(row=row, column=1).value = f"{cuenta.codigo} - {cuenta.nombre}"
@@ -7359,64 +7179,79 @@ def api_cc_clientes_listar(request):
 
 @login_required
 def api_cc_cliente_movimientos(request, id):
-    from .models import Cliente, MovimientoCuentaCorriente
-    from decimal import Decimal
+    """
+    Movimientos de cuenta corriente del cliente, del más nuevo al más viejo.
+    El saldo de cada fila es el persistido (MovimientoCuentaCorriente.saldo, ver CuentaCorrienteService);
+    desde/hasta (YYYY-MM-DD) se filtran en la base. Con `limite` pagina por cursor (`siguiente`).
+    """
+    from .models import Cliente
+    from .services_ctacte import CuentaCorrienteService
+    from datetime import datetime, timedelta
+    from django.utils import timezone
     
     try:
         cliente = Cliente.objects.get(id=id)
         fecha_desde = request.GET.get('desde')
         fecha_hasta = request.GET.get('hasta')
+        limite = request.GET.get('limite')
+        cursor = request.GET.get('cursor')
+        
+        # Días completos en hora local: [desde 00:00, hasta + 1 día 00:00)
+        desde = hasta = None
+        if fecha_desde:
+            desde = timezone.make_aware(datetime.strptime(fecha_desde, '%Y-%m-%d'))
+        if fecha_hasta:
+            hasta = timezone.make_aware(datetime.strptime(fecha_hasta, '%Y-%m-%d') + timedelta(days=1))
         
-        # 1. Obtener TODOS los movimientos ordenados por fecha antigua -> nueva para recalcular
-        movs = MovimientoCuentaCorriente.objects.filter(cliente=cliente).order_by('fecha', 'id')
+        movimientos = CuentaCorrienteService.movimientos(
+            cliente.id, desde, hasta,
+            cursor=CuentaCorrienteService.decodificar_cursor(cursor) if cursor else None
+        )
+        siguiente = None
+        if limite:
+            limite = max(1, min(int(limite), 1000))
+            movimientos = list(movimientos[:limite + 1])
+            if len(movimientos) > limite:
+                movimientos = movimientos[:limite]
+                siguiente = CuentaCorrienteService.codificar_cursor(movimientos[-1])
         
-        # 2. Recalcular saldos "al vuelo" para asegurar consistencia
-        saldo_acumulado = Decimal('0')
         movimientos_procesados = []
-        
-        for m in movs:
-            monto = m.monto if m.monto else Decimal('0')
-            if m.tipo == 'VENTA' or m.tipo == 'DEBE':  # Factura o ND (Aumenta Deuda)
-                saldo_acumulado += monto
-            else:  # Pago o NC (Disminuye Deuda)
-                saldo_acumulado -= monto
-                
+        for m in movimientos:
+            monto = m.monto if m.monto else 0
+            es_debe = m.tipo == 'VENTA' or m.tipo == 'DEBE'  # Factura o ND (Aumenta Deuda)
             movimientos_procesados.append({
                 'id': m.id,
-                'fecha_obj': m.fecha, # Guardar objeto fecha para filtrar después
-                'fecha': m.fecha.strftime('%d/%m/%Y'), # Formato frontend
+                'fecha': timezone.localtime(m.fecha).strftime('%d/%m/%Y'), # Formato frontend
                 'tipo': m.tipo,
                 'descripcion': m.descripcion,
-                'debe': float(monto) if (m.tipo == 'VENTA' or m.tipo == 'DEBE') else 0,
-                'haber': float(monto) if (m.tipo != 'VENTA' and m.tipo != 'DEBE') else 0,
-                'saldo': float(saldo_acumulado),
-                'comprobante_tipo': 'venta' if m.venta else ('pago' if m.recibo else 'otro'),
-                'comprobante_id': m.venta.id if m.venta else (m.recibo.id if m.recibo else None)
+                'debe': float(monto) if es_debe else 0,
+                'haber': float(monto) if not es_debe else 0,
+                'saldo': float(m.saldo),
+                'comprobante_tipo': 'venta' if m.venta_id else ('pago' if m.recibo_id else 'otro'),
+                'comprobante_id': m.venta_id or m.recibo_id
             })
-            
-        # 3. Aplicar Filtros de Fecha sobre la lista procesada
-        if fecha_desde:
-            movimientos_procesados = [m for m in movimientos_procesados if m['fecha_obj'].strftime('%Y-%m-%d') >= fecha_desde]
-        if fecha_hasta:
-            movimientos_procesados = [m for m in movimientos_procesados if m['fecha_obj'].strftime('%Y-%m-%d') <= fecha_hasta]
-
-        # 4. Ordenar descendente (más nuevo primero) para el frontend
-        movimientos_procesados.reverse()
-            
-        return JsonResponse({
+        
+        respuesta = {
             'ok': True, 
             'cliente': {
                 'id': cliente.id,
                 'nombre': cliente.nombre,
                 'cuit': cliente.cuit,
                 'telefono': cliente.telefono,
-                'saldo_actual': float(saldo_acumulado), # Usar el recalculado o cliente.saldo_actual
+                'saldo_actual': float(CuentaCorrienteService.ultimo_saldo(cliente.id)),
                 'limite_credito': float(cliente.limite_credito or 0)
             },
-            'movimientos': movimientos_procesados # Retornamos todos (frontend pagina)
-        })
+            'movimientos': movimientos_procesados, # Sin `limite` se retorna todo el rango (frontend pagina)
+            'siguiente': siguiente,
+        }
+        if desde:
+            # Saldo anterior al rango en una sola consulta (sin recorrer los movimientos previos)
+            respuesta['saldo_inicial'] = float(CuentaCorrienteService.saldo_al(cliente.id, desde))
+        return JsonResponse(respuesta)
     except Cliente.DoesNotExist:
         return JsonResponse({'ok': False, 'error': 'Cliente no encontrado'})
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Parámetros de fecha, límite o cursor inválidos'}, status=400)
     except Exception as e:
         print(f"Error CtaCte: {e}")
         return JsonResponse({'ok': False, 'error': str(e)})
@@ -7444,9 +7279,7 @@ def api_cc_cliente_nuevo_movimiento(request):
         # DEBE (Nota Debito, Venta) -> Aumenta Deuda (Saldo +)
         # HABER (Pago, Nota Credito) -> Disminuye Deuda (Saldo -)
         
-        nuevo_saldo = cliente.saldo_actual
         if tipo == 'DEBE':
-            nuevo_saldo += monto
             # Si impacta caja siendo DEBE, asumimos que es una "Salida" de dinero (ej. devolucion de saldo a favor)
             if impactar_caja:
                  caja = CajaDiaria.objects.filter(estado='ABIERTA').first()
@@ -7458,7 +7291,6 @@ def api_cc_cliente_nuevo_movimiento(request):
                     monto=monto
                 )
         else:
-            nuevo_saldo -= monto
             # Si impacta caja siendo HABER, es un COBRO (Entrada de dinero)
             if impactar_caja:
                 caja = CajaDiaria.objects.filter(estado='ABIERTA').first()
@@ -7470,19 +7302,10 @@ def api_cc_cliente_nuevo_movimiento(request):
                     monto=monto
                 )
             
-        # Crear Movimiento
-        MovimientoCuentaCorriente.objects.create(
-            cliente=cliente,
-            tipo=tipo,
-            descripcion=descripcion,
-            monto=monto,
-            saldo=nuevo_saldo,
-            # fecha se setea auto_now_add, si necesitamos fecha manual, habria que permitir editarla o sobreescribirla
-        )
-        
-        # Actualizar Cliente
-        cliente.saldo_actual = nuevo_saldo
-        cliente.save()
+        # Crear Movimiento (saldo encadenado y Cliente.saldo_actual)
+        # fecha se setea auto_now_add, si necesitamos fecha manual, habria que permitir editarla o sobreescribirla
+        from .services_ctacte import CuentaCorrienteService
+        CuentaCorrienteService.registrar(cliente, tipo, monto, descripcion)
         
         return JsonResponse({'ok': True})
     except Exception as e:
@@ -7536,9 +7359,9 @@ def api_cc_proveedor_movimientos(request, id):
         movs = MovimientoCuentaCorrienteProveedor.objects.filter(proveedor=proveedor).order_by('-fecha')
         
         if fecha_desde:
-            movs = movs.filter(fecha__date__gte=fecha_desde)
+            movs = movs.filter(fecha__gte=_inicio_dia(fecha_desde))
         if fecha_hasta:
-            movs = movs.filter(fecha__date__lte=fecha_hasta)
+            movs = movs.filter(fecha__lt=_inicio_dia(fecha_hasta, dias=1))
             
         data = []
         for m in movs[:100]:
@@ -7751,16 +7574,11 @@ def api_recibo_crear(request):
         
         # Crear movimiento en cuenta corriente
         if tipo == 'CLIENTE':
-            nuevo_saldo = entidad.saldo_actual - total  # HABER disminuye deuda
-            MovimientoCuentaCorriente.objects.create(
-                cliente=entidad,
-                tipo='HABER',
-                descripcion=f"Recibo de Cobro #{recibo.numero_formateado()}",
-                monto=total,
-                saldo=nuevo_saldo,
-                recibo=recibo
+            # HABER disminuye deuda; registrar() también actualiza entidad.saldo_actual
+            from .services_ctacte import CuentaCorrienteService
+            CuentaCorrienteService.registrar(
+                entidad, 'HABER', total, f"Recibo de Cobro #{recibo.numero_formateado()}", recibo=recibo
             )
-            entidad.saldo_actual = nuevo_saldo
         else:  # PROVEEDOR
             nuevo_saldo = entidad.saldo_actual - total  # DEBE disminuye deuda
             MovimientoCuentaCorrienteProveedor.objects.create(
@@ -7776,9 +7594,10 @@ def api_recibo_crear(request):
         
         # 🔹 GENERAR ASIENTO CONTABLE CONSOLIDADO
         try:
-            AccountingService.registrar_recibo(recibo)
+            from .services_jobs import JobService
+            JobService.asientos(('registrar_recibo', recibo))
         except Exception as e:
-            print(f"Error generando asiento contable consolidado para recibo {recibo.id}: {e}")
+            print(f"Error encolando asiento contable consolidado para recibo {recibo.id}: {e}")
 
         return JsonResponse({
             'ok': True,
@@ -7905,7 +7724,7 @@ def api_recibo_imprimir(request, id):
     try:
         from .utils_pdf import render_to_pdf
         recibo = Recibo.objects.prefetch_related('items').select_related('cliente', 'proveedor').get(id=id)
-        empresa = Empresa.objects.first()
+        empresa = ConfiguracionEmpresa.obtener()
         
         entidad = recibo.cliente if recibo.cliente else recibo.proveedor
         
@@ -7949,17 +7768,11 @@ def api_recibo_anular(request, id):
         
         # Crear movimiento inverso en cuenta corriente
         if recibo.tipo == 'CLIENTE':
-            cliente = recibo.cliente
-            nuevo_saldo = cliente.saldo_actual + recibo.total  # Revertir: volver a aumentar deuda
-            MovimientoCuentaCorriente.objects.create(
-                cliente=cliente,
-                tipo='DEBE',
-                descripcion=f"Anulación {recibo.numero_formateado()}",
-                monto=recibo.total,
-                saldo=nuevo_saldo
+            # Revertir: volver a aumentar deuda
+            from .services_ctacte import CuentaCorrienteService
+            CuentaCorrienteService.registrar(
+                recibo.cliente, 'DEBE', recibo.total, f"Anulación {recibo.numero_formateado()}"
             )
-            cliente.saldo_actual = nuevo_saldo
-            cliente.save()
         else:  # PROVEEDOR
             proveedor = recibo.proveedor
             nuevo_saldo = proveedor.saldo_actual + recibo.total  # Revertir: volver a aumentar deuda
@@ -8020,14 +7833,14 @@ def api_estadisticas_ventas(request):
     if fecha_desde_str:
         try:
             fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
-            ventas = ventas.filter(fecha__date__gte=fecha_desde)
+            ventas = ventas.filter(fecha__gte=_inicio_dia(fecha_desde))
         except ValueError:
             pass
     
     if fecha_hasta_str:
         try:
             fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
-            ventas = ventas.filter(fecha__date__lte=fecha_hasta)
+            ventas = ventas.filter(fecha__lt=_inicio_dia(fecha_hasta, dias=1))
         except ValueError:
             pass
     
@@ -8134,14 +7947,14 @@ def api_estadisticas_compras(request):
     if fecha_desde_str:
         try:
             fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
-            compras = compras.filter(fecha__date__gte=fecha_desde)
+            compras = compras.filter(fecha__gte=_inicio_dia(fecha_desde))
         except ValueError:
             pass
     
     if fecha_hasta_str:
         try:
             fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
-            compras = compras.filter(fecha__date__lte=fecha_hasta)
+            compras = compras.filter(fecha__lt=_inicio_dia(fecha_hasta, dias=1))
         except ValueError:
             pass
     
@@ -8301,14 +8114,14 @@ def api_estadisticas_caja(request):
     if fecha_desde_str:
         try:
             fecha_desde = datetime.strptime(fecha_desde_str, '%Y-%m-%d').date()
-            movimientos = movimientos.filter(fecha__date__gte=fecha_desde)
+            movimientos = movimientos.filter(fecha__gte=_inicio_dia(fecha_desde))
         except ValueError:
             pass
     
     if fecha_hasta_str:
         try:
             fecha_hasta = datetime.strptime(fecha_hasta_str, '%Y-%m-%d').date()
-            movimientos = movimientos.filter(fecha__date__lte=fecha_hasta)
+            movimientos = movimientos.filter(fecha__lt=_inicio_dia(fecha_hasta, dias=1))
         except ValueError:
             pass
     
@@ -8497,8 +8310,8 @@ def bancos(request):
 @login_required
 def api_cheques_listar(request):
     from .models import Cheque
-    from django.db.models import Sum, Q
-    from datetime import datetime, date
+    from .services_cheques import CarteraChequesService
+    from django.db.models import Q
 
     try:
         # Params
@@ -8508,8 +8321,8 @@ def api_cheques_listar(request):
         tipo = request.GET.get('tipo', '').strip()
         estado = request.GET.get('estado', '').strip()
         
-        # Base Query
-        cheques = Cheque.objects.all().order_by('-fecha_pago')
+        # Base Query (cliente en el mismo SELECT para origen_destino)
+        cheques = Cheque.objects.select_related('cliente').order_by('-fecha_pago', '-id')
 
         # Filters
         if busqueda:
@@ -8521,28 +8334,11 @@ def api_cheques_listar(request):
         if estado and estado != 'TODOS':
             cheques = cheques.filter(estado=estado)
 
-        # KPIs
-        kpi_cartera_terceros_qs = Cheque.objects.filter(estado='CARTERA', tipo='TERCERO')
-        kpi_cartera_terceros_total = kpi_cartera_terceros_qs.aggregate(t=Sum('monto'))['t'] or 0
-        kpi_cartera_terceros_count = kpi_cartera_terceros_qs.count()
-
-        kpi_propios_qs = Cheque.objects.filter(tipo='PROPIO', estado__in=['CARTERA', 'ENTREGADO']) 
-        kpi_propios_total = kpi_propios_qs.aggregate(t=Sum('monto'))['t'] or 0
-        
-        today = date.today()
-        # Filtramos depositados en el mes actual (aprox)
-        kpi_depositados_qs = Cheque.objects.filter(estado='DEPOSITADO', fecha_modificacion__month=today.month, fecha_modificacion__year=today.year)
-        kpi_depositados_total = kpi_depositados_qs.aggregate(t=Sum('monto'))['t'] or 0
-
-        kpi_rechazados_qs = Cheque.objects.filter(estado='RECHAZADO')
-        kpi_rechazados_total = kpi_rechazados_qs.aggregate(t=Sum('monto'))['t'] or 0
-
-        # Pagination
-        total = cheques.count()
-        cheques_page = cheques[(page - 1) * per_page : page * per_page]
+        # KPIs: 1 consulta con agregados condicionales, cacheada hasta el próximo cambio de cheques
+        kpis = CarteraChequesService.kpis()
 
-        cheques_qs = cheques
-        paginator = Paginator(cheques_qs, per_page)
+        # Pagination (1 COUNT + 1 SELECT de la página)
+        paginator = Paginator(cheques, per_page)
         cheques_page = paginator.get_page(page)
 
         data = []
@@ -8558,26 +8354,34 @@ def api_cheques_listar(request):
                 'estado': c.estado,
             })
 
-        print(f"DEBUG: Found {total} cheques. Page has {len(data)} items.")
-
         return JsonResponse({
             'ok': True,
             'data': data,
             'total': paginator.count,
             'total_pages': paginator.num_pages,
-            'current_page': page,
-            'kpis': {
-                'cartera_terceros': {'total': kpi_cartera_terceros_total, 'count': kpi_cartera_terceros_count},
-                'apagar_propios': {'total': kpi_propios_total},
-                'depositados_mes': {'total': kpi_depositados_total},
-                'rechazados': {'total': kpi_rechazados_total}
-            }
+            'current_page': cheques_page.number,
+            'kpis': kpis,
         })
 
     except Exception as e:
         print(f"Error api_cheques_listar: {e}")
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
+@login_required
+def api_cheques_vencimientos(request):
+    """Escalera de vencimientos: montos a cobrar/pagar por semana de fecha_pago (?desde=YYYY-MM-DD&semanas=8)"""
+    from .services_cheques import CarteraChequesService
+    from datetime import datetime
+
+    try:
+        desde = request.GET.get('desde', '').strip()
+        desde = datetime.strptime(desde, '%Y-%m-%d').date() if desde else None
+        semanas = max(1, min(int(request.GET.get('semanas', 8)), 52))
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Parámetros inválidos'}, status=400)
+
+    return JsonResponse({'ok': True, **CarteraChequesService.escalera_vencimientos(desde, semanas)})
+
 @login_required
 def api_cheque_cambiar_estado(request, id):
     from .models import Cheque, CuentaBancaria
@@ -8829,7 +8633,7 @@ def api_presupuestos_listar(request):
         fecha_start = request.GET.get('fecha_start', '')
         fecha_end = request.GET.get('fecha_end', '')
 
-        presupuestos = Presupuesto.objects.select_related('cliente').order_by('-fecha')
+        presupuestos = Presupuesto.objects.select_related('cliente').order_by('-fecha', '-id')
 
         if q:
             from django.db.models import Q
@@ -8852,53 +8656,36 @@ def api_presupuestos_listar(request):
             except (ValueError, TypeError):
                 pass
         
-        # Obtenemos resultados para filtrar por estado virtual (VENCIDO)
-        all_presupuestos = list(presupuestos)
-        today = datetime.date.today()
-        
-        filtered_data = []
+        # Estado virtual (VENCIDO), filtro, KPIs y paginación en la base: solo se leen las filas de la página
         from django.utils import timezone as dj_timezone
-        for p in all_presupuestos:
-            # Calcular vencimiento
-            fecha_venc = p.fecha.date() + datetime.timedelta(days=p.validez)
-            is_vencido = fecha_venc < today and p.estado == 'PENDIENTE'
-            estado_real = 'VENCIDO' if is_vencido else p.estado
-            
-            # Aplicar filtro de estado si existe
-            if estado and estado != estado_real:
-                continue
-            
-            # Si hay búsqueda 'q', también intentamos buscar en el estado real (ej: 'VENCIDO')
-            if q and q.upper() not in estado_real.upper() and q.lower() not in p.cliente.nombre.lower() and q not in str(p.id):
-                # Ya filtramos por QuerySet, pero el estado virtual solo se puede filtrar aquí
-                # Si el usuario buscó "VENCIDO" y este no lo es, pero el QuerySet lo trajo, lo sacamos
-                pass # El QuerySet ya hizo la mayor parte del trabajo, para el estado virtual es especial
+        from .services_presupuestos import PresupuestoService
+        today = dj_timezone.localdate()
+        if estado:
+            presupuestos = presupuestos.filter(PresupuestoService.filtro_estado(estado, today))
+
+        # Calcular KPIs sobre TODO el set filtrado (antes de paginar)
+        stats = PresupuestoService.kpis(presupuestos, today)
+        total_items = stats['count']
+
+        start = (page - 1) * per_page
+        end = start + per_page
+        pagina = presupuestos.annotate(estado_real=PresupuestoService.estado_real(today))[start:end]
 
+        data = []
+        for p in pagina:
             local_fecha = dj_timezone.localtime(p.fecha)
-            filtered_data.append({
+            data.append({
                 'id': p.id,
                 'fecha': local_fecha.strftime('%d/%m/%Y'),
                 'cliente': p.cliente.nombre,
-                'vencimiento': fecha_venc.strftime('%d/%m/%Y'),
+                'vencimiento': p.fecha_vencimiento.strftime('%d/%m/%Y') if p.fecha_vencimiento else '',
                 'total': float(p.total),
-                'estado': estado_real
+                'estado': p.estado_real
             })
-
-        total_items = len(filtered_data)
-        # Calcular KPIs sobre TODO el set filtrado (antes de paginar)
-        stats = {
-            'total_monto': sum(p['total'] for p in filtered_data),
-            'pendientes': sum(1 for p in filtered_data if p['estado'] == 'PENDIENTE'),
-            'aprobados': sum(1 for p in filtered_data if p['estado'] in ['APROBADO', 'APROBADO (Vendido)']),
-            'count': total_items
-        }
-
-        start = (page - 1) * per_page
-        end = start + per_page
         
         return JsonResponse({
             'ok': True, 
-            'data': filtered_data[start:end], 
+            'data': data, 
             'total': total_items,
             'stats': stats
         })
@@ -8938,7 +8725,7 @@ def api_presupuesto_guardar(request):
         if presupuesto_id:
             # EDICION
             presupuesto = Presupuesto.objects.get(pk=presupuesto_id)
-            if presupuesto.estado != 'PENDIENTE':
+            if presupuesto.estado not in ('PENDIENTE', 'VENCIDO'):
                 return JsonResponse({'ok': False, 'error': 'Solo se pueden editar presupuestos PENDIENTES'})
             
             presupuesto.cliente = cliente
@@ -8992,7 +8779,7 @@ def api_presupuesto_guardar(request):
 def api_presupuesto_cancelar(request, id):
     try:
         p = Presupuesto.objects.get(id=id)
-        if p.estado != 'PENDIENTE':
+        if p.estado not in ('PENDIENTE', 'VENCIDO'):
             return JsonResponse({'ok': False, 'error': 'Solo se pueden cancelar presupuestos pendientes'})
         
         p.estado = 'CANCELADO'
@@ -9010,9 +8797,10 @@ def api_presupuesto_reactivar(request, id):
     try:
         from django.utils import timezone
         p = Presupuesto.objects.get(id=id)
-        if p.estado != 'PENDIENTE':
+        if p.estado not in ('PENDIENTE', 'VENCIDO'):
             return JsonResponse({'ok': False, 'error': 'Solo se pueden reactivar presupuestos pendientes/vencidos'})
         
+        # save() recalcula el vencimiento y vuelve a PENDIENTE los ya marcados como vencidos
         p.fecha = timezone.now()
         p.save()
         return JsonResponse({'ok': True})
@@ -9028,10 +8816,8 @@ def api_presupuesto_detalle(request, id):
         return JsonResponse({'error': 'Presupuesto no encontrado'}, status=404)
     
     # Calcular estado real (VENCIDO si aplica)
-    today = datetime.date.today()
-    fecha_venc = p.fecha.date() + datetime.timedelta(days=p.validez)
-    is_vencido = fecha_venc < today and p.estado == 'PENDIENTE'
-    estado_real = 'VENCIDO' if is_vencido else p.estado
+    from .services_presupuestos import PresupuestoService
+    estado_real = PresupuestoService.estado_de(p)
 
     # Serializar detalles
     detalles = []
@@ -9050,7 +8836,7 @@ def api_presupuesto_detalle(request, id):
         'id': p.id,
         'fecha': p.fecha.strftime('%d/%m/%Y'),
         'validez': p.validez,
-        'vencimiento': fecha_venc.strftime('%d/%m/%Y'),
+        'vencimiento': p.fecha_vencimiento.strftime('%d/%m/%Y') if p.fecha_vencimiento else '',
         'cliente_id': p.cliente.id,
         'cliente_nombre': p.cliente.nombre,
         'cliente_cuit': p.cliente.cuit or '',
@@ -9079,10 +8865,8 @@ def api_presupuesto_convertir_a_pedido(request, id):
         p = Presupuesto.objects.get(id=id)
         
         # Validar Vencimiento
-        fecha_venc = p.fecha.date() + datetime.timedelta(days=p.validez)
-        is_vencido = fecha_venc < datetime.date.today() and p.estado == 'PENDIENTE'
-        
-        if is_vencido:
+        from .services_presupuestos import PresupuestoService
+        if PresupuestoService.estado_de(p) == 'VENCIDO':
             return JsonResponse({'ok': False, 'error': 'El presupuesto ha vencido. Intente reactivarlo o duplicarlo.'})
 
         if p.estado != 'PENDIENTE':
@@ -9126,7 +8910,7 @@ def presupuesto_pdf(request, id):
     
     try:
         presupuesto = Presupuesto.objects.prefetch_related('detalles__producto').select_related('cliente').get(id=id)
-        empresa = Empresa.objects.first()
+        empresa = ConfiguracionEmpresa.obtener()
         
         context = {
             'presupuesto': presupuesto,
@@ -9165,10 +8949,14 @@ def api_localidades_listar(request):
 # =========================================
 @login_required
 def api_remitos_listar(request):
-    """API para listar remitos con filtros y paginación"""
+    """
+    API para listar remitos con filtros y paginación.
+    Con limite/cursor pagina por keyset (respuesta con 'siguiente', sin total); formato=ndjson|csv exporta todo.
+    """
     try:
         from django.core.paginator import Paginator
-        from django.db.models import Q
+        from django.db.models import Q, Count
+        from .services_listados import ListadoKeyset
         import datetime
 
         page_number = request.GET.get('page', 1)
@@ -9176,8 +8964,15 @@ def api_remitos_listar(request):
         q = request.GET.get('q', '')
         fecha_start = request.GET.get('fecha_start', '')
         fecha_end = request.GET.get('fecha_end', '')
+        formato = request.GET.get('formato', 'json')
+        try:
+            limite, cursor = ListadoKeyset.parametros(request)
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros de paginación inválidos'}, status=400)
 
-        queryset = Remito.objects.select_related('cliente', 'venta_asociada').all().order_by('-fecha')
+        queryset = ListadoKeyset.ordenar(
+            Remito.objects.select_related('cliente', 'venta_asociada').annotate(item_count=Count('detalles'))
+        )
 
         # Filtros
         if q:
@@ -9201,24 +8996,36 @@ def api_remitos_listar(request):
             except (ValueError, TypeError):
                 pass
 
-        # Paginación
-        paginator = Paginator(queryset, per_page)
-        page_obj = paginator.get_page(page_number)
-
-        data = []
         from django.utils import timezone
-        for r in page_obj:
-            data.append({
+        punto_venta = ListadoKeyset.punto_venta()
+
+        def serializar(r):
+            return {
                 'id': r.id,
                 'numero': r.numero_formateado(),
                 'fecha': timezone.localtime(r.fecha).strftime('%d/%m/%Y'), # Solo fecha para la tabla
                 'cliente': r.cliente.nombre,
-                'venta_id': r.venta_asociada.id if r.venta_asociada else None,
-                'venta_str': r.venta_asociada.numero_factura_formateado() if r.venta_asociada else '-',
+                'venta_id': r.venta_asociada_id,
+                'venta_str': r.venta_asociada.numero_factura_formateado(punto_venta) if r.venta_asociada else '-',
                 'estado': r.estado,
                 'direccion': r.direccion_entrega,
-                'item_count': r.detalles.count()
-            })
+                'item_count': r.item_count
+            }
+
+        if formato in ListadoKeyset.FORMATOS:
+            return ListadoKeyset.exportar(
+                (serializar(r) for r in queryset.iterator(chunk_size=2000)), formato, "remitos"
+            )
+
+        if limite:
+            pagina, siguiente = ListadoKeyset.pagina(queryset, limite, cursor)
+            return JsonResponse({'remitos': [serializar(r) for r in pagina], 'siguiente': siguiente})
+
+        # Paginación
+        paginator = Paginator(queryset, per_page)
+        page_obj = paginator.get_page(page_number)
+
+        data = [serializar(r) for r in page_obj]
             
         return JsonResponse({
             'remitos': data,
@@ -9236,20 +9043,29 @@ def api_remitos_listar(request):
 # =========================================
 @login_required
 def api_notas_credito_listar(request):
-    """API para listar notas de crédito con filtros y paginación"""
+    """
+    API para listar notas de crédito con filtros y paginación.
+    Con limite/cursor pagina por keyset (respuesta con 'siguiente', sin total); formato=ndjson|csv exporta todo.
+    """
     try:
         from django.core.paginator import Paginator
         from django.db.models import Q
         from django.db.models.functions import Cast
         from django.db.models import CharField
+        from .services_listados import ListadoKeyset
 
         page_number = request.GET.get('page', 1)
         per_page = request.GET.get('per_page', 10)
         q = request.GET.get('q', '')
         fecha_start = request.GET.get('fecha_start', '')
         fecha_end = request.GET.get('fecha_end', '')
+        formato = request.GET.get('formato', 'json')
+        try:
+            limite, cursor = ListadoKeyset.parametros(request)
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros de paginación inválidos'}, status=400)
 
-        queryset = NotaCredito.objects.select_related('cliente', 'venta_asociada').all().order_by('-fecha')
+        queryset = ListadoKeyset.ordenar(NotaCredito.objects.select_related('cliente', 'venta_asociada'))
         
         # Filtros
         if q:
@@ -9273,24 +9089,36 @@ def api_notas_credito_listar(request):
             except (ValueError, TypeError):
                 pass
 
-        # Paginación
-        paginator = Paginator(queryset, per_page)
-        page_obj = paginator.get_page(page_number)
-        
-        data = []
         from django.utils import timezone
-        for nc in page_obj:
-            data.append({
+        punto_venta = ListadoKeyset.punto_venta()
+
+        def serializar(nc):
+            return {
                 'id': nc.id,
                 'numero': nc.numero_formateado(),
                 'fecha': timezone.localtime(nc.fecha).strftime('%d/%m/%Y %H:%M'),
                 'cliente': nc.cliente.nombre,
-                'venta_id': nc.venta_asociada.id if nc.venta_asociada else None,
-                'venta_str': nc.venta_asociada.numero_factura_formateado() if nc.venta_asociada else '-',
+                'venta_id': nc.venta_asociada_id,
+                'venta_str': nc.venta_asociada.numero_factura_formateado(punto_venta) if nc.venta_asociada else '-',
                 'total': float(nc.total),
                 'estado': nc.estado,
                 'tipo': nc.tipo_comprobante
-            })
+            }
+
+        if formato in ListadoKeyset.FORMATOS:
+            return ListadoKeyset.exportar(
+                (serializar(nc) for nc in queryset.iterator(chunk_size=2000)), formato, "notas_credito"
+            )
+
+        if limite:
+            pagina, siguiente = ListadoKeyset.pagina(queryset, limite, cursor)
+            return JsonResponse({'notas_credito': [serializar(nc) for nc in pagina], 'siguiente': siguiente})
+
+        # Paginación
+        paginator = Paginator(queryset, per_page)
+        page_obj = paginator.get_page(page_number)
+        
+        data = [serializar(nc) for nc in page_obj]
             
         return JsonResponse({
             'notas_credito': data,
@@ -9308,7 +9136,7 @@ def api_notas_credito_listar(request):
 def api_empresa_config(request):
     """Obtiene configuración pública de la empresa"""
     try:
-        empresa = Empresa.objects.first()
+        empresa = ConfiguracionEmpresa.obtener()
         if not empresa:
             return JsonResponse({'error': 'Empresa no configurada'}, status=404)
         
@@ -9459,55 +9287,6 @@ def api_empresa_config_guardar(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
-@login_required
-def api_notas_credito_listar(request):
-    try:
-        from django.core.paginator import Paginator
-        
-        page_number = request.GET.get('page', 1)
-        per_page = request.GET.get('per_page', 10)
-        q = request.GET.get('q', '')
-        fecha = request.GET.get('fecha', '')
-
-        notas = NotaCredito.objects.all().order_by('-fecha', '-id')
-
-        if q:
-            notas = notas.filter(
-                Q(cliente__nombre__icontains=q) | 
-                Q(numero__icontains=q)
-            )
-            
-        if fecha:
-            notas = notas.filter(fecha=fecha)
-
-        paginator = Paginator(notas, per_page)
-        page_obj = paginator.get_page(page_number)
-
-        data = []
-        for n in page_obj:
-            data.append({
-                'id': n.id,
-                'fecha': n.fecha.strftime('%d/%m/%Y'),
-                'numero': n.numero_formateado(),
-                'cliente': n.cliente.nombre,
-                'venta_id': n.venta_asociada.id if n.venta_asociada else None,
-                'venta_str': n.venta_asociada.numero_factura_formateado() if n.venta_asociada else '-',
-                'total': float(n.total),
-                'estado': n.estado
-            })
-
-        return JsonResponse({
-            'notas_credito': data,
-            'total': paginator.count,
-            'total_pages': paginator.num_pages,
-            'current_page': page_obj.number
-        })
-
-    except Exception as e:
-        print(f"Error api_notas_credito_listar: {e}")
-        return JsonResponse({'error': str(e)}, status=500)
-
-
 @login_required
 
 def api_remito_detalle(request, id):
@@ -9588,7 +9367,8 @@ def api_nota_credito_crear(request, venta_id):
         )
         
         # Copiar detalles
-        for det in venta.detalles.all():
+        detalles = list(venta.detalles.select_related('producto'))
+        for det in detalles:
             DetalleNotaCredito.objects.create(
                 nota_credito=nc,
                 producto=det.producto,
@@ -9597,23 +9377,19 @@ def api_nota_credito_crear(request, venta_id):
                 subtotal=det.subtotal
             )
             
-            # Devolver stock
-            det.producto.stock += int(det.cantidad)
-            det.producto.save()
-            MovimientoStock.objects.create(
-                producto=det.producto,
-                tipo='IN',
-                cantidad=det.cantidad,
-                referencia=f"NC {nc.id} (Anula Venta {venta.id})",
-                observaciones="Devolución por Nota de Crédito (API)"
-            )
+        # Devolver stock
+        LibroStockService.registrar(
+            [(det.producto, 'IN', det.cantidad) for det in detalles],
+            referencia=f"NC {nc.id} (Anula Venta {venta.id})",
+            observaciones="Devolución por Nota de Crédito (API)",
+        )
 
         # Generar Asiento Contable
         try:
-            from .services import AccountingService
-            AccountingService.registrar_nota_credito(nc)
+            from .services_jobs import JobService
+            JobService.asientos(('registrar_nota_credito', nc))
         except Exception as e:
-            print(f"Error generando asiento de NC {nc.id}: {e}")
+            print(f"Error encolando asiento de NC {nc.id}: {e}")
             
         # Actualizar estado de la venta? Generalmente queda como "Emitida" pero con NC asociada.
         # Opcional: venta.estado = 'Anulada'
@@ -9854,10 +9630,10 @@ def api_nota_debito_crear(request, venta_id):
 
         # Generar Asiento Contable
         try:
-            from .services import AccountingService
-            AccountingService.registrar_nota_debito(nd)
+            from .services_jobs import JobService
+            JobService.asientos(('registrar_nota_debito', nd))
         except Exception as e:
-            print(f"Error generando asiento de ND {nd.id}: {e}")
+            print(f"Error encolando asiento de ND {nd.id}: {e}")
             
         return JsonResponse({
             'ok': True, 
@@ -9892,8 +9668,7 @@ def api_nota_debito_anular(request, id):
         
         # Generar Asiento Contable de Reversión
         try:
-            from .services import AccountingService
-            from .models import Asiento, ItemAsiento, Ejercicio
+            from .services import AccountingService, AsientoBuilder
             
             fecha_asiento = date.today()
             ejercicio = AccountingService._obtener_ejercicio_vigente(fecha_asiento)
@@ -9906,30 +9681,24 @@ def api_nota_debito_anular(request, id):
                 
                 if all([cuenta_deudores, cuenta_ventas, cuenta_iva]):
                     total = nd.total
-                    neto = total / Decimal("1.21")
+                    neto = (total / Decimal("1.21")).quantize(AsientoBuilder.CENTAVO)
                     iva = total - neto
                     
                     # Crear asiento de reversión (invertir el asiento original)
-                    ultimo_numero = Asiento.objects.filter(ejercicio=ejercicio).order_by('-numero').first()
-                    nuevo_numero = (ultimo_numero.numero + 1) if ultimo_numero else 1
-                    
-                    asiento = Asiento.objects.create(
-                        numero=nuevo_numero,
-                        fecha=fecha_asiento,
-                        descripcion=f"Anulación ND {nd.numero_formateado()} - {nd.cliente.nombre}",
-                        ejercicio=ejercicio,
-                        origen='VENTAS',
-                        usuario='Sistema'
+                    asiento = AsientoBuilder(
+                        ejercicio, fecha_asiento, f"Anulación ND {nd.numero_formateado()} - {nd.cliente.nombre}",
+                        origen='VENTAS'
                     )
-                    
+
                     # Reversión: Invertir el asiento original
                     # Original era: Debe Deudores, Haber Ventas + IVA
                     # Reversión: Haber Deudores, Debe Ventas + IVA
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_deudores, debe=0, haber=total)
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_ventas, debe=neto, haber=0)
-                    ItemAsiento.objects.create(asiento=asiento, cuenta=cuenta_iva, debe=iva, haber=0)
-                    
-                    print(f"DEBUG: Asiento reversión ND {nuevo_numero} generado para anulación de ND {nd.id}")
+                    asiento.haber(cuenta_deudores, total)
+                    asiento.debe(cuenta_ventas, neto)
+                    asiento.debe(cuenta_iva, iva)
+
+                    registrado = asiento.registrar()
+                    print(f"DEBUG: Asiento reversión ND {registrado.numero} generado para anulación de ND {nd.id}")
         except Exception as e:
             print(f"Error generando asiento de reversión ND {nd.id}: {e}")
             # No fallar la anulación si falla el asiento
@@ -9951,10 +9720,9 @@ def api_nota_debito_anular(request, id):
 @login_required
 @verificar_permiso('reportes')
 def api_dashboard_stats(request):
-    from django.db.models import Sum, Count, F, Q
-    from datetime import date, timedelta, datetime
+    from datetime import datetime
     from django.utils import timezone
-    from .models import Cheque
+    from .services_dashboard import DashboardService
     
     # 1. Determine Date Range (Default: Current Month)
     local_now = timezone.localtime(timezone.now())
@@ -9978,290 +9746,8 @@ def api_dashboard_stats(request):
         dt_start = timezone.make_aware(datetime.combine(hoy_date.replace(day=1), datetime.min.time()))
         dt_end = timezone.make_aware(datetime.combine(hoy_date, datetime.max.time()))
 
-    # --- 1. RENTABILIDAD (Dynamic Date Range) ---
-    # Ventas en el rango
-    ventas_rango = Venta.objects.filter(fecha__range=(dt_start, dt_end))
-    agregado_ventas = ventas_rango.aggregate(total=Sum('total'), cantidad=Count('id'))
-    total_ventas = agregado_ventas['total'] or 0
-    cantidad_ventas = agregado_ventas['cantidad'] or 0
-    
-    ticket_promedio = float(total_ventas) / cantidad_ventas if cantidad_ventas > 0 else 0
-    
-    # Costo Estimado (Approximation using current Product cost)
-    detalles_rango = DetalleVenta.objects.filter(venta__in=ventas_rango).select_related('producto')
-    total_costo = sum((d.cantidad * d.producto.costo) for d in detalles_rango)
-    
-    ganancia_bruta = float(total_ventas) - float(total_costo)
-    
-    # Gastos Operativos (Egresos de Caja en el rango)
-    total_gastos = MovimientoCaja.objects.filter(
-        fecha__range=(dt_start, dt_end), 
-        tipo='Egreso'
-    ).aggregate(total=Sum('monto'))['total'] or 0
-    
-    ganancia_neta = ganancia_bruta - float(total_gastos)
-    
-    rentabilidad = {
-        'start': dt_start.strftime('%d/%m/%Y'),
-        'end': dt_end.strftime('%d/%m/%Y'),
-        'ventas': float(total_ventas),
-        'cantidad_ventas': cantidad_ventas,
-        'ticket_promedio': float(ticket_promedio),
-        'costos': float(total_costo),
-        'ganancia_bruta': float(ganancia_bruta),
-        'gastos': float(total_gastos),
-        'ganancia_neta': float(ganancia_neta),
-        'margen': round((float(ganancia_neta) / float(total_ventas) * 100), 1) if total_ventas > 0 else 0
-    }
-    
-    # --- 1.1 Top Clientes (Dynamic Date Range) ---
-    top_clientes_qs = ventas_rango.values('cliente__nombre')\
-        .annotate(total_comprado=Sum('total'), cantidad_compras=Count('id'))\
-        .order_by('-total_comprado')[:5]
-        
-    top_clientes = []
-    for c in top_clientes_qs:
-        top_clientes.append({
-            'cliente': c['cliente__nombre'],
-            'total': float(c['total_comprado']),
-            'cantidad': c['cantidad_compras']
-        })
-
-    # --- 2. KPIs Principales (REALTIME) ---
-    start_of_day = timezone.make_aware(datetime.combine(hoy_date, datetime.min.time()))
-    end_of_day = timezone.make_aware(datetime.combine(hoy_date, datetime.max.time()))
-    
-    # Ventas de Hoy
-    ventas_hoy_qs = Venta.objects.filter(fecha__range=(start_of_day, end_of_day))
-    ventas_hoy = ventas_hoy_qs.aggregate(total=Sum('total'))['total'] or 0
-    
-    # Utilidad de Hoy (Estimada por costo de productos)
-    detalles_hoy = DetalleVenta.objects.filter(venta__in=ventas_hoy_qs).select_related('producto')
-    total_costo_hoy = sum((d.cantidad * (d.producto.costo or 0)) for d in detalles_hoy)
-    utilidad_hoy = float(ventas_hoy) - float(total_costo_hoy)
-    
-    # Caja Disponible (Saldo de la Caja Activa)
-    from .models import CajaDiaria
-    caja_abierta = CajaDiaria.objects.filter(estado='ABIERTA').first()
-    if caja_abierta:
-        movs = MovimientoCaja.objects.filter(caja_diaria=caja_abierta).aggregate(
-            ingresos=Sum('monto', filter=Q(tipo='Ingreso')),
-            egresos=Sum('monto', filter=Q(tipo='Egreso'))
-        )
-        ing = movs['ingresos'] or 0
-        eg = movs['egresos'] or 0
-        caja_disponible = float(caja_abierta.monto_apertura) + float(ing) - float(eg)
-    else:
-        caja_disponible = 0
-    
-    caja_hoy_neto = caja_disponible
-
-    
-    # Pendientes Query & List
-    pedidos_pendientes_qs = Pedido.objects.filter(estado__in=['PENDIENTE', 'PREPARACION']).order_by('-fecha')
-    pedidos_pendientes_count = pedidos_pendientes_qs.count()
-    pedidos_pendientes_list = [{
-        'id': p.id,
-        'cliente': p.cliente.nombre,
-        'total': float(p.total),
-        'fecha': p.fecha.strftime('%d/%m %H:%M'),
-        'estado': p.estado
-    } for p in pedidos_pendientes_qs[:10]] # Limit to 10 for dashboard
-
-    # Low Stock Query & List
-    stock_bajo_qs = Producto.objects.filter(Q(stock__lte=F('stock_minimo')) | Q(stock__lte=10)).order_by('stock')
-    stock_bajo_count = stock_bajo_qs.count()
-    stock_bajo_list = [{
-        'id': p.id,
-        'nombre': p.descripcion, # Fixed: was p.nombre
-        'stock': float(p.stock),
-        'minimo': float(p.stock_minimo)
-    } for p in stock_bajo_qs[:10]] # Limit to 10 for dashboard
-    
-    # --- 3. PROYECCIÓN FINANCIERA (Próximos 30 días) ---
-    # Cheques por cobrar (Ingresos) vs Cheques por pagar (Egresos)
-    fecha_limite = hoy_date + timedelta(days=30)
-    
-    # Ingresos (Cheques en Cartera que vencen pronto)
-    cheques_ingreso = Cheque.objects.filter(
-        estado='CARTERA', 
-        fecha_pago__gte=hoy_date, 
-        fecha_pago__lte=fecha_limite
-    ).values('fecha_pago').annotate(total=Sum('monto')).order_by('fecha_pago')
-
-    # Egresos (Cheques Entregados o Propios que vencen pronto)
-    # Incluimos PROPIO (siempre pagamos) y TERCERO ENTREGADO (si se deposita, no sale plata nuestra, pero si es Propio Entregado si.
-    # Asumimos que TIPO_CHEQUE='PROPIO' implica salida de dinero de nuestra cuenta.
-    cheques_egreso = Cheque.objects.filter(
-        tipo='PROPIO',
-        estado__in=['ENTREGADO', 'CARTERA'], # Cartera propio = emitido pero aun no entregado? O entregado
-        fecha_pago__gte=hoy_date,
-        fecha_pago__lte=fecha_limite
-    ).values('fecha_pago').annotate(total=Sum('monto')).order_by('fecha_pago')
-
-    # Agrupar por semanas o dias? Días es mucho detalle, Semanas mejor. Vamos por Días para chart continuo.
-    proyeccion_labels = []
-    data_ingresos = []
-    data_egresos = []
-    
-    # Crear diccionario fecha -> valores
-    fechas_map = {}
-    delta = timedelta(days=1)
-    iter_date = hoy_date
-    while iter_date <= fecha_limite:
-        fechas_map[iter_date] = {'ingreso': 0, 'egreso': 0}
-        iter_date += delta
-        
-    for c in cheques_ingreso:
-        if c['fecha_pago'] in fechas_map:
-            fechas_map[c['fecha_pago']]['ingreso'] += float(c['total'])
-            
-    for c in cheques_egreso:
-        if c['fecha_pago'] in fechas_map:
-            fechas_map[c['fecha_pago']]['egreso'] += float(c['total'])
-            
-    # Convertir a listas ordenadas
-    sorted_dates = sorted(fechas_map.keys())
-    for d in sorted_dates:
-        proyeccion_labels.append(d.strftime('%d/%m'))
-        data_ingresos.append(fechas_map[d]['ingreso'])
-        data_egresos.append(fechas_map[d]['egreso'])
-
-    # --- 3. Chart: Rendimiento Mensual (Últimos 6 meses) ---
-    months_labels = []
-    data_ventas = []
-    data_compras = []
-    
-    meses_es = {1: 'Ene', 2: 'Feb', 3: 'Mar', 4: 'Abr', 5: 'May', 6: 'Jun', 
-                7: 'Jul', 8: 'Ago', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dic'}
-    
-    for i in range(5, -1, -1):
-        # Retroceder i meses de forma segura
-        target_date = hoy_date
-        for _ in range(i):
-            target_date = target_date.replace(day=1) - timedelta(days=1)
-        
-        m = target_date.month
-        label = meses_es[m]
-        months_labels.append(label)
-
-        # Calcular rango con datetimes
-        month_start_date = target_date.replace(day=1)
-        next_month_date = (month_start_date + timedelta(days=32)).replace(day=1)
-        month_end_date = next_month_date - timedelta(days=1)
-        
-        dt_start_month = timezone.make_aware(datetime.combine(month_start_date, datetime.min.time()))
-        dt_end_month = timezone.make_aware(datetime.combine(month_end_date, datetime.max.time()))
-        
-        # Totales del mes
-        v_mes = Venta.objects.filter(fecha__range=(dt_start_month, dt_end_month)).aggregate(total=Sum('total'))['total'] or 0
-        c_mes = Compra.objects.filter(fecha__range=(dt_start_month, dt_end_month)).aggregate(total=Sum('total'))['total'] or 0
-        
-        data_ventas.append(float(v_mes))
-        data_compras.append(float(c_mes))
-
-    chart_datasets = [
-        {'label': 'Ventas', 'data': data_ventas, 'borderColor': '#0d6efd', 'backgroundColor': 'rgba(13, 110, 253, 0.1)'},
-        {'label': 'Compras', 'data': data_compras, 'borderColor': '#dc3545', 'backgroundColor': 'rgba(220, 53, 69, 0.1)'}
-    ]
-    
-    chart_labels = months_labels
-
-    
-    # --- 4. Actividad Reciente ---
-    recientes = []
-    ultimas_ventas = Venta.objects.select_related('cliente').order_by('-fecha')[:8]
-    for v in ultimas_ventas:
-        recientes.append({
-            'timestamp': v.fecha.timestamp(),
-            'tipo': 'VENTA',
-            'icono': 'ShoppingCart',
-            'color': 'primary',
-            'fecha': (v.fecha - timedelta(hours=3)).strftime('%d/%m %H:%M'),
-            'texto': f"Venta #{v.id} - ${v.total}",
-            'subtexto': v.cliente.nombre if v.cliente else 'Cliente Final'
-        })
-    ultimas_compras = Compra.objects.select_related('proveedor').order_by('-fecha')[:8]
-    for c in ultimas_compras:
-        recientes.append({
-            'timestamp': c.fecha.timestamp(),
-            'tipo': 'COMPRA',
-            'icono': 'Truck', 
-            'color': 'danger',
-            'fecha': (c.fecha - timedelta(hours=3)).strftime('%d/%m %H:%M'),
-            'texto': f"Compra #{c.id} - ${c.total}",
-            'subtexto': c.proveedor.nombre if c.proveedor else 'Proveedor General'
-        })
-    recientes.sort(key=lambda x: x['timestamp'], reverse=True)
-    recientes = recientes[:10]
-
-    # --- 5. Top Productos (Last 30 days fixed) ---
-    fecha_inicio_top_date = hoy_date - timedelta(days=30)
-    start_top_dt = timezone.make_aware(datetime.combine(fecha_inicio_top_date, datetime.min.time()))
-    
-    top_productos = DetalleVenta.objects.filter(venta__fecha__gte=start_top_dt)\
-        .values('producto__descripcion')\
-        .annotate(total_vendido=Sum('cantidad'))\
-        .order_by('-total_vendido')[:5]
-    
-    top_list = []
-    for p in top_productos:
-        top_list.append({
-            'producto': p['producto__descripcion'] or "Producto Desconocido",
-            'total': float(p['total_vendido'] or 0)
-        })
-
-    # --- Additional KPI Details ---
-    cantidad_ventas_hoy = Venta.objects.filter(fecha__range=(start_of_day, end_of_day)).count()
-    
-    monto_pedidos_pendientes = pedidos_pendientes_qs.aggregate(total=Sum('total'))['total'] or 0
-    
-    ingresos_caja_hoy = 0
-    if caja_abierta:
-        ingresos_caja_hoy = MovimientoCaja.objects.filter(caja_diaria=caja_abierta, tipo='Ingreso').aggregate(t=Sum('monto'))['t'] or 0
-
-    data = {
-        'kpi': {
-            'ventas_hoy': float(ventas_hoy),
-            'cantidad_ventas_hoy': cantidad_ventas_hoy,
-            'utilidad_hoy': float(utilidad_hoy),
-            'caja_hoy': float(caja_hoy_neto),
-            'ingresos_caja_hoy': float(ingresos_caja_hoy),
-            'pedidos_pendientes': pedidos_pendientes_count,
-            'monto_pedidos_pendientes': float(monto_pedidos_pendientes),
-            'stock_bajo': stock_bajo_count,
-            'clientes_activos': Cliente.objects.count(),
-            'cantidad_pedidos_hoy': Pedido.objects.filter(fecha__range=(start_of_day, end_of_day)).count(),
-        },
-        'rentabilidad': rentabilidad,
-        'chart': {
-            'labels': chart_labels,
-            'data': data_ventas,
-            'datasets': chart_datasets
-        },
-        'proyeccion': {
-            'labels': proyeccion_labels,
-            'datasets': [
-                {
-                    'label': 'Ingresos (Cheques)',
-                    'data': data_ingresos,
-                    'borderColor': '#198754', # Success Green
-                    'backgroundColor': 'rgba(25, 135, 84, 0.1)'
-                },
-                {
-                    'label': 'Egresos (Pagos)',
-                    'data': data_egresos,
-                    'borderColor': '#dc3545', # Danger Red
-                    'backgroundColor': 'rgba(220, 53, 69, 0.1)'
-                }
-            ]
-        },
-        'actividad_reciente': recientes,
-        'top_productos': top_list,
-        'top_clientes': top_clientes,
-        'stock_bajo_list': stock_bajo_list,
-        'pedidos_pendientes_list': pedidos_pendientes_list
-    }
+    # KPIs, rentabilidad, gráfico mensual y proyección: cacheados por sección (ver DashboardService)
+    data = DashboardService.stats(dt_start, dt_end, hoy_date)
     
     return JsonResponse(data)
 
@@ -10707,19 +10193,10 @@ def api_cc_cliente_registrar_pago(request, id):
 
             # 2. Movimiento en Cuenta Corriente
             try:
-                nuevo_saldo = cliente.saldo_actual - monto
-                
-                movimiento = MovimientoCuentaCorriente.objects.create(
-                    cliente=cliente,
-                    tipo='HABER',
-                    descripcion=descripcion or f'Pago recibido - {metodo_pago}',
-                    monto=monto,
-                    saldo=nuevo_saldo,
-                    recibo=recibo
+                from .services_ctacte import CuentaCorrienteService
+                movimiento = CuentaCorrienteService.registrar(
+                    cliente, 'HABER', monto, descripcion or f'Pago recibido - {metodo_pago}', recibo=recibo
                 )
-                
-                cliente.saldo_actual = nuevo_saldo
-                cliente.save()
                 print(f"DEBUG: Movimiento CC creado y saldo actualizado")
             except Exception as e_cc:
                 print(f"ERROR actualizando CC: {e_cc}")
@@ -10762,10 +10239,11 @@ def api_cc_cliente_registrar_pago(request, id):
             
             # 4. Asiento Contable
             try:
-                AccountingService.registrar_recibo(recibo)
+                from .services_jobs import JobService
+                JobService.asientos(('registrar_recibo', recibo))
                 print("DEBUG: Asiento contable solicitado")
             except Exception as e_asiento:
-                print(f"Error generando asiento: {e_asiento}")
+                print(f"Error encolando asiento: {e_asiento}")
                 # No lanzamos excepción para no anular el pago solo por error contable,
                 # pero idealmente debería notificarse.
         
@@ -10794,18 +10272,7 @@ def cc_cliente_imprimir(request, id):
     from datetime import datetime
     from .models import Cliente, MovimientoCuentaCorriente, Empresa
     from decimal import Decimal
-    from django.template.loader import get_template
-    from xhtml2pdf import pisa
-    from io import BytesIO
-
-    def render_to_pdf(template_src, context_dict={}):
-        template = get_template(template_src)
-        html  = template.render(context_dict)
-        result = BytesIO()
-        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-        if not pdf.err:
-            return HttpResponse(result.getvalue(), content_type='application/pdf')
-        return None
+    from .services_pdf import ComprobantePdf
 
     try:
         cliente = Cliente.objects.get(id=id)
@@ -10839,7 +10306,7 @@ def cc_cliente_imprimir(request, id):
     movimientos_procesados.reverse()
     
     # 4. Obtener info empresa
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
     
     context = {
         'cliente': cliente,
@@ -10849,12 +10316,10 @@ def cc_cliente_imprimir(request, id):
         'fecha_impresion': datetime.now().strftime('%d/%m/%Y %H:%M')
     }
     
-    # Generar PDF
-    # DEBUG: Forzando uso de template final
-    print("DEBUG: Generando PDF con cliente_imprimir_final.html")
-    pdf = render_to_pdf('administrar/ctacte/cliente_imprimir_final.html', context)
+    # Generar PDF (motor de settings.PDF_MOTOR)
+    pdf = ComprobantePdf.estado_cuenta(context)
     if pdf:
-        response = HttpResponse(pdf.content, content_type='application/pdf')
+        response = HttpResponse(pdf, content_type='application/pdf')
         filename = f"Estado_Cuenta_{cliente.nombre.replace(' ', '_')}.pdf"
         response['Content-Disposition'] = f'inline; filename="{filename}"'
         return response
@@ -10948,7 +10413,7 @@ def cc_proveedor_imprimir(request, id):
     movimientos_procesados.reverse()
     
     # Obtener info empresa
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
     
     context = {
         'proveedor': proveedor,
@@ -11019,16 +10484,14 @@ def api_cc_cliente_exportar_excel(request, id):
 @login_required
 @verificar_permiso('ctacte')
 def api_cc_cliente_exportar_pdf(request, id):
-    """Exportar estado de cuenta a PDF usando xhtml2pdf"""
+    """Exportar estado de cuenta a PDF (motor de settings.PDF_MOTOR)"""
     try:
-        from django.template.loader import render_to_string
-        from xhtml2pdf import pisa
         from django.http import HttpResponse
         from .models import Cliente, Venta, MovimientoCuentaCorriente, Empresa
         from decimal import Decimal
         from datetime import datetime
         from django.db.models import Q
-        import io
+        from .services_pdf import ComprobantePdf
 
         cliente = Cliente.objects.get(id=id)
         movimientos = []
@@ -11076,7 +10539,7 @@ def api_cc_cliente_exportar_pdf(request, id):
                 mov['saldo'] = 0.0
         
         movimientos.reverse()
-        empresa = Empresa.objects.first()
+        empresa = ConfiguracionEmpresa.obtener()
 
         context = {
             'cliente': cliente,
@@ -11086,16 +10549,10 @@ def api_cc_cliente_exportar_pdf(request, id):
             'fecha_impresion': datetime.now().strftime('%d/%m/%Y %H:%M')
         }
 
-        # Renderizar HTML
-        print("DEBUG: Exportando PDF con cliente_imprimir_final.html")
-        html_string = render_to_string('administrar/ctacte/cliente_imprimir_final.html', context)
-        
-        # Crear PDF
-        result = io.BytesIO()
-        pdf = pisa.pisaDocument(io.BytesIO(html_string.encode("UTF-8")), result)
+        pdf = ComprobantePdf.estado_cuenta(context)
 
-        if not pdf.err:
-            response = HttpResponse(result.getvalue(), content_type='application/pdf')
+        if pdf:
+            response = HttpResponse(pdf, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="estado_cuenta_{cliente.id}.pdf"'
             return response
         else:
@@ -11359,160 +10816,85 @@ def api_manual_leer(request, slug):
 # AUTOMATIZACIONES CONTABLES
 # ==========================================
 
+def _rango_centralizacion(request):
+    """desde/hasta (AAAA-MM-DD, por defecto hoy) y consolidado de los parámetros GET o POST"""
+    from django.utils import timezone
+    params = request.POST if request.method == "POST" else request.GET
+    hoy = timezone.localdate()
+    desde = datetime.date.fromisoformat(params["desde"]) if params.get("desde") else hoy
+    hasta = datetime.date.fromisoformat(params["hasta"]) if params.get("hasta") else desde
+    if hasta < desde:
+        raise ValueError("La fecha hasta no puede ser anterior a desde")
+    return desde, hasta, params.get("consolidado") in ("1", "true", "on")
+
+
+def _periodo_centralizado(desde, hasta):
+    from django.utils import timezone
+    return "del día" if desde == hasta == timezone.localdate() else f"del {desde:%d/%m/%Y} al {hasta:%d/%m/%Y}"
+
+
 @login_required
 def api_contabilidad_centralizar_ventas(request):
-    """API para centralizar ventas del día en el libro diario"""
-    from administrar.models import Venta, Asiento, ItemAsiento, EjercicioContable, PlanCuenta
-    from django.db.models import Max
-    import datetime
-    from django.http import JsonResponse
+    """API para centralizar ventas (del día o de un rango desde/hasta, opcionalmente consolidadas por día) en el libro diario"""
+    from .services_centralizacion import CentralizacionService
     
     try:
-        hoy = datetime.date.today()
-        ventas = Venta.objects.filter(fecha__date=hoy, estado__in=["Emitida", "Pagada"])
-        
-        ejercicio = EjercicioContable.objects.filter(cerrado=False).last()
-        if not ejercicio:
+        desde, hasta, consolidado = _rango_centralizacion(request)
+        resultado = CentralizacionService.ventas(desde, hasta, consolidado=consolidado, usuario=request.user.username)
+        if resultado["sin_ejercicio"] and not resultado["asientos"]:
             return JsonResponse({"ok": False, "error": "No hay ejercicio contable abierto"}, status=400)
             
-        # Buscar cuentas (Ventas, Deudores, IVA)
-        cta_ventas = PlanCuenta.objects.filter(codigo__in=["4.1.01", "4.1.01.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="Venta", imputable=True).first()
-        cta_deudores = PlanCuenta.objects.filter(codigo__in=["1.1.02.001", "1.1.03.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="Deudor", imputable=True).first()
-        cta_iva = PlanCuenta.objects.filter(codigo__in=["2.1.02.001", "2.1.03.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="IVA D", imputable=True).first()
-        
-        if not (cta_ventas and cta_deudores):
-            return JsonResponse({"ok": False, "error": "No se encontraron las cuentas de Ventas o Deudores en el Plan de Cuentas"}, status=400)
-            
-        count = 0
-        for v in ventas:
-            if Asiento.objects.filter(origen="VENTAS", referencia_id=v.id).exists():
-                continue
-                
-            num = (Asiento.objects.filter(ejercicio=ejercicio).aggregate(m=Max("numero"))["m"] or 0) + 1
-            asiento = Asiento.objects.create(
-                numero=num,
-                fecha=v.fecha,
-                descripcion=f"Centralización Venta #{v.id} - {v.cliente.nombre[:50]}",
-                ejercicio=ejercicio,
-                origen="VENTAS",
-                referencia_id=v.id
-            )
-            
-            # DEBE: Deudores
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cta_deudores, debe=v.total, haber=0)
-            # HABER: Ventas
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cta_ventas, debe=0, haber=v.neto)
-            # HABER: IVA
-            if v.iva_amount > 0 and cta_iva:
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cta_iva, debe=0, haber=v.iva_amount)
-            count += 1
-            
-        return JsonResponse({"ok": True, "mensaje": f"Se centralizaron {count} ventas del día."})
+        return JsonResponse({
+            "ok": True,
+            "mensaje": f"Se centralizaron {resultado['documentos']} ventas {_periodo_centralizado(desde, hasta)}.",
+            **{clave: resultado[clave] for clave in ("documentos", "asientos", "sin_ejercicio")},
+        })
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 @login_required
 def api_contabilidad_centralizar_compras(request):
-    """API para centralizar compras del día"""
-    from administrar.models import Compra, Asiento, ItemAsiento, EjercicioContable, PlanCuenta
-    from django.db.models import Max
-    import datetime
-    from django.http import JsonResponse
+    """API para centralizar compras (del día o de un rango desde/hasta, opcionalmente consolidadas por día)"""
+    from .services_centralizacion import CentralizacionService
     
     try:
-        hoy = datetime.date.today()
-        compras = Compra.objects.filter(fecha__date=hoy, estado="REGISTRADA")
-        
-        ejercicio = EjercicioContable.objects.filter(cerrado=False).last()
-        if not ejercicio:
+        desde, hasta, consolidado = _rango_centralizacion(request)
+        resultado = CentralizacionService.compras(desde, hasta, consolidado=consolidado, usuario=request.user.username)
+        if resultado["sin_ejercicio"] and not resultado["asientos"]:
             return JsonResponse({"ok": False, "error": "No hay ejercicio contable abierto"}, status=400)
             
-        cta_mercaderia = PlanCuenta.objects.filter(codigo__in=["1.1.03.001", "1.1.05.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="Mercader", imputable=True).first()
-        cta_proveedores = PlanCuenta.objects.filter(codigo__in=["2.1.01.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="Proveedor", imputable=True).first()
-        cta_iva_c = PlanCuenta.objects.filter(codigo__in=["1.1.04.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="IVA C", imputable=True).first()
-        
-        if not (cta_mercaderia and cta_proveedores):
-            return JsonResponse({"ok": False, "error": "No se encontraron las cuentas de Mercaderías o Proveedores"}, status=400)
-            
-        count = 0
-        for c in compras:
-            if Asiento.objects.filter(origen="COMPRAS", referencia_id=c.id).exists():
-                continue
-                
-            num = (Asiento.objects.filter(ejercicio=ejercicio).aggregate(m=Max("numero"))["m"] or 0) + 1
-            asiento = Asiento.objects.create(
-                numero=num,
-                fecha=c.fecha,
-                descripcion=f"Centralización Compra #{c.id} - {c.proveedor.nombre[:50]}",
-                ejercicio=ejercicio,
-                origen="COMPRAS",
-                referencia_id=c.id
-            )
-            
-            # DEBE: Mercadería (Neto)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cta_mercaderia, debe=c.neto, haber=0)
-            # DEBE: IVA (si aplica)
-            if c.iva > 0 and cta_iva_c:
-                ItemAsiento.objects.create(asiento=asiento, cuenta=cta_iva_c, debe=c.iva, haber=0)
-            # HABER: Proveedores (Total)
-            ItemAsiento.objects.create(asiento=asiento, cuenta=cta_proveedores, debe=0, haber=c.total)
-            count += 1
-            
-        return JsonResponse({"ok": True, "mensaje": f"Se centralizaron {count} compras del día."})
+        return JsonResponse({
+            "ok": True,
+            "mensaje": f"Se centralizaron {resultado['documentos']} compras {_periodo_centralizado(desde, hasta)}.",
+            **{clave: resultado[clave] for clave in ("documentos", "asientos", "sin_ejercicio")},
+        })
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 @login_required
 def api_contabilidad_centralizar_cmv(request):
-    """API para generar el asiento de Costo de Mercadería Vendida"""
-    from administrar.models import Venta, DetalleVenta, Asiento, ItemAsiento, EjercicioContable, PlanCuenta
-    from django.db.models import Max, Sum, F
-    from decimal import Decimal
-    import datetime
-    from django.http import JsonResponse
+    """API para generar los asientos diarios de Costo de Mercadería Vendida (del día o de un rango desde/hasta)"""
+    from .services_centralizacion import CentralizacionService
     
     try:
-        hoy = datetime.date.today()
-        ejercicio = EjercicioContable.objects.filter(cerrado=False).last()
-        if not ejercicio:
+        desde, hasta, _ = _rango_centralizacion(request)
+        resultado = CentralizacionService.cmv(desde, hasta, usuario=request.user.username)
+        if resultado["sin_ejercicio"] and not resultado["asientos"]:
             return JsonResponse({"ok": False, "error": "No hay ejercicio contable abierto"}, status=400)
+        if not resultado["asientos"]:
+            return JsonResponse({"ok": False, "error": f"No hay ventas con costo pendientes de centralizar {_periodo_centralizado(desde, hasta)}."}, status=400)
             
-        # Verificar si ya se hizo hoy
-        if Asiento.objects.filter(fecha__date=hoy, descripcion__contains="ASIENTO CMV").exists():
-             return JsonResponse({"ok": False, "error": "El asiento de CMV de hoy ya fue generado."}, status=400)
-             
-        # Calcular el costo total de lo vendido hoy
-        detalles = DetalleVenta.objects.filter(venta__fecha__date=hoy, venta__estado__in=["Emitida", "Pagada"])
-        total_costo = Decimal("0")
-        
-        for d in detalles:
-            costo_unitario = d.producto.costo
-            total_costo += d.cantidad * costo_unitario
-            
-        if total_costo == 0:
-            return JsonResponse({"ok": False, "error": "No hay movimientos de venta con costo para procesar hoy."}, status=400)
-            
-        cta_cmv = PlanCuenta.objects.filter(codigo__in=["5.1.01.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="CMV", imputable=True).first()
-        cta_stock = PlanCuenta.objects.filter(codigo__in=["1.1.05.001", "1.1.03.001"]).first() or PlanCuenta.objects.filter(nombre__icontains="Mercader", imputable=True).first()
-        
-        if not (cta_cmv and cta_stock):
-            return JsonResponse({"ok": False, "error": "No se encontraron las cuentas de CMV o Mercaderías"}, status=400)
-            
-        num = (Asiento.objects.filter(ejercicio=ejercicio).aggregate(m=Max("numero"))["m"] or 0) + 1
-        asiento = Asiento.objects.create(
-            numero=num,
-            fecha=datetime.datetime.now(),
-            descripcion=f"ASIENTO CMV - CENTRALIZACION DIARIA {hoy}",
-            ejercicio=ejercicio,
-            origen="MANUAL"
-        )
-        
-        # DEBE: Gasto (CMV)
-        ItemAsiento.objects.create(asiento=asiento, cuenta=cta_cmv, debe=total_costo, haber=0)
-        # HABER: Activo (Stock)
-        ItemAsiento.objects.create(asiento=asiento, cuenta=cta_stock, debe=0, haber=total_costo)
-        
-        return JsonResponse({"ok": True, "mensaje": f"Asiento de CMV generado por ${total_costo:,.2f}."})
+        return JsonResponse({
+            "ok": True,
+            "mensaje": f"Asiento de CMV generado por ${resultado['total']:,.2f}.",
+            **{clave: resultado[clave] for clave in ("documentos", "asientos", "sin_ejercicio")},
+        })
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
@@ -11573,7 +10955,7 @@ def cc_proveedor_imprimir(request, id):
         saldo += Decimal(str(mov['haber'])) - Decimal(str(mov['debe']))
         mov['saldo'] = float(saldo)
 
-    empresa = Empresa.objects.first()
+    empresa = ConfiguracionEmpresa.obtener()
 
     context = {
         'proveedor': proveedor,
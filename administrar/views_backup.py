@@ -46,217 +46,50 @@ def api_listar_backups(request):
         
     return JsonResponse({'ok': True, 'data': data})
 
-def get_mysql_executable(name):
-    """Busca el ejecutable de MySQL en el PATH o en rutas comunes de Windows"""
-    # 1. Intentar usar shutil.which para buscar en el PATH
-    import shutil
-    path = shutil.which(name)
-    if path:
-        return path
-        
-    # 2. Rutas comunes en Windows
-    common_paths = [
-        r"C:\Program Files\MySQL\MySQL Server 8.0\bin",
-        r"C:\Program Files\MySQL\MySQL Workbench 8.0",
-        r"C:\Program Files\MySQL\MySQL Workbench 8.0 CE",
-        r"C:\Program Files\MySQL\MySQL Server 5.7\bin",
-        r"C:\xampp\mysql\bin",
-    ]
-    
-    # Buscar en rutas comunes
-    for base_path in common_paths:
-        exe_path = os.path.join(base_path, f"{name}.exe")
-        if os.path.exists(exe_path):
-            return exe_path
-            
-    # 3. Búsqueda más amplia (opcional, puede ser lenta)
-    return name
-
 @csrf_exempt
 @login_required
 def api_crear_backup(request):
-    """API para crear un nuevo backup"""
+    """API para crear un nuevo backup: se encola y lo genera el worker (run_workers)"""
     if not request.user.is_staff:
         return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
         
     if request.method != 'POST':
         return JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
     
+    from .services_backup import BackupService
+    from .services_jobs import JobService
     try:
         data = json.loads(request.body)
-        tipo = data.get('tipo', 'DB') # DB o SISTEMA
-        ubicacion = data.get('ubicacion', 'LOCAL')
-        
-        # Directorios - usar ruta configurada o la por defecto
-        from .models import Empresa
-        try:
-            empresa = Empresa.objects.get(id=1)
-            if empresa.backup_local_path and empresa.backup_local_path.strip():
-                local_backup_dir = empresa.backup_local_path.strip()
-            else:
-                local_backup_dir = os.path.join(settings.BASE_DIR, 'backups', 'local')
-        except Empresa.DoesNotExist:
-            local_backup_dir = os.path.join(settings.BASE_DIR, 'backups', 'local')
-        
-        os.makedirs(local_backup_dir, exist_ok=True)
-
-        
-        timestamp = datetime.datetime.now().strftime('%d%m%Y_%H%M%S')
-        
-        final_zip_path = ""
-        nombre_backup = ""
-        
-        if tipo == 'DB':
-            # Configuración de BD
-            db_settings = settings.DATABASES['default']
-            db_name = db_settings['NAME']
-            db_user = db_settings['USER']
-            db_password = db_settings['PASSWORD']
-            db_host = db_settings['HOST']
-            
-            filename = f"backup_datos_{timestamp}.sql"
-            file_path = os.path.join(local_backup_dir, filename)
-            
-            # Obtener ruta de mysqldump
-            mysqldump_exe = get_mysql_executable('mysqldump')
-            
-            # Comando mysqldump con rutinas y triggers
-            dump_cmd = [
-                mysqldump_exe,
-                f'--host={db_host}',
-                f'--user={db_user}',
-                '--routines',
-                '--triggers',
-                '--events'
-            ]
-            
-            if db_password:
-                dump_cmd.append(f'--password={db_password}')
-                
-            dump_cmd.append(db_name)
-            
-            # Ejecutar backup
-            with open(file_path, 'w') as f:
-                try:
-                    # Timeout de 60 segundos
-                    process = subprocess.run(dump_cmd, stdout=f, stderr=subprocess.PIPE, check=False, timeout=60)
-                    
-                    if process.returncode != 0:
-                        error_msg = process.stderr.decode('utf-8')
-                        return JsonResponse({'ok': False, 'error': f'Error al ejecutar mysqldump: {error_msg}. Verifique que MySQL esté instalado y accesible.'})
-                except subprocess.TimeoutExpired:
-                    return JsonResponse({'ok': False, 'error': 'El proceso de backup excedió el tiempo límite (60s).'})
-                except FileNotFoundError:
-                     return JsonResponse({'ok': False, 'error': 'No se encontró el ejecutable "mysqldump". Por favor instale MySQL Server o agregue la carpeta bin al PATH del sistema.'})
-
-            # Comprimir a ZIP
-            zip_filename = f"backup_datos_{timestamp}.zip"
-            final_zip_path = os.path.join(local_backup_dir, zip_filename)
-            
-            with zipfile.ZipFile(final_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(file_path, arcname=filename)
-                
-            # Eliminar archivo SQL original
-            os.remove(file_path)
-            nombre_backup = f"Backup Datos SQL {timestamp}"
-            
-        elif tipo == 'DB_JSON':
-            # Backup Nativo Django (JSON)
-            from django.core.management import call_command
-            
-            filename = f"backup_datos_{timestamp}.json"
-            file_path = os.path.join(local_backup_dir, filename)
-            
-            # Ejecutar dumpdata
-            with open(file_path, 'w', encoding='utf-8') as f:
-                # Excluir sessions y contenttypes para evitar conflictos al restaurar
-                call_command('dumpdata', exclude=['auth.permission', 'contenttypes', 'sessions', 'admin'], stdout=f)
-                
-            # Comprimir a ZIP
-            zip_filename = f"backup_datos_json_{timestamp}.zip"
-            final_zip_path = os.path.join(local_backup_dir, zip_filename)
-            
-            with zipfile.ZipFile(final_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(file_path, arcname=filename)
-                
-            os.remove(file_path)
-            nombre_backup = f"Backup Datos JSON {timestamp}"
-            
-        elif tipo == 'SOLO_SISTEMA':
-            # Backup solo de archivos del sistema (sin BD)
-            zip_filename = f"backup_solo_sistema_{timestamp}.zip"
-            final_zip_path = os.path.join(local_backup_dir, zip_filename)
-            
-            project_root = settings.BASE_DIR
-            
-            with zipfile.ZipFile(final_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(project_root):
-                    # Excluir directorios pesados o innecesarios
-                    dirs[:] = [d for d in dirs if d not in ['venv', '.git', '__pycache__', 'backups', 'node_modules', 'dist', '.idea', '.vscode']]
-                    
-                    for file in files:
-                        if file.endswith('.pyc') or file.endswith('.zip') or file.endswith('.rar'):
-                            continue
-                            
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, project_root)
-                        zipf.write(file_path, arcname=arcname)
-            
-            nombre_backup = f"Backup Solo Sistema {timestamp}"
-            
-        elif tipo == 'SISTEMA':
-            # Backup de archivos del sistema
-            zip_filename = f"backup_sistema_{timestamp}.zip"
-            final_zip_path = os.path.join(local_backup_dir, zip_filename)
-            
-            project_root = settings.BASE_DIR
-            
-            with zipfile.ZipFile(final_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(project_root):
-                    # Excluir directorios pesados o innecesarios
-                    dirs[:] = [d for d in dirs if d not in ['venv', '.git', '__pycache__', 'backups', 'node_modules', 'dist', '.idea', '.vscode']]
-                    
-                    for file in files:
-                        if file.endswith('.pyc') or file.endswith('.zip') or file.endswith('.rar'):
-                            continue
-                            
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, project_root)
-                        zipf.write(file_path, arcname=arcname)
-            
-            nombre_backup = f"Backup Sistema {timestamp}"
-        
-        else:
-             return JsonResponse({'ok': False, 'error': 'Tipo de backup no válido'})
+        tipo = data.get('tipo', 'DB') # DB, DB_JSON, SOLO_SISTEMA o SISTEMA
+        if tipo not in BackupService.TIPOS:
+            return JsonResponse({'ok': False, 'error': 'Tipo de backup no válido'})
 
-        # Calcular tamaño
-        file_size = os.path.getsize(final_zip_path)
-        
-        # Guardar registro en BD (solo LOCAL)
-        backup = Backup.objects.create(
-            nombre=nombre_backup,
-            tipo=tipo,
-            archivo=final_zip_path,
-            tamanio=file_size,
-            ubicacion='LOCAL',
-            creado_por=request.user
-        )
-        
+        job = JobService.encolar('backup', {'tipo': tipo, 'usuario_id': request.user.id})
         return JsonResponse({
-            'ok': True, 
-            'mensaje': 'Backup creado exitosamente',
-            'backup': {
-                'id': backup.id,
-                'nombre': backup.nombre,
-                'fecha': backup.fecha_creacion.strftime('%d/%m/%Y %H:%M'),
-                'tamanio': backup.tamanio_formateado(),
-                'tipo': backup.get_tipo_display()
-            }
+            'ok': True,
+            'mensaje': 'Backup en proceso',
+            'job_id': job.id if job else None,
         })
         
     except Exception as e:
         return JsonResponse({'ok': False, 'error': str(e)}, status=500)
 
+@login_required
+def api_estado_backup(request, job_id):
+    """API para consultar el estado de un backup encolado"""
+    if not request.user.is_staff:
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+
+    from .models import Job
+    job = get_object_or_404(Job, pk=job_id, tipo='backup')
+    return JsonResponse({
+        'ok': True,
+        'estado': job.estado,
+        'intentos': job.intentos,
+        'error': job.ultimo_error.strip().splitlines()[-1] if job.ultimo_error else '',
+        'resultado': job.resultado,
+    })
+
 @csrf_exempt
 @login_required
 def api_subir_backup(request):
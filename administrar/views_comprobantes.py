@@ -3,7 +3,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.db import transaction
-from .models import Venta, DetalleVenta, NotaCredito, DetalleNotaCredito, NotaDebito, DetalleNotaDebito, Remito, DetalleRemito, Producto, MovimientoStock, Empresa
+from .models import Venta, DetalleVenta, NotaCredito, DetalleNotaCredito, NotaDebito, DetalleNotaDebito, Remito, DetalleRemito, Producto, Empresa
+from .services import ConfiguracionEmpresa
+from .services_stock import LibroStockService
 
 @login_required
 def lista_nc_nd(request):
@@ -74,24 +76,19 @@ def crear_nota_credito(request, venta_id):
                         subtotal=subtotal
                     )
 
-                    # Devolver stock
-                    producto.stock += int(cantidad) 
-                    producto.save()
-                    
-                    MovimientoStock.objects.create(
-                        producto=producto,
-                        tipo='IN',
-                        cantidad=cantidad,
+                    # Devolver stock (movimiento + UPDATE con F())
+                    LibroStockService.registrar(
+                        [(producto, 'IN', cantidad)],
                         referencia=f"NC {nc.numero_formateado()} (Anula Venta {venta.id})",
-                        observaciones=f"Devolución parcial/total - {motivo}"
+                        observaciones=f"Devolución parcial/total - {motivo}",
                     )
 
                 # Generar Asiento
                 try:
-                    from .services import AccountingService
-                    AccountingService.registrar_nota_credito(nc)
+                    from .services_jobs import JobService
+                    JobService.asientos(('registrar_nota_credito', nc))
                 except Exception as e:
-                    print(f"Error generando asiento de NC {nc.id}: {e}")
+                    print(f"Error encolando asiento de NC {nc.id}: {e}")
 
                 return JsonResponse({'ok': True, 'message': 'Nota de Crédito generada correctamente', 'id': nc.id})
 
@@ -114,7 +111,8 @@ def crear_nota_credito(request, venta_id):
             )
             
             # Copiar detalles completos
-            for det in venta.detalles.all():
+            detalles = list(venta.detalles.select_related('producto'))
+            for det in detalles:
                 DetalleNotaCredito.objects.create(
                     nota_credito=nc,
                     producto=det.producto,
@@ -122,22 +120,18 @@ def crear_nota_credito(request, venta_id):
                     precio_unitario=det.precio_unitario,
                     subtotal=det.subtotal
                 )
-                
-                det.producto.stock += int(det.cantidad)
-                det.producto.save()
-                MovimientoStock.objects.create(
-                    producto=det.producto,
-                    tipo='IN',
-                    cantidad=det.cantidad,
-                    referencia=f"NC {nc.id} (Anula Venta {venta.id})",
-                    observaciones="Devolución por Nota de Crédito"
-                )
+
+            LibroStockService.registrar(
+                [(det.producto, 'IN', det.cantidad) for det in detalles],
+                referencia=f"NC {nc.id} (Anula Venta {venta.id})",
+                observaciones="Devolución por Nota de Crédito",
+            )
 
             try:
-                from .services import AccountingService
-                AccountingService.registrar_nota_credito(nc)
+                from .services_jobs import JobService
+                JobService.asientos(('registrar_nota_credito', nc))
             except Exception as e:
-                print(f"Error generando asiento de NC {nc.id}: {e}")
+                print(f"Error encolando asiento de NC {nc.id}: {e}")
 
             messages.success(request, f'Nota de Crédito {nc.numero_formateado()} generada correctamente.')
             return redirect('detalle_venta', venta_id=venta.id)
@@ -182,16 +176,11 @@ def detalle_remito(request, id):
 
 @login_required
 def imprimir_remito(request, id):
-    from .utils_pdf import render_to_pdf
+    from .services_pdf import ComprobantePdf
     remito = get_object_or_404(Remito, pk=id)
-    empresa = Empresa.objects.first()
-    
-    context = {'remito': remito, 'empresa': empresa}
     
-    response = render_to_pdf('administrar/comprobantes/rem_pdf.html', context)
+    response, context = ComprobantePdf.respuesta(request, 'remito', remito)
     if response:
-        filename = f"Remito_{remito.numero_formateado().replace('-', '_')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
         return response
         
     return render(request, 'administrar/comprobantes/rem_modern.html', context)
@@ -199,40 +188,22 @@ def imprimir_remito(request, id):
 
 @login_required
 def imprimir_nc(request, id):
-    from .utils_pdf import render_to_pdf
+    from .services_pdf import ComprobantePdf
     nc = get_object_or_404(NotaCredito, pk=id)
-    empresa = Empresa.objects.first()
     
-    context = {
-        'nota': nc,
-        'empresa': empresa,
-        'detalles': nc.detalles.all()
-    }
-    
-    response = render_to_pdf('administrar/comprobantes/nc_nd_pdf.html', context)
+    response, context = ComprobantePdf.respuesta(request, 'nc', nc)
     if response:
-        filename = f"NotaCredito_{nc.numero_formateado().replace('-', '_')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
         return response
         
     return render(request, 'administrar/comprobantes/nc_modern.html', context)
 
 @login_required
 def imprimir_nd(request, id):
-    from .utils_pdf import render_to_pdf
+    from .services_pdf import ComprobantePdf
     nd = get_object_or_404(NotaDebito, pk=id)
-    empresa = Empresa.objects.first()
-    
-    context = {
-        'nota': nd,
-        'empresa': empresa,
-        'detalles': nd.detalles.all()
-    }
     
-    response = render_to_pdf('administrar/comprobantes/nc_nd_pdf.html', context)
+    response, context = ComprobantePdf.respuesta(request, 'nd', nd)
     if response:
-        filename = f"NotaDebito_{nd.numero_formateado().replace('-', '_')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
         return response
         
     return render(request, 'administrar/comprobantes/nd_modern.html', context)
@@ -363,15 +334,10 @@ def api_remito_guardar(request):
                 # STOCK LOGIC:
                 # Si NO hay venta asociada, el remito mueve stock (es una entrega directa/"negro"/garantía)
                 if not venta:
-                    producto.stock -= int(cantidad) 
-                    producto.save()
-                    
-                    MovimientoStock.objects.create(
-                        producto=producto,
-                        tipo='OUT',
-                        cantidad=cantidad,
+                    LibroStockService.registrar(
+                        [(producto, 'OUT', cantidad)],
                         referencia=f"Remito {remito.numero_formateado()}",
-                        observaciones="Entrega por Remito Independiente"
+                        observaciones="Entrega por Remito Independiente",
                     )
 
             return JsonResponse({'ok': True, 'id': remito.id, 'message': 'Remito generado correctamente'})
@@ -381,3 +347,63 @@ def api_remito_guardar(request):
             return JsonResponse({'ok': False, 'error': str(e)}, status=500)
             
     return JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
+
+
+@login_required
+def api_comprobantes_lote_pdf(request):
+    """
+    Encola la exportación a 1 ZIP de los PDFs de facturas, NC, ND y remitos de un período
+    (entrega de fin de mes al contador). Body: {desde, hasta, tipos?: ['factura', 'nc', 'nd', 'remito']}
+    """
+    import json
+    from datetime import date
+    from .services_jobs import JobService
+    from .services_pdf import ComprobantePdf
+    from .services_permisos import PermisosUsuario
+
+    if not PermisosUsuario.tiene(request.user, 'contabilidad'):
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        desde = date.fromisoformat(data.get('desde', ''))
+        hasta = date.fromisoformat(data.get('hasta', ''))
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Fechas inválidas (YYYY-MM-DD)'}, status=400)
+    if hasta < desde:
+        return JsonResponse({'ok': False, 'error': 'La fecha hasta no puede ser anterior a desde'}, status=400)
+    tipos = data.get('tipos') or None
+    if tipos and not set(tipos) <= set(ComprobantePdf.DOCUMENTOS):
+        return JsonResponse({'ok': False, 'error': 'Tipo de comprobante no válido'}, status=400)
+
+    job = JobService.encolar('pdf_lote', {'desde': desde.isoformat(), 'hasta': hasta.isoformat(), 'tipos': tipos})
+    return JsonResponse({'ok': True, 'mensaje': 'Exportación en proceso', 'job_id': job.id if job else None})
+
+
+@login_required
+def api_comprobantes_lote_pdf_estado(request, job_id):
+    """Estado de una exportación en lote; con ?descargar=1 y la exportación terminada, descarga el ZIP"""
+    import os
+    from django.http import FileResponse, Http404
+    from .models import Job
+    from .services_permisos import PermisosUsuario
+
+    if not PermisosUsuario.tiene(request.user, 'contabilidad'):
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+    job = get_object_or_404(Job, pk=job_id, tipo='pdf_lote')
+
+    if request.GET.get('descargar') and job.estado == 'COMPLETADO':
+        archivo = job.resultado['archivo']
+        if not os.path.isfile(archivo):
+            raise Http404("El archivo de la exportación ya no existe")
+        return FileResponse(open(archivo, 'rb'), as_attachment=True, filename=os.path.basename(archivo))
+
+    return JsonResponse({
+        'ok': True,
+        'estado': job.estado,
+        'documentos': (job.resultado or {}).get('documentos'),
+        'errores': (job.resultado or {}).get('errores', []),
+        'error': job.ultimo_error.strip().splitlines()[-1] if job.ultimo_error else '',
+    })
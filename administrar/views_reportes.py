@@ -1,12 +1,13 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, F, ExpressionWrapper, DecimalField, Q, DateField
+from django.db.models import Sum, Count, F, Q, DateField
 from django.db.models.functions import Cast
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import Venta, Compra, Producto, MovimientoCaja, Cliente, Proveedor, DetalleVenta, DetalleCompra, Empresa
 from .views import verificar_permiso
+from .services_ventas import VentaService
 from decimal import Decimal
 
 @login_required
@@ -79,8 +80,8 @@ def api_reportes_generar(request):
             ).annotate(
                 qty=Sum('cantidad'),
                 total=Sum('subtotal'),
-                # Calculamos el costo total multiplicando cantidad vendida por costo actual del producto
-                costo_tot=Sum(ExpressionWrapper(F('cantidad') * F('producto__costo'), output_field=DecimalField()))
+                # Costo total con el costo capturado en cada línea al momento de la venta
+                costo_tot=Sum(VentaService.costo_linea())
             ).order_by('-qty')[:100]
             
             for s in stats:
@@ -427,13 +428,8 @@ def api_reportes_generar(request):
             n_sum = ventas_tot.aggregate(s=Sum('neto'))['s'] or 0
             g_sum = gastos_tot.aggregate(s=Sum('monto'))['s'] or 0
             
-            # Aproximación del costo de mercadería vendida (CMV)
-            # Podríamos calcularlo exacto sumando costos de DetalleVenta
-            detalles = DetalleVenta.objects.filter(venta__in=ventas_tot)
-            cmv = 0
-            for d in detalles:
-                # Buscamos el costo en el momento de la venta o actual
-                cmv += (d.cantidad * (d.producto.costo if d.producto else 0))
+            # Costo de mercadería vendida (CMV) con el costo de cada línea al momento de la venta, 1 aggregate
+            cmv = VentaService.costo_ventas(ventas_tot)
 
             headers = ['Concepto', 'Monto']
             data = [
@@ -1,14 +1,21 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.timezone import make_aware, get_current_timezone
 from datetime import datetime, time
 from decimal import Decimal
 import json
+import logging
 
-from .models import Producto, MovimientoStock, Empresa
+from .models import Producto, MovimientoStock
+from .services import ConfiguracionEmpresa
+from .services_stock import InventarioService, ErrorInventario, LibroStockService
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
@@ -35,42 +42,33 @@ def api_stock_ajuste_crear(request):
         if cantidad <= 0:
             return JsonResponse({'error': 'Cantidad debe ser mayor a 0'}, status=400)
 
-        # Obtener producto
-        try:
-            producto = Producto.objects.get(id=producto_id)
-        except Producto.DoesNotExist:
+        # El stock se lleva en unidades: no truncar cantidades con decimales
+        if cantidad != cantidad.to_integral_value():
+            return JsonResponse({'error': 'La cantidad debe ser un número entero'}, status=400)
+        unidades = int(cantidad)
+
+        if not Producto.objects.filter(id=producto_id).exists():
             return JsonResponse({'error': 'Producto no encontrado'}, status=404)
 
-        # Verificar stock negativo si está configurado
-        empresa = Empresa.objects.first()
-        if empresa and not empresa.permitir_stock_negativo:
-            if tipo == 'OUT' and producto.stock < cantidad:
+        empresa = ConfiguracionEmpresa.obtener()
+        controlar_negativo = tipo == 'OUT' and empresa and not empresa.permitir_stock_negativo
+
+        with transaction.atomic():
+            # Bloqueo del producto: el control de stock y el ajuste no se cruzan con una venta concurrente
+            producto = Producto.objects.select_for_update().only('id', 'stock', 'costo').get(id=producto_id)
+            if controlar_negativo and producto.stock < unidades:
                 return JsonResponse({
                     'error': f'Stock insuficiente. Stock actual: {producto.stock}'
                 }, status=400)
-
-        # Crear movimiento
-        movimiento = MovimientoStock.objects.create(
-            producto=producto,
-            tipo=tipo,
-            cantidad=cantidad,
-            referencia='Ajuste Manual',
-            observaciones=observaciones
-        )
-
-        # Actualizar stock del producto
-        if tipo == 'IN':
-            producto.stock += int(cantidad)
-        else:  # OUT
-            producto.stock -= int(cantidad)
-        
-        producto.save()
+            delta = unidades if tipo == 'IN' else -unidades
+            movimiento, = LibroStockService.registrar([(producto, tipo, unidades)], 'Ajuste Manual', observaciones)
+            stock_nuevo = producto.stock + delta
 
         return JsonResponse({
             'success': True,
             'movimiento_id': movimiento.id,
-            'stock_anterior': producto.stock - int(cantidad) if tipo == 'IN' else producto.stock + int(cantidad),
-            'stock_nuevo': producto.stock,
+            'stock_anterior': stock_nuevo - delta,
+            'stock_nuevo': stock_nuevo,
             'mensaje': f'Ajuste de stock realizado correctamente'
         })
 
@@ -80,6 +78,57 @@ def api_stock_ajuste_crear(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+@require_http_methods(["POST"])
+def api_stock_inventario(request):
+    """
+    Importa un conteo físico de inventario (codigo, cantidad contada) y ajusta el stock por la diferencia.
+    Recibe un archivo `archivo` (multipart) o el conteo en el cuerpo del request.
+    Parámetros: formato (csv | json | ndjson, por defecto según extensión/content-type), aplicar=1
+    (sin él solo devuelve el informe de diferencias), observaciones.
+    Requiere el permiso de productos (o staff): reemplaza el stock de todo el catálogo.
+    """
+    import io
+    from .services_permisos import PermisosUsuario
+
+    if not PermisosUsuario.tiene(request.user, 'productos'):
+        return JsonResponse({'ok': False, 'error': 'No autorizado'}, status=403)
+
+    archivo = request.FILES.get('archivo')
+    formato = (request.GET.get('formato') or request.POST.get('formato') or '').strip().lower()
+    if not formato:
+        nombre = archivo.name.lower() if archivo else ''
+        tipo_contenido = (archivo.content_type if archivo else request.content_type) or ''
+        if nombre.endswith('.ndjson') or 'ndjson' in tipo_contenido:
+            formato = 'ndjson'
+        elif nombre.endswith('.json') or 'json' in tipo_contenido:
+            formato = 'json'
+        else:
+            formato = 'csv'
+    aplicar = (request.GET.get('aplicar') or request.POST.get('aplicar')) in ('1', 'true', 'si')
+    observaciones = request.GET.get('observaciones') or request.POST.get('observaciones') or ''
+
+    try:
+        if archivo:
+            lineas = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+        elif request.content_type == 'multipart/form-data':
+            return JsonResponse({'error': 'Falta el archivo de conteo'}, status=400)
+        else:
+            lineas = io.StringIO(request.body.decode('utf-8-sig'), newline='')
+        conteo, errores = InventarioService.conteo(InventarioService.leer(lineas, formato))
+    except (ErrorInventario, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if errores and aplicar:
+        # No aplicar un conteo parcial: se corrige el archivo y se vuelve a importar
+        return JsonResponse({'error': 'El archivo tiene filas con errores', 'errores': errores}, status=400)
+
+    informe = InventarioService.aplicar_conteo(conteo, aplicar=aplicar, observaciones=observaciones)
+    logger.info("Inventario %s: %s ajustes, %s códigos no encontrados", 'aplicado' if aplicar else 'simulado',
+                len(informe['ajustes']), len(informe['no_encontrados']))
+    return JsonResponse({'success': True, 'errores': errores, **informe})
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def api_stock_movimientos_listar(request):
@@ -220,3 +269,49 @@ def api_stock_movimientos_producto(request, producto_id):
 
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_stock_inventario_al(request):
+    """
+    Inventario valorizado al cierre de una fecha (último CierreStock + movimientos posteriores).
+    Parámetros: fecha (YYYY-MM-DD, por defecto hoy), formato (json | ndjson | csv), todos=1 (incluye cantidad 0).
+    """
+    from .services_listados import ListadoKeyset
+
+    try:
+        fecha = request.GET.get('fecha', '').strip()
+        fecha = datetime.strptime(fecha, '%Y-%m-%d').date() if fecha else timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'Fecha inválida (YYYY-MM-DD)'}, status=400)
+    formato = request.GET.get('formato', 'json')
+    incluir_ceros = request.GET.get('todos') == '1'
+
+    inventario = LibroStockService.inventario_al(fecha)
+    productos = Producto.objects.values_list('id', 'codigo', 'descripcion').order_by('codigo')
+
+    def filas():
+        for producto_id, codigo, descripcion in productos.iterator(chunk_size=2000):
+            cantidad, costo = inventario.get(producto_id, (Decimal('0'), Decimal('0')))
+            if not cantidad and not incluir_ceros:
+                continue
+            yield {
+                'codigo': codigo,
+                'descripcion': descripcion,
+                'cantidad': float(cantidad),
+                'costo_unitario': float(costo),
+                'valor': float(cantidad * costo) if cantidad > 0 else 0.0,
+            }
+
+    if formato in ListadoKeyset.FORMATOS:
+        return ListadoKeyset.exportar(filas(), formato, f"inventario_{fecha.isoformat()}")
+
+    data = list(filas())
+    cierre = LibroStockService.ultimo_cierre(fecha)
+    return JsonResponse({
+        'fecha': fecha.isoformat(),
+        'cierre_base': cierre.isoformat() if cierre else None,
+        'productos': data,
+        'valor_total': round(sum(fila['valor'] for fila in data), 2),
+    })
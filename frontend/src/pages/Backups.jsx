@@ -94,6 +94,19 @@ const Backups = () => {
 
         try {
             const response = await axios.post('/api/backups/crear/', createForm);
+            if (response.data.ok && response.data.job_id) {
+                // El backup lo genera el worker en segundo plano: consultar su estado hasta que termine
+                let estado = { estado: 'PENDIENTE' };
+                while (estado.estado === 'PENDIENTE' || estado.estado === 'EN_CURSO') {
+                    await new Promise(resolve => setTimeout(resolve, 2000));
+                    estado = (await axios.get(`/api/backups/estado/${response.data.job_id}/`)).data;
+                    if (estado.estado === 'PENDIENTE' && estado.error) break;
+                }
+                if (estado.estado !== 'COMPLETADO') {
+                    showErrorAlert('Error', estado.error || 'No se pudo crear el respaldo');
+                    return;
+                }
+            }
             if (response.data.ok) {
                 await showSuccessAlert(
                     'Éxito',
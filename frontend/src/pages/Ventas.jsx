@@ -62,11 +62,16 @@ const Ventas = () => {
                 fecha_start: dateRange.start,
                 fecha_end: dateRange.end
             });
-            const response = await fetch(`/api/ventas/listar/?${params}`, { signal });
-            const data = await response.json();
-
-            let allVentas = data.data || data.ventas || [];
-            if (Array.isArray(data)) allVentas = data;
+            // El listado viene paginado por cursor: se siguen las páginas hasta completar el rango
+            let allVentas = [];
+            let cursor = null;
+            do {
+                if (cursor) params.set('cursor', cursor);
+                const response = await fetch(`/api/ventas/listar/?${params}`, { signal });
+                const data = await response.json();
+                allVentas = allVentas.concat(data.data || data.ventas || []);
+                cursor = data.siguiente;
+            } while (cursor);
 
             if (busqueda) {
                 const q = busqueda.toLowerCase();
@@ -14,7 +14,10 @@ if exist venv\Scripts\activate (
 echo 2. Abriendo navegador...
 start http://localhost:8000
 
-echo 3. Iniciando servidor...
+echo 3. Iniciando workers de tareas en segundo plano (asientos, backups)...
+start "Sistema de Facturacion - Workers" /min python manage.py run_workers --hilos 2
+
+echo 4. Iniciando servidor...
 echo    (No cierres esta ventana mientras uses el sistema)
 echo.
 python run_waitress.py
@@ -101,6 +101,27 @@ DATABASES = {
 db_from_env = dj_database_url.config(conn_max_age=600)
 DATABASES['default'].update(db_from_env)
 
+# Cache compartido entre procesos (workers de gunicorn/waitress y run_workers). Sólo guarda las versiones
+# de administrar.utils_cache.CacheVersionado (empresa, permisos, dashboard, cheques, ...): los valores
+# viven en cada proceso y las versiones se leen juntas 1 vez por request, así que con la tabla de la base
+# cada request paga a lo sumo 1 SELECT. Con REDIS_URL se usa Redis; si no, una tabla de la base (la crea
+# la migración 0076 / createcachetable).
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_compartido',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
 # Render.com Configuration
 if 'RENDER' in os.environ:
     RENDER_EXTERNAL_HOSTNAME = os.environ.get('RENDER_EXTERNAL_HOSTNAME')
@@ -189,3 +210,15 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Sistema Gani <noreply@distribuidoragani.com>')
 
+# Jobs en segundo plano (administrar.services_jobs, procesados por `manage.py run_workers`).
+# True: se ejecutan en el mismo proceso al commit, para instalaciones sin worker
+JOBS_EN_LINEA = os.getenv('JOBS_EN_LINEA', 'False') == 'True'
+
+# Cache en disco de PDFs de comprobantes (MEDIA_ROOT/pdf_cache), tamaño máximo antes de borrar los menos usados
+PDF_CACHE_MAX_MB = int(os.getenv('PDF_CACHE_MAX_MB', 500))
+
+# Motor de los PDFs de comprobantes y estados de cuenta: 'reportlab' (directo, administrar.services_pdf_nativo)
+# o 'xhtml2pdf' (templates HTML). Fuentes TTF opcionales para ReportLab: "ruta_normal.ttf,ruta_negrita.ttf"
+PDF_MOTOR = os.getenv('PDF_MOTOR', 'reportlab')
+PDF_FUENTES_TTF = os.getenv('PDF_FUENTES_TTF', '')
+